@@ -1,170 +1,720 @@
 """
 批量下载编排模块
 负责协调CSV数据处理和下载流程，实现批量下载功能
+提供任务队列（download_jobs）时，编号先入队再领取，每个编号的结果持久化，中断后重新运行从中断处继续
+提供优先级调度器（code_priority）时，按分数从高到低处理编号，每个结果出来后重新打分
+
+CSV、数据库与编号列表三种入口共用同一个编排循环（BatchDownloader.run）：
+- 执行器：搜索函数在执行器中运行（默认每个worker一个专属线程，协程函数使用asyncio事件循环），编排循环只负责派发与收集结果
+- 单任务时限：单个编号超过 task_timeout 秒未返回时记为超时失败；线程执行器放弃该worker
+  （卡住的调用返回后自行关闭浏览器会话，结束时最多等待 abandon_timeout 秒）并启动替补worker，
+  asyncio执行器直接取消协程。超时后才返回的结果按实际结论更正统计与任务队列
+- 自适应间隔：最近一段结果的失败率升高时成倍拉长下载间隔，恢复后逐步缩回设定值
+- 进度回调：每个编号完成后报告已完成数、吞吐（个/分钟）与预计剩余时间
 """
 
+import asyncio
+import itertools
+import os
+import queue
+import threading
 import time
-from typing import List, Optional, Callable
-from csv_utils import get_video_codes_from_csv
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional, Sized, Tuple
+from csv_utils import iter_video_codes_from_csv
+
+
+# 单个编号的默认时限（秒）；可用环境变量 BATCH_TASK_TIMEOUT 覆盖，0 表示不限时
+DEFAULT_TASK_TIMEOUT = 600
+
+
+def default_task_timeout() -> Optional[float]:
+    """单任务时限：环境变量 BATCH_TASK_TIMEOUT 优先，0 表示不限时"""
+    value = float(os.getenv("BATCH_TASK_TIMEOUT", DEFAULT_TASK_TIMEOUT))
+    return value if value > 0 else None
+
+
+def format_duration(seconds: float) -> str:
+    """把秒数格式化为 1小时5分 / 3分20秒 / 45秒"""
+    seconds = int(max(seconds, 0))
+    hours, rest = divmod(seconds, 3600)
+    minutes, secs = divmod(rest, 60)
+    if hours:
+        return f"{hours}小时{minutes}分"
+    if minutes:
+        return f"{minutes}分{secs}秒"
+    return f"{secs}秒"
+
+
+def print_progress(progress: Dict[str, Any]):
+    """默认的进度回调：打印完成数、吞吐与预计剩余时间"""
+    eta = format_duration(progress['eta']) if progress['eta'] is not None else "未知"
+    print(f"📶 进度 {progress['done']}/{progress['total']} | ✅ {progress['success']} "
+          f"❌ {progress['failed']} ⏭️ {progress['skipped']} | "
+          f"{progress['per_minute']:.1f} 个/分钟 | 间隔 {progress['delay']:.1f}秒 | 预计剩余 {eta}")
+
+
+class AdaptivePacer:
+    """
+    按最近结果的失败率调整下载间隔
+
+    失败（下载流程失败、超时）比例达到 high 时间隔倍数翻倍（最多 max_factor 倍），
+    降到 low 以下时倍数减半直至恢复设定值。论坛无结果、已购买跳过不算失败。
+    """
+
+    def __init__(self, base_delay: float, window: int = 10, high: float = 0.3, low: float = 0.1,
+                 max_factor: float = 8.0):
+        self.base_delay = base_delay
+        self.window: Deque[bool] = deque(maxlen=window)
+        self.high = high
+        self.low = low
+        self.max_factor = max_factor
+        self.factor = 1.0
+
+    def delay(self) -> float:
+        if self.factor <= 1.0:
+            return self.base_delay
+        # 设定间隔为0时以1秒为单位退避
+        return (self.base_delay or 1.0) * self.factor
+
+    def failure_rate(self) -> float:
+        return sum(self.window) / len(self.window) if self.window else 0.0
+
+    def record(self, failed: bool):
+        self.window.append(failed)
+        # 窗口未满时只在连续失败时退避，避免前几个结果的偶然失败就拉长间隔
+        if len(self.window) < self.window.maxlen and not all(self.window):
+            return
+        rate = self.failure_rate()
+        previous = self.factor
+        if rate >= self.high:
+            self.factor = min(self.factor * 2, self.max_factor)
+        elif rate <= self.low:
+            self.factor = max(self.factor / 2, 1.0)
+        if self.factor != previous:
+            icon = "🐢" if self.factor > previous else "🐇"
+            print(f"{icon} 最近失败率 {rate:.0%}，下载间隔调整为 {self.delay():.1f} 秒")
+
+
+class ThreadWorkerExecutor:
+    """
+    每个worker一个专属线程的执行器
+
+    worker_factory(序号) 在worker线程内调用，返回 (搜索下载函数, 关闭函数)；启动失败返回None。
+    Playwright同步API不能跨线程共享，浏览器会话在线程内创建，之后也只在该线程内使用，
+    关闭函数也只能由该线程在退出前调用。
+    """
+
+    def __init__(self, worker_factory: Callable[[int], Optional[Tuple[Callable[[str], Any], Callable[[], None]]]],
+                 workers: int = 1, abandon_timeout: float = 30.0):
+        self.worker_factory = worker_factory
+        self.workers = workers
+        self.abandon_timeout = abandon_timeout
+        self._indexes = itertools.count()
+        self._inboxes: Dict[int, "queue.Queue[Optional[Tuple[str, Future]]]"] = {}
+        self._threads: Dict[int, threading.Thread] = {}
+        # 因超时被放弃、卡住的调用尚未返回的worker线程
+        self._abandoned: Dict[int, threading.Thread] = {}
+
+    def start(self) -> List[int]:
+        """启动全部worker（并行启动），返回启动成功的worker序号"""
+        pending = [self._spawn() for _ in range(self.workers)]
+        return [index for index, ready in pending if ready.result()]
+
+    def _spawn(self) -> Tuple[int, Future]:
+        index = next(self._indexes)
+        inbox: "queue.Queue[Optional[Tuple[str, Future]]]" = queue.Queue()
+        ready: Future = Future()
+        thread = threading.Thread(target=self._worker_loop, args=(index, inbox, ready),
+                                  name=f"subtitle-worker-{index}", daemon=True)
+        self._inboxes[index] = inbox
+        self._threads[index] = thread
+        thread.start()
+        return index, ready
+
+    def _worker_loop(self, index: int, inbox: "queue.Queue", ready: Future):
+        try:
+            worker = self.worker_factory(index)
+            if worker is None:
+                print(f"❌ worker-{index} 启动失败，其余worker继续处理")
+        except Exception as e:
+            print(f"❌ worker-{index} 启动失败: {e}")
+            worker = None
+        if worker is None:
+            self._inboxes.pop(index, None)
+            self._threads.pop(index, None)
+            ready.set_result(False)
+            return
+        search_function, close_function = worker
+        ready.set_result(True)
+        try:
+            while True:
+                item = inbox.get()
+                if item is None:
+                    break
+                code, future = item
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    future.set_result(search_function(code))
+                except BaseException as e:
+                    # 包括 sys.exit()，由编排循环按 exit 类型处理
+                    future.set_exception(e)
+        finally:
+            try:
+                close_function()
+            except Exception as e:
+                print(f"⚠️ worker-{index} 关闭失败: {e}")
+
+    def submit(self, worker: int, code: str) -> Future:
+        future: Future = Future()
+        self._inboxes[worker].put((code, future))
+        return future
+
+    def cancel(self, worker: int, future: Future) -> Optional[int]:
+        """
+        放弃超时的worker并启动替补，返回替补worker序号（启动失败返回None）
+
+        线程无法被强制终止：卡住的调用返回后该worker自行关闭浏览器会话并退出，
+        shutdown() 时最多等待 abandon_timeout 秒
+        """
+        self.retire(worker)
+        thread = self._threads.pop(worker, None)
+        if thread is not None:
+            self._abandoned[worker] = thread
+        index, ready = self._spawn()
+        if not ready.result():
+            return None
+        print(f"🔄 worker-{worker} 已放弃，替补 worker-{index} 已启动")
+        return index
+
+    def retire(self, worker: int):
+        """让worker处理完当前任务后退出"""
+        inbox = self._inboxes.pop(worker, None)
+        if inbox is not None:
+            inbox.put(None)
+
+    def shutdown(self):
+        for worker in list(self._inboxes):
+            self.retire(worker)
+        for thread in list(self._threads.values()):
+            thread.join()
+        self._threads.clear()
+        # 被放弃的worker在卡住的调用返回后才会关闭浏览器会话，限时等待
+        deadline = time.monotonic() + self.abandon_timeout
+        for index, thread in list(self._abandoned.items()):
+            thread.join(max(deadline - time.monotonic(), 0))
+            if thread.is_alive():
+                print(f"⚠️ worker-{index} 的超时任务仍未返回，放弃等待（浏览器会话未能关闭）")
+            else:
+                del self._abandoned[index]
+
+
+class AsyncioExecutor:
+    """
+    协程搜索函数的执行器：在后台线程的事件循环中并发运行 concurrency 个任务，超时的任务直接取消
+    """
+
+    def __init__(self, search_function: Callable[[str], Any], concurrency: int = 1):
+        self.search_function = search_function
+        self.concurrency = concurrency
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> List[int]:
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="batch-asyncio", daemon=True)
+        self._thread.start()
+        return list(range(self.concurrency))
+
+    def submit(self, worker: int, code: str) -> Future:
+        return asyncio.run_coroutine_threadsafe(self.search_function(code), self._loop)
+
+    def cancel(self, worker: int, future: Future) -> Optional[int]:
+        future.cancel()
+        return worker
+
+    def retire(self, worker: int):
+        pass
+
+    def shutdown(self):
+        if self._loop is None:
+            return
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+        self._loop = None
 
 
 class BatchDownloader:
     """批量下载器类"""
-    
-    def __init__(self, 
-                 search_function: Callable[[str], None],
-                 delay_between_downloads: float = 2.0):
+
+    def __init__(self,
+                 search_function: Callable[[str], Any],
+                 delay_between_downloads: float = 2.0,
+                 job_queue=None,
+                 scheduler=None,
+                 task_timeout: Optional[float] = -1,
+                 progress_callback: Optional[Callable[[Dict[str, Any]], None]] = print_progress):
         """
         初始化批量下载器
-        
+
         Args:
-            search_function: 搜索下载函数，接受keyword参数
-            delay_between_downloads: 下载间隔时间（秒）
+            search_function: 搜索下载函数，接受keyword参数（可为协程函数）；
+                             返回结果字典（含 status 字段）时按状态计数，返回None视为成功
+            delay_between_downloads: 下载间隔时间（秒），失败率升高时自动拉长
+            job_queue: 可选的 DownloadJobQueue，提供时编号从任务队列领取并记录结果
+            scheduler: 可选的 PriorityScheduler，提供时按优先级分数顺序处理编号
+            task_timeout: 单个编号的时限（秒），None 不限时，默认取 BATCH_TASK_TIMEOUT 或 600 秒
+            progress_callback: 每个编号完成后以进度字典调用，None 不报告
         """
         self.search_function = search_function
         self.delay_between_downloads = delay_between_downloads
+        self.job_queue = job_queue
+        self.scheduler = scheduler
+        self.task_timeout = default_task_timeout() if task_timeout == -1 else task_timeout
+        self.progress_callback = progress_callback
+        self.pacer = AdaptivePacer(delay_between_downloads)
+        self.workers_started = 0
+        self._claimed = 0
+        self._pending: Deque[Tuple[int, str]] = deque()
         self.download_stats = {
             'total': 0,
             'success': 0,
             'failed': 0,
             'skipped': 0
         }
-    
-    def download_from_csv(self, 
-                         csv_path: str, 
+        self._stats_lock = threading.Lock()
+
+    def download_from_csv(self,
+                         csv_path: str,
                          video_type: str = "无码破解",
                          title_col: str = "video_title",
                          max_downloads: Optional[int] = None,
                          skip_existing: bool = True) -> dict:
         """
         从CSV文件批量下载视频
-        
+
         Args:
             csv_path: CSV文件路径
             video_type: 视频类型筛选条件
             title_col: 标题列名
             max_downloads: 最大下载数量限制
             skip_existing: 是否跳过已存在的文件
-            
+
         Returns:
             dict: 下载统计信息
         """
         print(f"🚀 开始批量下载任务")
         print(f"📁 CSV文件: {csv_path}")
         print(f"🎯 视频类型: {video_type}")
-        print(f"📊 最大下载数: {max_downloads or '无限制'}")
-        print(f"⏱️ 下载间隔: {self.delay_between_downloads}秒")
         print("=" * 60)
-        
+
         try:
-            # 1. 从CSV提取视频编号
-            video_codes = get_video_codes_from_csv(csv_path, video_type, title_col)
-            
-            if not video_codes:
-                print("❌ 未找到任何视频编号，批量下载终止")
-                return self.download_stats
-            
-            # 2. 应用下载数量限制
-            if max_downloads and max_downloads > 0:
-                video_codes = video_codes[:max_downloads]
-                print(f"📋 应用下载限制，实际处理: {len(video_codes)} 个编号")
-            
-            self.download_stats['total'] = len(video_codes)
-            
-            # 3. 批量下载循环
-            for i, code in enumerate(video_codes, 1):
-                print(f"\n🔄 [{i}/{len(video_codes)}] 处理视频编号: {code}")
-                
-                try:
-                    # 执行搜索下载
-                    print(f"🔍 开始搜索和下载: {code}")
-                    self.search_function(code)
-                    
-                    self.download_stats['success'] += 1
-                    print(f"✅ [{i}/{len(video_codes)}] 完成: {code}")
-                    
-                except SystemExit:
-                    # 捕获sys.exit()调用，在批量下载模式下不应该退出整个程序
-                    print(f"ℹ️ [{i}/{len(video_codes)}] 跳过: {code} (附件已购买或其他原因)")
-                    self.download_stats['skipped'] += 1
-                    
-                except Exception as e:
-                    self.download_stats['failed'] += 1
-                    print(f"❌ [{i}/{len(video_codes)}] 失败: {code} - {str(e)}")
-                
-                # 下载间隔（最后一个不需要等待）
-                if i < len(video_codes):
-                    print(f"⏳ 等待 {self.delay_between_downloads} 秒后继续...")
-                    time.sleep(self.delay_between_downloads)
-            
-            # 4. 输出最终统计
-            self._print_final_stats()
-            return self.download_stats
-            
+            # 预读第一个编号：文件缺失等错误在此暴露，其余编号在下载过程中流式读取
+            video_codes = iter_video_codes_from_csv(csv_path, video_type, title_col)
+            first = next(video_codes, None)
         except Exception as e:
-            print(f"❌ 批量下载过程中发生错误: {e}")
+            print(f"❌ 读取CSV失败: {e}")
             self._print_final_stats()
             return self.download_stats
-    
-    def download_from_codes(self, 
-                           video_codes: List[str],
-                           max_downloads: Optional[int] = None) -> dict:
+
+        if first is None:
+            print("❌ 未找到任何视频编号，批量下载终止")
+            return self.download_stats
+        return self.download_from_codes(itertools.chain([first], video_codes), max_downloads=max_downloads)
+
+    def download_from_codes(self,
+                           video_codes: Iterable[str],
+                           max_downloads: Optional[int] = None,
+                           workers: int = 1) -> dict:
+        """
+        用 search_function 从视频编号列表批量下载
+
+        Args:
+            video_codes: 视频编号列表
+            max_downloads: 最大下载数量限制
+            workers: 并发数；search_function 为协程函数时在事件循环中并发，否则各worker线程共用该函数
+
+        Returns:
+            dict: 下载统计信息
+        """
+        if asyncio.iscoroutinefunction(self.search_function):
+            executor = AsyncioExecutor(self.search_function, workers)
+        else:
+            search_function = self.search_function
+            executor = ThreadWorkerExecutor(lambda index: (search_function, lambda: None), workers)
+        return self.run(video_codes, executor, max_downloads)
+
+    def download_concurrently(self,
+                              video_codes: Iterable[str],
+                              worker_factory: Callable[[int], Optional[Tuple[Callable[[str], Any], Callable[[], None]]]],
+                              workers: int = 2,
+                              max_downloads: Optional[int] = None) -> dict:
         """
-        从视频编号列表批量下载
-        
+        多个worker并发批量下载，各worker在自己的线程内创建会话
+
         Args:
             video_codes: 视频编号列表
+            worker_factory: 在worker线程内调用 worker_factory(序号)，返回 (搜索下载函数, 关闭函数)；
+                            启动失败返回None。Playwright同步API不能跨线程共享，浏览器需在线程内创建
+            workers: worker数量
+            max_downloads: 最大下载数量限制
+
+        Returns:
+            dict: 下载统计信息
+        """
+        return self.run(video_codes, ThreadWorkerExecutor(worker_factory, workers), max_downloads)
+
+    def run(self, video_codes: Iterable[str], executor, max_downloads: Optional[int] = None) -> dict:
+        """
+        编排循环：领取编号派发给执行器，收集结果、处理超时并按自适应间隔派发下一个
+
+        Args:
+            video_codes: 视频编号列表或可迭代对象（生成器只遍历一次）
+            executor: 执行器，需提供 start() -> worker列表、submit(worker, 编号) -> Future、
+                      cancel(worker, future) -> 替补worker或None、retire(worker)、shutdown()
             max_downloads: 最大下载数量限制
-            
+
         Returns:
             dict: 下载统计信息
         """
-        print(f"🚀 开始批量下载任务（编号列表模式）")
-        print(f"📋 视频编号数量: {len(video_codes)}")
+        workers = getattr(executor, "workers", None) or getattr(executor, "concurrency", 1)
+        print(f"🚀 开始批量下载任务（{workers} 个worker）")
+        if isinstance(video_codes, Sized):
+            print(f"📋 视频编号数量: {len(video_codes)}")
         print(f"📊 最大下载数: {max_downloads or '无限制'}")
+        print(f"⏱️ 下载间隔: {self.delay_between_downloads}秒，单任务时限: "
+              f"{f'{self.task_timeout:g}秒' if self.task_timeout else '不限'}")
         print("=" * 60)
-        
-        if not video_codes:
+
+        if isinstance(video_codes, Sized) and not video_codes:
             print("❌ 视频编号列表为空，批量下载终止")
             return self.download_stats
-        
-        # 应用下载数量限制
+
+        # 编号来源可以是生成器（如流式读取的CSV），由 _prepare 边读边入队
+        total = self._prepare(video_codes, max_downloads)
+        if total == 0:
+            print("❌ 没有可处理的视频编号，批量下载终止")
+            self._print_final_stats()
+            return self.download_stats
+        idle = executor.start()
+        self.workers_started = len(idle)
+        ready_at = {worker: 0.0 for worker in idle}
+        running: Dict[Future, Tuple[Any, int, str, float]] = {}
+        started = time.monotonic()
+        done = 0
+        # 领取不到编号后不再派发（任务队列中的剩余编号可能已被其他进程领取）
+        exhausted = False
+
+        try:
+            while True:
+                now = time.monotonic()
+                for worker in [w for w in idle if ready_at[w] <= now and not exhausted]:
+                    task = self._next_task(worker)
+                    if task is None:
+                        exhausted = True
+                        break
+                    index, code = task
+                    print(f"\n🔄 [worker-{worker}] [{index}/{total}] 处理视频编号: {code}")
+                    idle.remove(worker)
+                    running[executor.submit(worker, code)] = (worker, index, code, now)
+
+                more = not exhausted and self._has_more()
+                if not running:
+                    if not idle or not more:
+                        break
+                    # 所有空闲worker都在等待下载间隔
+                    time.sleep(max(min(ready_at[w] for w in idle) - now, 0))
+                    continue
+
+                next_dispatch = min(ready_at[w] for w in idle) if idle and more else None
+                finished, _ = wait(list(running), timeout=self._wait_timeout(running, next_dispatch, now),
+                                   return_when=FIRST_COMPLETED)
+                now = time.monotonic()
+                for future in finished:
+                    worker, index, code, _ = running.pop(future)
+                    outcome = self._handle_result(code, index, total, future)
+                    if outcome == 'login_lost':
+                        # 该worker的账号已失效，编号交还队列由其他worker处理
+                        self._give_back(index, code)
+                        exhausted = False
+                        executor.retire(worker)
+                        continue
+                    done += 1
+                    self.pacer.record(outcome == 'failed')
+                    idle.append(worker)
+                    ready_at[worker] = now + self.pacer.delay()
+                    self._report_progress(done, total, started)
+
+                for future, (worker, index, code, submitted) in list(running.items()):
+                    if not self.task_timeout or now - submitted < self.task_timeout:
+                        continue
+                    running.pop(future)
+                    self._handle_timeout(code, index, total)
+                    done += 1
+                    self.pacer.record(True)
+                    # 卡住的调用之后返回时按实际结论更正
+                    future.add_done_callback(lambda f, code=code: self._handle_late_result(code, f))
+                    replacement = executor.cancel(worker, future)
+                    if replacement is not None:
+                        idle.append(replacement)
+                        ready_at[replacement] = now + self.pacer.delay()
+                    self._report_progress(done, total, started)
+        finally:
+            executor.shutdown()
+
+        unfinished = total - done
+        if unfinished:
+            print(f"⚠️ 所有worker已退出，仍有 {unfinished} 个编号未处理")
+            self._count('failed', unfinished)
+
+        self._print_final_stats()
+        return self.download_stats
+
+    def _wait_timeout(self, running: Dict[Future, Tuple[Any, int, str, float]],
+                      next_dispatch: Optional[float], now: float) -> Optional[float]:
+        """等待结果的最长时间：最近的任务时限，或空闲worker的下一次派发时间"""
+        deadlines = []
+        if self.task_timeout:
+            deadlines.extend(submitted + self.task_timeout for _, _, _, submitted in running.values())
+        if next_dispatch is not None:
+            deadlines.append(next_dispatch)
+        return max(min(deadlines) - now, 0) if deadlines else None
+
+    def _report_progress(self, done: int, total: int, started: float):
+        """计算吞吐与预计剩余时间并调用进度回调"""
+        if self.progress_callback is None:
+            return
+        elapsed = time.monotonic() - started
+        per_second = done / elapsed if elapsed > 0 else 0.0
+        remaining = max(total - done, 0)
+        with self._stats_lock:
+            stats = dict(self.download_stats)
+        try:
+            self.progress_callback({
+                "done": done,
+                "total": total,
+                "success": stats['success'],
+                "failed": stats['failed'],
+                "skipped": stats['skipped'],
+                "elapsed": elapsed,
+                "per_minute": per_second * 60,
+                "eta": remaining / per_second if per_second > 0 else None,
+                "delay": self.pacer.delay(),
+            })
+        except Exception as e:
+            print(f"⚠️ 进度回调失败: {e}")
+
+    # ==================== 编号来源 ====================
+
+    def _prepare(self, video_codes: Iterable[str], max_downloads: Optional[int]) -> int:
+        """按编号来源（任务队列、优先级调度器或内存列表）准备本次要处理的编号，返回数量"""
+        if self.job_queue is not None:
+            # 任务队列本身按编号去重，领取是原子的
+            return self._prepare_jobs(video_codes, max_downloads)
+        if self.scheduler is not None:
+            total = self._prepare_scheduler(video_codes, max_downloads)
+            self.download_stats['total'] = total
+            return total
+        # 去重，避免两个worker同时处理同一编号写入同一下载目录
+        video_codes = list(dict.fromkeys(video_codes))
         if max_downloads and max_downloads > 0:
             video_codes = video_codes[:max_downloads]
             print(f"📋 应用下载限制，实际处理: {len(video_codes)} 个编号")
-        
         self.download_stats['total'] = len(video_codes)
-        
-        # 批量下载循环
-        for i, code in enumerate(video_codes, 1):
-            print(f"\n🔄 [{i}/{len(video_codes)}] 处理视频编号: {code}")
-            
-            try:
-                # 执行搜索下载
-                print(f"🔍 开始搜索和下载: {code}")
-                self.search_function(code)
-                
-                self.download_stats['success'] += 1
-                print(f"✅ [{i}/{len(video_codes)}] 完成: {code}")
-                
-            except SystemExit:
-                # 捕获sys.exit()调用，在批量下载模式下不应该退出整个程序
-                print(f"ℹ️ [{i}/{len(video_codes)}] 跳过: {code} (附件已购买或其他原因)")
-                self.download_stats['skipped'] += 1
-                
-            except Exception as e:
-                self.download_stats['failed'] += 1
-                print(f"❌ [{i}/{len(video_codes)}] 失败: {code} - {str(e)}")
-            
-            # 下载间隔（最后一个不需要等待）
-            if i < len(video_codes):
-                print(f"⏳ 等待 {self.delay_between_downloads} 秒后继续...")
-                time.sleep(self.delay_between_downloads)
-        
-        # 输出最终统计
-        self._print_final_stats()
-        return self.download_stats
-    
+        self._pending = deque(enumerate(video_codes, 1))
+        return len(video_codes)
+
+    def _next_task(self, worker: Any) -> Optional[Tuple[int, str]]:
+        """领取下一个编号，返回 (序号, 编号)；没有可处理的编号时返回None"""
+        if self.job_queue is not None:
+            return self._claim_job(self.job_queue.owner_name(worker), self.download_stats['total'])
+        if self.scheduler is not None:
+            return self._claim_scheduled(self.download_stats['total'])
+        return self._pending.popleft() if self._pending else None
+
+    def _has_more(self) -> bool:
+        if self.job_queue is not None:
+            return self._claimed < self.download_stats['total']
+        if self.scheduler is not None:
+            return self._claimed < self.download_stats['total'] and len(self.scheduler) > 0
+        return bool(self._pending)
+
+    def _give_back(self, index: int, code: str):
+        """登录失效的编号交还，由其他worker处理"""
+        if self.scheduler is not None:
+            self.scheduler.push(code)
+        if self.job_queue is not None or self.scheduler is not None:
+            self._unclaim()
+        else:
+            self._pending.appendleft((index, code))
+
+    def _prepare_jobs(self, video_codes: Iterable[str], max_downloads: Optional[int]) -> int:
+        """编号入队并返回本次要处理的任务数"""
+        counts = self.job_queue.enqueue(video_codes)
+        print(f"🗂️ 任务队列: 新增 {counts['added']}，续跑 {counts['resumed']}，"
+              f"已完成 {counts['done']}，已放弃 {counts['dead']}")
+        ready = self.job_queue.ready_count()
+        waiting = counts['added'] + counts['resumed'] - ready
+        total = ready
+        if max_downloads and max_downloads > 0 and total > max_downloads:
+            total = max_downloads
+            print(f"📋 应用下载限制，实际处理: {total} 个编号")
+        if waiting > 0:
+            print(f"⏳ {waiting} 个编号尚未到重试时间，本次跳过")
+        if self.scheduler is not None:
+            self.scheduler.push_many(self.job_queue.ready_codes())
+            print(f"📈 按优先级分数领取任务（{len(self.scheduler)} 个可领取编号）")
+        self.download_stats['total'] = total
+        self._claimed = 0
+        return total
+
+    def _prepare_scheduler(self, video_codes: Iterable[str], max_downloads: Optional[int]) -> int:
+        """编号放入优先级调度器并返回本次要处理的数量"""
+        self.scheduler.push_many(video_codes)
+        total = len(self.scheduler)
+        if max_downloads and max_downloads > 0 and total > max_downloads:
+            total = max_downloads
+            print(f"📋 应用下载限制，实际处理: {total} 个编号")
+        print(f"📈 按优先级分数处理 {len(self.scheduler)} 个候选编号")
+        self._claimed = 0
+        return total
+
+    def _claim_scheduled(self, total: int) -> Optional[Tuple[int, str]]:
+        """从优先级调度器取出下一个编号，返回 (序号, 编号)"""
+        with self._stats_lock:
+            if self._claimed >= total:
+                return None
+            code = self.scheduler.pop()
+            if code is None:
+                return None
+            self._claimed += 1
+            return self._claimed, code
+
+    def _claim_job(self, owner: str, total: int) -> Optional[Tuple[int, str]]:
+        """从任务队列领取下一个编号，返回 (序号, 编号)；达到本次数量或无可领取任务时返回None"""
+        with self._stats_lock:
+            if self._claimed >= total:
+                return None
+            code = None
+            if self.scheduler is not None:
+                # 调度器选出的编号可能已被其他进程领取，依次尝试下一个
+                while code is None and len(self.scheduler) > 0:
+                    candidate = self.scheduler.pop()
+                    if candidate is None:
+                        break
+                    code = self.job_queue.claim(owner, candidate)
+            if code is None:
+                code = self.job_queue.claim(owner)
+            if code is None:
+                return None
+            self._claimed += 1
+            return self._claimed, code
+
+    def _unclaim(self):
+        """登录失效交还的任务不占用本次处理数量"""
+        with self._stats_lock:
+            self._claimed -= 1
+
+    # ==================== 结果记录 ====================
+
+    def _record_job(self, action: Callable[[], Optional[float]]):
+        """把结果写入任务队列；写入失败只提示，不影响批量流程"""
+        if self.job_queue is None:
+            return
+        try:
+            delay = action()
+        except Exception as e:
+            print(f"⚠️ 记录任务结果失败: {e}")
+            return
+        if delay:
+            print(f"🔁 已安排 {delay / 3600:.1f} 小时后重试")
+
+    def _count(self, key: str, amount: int = 1):
+        """线程安全地累加统计"""
+        with self._stats_lock:
+            self.download_stats[key] += amount
+
+    def _handle_timeout(self, code: str, index: int, total: int):
+        """超过单任务时限的编号记为失败，任务队列中按 timeout 类型安排重试"""
+        self._count('failed')
+        print(f"⌛ [{index}/{total}] 超时: {code}（超过 {self.task_timeout:g} 秒未完成）")
+        self._record_job(lambda: self.job_queue.fail(code, 'timeout', f'timeout after {self.task_timeout:g}s'))
+
+    def _handle_late_result(self, code: str, future: Future):
+        """
+        超时后才返回的结果（在worker线程中回调）：有确定结论时更正统计，并按实际结果更新任务队列
+        （成功的编号记为完成，不再按超时重试）
+        """
+        if future.cancelled():
+            return
+        try:
+            result = future.result()
+        except BaseException as e:
+            print(f"⏰ {code} 超时后返回失败: {e}")
+            return
+        status = result.get('status') if isinstance(result, dict) else 'downloaded'
+        print(f"⏰ {code} 超时后返回: {status}")
+        if status not in ('downloaded', 'not_found', 'skipped'):
+            return
+        with self._stats_lock:
+            self.download_stats['failed'] -= 1
+            self.download_stats['success' if status == 'downloaded' else 'skipped'] += 1
+        if self.scheduler is not None and status in ('downloaded', 'not_found'):
+            self.scheduler.record(code, status == 'downloaded')
+        self._record_job(lambda: self.job_queue.record_result(code, result))
+
+    def _handle_result(self, code: str, index: int, total: int, future: Future) -> str:
+        """
+        处理单个编号的执行结果并计入统计
+
+        Returns:
+            str: 结果类型 downloaded / not_found / skipped / failed / exit / login_lost
+        """
+        try:
+            result = future.result()
+        except SystemExit:
+            # 捕获sys.exit()调用，在批量下载模式下不应该退出整个程序；任务队列中按 exit 类型安排重试
+            self._count('skipped')
+            print(f"ℹ️ [{index}/{total}] 跳过: {code} (附件已购买或其他原因)")
+            self._record_job(lambda: self.job_queue.fail(code, 'exit', 'sys_exit'))
+            return 'exit'
+        except Exception as e:
+            error = str(e)
+            self._count('failed')
+            print(f"❌ [{index}/{total}] 失败: {code} - {error}")
+            self._record_job(lambda: self.job_queue.fail(code, 'failed', error))
+            return 'failed'
+
+        status = result.get('status') if isinstance(result, dict) else 'downloaded'
+        if status == 'login_lost':
+            self._record_job(lambda: self.job_queue.record_result(code, result))
+            # 不计入统计：编号交还队列，由其他worker处理
+            print("🛑 论坛登录已失效，停止该会话的剩余下载。请更新会话文件后重试")
+            return 'login_lost'
+        attempts = result.get('attempts') if isinstance(result, dict) else None
+        if status == 'downloaded':
+            self._count('success')
+            if attempts and len(attempts) > 1:
+                print(f"✅ [{index}/{total}] 完成: {code}（第 {len(attempts)} 个候选帖子）")
+            else:
+                print(f"✅ [{index}/{total}] 完成: {code}")
+        elif status in ('not_found', 'skipped'):
+            self._count('skipped')
+            print(f"ℹ️ [{index}/{total}] 跳过: {code} ({result.get('message')})")
+        else:
+            self._count('failed')
+            tried = f"（已尝试 {len(attempts)} 个候选帖子）" if attempts else ""
+            print(f"❌ [{index}/{total}] 失败: {code} - {result.get('message')}{tried}")
+            status = 'failed'
+        if self.scheduler is not None and status in ('downloaded', 'not_found'):
+            # 有确定结论的结果更新同演员/片商/类型的命中率
+            self.scheduler.record(code, status == 'downloaded')
+        self._record_job(lambda: self.job_queue.record_result(code, result))
+        return status
+
     def _print_final_stats(self):
         """打印最终统计信息"""
         print("\n" + "=" * 60)
@@ -173,13 +723,13 @@ class BatchDownloader:
         print(f"   ✅ 成功: {self.download_stats['success']}")
         print(f"   ❌ 失败: {self.download_stats['failed']}")
         print(f"   ⏭️ 跳过: {self.download_stats['skipped']}")
-        
+
         if self.download_stats['total'] > 0:
             success_rate = (self.download_stats['success'] / self.download_stats['total']) * 100
             print(f"   📈 成功率: {success_rate:.1f}%")
-        
+
         print("=" * 60)
-    
+
     def reset_stats(self):
         """重置下载统计"""
         self.download_stats = {
@@ -190,19 +740,25 @@ class BatchDownloader:
         }
 
 
-def create_batch_downloader(search_function: Callable[[str], None], 
-                           delay: float = 2.0) -> BatchDownloader:
+def create_batch_downloader(search_function: Callable[[str], Any],
+                           delay: float = 2.0,
+                           job_queue=None,
+                           scheduler=None,
+                           task_timeout: Optional[float] = -1) -> BatchDownloader:
     """
     创建批量下载器实例的工厂函数
-    
+
     Args:
         search_function: 搜索下载函数
         delay: 下载间隔时间
-        
+        job_queue: 可选的 DownloadJobQueue
+        scheduler: 可选的 PriorityScheduler
+        task_timeout: 单个编号的时限（秒），None 不限时，默认取 BATCH_TASK_TIMEOUT 或 600 秒
+
     Returns:
         BatchDownloader: 批量下载器实例
     """
-    return BatchDownloader(search_function, delay)
+    return BatchDownloader(search_function, delay, job_queue, scheduler, task_timeout)
 
 
 if __name__ == "__main__":
@@ -211,11 +767,11 @@ if __name__ == "__main__":
         """模拟搜索函数"""
         print(f"模拟搜索: {keyword}")
         time.sleep(0.5)  # 模拟下载时间
-    
+
     # 测试批量下载器
     downloader = create_batch_downloader(mock_search_function, delay=1.0)
-    
+
     # 测试编号列表模式
     test_codes = ["SSIS-001", "SSIS-002", "SSIS-003"]
     stats = downloader.download_from_codes(test_codes, max_downloads=2)
-    print(f"测试结果: {stats}")
\ No newline at end of file
+    print(f"测试结果: {stats}")
@@ -0,0 +1,654 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+常驻浏览器池
+守护进程预先启动若干个带CDP调试端口的持久化浏览器上下文（按站点预加载会话Cookie并完成预热），
+爬虫、详情抓取和字幕下载脚本通过 connect_over_cdp 租用一个已预热的上下文，
+省去每次冷启动浏览器与登录预热的时间
+
+用法示例:
+python browser_fleet.py serve                                  # 默认 missav:1, forum:1
+python browser_fleet.py serve --sites missav:2,forum:1 --max-navigations 300 --max-heap-mb 800
+python browser_fleet.py status                                 # 查看槽位与租用情况
+
+回收策略:
+- 单个上下文累计导航次数达到 --max-navigations 后，在空闲时关闭并重新启动
+- 上下文内页面JS堆内存合计超过 --max-heap-mb 时同样回收
+- 租用方进程崩溃后租约过期，槽位直接回收（页面状态未知）
+
+脚本端:
+    page, context, lease = open_page(playwright, "missav", setup_playwright_page)
+    try:
+        ...
+    finally:
+        close_page(page, context, lease)   # 租用的槽位只归还、不关闭；守护进程未运行时照常自行启动与关闭
+
+设置环境变量 BROWSER_FLEET_DISABLED=1 可让脚本忽略浏览器池。
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from playwright.sync_api import Playwright, sync_playwright, Page, BrowserContext
+from playwright_stealth.stealth import stealth_sync
+
+from rate_limiter import acquire_for_url, default_owner_name
+from har_replay import har_active
+
+
+DEFAULT_DB_PATH = Path(__file__).parent / "database" / "browser_fleet.db"
+DEFAULT_PROFILE_DIR = Path(__file__).parent / "browser_fleet"
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36"
+
+# 论坛地址，可用 FORUM_BASE_URL 指向本地替身论坛（forum_standin.py）
+FORUM_BASE_URL = (os.getenv("FORUM_BASE_URL") or "https://37ub.w7zvq.net").rstrip("/")
+
+# 各站点的会话文件与预热地址
+SITES = {
+    "missav": {
+        "session_file": "./session_videoID.json",
+        "warm_url": "https://missav.live/cn",
+    },
+    "forum": {
+        "session_file": "./session.json",
+        "warm_url": f"{FORUM_BASE_URL}/forum.php",
+    },
+}
+
+LAUNCH_ARGS = [
+    "--no-sandbox",
+    "--disable-blink-features=AutomationControlled",
+    "--disable-web-security",
+    "--disable-features=VizDisplayCompositor",
+    "--disable-dev-shm-usage",
+    "--no-first-run",
+    f"--user-agent={USER_AGENT}",
+]
+
+ANTI_DETECT_SCRIPT = """
+    Object.defineProperty(navigator, 'webdriver', {
+        get: () => undefined,
+    });
+
+    Object.defineProperty(navigator, 'plugins', {
+        get: () => [1, 2, 3, 4, 5],
+    });
+
+    Object.defineProperty(navigator, 'languages', {
+        get: () => ['zh-CN', 'zh', 'en'],
+    });
+
+    window.chrome = {
+        runtime: {},
+    };
+"""
+
+# 守护进程心跳超过该时间未更新视为未运行（秒）
+DAEMON_STALE_SECONDS = 15
+# 租约时长与续期间隔（秒）
+LEASE_TTL = 120
+LEASE_RENEW_INTERVAL = 30
+
+
+def _connect(db_path: str) -> sqlite3.Connection:
+    # 手动管理事务，配合 BEGIN IMMEDIATE 保证跨进程原子性
+    conn = sqlite3.connect(db_path, timeout=30.0, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    return conn
+
+
+def init_fleet_database(db_path: str):
+    """初始化浏览器池表结构"""
+    db_dir = os.path.dirname(db_path)
+    if db_dir and not os.path.exists(db_dir):
+        os.makedirs(db_dir, exist_ok=True)
+
+    conn = _connect(db_path)
+    try:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS fleet_slots (
+                slot_id TEXT PRIMARY KEY,
+                site TEXT NOT NULL,
+                endpoint TEXT NOT NULL,
+                status TEXT NOT NULL,
+                lease_owner TEXT,
+                lease_expires_at REAL,
+                navigations INTEGER DEFAULT 0,
+                leases INTEGER DEFAULT 0,
+                recycled INTEGER DEFAULT 0,
+                heap_mb REAL DEFAULT 0,
+                started_at REAL NOT NULL
+            )
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS fleet_daemon (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                pid INTEGER,
+                started_at REAL,
+                heartbeat REAL
+            )
+        """)
+    finally:
+        conn.close()
+
+
+# ==================== 守护进程 ====================
+
+class BrowserFleet:
+    """浏览器池守护进程：启动、预热、监控并回收持久化上下文"""
+
+    def __init__(self,
+                 playwright: Playwright,
+                 site_counts: Dict[str, int],
+                 db_path: Optional[str] = None,
+                 profile_dir: Optional[str] = None,
+                 base_port: int = 9300,
+                 max_navigations: int = 300,
+                 max_heap_mb: float = 800,
+                 headless: bool = False):
+        """
+        初始化浏览器池
+
+        Args:
+            playwright: Playwright实例
+            site_counts: 每个站点的槽位数，如 {"missav": 2, "forum": 1}
+            db_path: 浏览器池数据库路径
+            profile_dir: 持久化上下文的用户数据目录根路径
+            base_port: 第一个槽位的CDP调试端口，其余依次递增
+            max_navigations: 单个上下文累计导航次数上限
+            max_heap_mb: 单个上下文页面JS堆内存上限（MB）
+            headless: 是否无头模式
+        """
+        self.playwright = playwright
+        self.site_counts = site_counts
+        self.db_path = str(db_path or DEFAULT_DB_PATH)
+        self.profile_dir = Path(profile_dir or DEFAULT_PROFILE_DIR)
+        self.base_port = base_port
+        self.max_navigations = max_navigations
+        self.max_heap_mb = max_heap_mb
+        self.headless = headless
+
+        # slot_id -> {"site", "port", "context"}
+        self.slots: Dict[str, Dict[str, Any]] = {}
+        init_fleet_database(self.db_path)
+
+    def _launch_context(self, site: str, slot_id: str, port: int) -> BrowserContext:
+        """启动带调试端口的持久化上下文，加载站点Cookie并预热"""
+        user_data_dir = str(self.profile_dir / slot_id)
+        options = dict(
+            headless=self.headless,
+            args=LAUNCH_ARGS + [f"--remote-debugging-port={port}"],
+            user_agent=USER_AGENT,
+            viewport={'width': 1920, 'height': 1080},
+            extra_http_headers={
+                'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
+                'Accept-Encoding': 'gzip, deflate, br',
+                'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,image/apng,*/*;q=0.8'
+            },
+            accept_downloads=True,
+        )
+        try:
+            context = self.playwright.chromium.launch_persistent_context(user_data_dir, channel="msedge", **options)
+        except Exception as e:
+            print(f"Edge浏览器启动失败，回退到Chromium: {e}")
+            context = self.playwright.chromium.launch_persistent_context(user_data_dir, **options)
+
+        site_config = SITES[site]
+        session_file = site_config["session_file"]
+        if os.path.exists(session_file):
+            try:
+                with open(session_file, "r", encoding="utf-8") as f:
+                    session_state = json.load(f)
+                if session_state.get("cookies"):
+                    context.add_cookies(session_state["cookies"])
+            except Exception as e:
+                print(f"加载会话文件 {session_file} 失败: {e}")
+        else:
+            print(f"⚠️ 未发现 {session_file}，槽位 {slot_id} 将以未登录状态运行")
+
+        context.add_init_script(ANTI_DETECT_SCRIPT)
+        page = context.pages[0] if context.pages else context.new_page()
+        stealth_sync(page)
+
+        # 预热：提前完成首屏加载与Cookie刷新
+        try:
+            acquire_for_url(site_config["warm_url"])
+            page.goto(site_config["warm_url"], wait_until="domcontentloaded", timeout=30000)
+        except Exception as e:
+            print(f"槽位 {slot_id} 预热失败: {e}")
+
+        return context
+
+    def _start_slot(self, site: str, slot_id: str, port: int):
+        """启动槽位并登记为空闲"""
+        print(f"启动槽位 {slot_id} (CDP端口 {port})...")
+        context = self._launch_context(site, slot_id, port)
+        self.slots[slot_id] = {"site": site, "port": port, "context": context}
+
+        now = time.time()
+        conn = _connect(self.db_path)
+        try:
+            conn.execute("""
+                INSERT INTO fleet_slots (slot_id, site, endpoint, status, navigations, leases, started_at)
+                VALUES (?, ?, ?, 'idle', 0, 0, ?)
+                ON CONFLICT(slot_id) DO UPDATE SET
+                    site = excluded.site, endpoint = excluded.endpoint, status = 'idle',
+                    lease_owner = NULL, lease_expires_at = NULL, navigations = 0, heap_mb = 0,
+                    started_at = excluded.started_at
+            """, (slot_id, site, f"http://127.0.0.1:{port}", now))
+        finally:
+            conn.close()
+        print(f"✅ 槽位 {slot_id} 已就绪")
+
+    def _stop_slot(self, slot_id: str, save_session: bool = True):
+        """关闭槽位的上下文，关闭前把最新Cookie写回站点会话文件"""
+        slot = self.slots.pop(slot_id, None)
+        if not slot:
+            return
+        context = slot["context"]
+        if save_session:
+            try:
+                context.storage_state(path=SITES[slot["site"]]["session_file"])
+            except Exception as e:
+                print(f"保存槽位 {slot_id} 会话失败: {e}")
+        try:
+            context.close()
+        except Exception:
+            pass
+
+    def _heap_mb(self, context: BrowserContext) -> float:
+        """统计上下文内各页面的JS堆内存（MB）"""
+        total = 0.0
+        for page in list(context.pages):
+            try:
+                session = context.new_cdp_session(page)
+                try:
+                    metrics = session.send("Performance.getMetrics")
+                finally:
+                    session.detach()
+                for metric in metrics.get("metrics", []):
+                    if metric.get("name") == "JSHeapTotalSize":
+                        total += metric.get("value", 0) / (1024 * 1024)
+            except Exception:
+                continue
+        return total
+
+    def _recycle_slot(self, slot_id: str, reason: str):
+        """回收槽位：关闭后用同一端口重新启动"""
+        slot = self.slots.get(slot_id)
+        if not slot:
+            return
+        print(f"♻️ 回收槽位 {slot_id}: {reason}")
+        site, port = slot["site"], slot["port"]
+        self._stop_slot(slot_id)
+        self._start_slot(site, slot_id, port)
+
+        conn = _connect(self.db_path)
+        try:
+            conn.execute("UPDATE fleet_slots SET recycled = recycled + 1 WHERE slot_id = ?", (slot_id,))
+        finally:
+            conn.close()
+
+    def start(self):
+        """按站点启动全部槽位"""
+        conn = _connect(self.db_path)
+        try:
+            now = time.time()
+            conn.execute("""
+                INSERT INTO fleet_daemon (id, pid, started_at, heartbeat) VALUES (1, ?, ?, ?)
+                ON CONFLICT(id) DO UPDATE SET pid = excluded.pid, started_at = excluded.started_at,
+                                              heartbeat = excluded.heartbeat
+            """, (os.getpid(), now, now))
+            # 清理上次运行遗留的槽位记录
+            conn.execute("DELETE FROM fleet_slots")
+        finally:
+            conn.close()
+
+        port = self.base_port
+        for site, count in self.site_counts.items():
+            if site not in SITES:
+                print(f"未知站点 {site}，可选: {', '.join(SITES)}")
+                continue
+            for i in range(count):
+                self._start_slot(site, f"{site}-{i}", port)
+                port += 1
+
+    def check_slots(self):
+        """检查租约过期与回收条件（守护进程主循环每轮调用）"""
+        now = time.time()
+        conn = _connect(self.db_path)
+        try:
+            conn.execute("UPDATE fleet_daemon SET heartbeat = ? WHERE id = 1", (now,))
+            rows = conn.execute("""
+                SELECT slot_id, status, lease_expires_at, navigations FROM fleet_slots
+            """).fetchall()
+        finally:
+            conn.close()
+
+        for slot_id, status, lease_expires_at, navigations in rows:
+            slot = self.slots.get(slot_id)
+            if not slot:
+                continue
+
+            if status == 'leased':
+                if lease_expires_at is not None and lease_expires_at < now:
+                    self._recycle_slot(slot_id, "租约过期（租用方可能已崩溃）")
+                continue
+
+            if navigations >= self.max_navigations:
+                self._recycle_slot(slot_id, f"导航次数 {navigations} 达到上限")
+                continue
+
+            heap_mb = self._heap_mb(slot["context"])
+            conn = _connect(self.db_path)
+            try:
+                conn.execute("UPDATE fleet_slots SET heap_mb = ? WHERE slot_id = ?", (heap_mb, slot_id))
+            finally:
+                conn.close()
+            if heap_mb > self.max_heap_mb:
+                self._recycle_slot(slot_id, f"JS堆内存 {heap_mb:.0f}MB 超过上限")
+
+    def serve(self, check_interval: float = 5.0):
+        """运行守护进程主循环，Ctrl+C退出"""
+        self.start()
+        print(f"浏览器池已启动，共 {len(self.slots)} 个槽位，按 Ctrl+C 退出")
+        try:
+            while True:
+                time.sleep(check_interval)
+                self.check_slots()
+        except KeyboardInterrupt:
+            print("\n正在关闭浏览器池...")
+        finally:
+            for slot_id in list(self.slots):
+                self._stop_slot(slot_id)
+            conn = _connect(self.db_path)
+            try:
+                conn.execute("DELETE FROM fleet_slots")
+                conn.execute("UPDATE fleet_daemon SET heartbeat = 0 WHERE id = 1")
+            finally:
+                conn.close()
+
+
+# ==================== 脚本端租用 ====================
+
+class FleetLease:
+    """已租用的浏览器槽位：使用 page/context，完成后调用 release()（不要关闭 context）"""
+
+    def __init__(self, db_path: str, slot_id: str, owner: str, browser, context: BrowserContext, page: Page):
+        self.db_path = db_path
+        self.slot_id = slot_id
+        self.owner = owner
+        self.browser = browser
+        self.context = context
+        self.page = page
+        self.navigations = 0
+        self._released = False
+        self._stop_event = threading.Event()
+
+        page.on("framenavigated", self._on_navigated)
+        self._renew_thread = threading.Thread(target=self._renew_loop, name="fleet-lease", daemon=True)
+        self._renew_thread.start()
+
+    def _on_navigated(self, frame):
+        if frame == self.page.main_frame:
+            self.navigations += 1
+
+    def _renew_loop(self):
+        """定期续期租约，租用方崩溃后租约自然过期"""
+        while not self._stop_event.wait(LEASE_RENEW_INTERVAL):
+            try:
+                conn = _connect(self.db_path)
+                try:
+                    conn.execute("""
+                        UPDATE fleet_slots SET lease_expires_at = ?
+                        WHERE slot_id = ? AND lease_owner = ?
+                    """, (time.time() + LEASE_TTL, self.slot_id, self.owner))
+                finally:
+                    conn.close()
+            except sqlite3.Error as e:
+                print(f"浏览器池租约续期失败: {e}")
+
+    def release(self):
+        """归还槽位：关闭本次新开的页面，断开CDP连接，累计导航次数"""
+        if self._released:
+            return
+        self._released = True
+        self._stop_event.set()
+
+        try:
+            for extra in list(self.context.pages):
+                if extra != self.page:
+                    extra.close()
+        except Exception:
+            pass
+
+        # 连接方式为CDP时 close() 只断开连接，不会关闭守护进程中的浏览器
+        try:
+            self.browser.close()
+        except Exception:
+            pass
+
+        conn = _connect(self.db_path)
+        try:
+            conn.execute("""
+                UPDATE fleet_slots
+                SET status = 'idle', lease_owner = NULL, lease_expires_at = NULL,
+                    navigations = navigations + ?
+                WHERE slot_id = ? AND lease_owner = ?
+            """, (self.navigations, self.slot_id, self.owner))
+        finally:
+            conn.close()
+        print(f"已归还浏览器槽位 {self.slot_id} (本次导航 {self.navigations} 次)")
+
+
+def fleet_available(db_path: Optional[str] = None) -> bool:
+    """守护进程是否在运行"""
+    if os.environ.get("BROWSER_FLEET_DISABLED") == "1":
+        return False
+    db_path = str(db_path or DEFAULT_DB_PATH)
+    if not os.path.exists(db_path):
+        return False
+    try:
+        conn = _connect(db_path)
+        try:
+            row = conn.execute("SELECT heartbeat FROM fleet_daemon WHERE id = 1").fetchone()
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return False
+    return bool(row and row[0] and time.time() - row[0] < DAEMON_STALE_SECONDS)
+
+
+def _claim_slot(db_path: str, site: str, owner: str) -> Optional[Dict[str, str]]:
+    """原子地抢占一个空闲槽位"""
+    conn = _connect(db_path)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        row = conn.execute("""
+            SELECT slot_id, endpoint FROM fleet_slots
+            WHERE site = ? AND status = 'idle'
+            ORDER BY navigations ASC LIMIT 1
+        """, (site,)).fetchone()
+        if row is None:
+            conn.execute("COMMIT")
+            return None
+        conn.execute("""
+            UPDATE fleet_slots
+            SET status = 'leased', lease_owner = ?, lease_expires_at = ?, leases = leases + 1
+            WHERE slot_id = ?
+        """, (owner, time.time() + LEASE_TTL, row[0]))
+        conn.execute("COMMIT")
+        return {"slot_id": row[0], "endpoint": row[1]}
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+
+
+def _return_slot(db_path: str, slot_id: str, owner: str):
+    """连接失败时归还槽位"""
+    conn = _connect(db_path)
+    try:
+        conn.execute("""
+            UPDATE fleet_slots SET status = 'idle', lease_owner = NULL, lease_expires_at = NULL
+            WHERE slot_id = ? AND lease_owner = ?
+        """, (slot_id, owner))
+    finally:
+        conn.close()
+
+
+def lease_fleet_page(playwright: Playwright, site: str, wait_timeout: float = 30.0,
+                     db_path: Optional[str] = None, owner: Optional[str] = None) -> Optional[FleetLease]:
+    """
+    从浏览器池租用一个已预热的上下文
+
+    Args:
+        playwright: 当前脚本的Playwright实例
+        site: 站点名（missav/forum）
+        wait_timeout: 槽位全部被占用时的最长等待时间（秒）
+        db_path: 浏览器池数据库路径
+        owner: 租用方标识，默认 "脚本名:PID"
+
+    Returns:
+        FleetLease: 租用成功返回租约；守护进程未运行或等待超时返回None（调用方应自行启动浏览器）
+    """
+    db_path = str(db_path or DEFAULT_DB_PATH)
+    if not fleet_available(db_path):
+        return None
+
+    owner = owner or default_owner_name()
+    deadline = time.time() + wait_timeout
+    slot = None
+    while slot is None:
+        try:
+            slot = _claim_slot(db_path, site, owner)
+        except sqlite3.Error as e:
+            print(f"浏览器池不可用: {e}")
+            return None
+        if slot is None:
+            if time.time() >= deadline:
+                print(f"浏览器池中没有空闲的 {site} 槽位，改为自行启动浏览器")
+                return None
+            time.sleep(0.5)
+
+    try:
+        browser = playwright.chromium.connect_over_cdp(slot["endpoint"])
+        context = browser.contexts[0]
+        page = context.pages[0] if context.pages else context.new_page()
+    except Exception as e:
+        print(f"连接浏览器槽位 {slot['slot_id']} 失败: {e}")
+        _return_slot(db_path, slot["slot_id"], owner)
+        return None
+
+    print(f"已租用浏览器槽位 {slot['slot_id']} ({slot['endpoint']})")
+    return FleetLease(db_path, slot["slot_id"], owner, browser, context, page)
+
+
+def open_page(playwright: Playwright, site: str,
+              launch_local: Callable[[Playwright], Tuple[Page, BrowserContext]]) -> Tuple[Page, BrowserContext, Optional[FleetLease]]:
+    """
+    优先从浏览器池租用页面，守护进程未运行或处于HAR录制/回放模式时调用 launch_local 自行启动
+
+    Returns:
+        (page, context, lease)：lease 为None表示本地启动，用完后交给 close_page 处理
+    """
+    lease = None if har_active() else lease_fleet_page(playwright, site)
+    if lease is not None:
+        return lease.page, lease.context, lease
+    page, context = launch_local(playwright)
+    return page, context, None
+
+
+def close_page(page: Page, context: BrowserContext, lease: Optional[FleetLease]):
+    """归还租用的槽位，或关闭本地启动的浏览器上下文"""
+    if lease is not None:
+        lease.release()
+        return
+    try:
+        page.close()
+    except Exception:
+        pass
+    context.close()
+
+
+# ==================== 命令行 ====================
+
+def print_status(db_path: Optional[str] = None):
+    """打印浏览器池状态"""
+    db_path = str(db_path or DEFAULT_DB_PATH)
+    if not os.path.exists(db_path):
+        print("浏览器池尚未启动")
+        return
+    conn = _connect(db_path)
+    try:
+        rows = conn.execute("""
+            SELECT slot_id, endpoint, status, lease_owner, navigations, leases, recycled, heap_mb, started_at
+            FROM fleet_slots ORDER BY slot_id
+        """).fetchall()
+    finally:
+        conn.close()
+
+    print(f"守护进程: {'运行中' if fleet_available(db_path) else '未运行'}")
+    if not rows:
+        print("暂无槽位")
+        return
+    print(f"{'槽位':<12}{'端点':<26}{'状态':<8}{'导航':<8}{'租用':<8}{'回收':<8}{'堆MB':<8}{'运行':<10}租用方")
+    for slot_id, endpoint, status, owner, navigations, leases, recycled, heap_mb, started_at in rows:
+        uptime = int(time.time() - started_at)
+        print(f"{slot_id:<12}{endpoint:<26}{status:<8}{navigations:<8}{leases:<8}{recycled:<8}"
+              f"{heap_mb or 0:<8.0f}{f'{uptime // 60}m':<10}{owner or '-'}")
+
+
+def parse_site_counts(value: str) -> Dict[str, int]:
+    """解析 --sites 参数，如 missav:2,forum:1"""
+    counts: Dict[str, int] = {}
+    for part in value.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        name, _, count = part.partition(":")
+        counts[name.strip()] = int(count) if count else 1
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="常驻浏览器池")
+    subparsers = parser.add_subparsers(dest="command")
+
+    serve = subparsers.add_parser("serve", help="启动浏览器池守护进程")
+    serve.add_argument("--sites", default="missav:1,forum:1", help="各站点槽位数，如 missav:2,forum:1")
+    serve.add_argument("--base-port", type=int, default=9300, help="第一个槽位的CDP调试端口")
+    serve.add_argument("--max-navigations", type=int, default=300, help="上下文累计导航次数上限")
+    serve.add_argument("--max-heap-mb", type=float, default=800, help="上下文JS堆内存上限（MB）")
+    serve.add_argument("--headless", action="store_true", help="无头模式")
+    serve.add_argument("--db", default=None, help="浏览器池数据库路径")
+
+    status = subparsers.add_parser("status", help="查看槽位状态")
+    status.add_argument("--db", default=None, help="浏览器池数据库路径")
+
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        with sync_playwright() as playwright:
+            fleet = BrowserFleet(playwright, parse_site_counts(args.sites), db_path=args.db,
+                                 base_port=args.base_port, max_navigations=args.max_navigations,
+                                 max_heap_mb=args.max_heap_mb, headless=args.headless)
+            fleet.serve()
+    elif args.command == "status":
+        print_status(args.db)
+    else:
+        parser.print_help()
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+批量下载的编号优先级
+get_video_codes_from_db 按 video_id 字母序返回编号，带 --max 的批次把额度花在排序靠前的编号上。
+本模块为候选编号打分，按分数从高到低处理，目标是在固定的每晚额度内找到尽可能多的字幕：
+- 同类命中率：同演员、同片商、同类型的编号中已找到字幕的比例（按全局命中率做平滑，演员与片商取较高者）
+- 发行时间：越新的作品分数越高（按年衰减，缺少发行日期时取中间值）
+- 无结果历史：subtitle_search_state 中连续无结果的次数越多分数越低
+- 视频类型：各类型的先验命中率（中文字幕 > 无码破解 > 普通），随本批次的结果一起更新
+
+调度器用堆按分数取出编号；每个编号有了结果（找到/无结果）后更新所属演员、片商与类型的命中率，
+同演员、同片商中尚未处理的编号重新打分后放回堆中（旧条目惰性作废）。类型命中率与全局命中率
+对每个编号的影响都很小，打分时使用快照，每记录 RESNAPSHOT_EVERY 个结果才刷新快照并整体重建堆，
+避免单个结果触发同类型全部编号的重新打分。
+
+设置环境变量 CODE_PRIORITY_DISABLED=1 可恢复按编号顺序处理。
+
+用法示例:
+  python code_priority.py --no-subtitle --top 30
+  python code_priority.py --type 无码破解 --actress 波多野结衣 --top 20
+"""
+
+import argparse
+import heapq
+import itertools
+import math
+import os
+import sqlite3
+import sys
+import threading
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+
+DEFAULT_DB_PATH = Path(__file__).parent / "database" / "actresses.db"
+
+# 各视频类型的先验命中率
+TYPE_PRIORS = {
+    "中文字幕": 0.6,
+    "无码破解": 0.4,
+    "普通": 0.25,
+}
+DEFAULT_TYPE_PRIOR = 0.3
+
+# 群组命中率的平滑强度（相当于按全局命中率预置的样本数）
+SMOOTHING = 5.0
+# 群组命中率与类型命中率的权重
+COHORT_WEIGHT = 0.7
+# 发行时间按年衰减：新作 1.0，一年前 0.75，很久以前趋近 0.5；缺少发行日期取 0.6
+RECENCY_HALF_LIFE_DAYS = 365
+UNKNOWN_RECENCY = 0.6
+# 每记录多少个结果刷新一次类型/全局命中率快照并重建堆
+RESNAPSHOT_EVERY = 200
+# 堆中作废条目超过有效条目的倍数时压缩
+HEAP_COMPACT_RATIO = 2
+
+
+def priority_enabled() -> bool:
+    """优先级排序是否启用"""
+    return os.getenv("CODE_PRIORITY_DISABLED") != "1"
+
+
+def _normalize(code: str) -> str:
+    return (code or "").strip().upper()
+
+
+def recency_factor(release_date: Optional[str], now: Optional[datetime] = None) -> float:
+    """发行时间系数（0.5~1.0）"""
+    try:
+        released = datetime.strptime((release_date or "").strip()[:10], "%Y-%m-%d")
+    except ValueError:
+        return UNKNOWN_RECENCY
+    age_days = max(((now or datetime.now()) - released).days, 0)
+    return 0.5 + 0.5 * 0.5 ** (age_days / RECENCY_HALF_LIFE_DAYS)
+
+
+class CohortStats:
+    """演员/片商/类型群组的命中统计：found 为已找到字幕的编号数，searched 为已有结论的编号数"""
+
+    def __init__(self):
+        self.found: Dict[Tuple[str, str], int] = defaultdict(int)
+        self.searched: Dict[Tuple[str, str], int] = defaultdict(int)
+        self.total_found = 0
+        self.total_searched = 0
+
+    def add(self, keys: Iterable[Tuple[str, str]], found: bool):
+        for key in keys:
+            self.searched[key] += 1
+            if found:
+                self.found[key] += 1
+        self.total_searched += 1
+        if found:
+            self.total_found += 1
+
+    def global_rate(self) -> float:
+        return (self.total_found + 1) / (self.total_searched + 2)
+
+    def rate(self, key: Tuple[str, str], prior: Optional[float] = None) -> float:
+        """平滑后的命中率"""
+        prior = self.global_rate() if prior is None else prior
+        return (self.found.get(key, 0) + SMOOTHING * prior) / (self.searched.get(key, 0) + SMOOTHING)
+
+
+def cohort_keys(feature: Dict[str, Any]) -> List[Tuple[str, str]]:
+    """编号所属的群组"""
+    keys = [("actress", name) for name in feature["actresses"]]
+    if feature.get("maker"):
+        keys.append(("maker", feature["maker"]))
+    keys.append(("type", feature.get("video_type") or ""))
+    return keys
+
+
+def load_features(db_path: Optional[str] = None) -> Tuple[Dict[str, Dict[str, Any]], CohortStats]:
+    """
+    从 videos 表与 subtitle_search_state 读取每个编号的特征，并统计各群组的命中率
+
+    Returns:
+        (features, stats)：features 为 {编号: {"actresses","maker","video_type","release_date","found","misses"}}
+    """
+    db_path = str(db_path or DEFAULT_DB_PATH)
+    features: Dict[str, Dict[str, Any]] = {}
+    stats = CohortStats()
+    if not os.path.exists(db_path):
+        return features, stats
+
+    conn = sqlite3.connect(db_path)
+    try:
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(videos)")}
+        if not columns:
+            return features, stats
+        optional = [f"v.{c}" if c in columns else "NULL" for c in ("maker", "release_date", "subtitle_downloaded")]
+        has_state = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'subtitle_search_state'"
+        ).fetchone() is not None
+        misses = "s.miss_count" if has_state else "0"
+        join = "LEFT JOIN subtitle_search_state s ON s.video_id = UPPER(TRIM(v.video_id))" if has_state else ""
+        rows = conn.execute(f"""
+            SELECT v.video_id, v.actress_name, v.video_type, {', '.join(optional)}, {misses}
+            FROM videos v
+            {join}
+            WHERE v.video_id IS NOT NULL AND v.video_id != ''
+        """).fetchall()
+    finally:
+        conn.close()
+
+    for video_id, actress, video_type, maker, release_date, downloaded, miss_count in rows:
+        code = _normalize(video_id)
+        feature = features.setdefault(code, {
+            "actresses": set(), "maker": None, "video_type": None,
+            "release_date": None, "found": False, "misses": 0,
+        })
+        if actress:
+            feature["actresses"].add(actress.strip())
+        feature["maker"] = feature["maker"] or (maker or "").strip() or None
+        feature["video_type"] = feature["video_type"] or (video_type or "").strip() or None
+        if release_date and (feature["release_date"] or "") < release_date:
+            feature["release_date"] = release_date
+        feature["found"] = feature["found"] or downloaded == 1
+        feature["misses"] = max(feature["misses"], miss_count or 0)
+
+    for feature in features.values():
+        if feature["found"] or feature["misses"]:
+            stats.add(cohort_keys(feature), feature["found"])
+    return features, stats
+
+
+class PriorityScheduler:
+    """
+    按分数取编号的堆调度器（线程安全）
+
+    堆中条目为 (-分数, 序号, 编号)；重新打分时压入新条目，弹出时跳过分数已变化的旧条目，
+    作废条目过多时按当前分数重建堆
+    """
+
+    def __init__(self, features: Dict[str, Dict[str, Any]], stats: CohortStats,
+                 now: Optional[datetime] = None):
+        self.features = features
+        self.stats = stats
+        self.now = now or datetime.now()
+        self._heap: List[Tuple[float, int, str]] = []
+        self._scores: Dict[str, float] = {}
+        self._members: Dict[Tuple[str, str], Set[str]] = defaultdict(set)
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self.rescored = 0
+        self._recorded = 0
+        self._static: Dict[str, Tuple[float, float]] = {}
+        self._snapshot()
+
+    @classmethod
+    def from_db(cls, codes: Iterable[str], db_path: Optional[str] = None) -> "PriorityScheduler":
+        features, stats = load_features(db_path)
+        scheduler = cls(features, stats)
+        scheduler.push_many(codes)
+        return scheduler
+
+    def _feature(self, code: str) -> Dict[str, Any]:
+        feature = self.features.get(code)
+        if feature is None:
+            feature = {"actresses": set(), "maker": None, "video_type": None,
+                       "release_date": None, "found": False, "misses": 0}
+            self.features[code] = feature
+        return feature
+
+    def _snapshot(self):
+        """刷新全局命中率快照，类型命中率在下次打分时按需重新计算"""
+        self._global_rate = self.stats.global_rate()
+        self._type_rates: Dict[str, float] = {}
+
+    def _type_rate(self, video_type: str) -> float:
+        rate = self._type_rates.get(video_type)
+        if rate is None:
+            rate = self.stats.rate(("type", video_type), TYPE_PRIORS.get(video_type, DEFAULT_TYPE_PRIOR))
+            self._type_rates[video_type] = rate
+        return rate
+
+    def _static_factors(self, code: str) -> Tuple[List[Tuple[str, str]], str, float, float]:
+        """
+        本批次内不变的部分，按编号缓存：演员/片商群组、视频类型、发行时间系数、无结果惩罚
+        """
+        factors = self._static.get(code)
+        if factors is None:
+            feature = self._feature(code)
+            factors = ([key for key in cohort_keys(feature) if key[0] != "type"],
+                       feature.get("video_type") or "",
+                       recency_factor(feature.get("release_date"), self.now),
+                       1.0 / (1 + feature.get("misses", 0)))
+            self._static[code] = factors
+        return factors
+
+    def _factors(self, code: str) -> Tuple[float, float, float, float, float]:
+        keys, video_type, recency, miss_penalty = self._static_factors(code)
+        type_rate = self._type_rate(video_type)
+        cohort_rate = max((self.stats.rate(key, self._global_rate) for key in keys), default=self._global_rate)
+        hit_rate = COHORT_WEIGHT * cohort_rate + (1 - COHORT_WEIGHT) * type_rate
+        return hit_rate * recency * miss_penalty, cohort_rate, type_rate, recency, miss_penalty
+
+    def explain(self, code: str) -> Dict[str, float]:
+        """分数及各项因子"""
+        score, cohort_rate, type_rate, recency, miss_penalty = self._factors(_normalize(code))
+        return {
+            "score": score,
+            "cohort": cohort_rate,
+            "type": type_rate,
+            "recency": recency,
+            "miss_penalty": miss_penalty,
+        }
+
+    def _rescore_keys(self, code: str) -> List[Tuple[str, str]]:
+        """结果出来后需要重新打分的群组（演员、片商；类型走快照）"""
+        return self._static_factors(code)[0]
+
+    def score(self, code: str) -> float:
+        return self._factors(_normalize(code))[0]
+
+    def _push(self, code: str):
+        score = self._factors(code)[0]
+        self._scores[code] = score
+        heapq.heappush(self._heap, (-score, next(self._seq), code))
+        if len(self._heap) > HEAP_COMPACT_RATIO * len(self._scores) + 64:
+            self._rebuild_heap()
+
+    def _rebuild_heap(self):
+        """丢弃作废条目，按当前分数重建堆"""
+        self._heap = [(-score, next(self._seq), code) for code, score in self._scores.items()]
+        heapq.heapify(self._heap)
+
+    def push(self, code: str):
+        """加入（或交还）一个编号"""
+        code = _normalize(code)
+        if not code:
+            return
+        with self._lock:
+            for key in self._rescore_keys(code):
+                self._members[key].add(code)
+            self._push(code)
+
+    def push_many(self, codes: Iterable[str]):
+        for code in dict.fromkeys(_normalize(c) for c in codes):
+            self.push(code)
+
+    def pop(self) -> Optional[str]:
+        """取出当前分数最高的编号；没有时返回 None"""
+        with self._lock:
+            while self._heap:
+                neg_score, _, code = heapq.heappop(self._heap)
+                if self._scores.get(code) != -neg_score:
+                    continue
+                del self._scores[code]
+                for key in self._rescore_keys(code):
+                    self._members[key].discard(code)
+                return code
+            return None
+
+    def record(self, code: str, found: bool):
+        """记录一个编号的结论，并重新为同演员、同片商中尚未处理的编号打分"""
+        code = _normalize(code)
+        with self._lock:
+            keys = cohort_keys(self._feature(code))
+            self.stats.add(keys, found)
+            self._recorded += 1
+            if self._recorded % RESNAPSHOT_EVERY == 0:
+                # 类型/全局命中率快照过期：全部重新打分并重建堆
+                self._snapshot()
+                self._scores = {other: self._factors(other)[0] for other in self._scores}
+                self.rescored += len(self._scores)
+                self._rebuild_heap()
+                return
+            affected = set()
+            for key in self._rescore_keys(code):
+                affected |= self._members.get(key, set())
+            for other in affected:
+                if other in self._scores and not math.isclose(self._factors(other)[0], self._scores[other]):
+                    self._push(other)
+                    self.rescored += 1
+
+    def ranked(self, limit: Optional[int] = None) -> List[Tuple[str, float]]:
+        """按当前分数排序的待处理编号（不取出）"""
+        with self._lock:
+            ordered = sorted(self._scores.items(), key=lambda item: (-item[1], item[0]))
+        return ordered[:limit] if limit else ordered
+
+    def __len__(self) -> int:
+        return len(self._scores)
+
+
+def build_scheduler(db_path: Optional[str] = None) -> Optional[PriorityScheduler]:
+    """
+    读取特征并建立空的调度器（候选编号由批量下载器放入）
+
+    设置 CODE_PRIORITY_DISABLED=1 或读取失败时返回 None，批量下载按编号顺序处理
+    """
+    if not priority_enabled():
+        return None
+    try:
+        features, stats = load_features(db_path)
+    except sqlite3.Error as e:
+        print(f"⚠️ 读取优先级特征失败，按编号顺序处理: {e}")
+        return None
+    return PriorityScheduler(features, stats)
+
+
+def print_ranking(scheduler: PriorityScheduler, top: int = 20):
+    """打印排名靠前的编号及各项因子"""
+    print(f"{'排名':<6}{'编号':<16}{'分数':<8}{'同类':<8}{'类型':<8}{'时间':<8}{'无结果':<8}")
+    for rank, (code, _) in enumerate(scheduler.ranked(top), 1):
+        parts = scheduler.explain(code)
+        print(f"{rank:<6}{code:<16}{parts['score']:<8.3f}{parts['cohort']:<8.2f}{parts['type']:<8.2f}"
+              f"{parts['recency']:<8.2f}{parts['miss_penalty']:<8.2f}")
+    print(f"共 {len(scheduler)} 个编号，全局命中率 {scheduler.stats.global_rate():.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="批量下载编号优先级预览")
+    parser.add_argument("--db", default=None, help="actresses.db 路径")
+    parser.add_argument("--type", default=None, help="视频类型筛选")
+    parser.add_argument("--actress", default=None, help="演员名称筛选")
+    parser.add_argument("--no-subtitle", action="store_true", help="只看未有字幕的编号")
+    parser.add_argument("--top", type=int, default=20, help="显示前N个")
+    args = parser.parse_args()
+
+    from db_utils import DatabaseUtils
+    codes = DatabaseUtils(args.db).get_video_codes_from_db(
+        video_type=args.type, actress_name=args.actress,
+        has_subtitle=False if args.no_subtitle else None)
+    scheduler = PriorityScheduler.from_db(codes, args.db)
+    print_ranking(scheduler, args.top)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
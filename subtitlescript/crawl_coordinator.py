@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分布式抓取协调模块
+多个爬虫进程（可分布在多台机器上，通过本地路径共享同一个数据库文件）通过
+actress_status 上的租约（持有者、心跳、过期时间）分配演员，
+进程崩溃后租约过期，演员会被其他worker重新接手
+
+用法示例:
+python crawl_coordinator.py --status                # 查看存活worker、吞吐量与持有中的租约
+python crawl_coordinator.py --status --watch 10     # 每10秒刷新一次
+python crawl_coordinator.py --requeue-expired       # 立即清除已过期的租约
+python crawl_coordinator.py --forget-stopped        # 删除已退出worker的记录
+"""
+
+import argparse
+import os
+import socket
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from database_manager import DatabaseManager
+
+
+DEFAULT_LEASE_SECONDS = 300
+DEFAULT_HEARTBEAT_INTERVAL = 30
+
+
+class LeaseLostError(Exception):
+    """演员租约已被其他worker接手：当前worker应放弃该演员，不标记完成也不释放租约"""
+
+
+def default_worker_id() -> str:
+    """默认worker标识: 主机名:进程号"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class CrawlWorker:
+    """抓取worker：登记自身、抢占/释放演员租约，并在后台线程中定期心跳续期"""
+
+    def __init__(self,
+                 db_manager: DatabaseManager,
+                 worker_id: Optional[str] = None,
+                 lease_seconds: float = DEFAULT_LEASE_SECONDS,
+                 heartbeat_interval: float = DEFAULT_HEARTBEAT_INTERVAL):
+        """
+        初始化worker
+
+        Args:
+            db_manager: 数据库管理器（各worker共享同一数据库文件）
+            worker_id: worker标识，默认为 主机名:进程号
+            lease_seconds: 租约时长（秒），超过该时长未续期视为worker已崩溃
+            heartbeat_interval: 心跳间隔（秒），应明显小于租约时长
+        """
+        self.db_manager = db_manager
+        self.worker_id = worker_id or default_worker_id()
+        self.lease_seconds = lease_seconds
+        self.heartbeat_interval = heartbeat_interval
+
+        self.current_actress: Optional[str] = None
+        self.held_actresses = set()
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """登记worker并启动心跳线程"""
+        self.db_manager.enable_shared_access()
+        self.db_manager.register_worker(self.worker_id, socket.gethostname(), os.getpid())
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._heartbeat_loop, name="crawl-heartbeat", daemon=True)
+        self._thread.start()
+        print(f"worker {self.worker_id} 已登记 (租约 {self.lease_seconds}s, 心跳 {self.heartbeat_interval}s)")
+
+    def stop(self):
+        """停止心跳并释放全部租约"""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+        try:
+            self.db_manager.stop_worker(self.worker_id)
+        except sqlite3.Error as e:
+            print(f"注销worker失败: {e}")
+
+    def claim(self, actress_name: str, actress_url: str) -> bool:
+        """抢占演员租约，成功后由心跳线程负责续期"""
+        if not self.db_manager.claim_actress(actress_name, actress_url, self.worker_id, self.lease_seconds):
+            return False
+
+        with self._lock:
+            self.current_actress = actress_name
+            self.held_actresses.add(actress_name)
+        self.db_manager.heartbeat_worker(self.worker_id, actress_name)
+        return True
+
+    def holds(self, actress_name: str) -> bool:
+        """是否仍持有演员的租约（心跳续期失败后返回 False）"""
+        with self._lock:
+            return actress_name in self.held_actresses
+
+    def ensure_lease(self, actress_name: str):
+        """
+        确认仍持有演员的租约，在抓取的每一页之间调用
+
+        Raises:
+            LeaseLostError: 租约已被其他worker接手
+        """
+        if not self.holds(actress_name):
+            raise LeaseLostError(f"演员 {actress_name} 的租约已被其他worker接手")
+
+    def release(self, actress_name: str, failed: bool = False, videos_written: int = 0, requests: int = 0,
+                skipped: bool = False):
+        """
+        释放租约并累计本worker的吞吐数据（租约已被接手时不再释放，以免清掉新持有者的租约）；
+        skipped 为 True 时（抢到租约后发现无需抓取）只释放租约，不计入完成数
+        """
+        with self._lock:
+            held = actress_name in self.held_actresses
+            self.held_actresses.discard(actress_name)
+            if self.current_actress == actress_name:
+                self.current_actress = None
+            current_actress = self.current_actress
+
+        if held:
+            self.db_manager.release_lease(actress_name, self.worker_id)
+        if not skipped:
+            self.db_manager.record_worker_result(self.worker_id, failed=failed,
+                                                 videos_written=videos_written, requests=requests)
+        self.db_manager.heartbeat_worker(self.worker_id, current_actress)
+
+    def _heartbeat_loop(self):
+        """定期更新worker心跳并续期当前租约"""
+        while not self._stop_event.wait(self.heartbeat_interval):
+            with self._lock:
+                current_actress = self.current_actress
+                held = list(self.held_actresses)
+
+            try:
+                self.db_manager.heartbeat_worker(self.worker_id, current_actress)
+                for actress_name in held:
+                    if not self.db_manager.renew_lease(actress_name, self.worker_id, self.lease_seconds):
+                        with self._lock:
+                            self.held_actresses.discard(actress_name)
+                        print(f"⚠️ 演员 {actress_name} 的租约已被其他worker接手")
+            except sqlite3.Error as e:
+                # 数据库暂时繁忙时下一轮再试，租约时长足以覆盖几次失败
+                print(f"心跳失败: {e}")
+
+
+# ==================== 协调命令 ====================
+
+def _seconds_since(value: Optional[str]) -> Optional[float]:
+    """距ISO时间的秒数"""
+    if not value:
+        return None
+    try:
+        return (datetime.now() - datetime.fromisoformat(value)).total_seconds()
+    except ValueError:
+        return None
+
+
+def _format_duration(seconds: Optional[float]) -> str:
+    """格式化时长"""
+    if seconds is None:
+        return "-"
+    seconds = int(seconds)
+    if seconds < 0:
+        return f"-{_format_duration(-seconds)}"
+    if seconds < 60:
+        return f"{seconds}s"
+    if seconds < 3600:
+        return f"{seconds // 60}m{seconds % 60:02d}s"
+    return f"{seconds // 3600}h{(seconds % 3600) // 60:02d}m"
+
+
+def worker_state(worker: Dict[str, Any], heartbeat_interval: float = DEFAULT_HEARTBEAT_INTERVAL) -> str:
+    """根据状态与心跳判断worker是否存活"""
+    if worker['status'] != 'running':
+        return '已退出'
+    since = _seconds_since(worker['last_heartbeat'])
+    if since is None or since > heartbeat_interval * 3:
+        return '失联'
+    return '运行中'
+
+
+def print_status(db_manager: DatabaseManager, show_stopped: bool = False):
+    """打印worker列表、吞吐量与持有中的租约"""
+    workers = db_manager.get_crawl_workers()
+    leases = db_manager.get_active_leases()
+
+    print("\n" + "=" * 100)
+    print(f"分布式抓取状态  {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print("=" * 100)
+    print(f"{'worker':<28}{'状态':<8}{'运行时长':<10}{'完成/失败':<12}{'视频':<8}{'请求':<8}"
+          f"{'演员/时':<9}{'请求/分':<9}当前演员")
+    print("-" * 100)
+
+    shown = 0
+    totals = {'done': 0, 'videos': 0, 'requests': 0, 'alive': 0}
+    for worker in workers:
+        state = worker_state(worker)
+        if state == '已退出' and not show_stopped:
+            continue
+        shown += 1
+
+        uptime = _seconds_since(worker['started_at']) or 0
+        hours = max(uptime / 3600, 1e-6)
+        minutes = max(uptime / 60, 1e-6)
+        done = worker['actresses_done'] or 0
+        failed = worker['actresses_failed'] or 0
+        videos = worker['videos_written'] or 0
+        requests = worker['requests'] or 0
+
+        if state == '运行中':
+            totals['alive'] += 1
+            totals['done'] += done
+            totals['videos'] += videos
+            totals['requests'] += requests
+
+        print(f"{worker['worker_id']:<28}{state:<8}{_format_duration(uptime):<10}{f'{done}/{failed}':<12}"
+              f"{videos:<8}{requests:<8}{done / hours:<9.1f}{requests / minutes:<9.1f}"
+              f"{worker['current_actress'] or '-'}")
+
+    if not shown:
+        print("暂无运行中的worker")
+    print("-" * 100)
+    print(f"存活worker: {totals['alive']}  完成演员: {totals['done']}  写入视频: {totals['videos']}  请求: {totals['requests']}")
+
+    if leases:
+        print(f"\n持有中的租约 ({len(leases)}):")
+        for lease in leases:
+            expires_in = _seconds_since(lease['lease_expires_at'])
+            expires_in = -expires_in if expires_in is not None else None
+            flag = "  (已过期，等待接手)" if expires_in is not None and expires_in < 0 else ""
+            print(f"  {lease['actress_name']:<24} {lease['lease_owner']:<28} "
+                  f"页 {lease['completed_pages']}/{lease['total_pages']}  剩余 {_format_duration(expires_in)}{flag}")
+    print("=" * 100)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="分布式抓取协调命令")
+    parser.add_argument("--db", default="./database/actresses.db", help="数据库路径")
+    parser.add_argument("--status", action="store_true", help="查看worker与租约状态")
+    parser.add_argument("--watch", type=float, default=0, help="每N秒刷新状态（配合 --status）")
+    parser.add_argument("--all", action="store_true", help="同时显示已退出的worker")
+    parser.add_argument("--requeue-expired", action="store_true", help="清除已过期的租约")
+    parser.add_argument("--forget-stopped", action="store_true", help="删除已退出worker的记录")
+    args = parser.parse_args()
+
+    db_manager = DatabaseManager(args.db)
+
+    if args.requeue_expired:
+        count = db_manager.requeue_expired_leases()
+        print(f"已清除 {count} 个过期租约")
+
+    if args.forget_stopped:
+        count = db_manager.delete_stopped_workers()
+        print(f"已删除 {count} 条已退出worker记录")
+
+    if args.status or not (args.requeue_expired or args.forget_stopped):
+        try:
+            while True:
+                print_status(db_manager, show_stopped=args.all)
+                if not args.watch:
+                    break
+                time.sleep(args.watch)
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+演员抓取调度模块
+根据观测到的新作发行频率、距上次抓取时间、作品库规模和历史错误率为每个演员打分，
+按优先队列向抓取线程分发任务，并在单次运行内遵守全局请求预算
+
+打分方式（预期新作数 / 预计请求数）:
+- 未抓取或未完成的演员: 剩余作品全部为新作，每页约12个，优先级最高
+- 已完成的演员: 发行频率 × 距上次抓取天数，增量抓取通常只需1~2页
+- 发行频率取近一年发行数、增量抓取累计新作数两者中的较大值，均无数据时按作品库规模估算
+- 历史错误率越高，得分越低
+
+用法示例:
+python crawl_scheduler.py                  # 查看当前调度计划（前20个）
+python crawl_scheduler.py --top 50 --budget 500
+"""
+
+import argparse
+import heapq
+import itertools
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from database_manager import DatabaseManager
+
+
+VIDEOS_PER_PAGE = 12
+# 无页数信息时假定的作品页数
+DEFAULT_UNKNOWN_PAGES = 3
+# 无发行数据时，假定作品库在约5年内积累
+PRIOR_CATALOG_DAYS = 5 * 365
+
+
+def _parse_time(value: Optional[str]) -> Optional[datetime]:
+    """解析ISO时间字符串，失败返回None"""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        return None
+
+
+class CrawlScheduler:
+    """基于优先队列的演员抓取调度器（线程安全）"""
+
+    def __init__(self,
+                 db_manager: DatabaseManager,
+                 actress_urls: List[str],
+                 request_budget: Optional[int] = None,
+                 include_completed: bool = True,
+                 full_interval_days: float = 30,
+                 min_recrawl_hours: float = 12):
+        """
+        初始化调度器
+
+        Args:
+            db_manager: 数据库管理器
+            actress_urls: 演员详情页URL列表
+            request_budget: 本次运行的全局页面请求预算，None表示不限
+            include_completed: 是否调度已完成的演员（增量/全量重抓）
+            full_interval_days: 强制全量抓取的间隔天数
+            min_recrawl_hours: 已完成演员的最短重抓间隔（小时）
+        """
+        self.db_manager = db_manager
+        self.request_budget = request_budget
+        self.include_completed = include_completed
+        self.full_interval_days = full_interval_days
+        self.min_recrawl_hours = min_recrawl_hours
+
+        self._lock = threading.Lock()
+        self._heap: List[Any] = []
+        self._counter = itertools.count()
+        self.requests_used = 0
+        self.stats = {
+            'scheduled': 0,
+            'dispatched': 0,
+            'skipped_recent': 0,
+            'skipped_budget': 0,
+            'failed': 0,
+            'new_videos': 0,
+        }
+
+        self._build(actress_urls)
+
+    # ==================== 打分 ====================
+
+    def _release_rate(self, info: Dict[str, Any]) -> float:
+        """估算演员每天的新作数"""
+        rates = []
+
+        if info.get('recent_releases') is not None:
+            rates.append(info['recent_releases'] / 365.0)
+
+        first_completed = _parse_time(info.get('first_completed_at'))
+        if first_completed and info.get('delta_new_videos'):
+            observed_days = max(1.0, (datetime.now() - first_completed).total_seconds() / 86400)
+            rates.append(info['delta_new_videos'] / observed_days)
+
+        if rates:
+            return max(rates)
+        return info.get('catalog_size', 0) / PRIOR_CATALOG_DAYS
+
+    def _error_rate(self, info: Dict[str, Any]) -> float:
+        """历史错误率（加一平滑，最高0.9）"""
+        attempts = info.get('crawl_attempts') or 0
+        failures = info.get('crawl_failures') or 0
+        return min(0.9, failures / (attempts + 1))
+
+    def score_actress(self, actress_name: str, actress_url: str,
+                      info: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """
+        计算单个演员的调度任务
+
+        Returns:
+            Dict: 任务信息（mode为new/delta/full），不需要调度时返回None
+        """
+        now = datetime.now()
+
+        if not info or info.get('status') != 'completed':
+            # 未抓取或未完成：按剩余页数估算成本，剩余作品全部视为新作
+            total_pages = (info or {}).get('total_pages') or 0
+            completed_pages = (info or {}).get('completed_pages') or 0
+            remaining_pages = max(1, total_pages - completed_pages) if total_pages else DEFAULT_UNKNOWN_PAGES
+            expected_new = remaining_pages * VIDEOS_PER_PAGE
+            mode = 'new'
+            est_requests = remaining_pages
+        else:
+            if not self.include_completed:
+                return None
+
+            last_full = _parse_time(info.get('last_full_crawl_at')) or _parse_time(info.get('end_time'))
+            last_delta = _parse_time(info.get('last_delta_crawl_at'))
+            last_crawl = max((t for t in (last_full, last_delta) if t), default=None)
+
+            days_since = (now - last_crawl).total_seconds() / 86400 if last_crawl else self.full_interval_days
+            if days_since * 24 < self.min_recrawl_hours:
+                self.stats['skipped_recent'] += 1
+                return None
+
+            expected_new = self._release_rate(info) * days_since
+            needs_full = (not last_full) or (now - last_full).total_seconds() >= self.full_interval_days * 86400
+            if needs_full:
+                mode = 'full'
+                est_requests = max(1, info.get('total_pages') or DEFAULT_UNKNOWN_PAGES)
+            else:
+                mode = 'delta'
+                est_requests = 1 + int(expected_new // VIDEOS_PER_PAGE)
+
+        score = expected_new / est_requests * (1 - self._error_rate(info or {}))
+        return {
+            'actress_name': actress_name,
+            'actress_url': actress_url,
+            'mode': mode,
+            'score': score,
+            'expected_new': expected_new,
+            'est_requests': est_requests,
+        }
+
+    def _build(self, actress_urls: List[str]):
+        """加载统计信息并构建优先队列"""
+        stats = self.db_manager.get_actress_schedule_stats()
+        seen = set()
+
+        for actress_url in actress_urls:
+            actress_name = self.db_manager._extract_actress_name_from_url(actress_url)
+            if actress_name in seen:
+                continue
+            seen.add(actress_name)
+
+            task = self.score_actress(actress_name, actress_url, stats.get(actress_name))
+            if task is None:
+                continue
+            heapq.heappush(self._heap, (-task['score'], next(self._counter), task))
+
+        self.stats['scheduled'] = len(self._heap)
+
+    # ==================== 分发 ====================
+
+    def remaining_budget(self) -> Optional[int]:
+        """剩余请求预算，None表示不限"""
+        if self.request_budget is None:
+            return None
+        return max(0, self.request_budget - self.requests_used)
+
+    def next_task(self) -> Optional[Dict[str, Any]]:
+        """
+        取出下一个任务
+
+        预计请求数超过剩余预算的任务会被跳过（继续尝试更便宜的任务），预算耗尽返回None
+        """
+        with self._lock:
+            while self._heap:
+                remaining = self.remaining_budget()
+                if remaining is not None and remaining <= 0:
+                    return None
+
+                _, _, task = heapq.heappop(self._heap)
+                if remaining is not None and task['est_requests'] > remaining and task['mode'] != 'new':
+                    # 未完成的演员支持页级续抓，可以只消耗部分预算；其余任务预算不足则跳过
+                    self.stats['skipped_budget'] += 1
+                    continue
+
+                self.stats['dispatched'] += 1
+                return task
+            return None
+
+    def refresh_task(self, task: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        按最新数据库状态重新评估任务
+
+        多个worker共享数据库时，任务出队前可能已被其他worker完成，
+        抢到租约后调用此方法，返回None表示已无需抓取
+        """
+        info = self.db_manager.get_actress_schedule_stats(task['actress_name']).get(task['actress_name'])
+        return self.score_actress(task['actress_name'], task['actress_url'], info)
+
+    def report(self, task: Dict[str, Any], requests_used: int, new_videos: int = 0, failed: bool = False):
+        """回报任务结果：扣减预算并记录错误率"""
+        with self._lock:
+            self.requests_used += requests_used
+            self.stats['new_videos'] += new_videos
+            if failed:
+                self.stats['failed'] += 1
+
+        self.db_manager.record_crawl_attempt(task['actress_name'], failed=failed)
+
+    def pending_count(self) -> int:
+        """队列中剩余任务数"""
+        with self._lock:
+            return len(self._heap)
+
+    def peek(self, top: int = 20) -> List[Dict[str, Any]]:
+        """查看优先级最高的若干任务（不出队）"""
+        with self._lock:
+            return [entry[2] for entry in heapq.nsmallest(top, self._heap)]
+
+    def print_plan(self, top: int = 20):
+        """打印调度计划"""
+        budget = "不限" if self.request_budget is None else str(self.request_budget)
+        print("\n" + "=" * 60)
+        print(f"抓取调度计划: 共 {self.pending_count()} 个任务，请求预算 {budget}")
+        if self.stats['skipped_recent']:
+            print(f"最近 {self.min_recrawl_hours} 小时内已抓取而跳过: {self.stats['skipped_recent']}")
+        print("-" * 60)
+        for i, task in enumerate(self.peek(top), 1):
+            print(f"{i:3d}. [{task['mode']:5s}] {task['actress_name']}  "
+                  f"得分 {task['score']:.2f}  预期新作 {task['expected_new']:.1f}  预计请求 {task['est_requests']}")
+        print("=" * 60)
+
+    def print_summary(self):
+        """打印本次运行的调度统计"""
+        print("\n调度统计:")
+        print(f"  已分发: {self.stats['dispatched']}/{self.stats['scheduled']}")
+        print(f"  已用请求: {self.requests_used}" +
+              (f"/{self.request_budget}" if self.request_budget is not None else ""))
+        print(f"  新增视频: {self.stats['new_videos']}")
+        print(f"  失败: {self.stats['failed']}")
+        if self.stats['skipped_budget']:
+            print(f"  预算不足跳过: {self.stats['skipped_budget']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="查看演员抓取调度计划")
+    parser.add_argument("--db", default="./database/actresses.db", help="数据库路径")
+    parser.add_argument("--top", type=int, default=20, help="显示前N个任务")
+    parser.add_argument("--budget", type=int, default=None, help="请求预算")
+    parser.add_argument("--full-interval-days", type=float, default=30, help="强制全量抓取的间隔天数")
+    parser.add_argument("--min-recrawl-hours", type=float, default=12, help="已完成演员的最短重抓间隔（小时）")
+    args = parser.parse_args()
+
+    db_manager = DatabaseManager(args.db)
+    scheduler = CrawlScheduler(db_manager, db_manager.get_all_actress_urls(),
+                               request_budget=args.budget,
+                               full_interval_days=args.full_interval_days,
+                               min_recrawl_hours=args.min_recrawl_hours)
+    scheduler.print_plan(args.top)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,162 +1,278 @@
 """
 CSV数据处理工具模块
 用于读取演员CSV文件，筛选特定类型视频，并提取视频编号
+
+大文件按块读取（pd.read_csv(chunksize=...)）：每块只读取类型列与标题列，筛选与编号提取用向量化的
+pandas 字符串操作完成，跨块增量去重并以生成器逐个产出编号。内存只与块大小和唯一编号数有关，
+与文件大小无关。
 """
 
-import re
+import codecs
 import pandas as pd
-from typing import List, Optional
-from collections import OrderedDict
+from typing import Dict, Iterator, List, Optional, Set
+
+
+# 每块读取的行数
+CHUNK_SIZE = 50_000
+
+# 视频编号正则模式：2-5个字母 + 连字符 + 2-4个数字（提取后统一大写）
+CODE_PATTERN = r"\b([A-Za-z]{2,5}-\d{2,4})\b"
+
+# 标准化标题：全角括号与空格转半角
+_TITLE_TRANSLATION = str.maketrans({'（': '(', '）': ')', '　': ' '})
+
+# 编码探测读取的字节数
+_SNIFF_BYTES = 1 << 20
+
+
+def detect_encoding(csv_path: str) -> str:
+    """
+    按文件开头的内容探测CSV编码（utf-8-sig / utf-8 / gbk）
+
+    Raises:
+        FileNotFoundError: 文件不存在
+        ValueError: 常见编码都无法解码
+    """
+    with open(csv_path, 'rb') as f:
+        sample = f.read(_SNIFF_BYTES)
+    if sample.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    for encoding in ['utf-8', 'gbk']:
+        try:
+            # 增量解码：样本末尾被截断的多字节字符不算解码失败
+            codecs.getincrementaldecoder(encoding)().decode(sample, final=False)
+            return encoding
+        except UnicodeDecodeError:
+            continue
+    raise ValueError(f"无法使用常见编码读取CSV文件: {csv_path}")
 
 
 def load_actor_csv(csv_path: str) -> pd.DataFrame:
     """
-    加载演员CSV文件
-    
+    加载演员CSV文件（整个文件读入内存；大文件请使用 iter_actor_csv）
+
     Args:
         csv_path: CSV文件路径
-        
+
     Returns:
         pandas.DataFrame: 加载的数据框
-        
+
     Raises:
         FileNotFoundError: 文件不存在
         ValueError: 缺少必需列
     """
     try:
-        # 尝试不同编码读取CSV
-        for encoding in ['utf-8', 'utf-8-sig', 'gbk']:
-            try:
-                df = pd.read_csv(csv_path, encoding=encoding)
-                print(f"✅ 成功读取CSV文件: {csv_path} (编码: {encoding})")
-                break
-            except UnicodeDecodeError:
-                continue
-        else:
-            raise ValueError(f"无法使用常见编码读取CSV文件: {csv_path}")
-        
+        encoding = detect_encoding(csv_path)
+        df = pd.read_csv(csv_path, encoding=encoding)
+        print(f"✅ 成功读取CSV文件: {csv_path} (编码: {encoding})")
+
         # 校验必需列
-        required_columns = ['video_type', 'video_title']
-        missing_columns = [col for col in required_columns if col not in df.columns]
-        
-        if missing_columns:
-            raise ValueError(f"CSV文件缺少必需列: {missing_columns}，现有列: {list(df.columns)}")
-        
+        _check_columns(list(df.columns), ['video_type', 'video_title'])
+
         print(f"📊 CSV数据概览: 共 {len(df)} 行，列: {list(df.columns)}")
         return df
-        
+
     except FileNotFoundError:
         raise FileNotFoundError(f"CSV文件不存在: {csv_path}")
     except Exception as e:
         raise ValueError(f"读取CSV文件失败: {e}")
 
 
+def _check_columns(columns: List[str], required_columns: List[str]):
+    missing_columns = [col for col in required_columns if col not in columns]
+    if missing_columns:
+        raise ValueError(f"CSV文件缺少必需列: {missing_columns}，现有列: {columns}")
+
+
+def iter_actor_csv(csv_path: str, title_col: str = "video_title",
+                   chunksize: int = CHUNK_SIZE) -> Iterator[pd.DataFrame]:
+    """
+    按块读取演员CSV文件，每块只包含 video_type 与标题列（均为字符串）
+
+    Args:
+        csv_path: CSV文件路径
+        title_col: 标题列名
+        chunksize: 每块行数
+
+    Yields:
+        pandas.DataFrame: 数据块
+
+    Raises:
+        FileNotFoundError: 文件不存在
+        ValueError: 编码无法识别或缺少必需列
+    """
+    try:
+        encoding = detect_encoding(csv_path)
+    except FileNotFoundError:
+        raise FileNotFoundError(f"CSV文件不存在: {csv_path}")
+
+    columns = list(pd.read_csv(csv_path, encoding=encoding, nrows=0).columns)
+    _check_columns(columns, ['video_type', title_col])
+    print(f"✅ 按块读取CSV文件: {csv_path} (编码: {encoding}，每块 {chunksize} 行)")
+
+    with pd.read_csv(csv_path, encoding=encoding, usecols=['video_type', title_col], dtype=str,
+                     chunksize=chunksize) as reader:
+        yield from reader
+
+
+def _type_mask(types: pd.Series, video_type: str) -> pd.Series:
+    """video_type 去除空格后与筛选条件相等的行"""
+    return types.astype(str).str.strip() == video_type.strip()
+
+
 def filter_by_type(df: pd.DataFrame, video_type: Optional[str] = "无码破解") -> pd.DataFrame:
     """
     根据视频类型筛选数据
-    
+
     Args:
         df: 包含视频数据的DataFrame
         video_type: 要筛选的视频类型，默认"无码破解"，如果为None则返回所有数据
-        
+
     Returns:
         pandas.DataFrame: 筛选后的数据框
     """
     if 'video_type' not in df.columns:
         raise ValueError("数据框中缺少 'video_type' 列")
-    
+
     # 如果video_type为None，返回所有数据
     if video_type is None:
         print("🔍 筛选条件: 无筛选，返回所有数据")
         print(f"📋 筛选结果: {len(df)} 行 (原始: {len(df)} 行)")
         return df
-    
-    # 标准化处理：去除空格，统一大小写比较
-    df_filtered = df[df['video_type'].astype(str).str.strip() == video_type.strip()]
-    
+
+    # 标准化处理：去除空格后比较
+    df_filtered = df[_type_mask(df['video_type'], video_type)]
+
     print(f"🔍 筛选条件: video_type == '{video_type}'")
     print(f"📋 筛选结果: {len(df_filtered)} 行 (原始: {len(df)} 行)")
-    
+
     if len(df_filtered) == 0:
         print(f"⚠️ 未找到匹配的记录，现有video_type值: {df['video_type'].unique().tolist()}")
-    
+
     return df_filtered
 
 
+def extract_code_matches(titles: pd.Series) -> pd.Series:
+    """
+    向量化提取标题中的视频编号
+
+    Args:
+        titles: 标题列
+
+    Returns:
+        pandas.Series: 按标题顺序排列的大写编号，索引为所在行的索引（一行可有多个编号）
+    """
+    normalized = titles.dropna().astype(str).str.translate(_TITLE_TRANSLATION)
+    matches = normalized.str.extractall(CODE_PATTERN)[0].str.upper()
+    return matches.droplevel('match')
+
+
+def _print_extract_summary(unique_count: int, failed_count: int, failed_samples: List[str],
+                           preview: List[str]):
+    print(f"🎯 编号提取结果:")
+    print(f"   - 成功提取: {unique_count} 个唯一编号")
+    print(f"   - 提取失败: {failed_count} 个标题")
+    if preview:
+        more = f" 等（共 {unique_count} 个）" if unique_count > len(preview) else ""
+        print(f"   - 提取的编号: {preview}{more}")
+    if failed_samples:
+        print(f"⚠️ 未能提取编号的标题示例: {failed_samples}")
+
+
 def extract_codes(df: pd.DataFrame, title_col: str = "video_title") -> List[str]:
     """
     从视频标题中提取视频编号
-    
+
     Args:
         df: 输入数据框
         title_col: 标题列名，默认"video_title"
-        
+
     Returns:
         List[str]: 提取的视频编号列表（已去重并保序）
     """
     if title_col not in df.columns:
         raise ValueError(f"数据框中缺少 '{title_col}' 列")
-    
-    # 视频编号正则模式：2-5个大写字母 + 连字符 + 2-4个数字
-    pattern = r"\b[A-Z]{2,5}-\d{2,4}\b"
-    
-    codes = []
-    failed_titles = []
-    
-    for idx, title in df[title_col].items():
-        if pd.isna(title):
-            continue
-            
-        # 标准化标题：去除全角字符，转换为半角
-        normalized_title = str(title).replace('（', '(').replace('）', ')').replace('　', ' ')
-        
-        # 提取编号
-        matches = re.findall(pattern, normalized_title, re.IGNORECASE)
-        
-        if matches:
-            # 转换为大写并添加到列表
-            for match in matches:
-                codes.append(match.upper())
-        else:
-            failed_titles.append(title)
-    
+
+    titles = df[title_col].dropna()
+    matches = extract_code_matches(titles)
+    failed = titles[~titles.index.isin(matches.index)]
+
     # 去重并保持顺序
-    unique_codes = list(OrderedDict.fromkeys(codes))
-    
-    print(f"🎯 编号提取结果:")
-    print(f"   - 成功提取: {len(unique_codes)} 个唯一编号")
-    print(f"   - 提取失败: {len(failed_titles)} 个标题")
-    print(f"   - 提取的编号: {unique_codes}")
-    
-    if failed_titles:
-        print(f"⚠️ 未能提取编号的标题示例: {failed_titles[:3]}")
-    
+    unique_codes = matches.drop_duplicates().tolist()
+    _print_extract_summary(len(unique_codes), len(failed), failed.head(3).tolist(), unique_codes[:10])
     return unique_codes
 
 
+def iter_video_codes_from_csv(csv_path: str, video_type: Optional[str] = "无码破解",
+                              title_col: str = "video_title", chunksize: int = CHUNK_SIZE,
+                              stats: Optional[Dict[str, int]] = None) -> Iterator[str]:
+    """
+    按块流式提取指定类型的视频编号（跨块去重，按首次出现的顺序产出）
+
+    Args:
+        csv_path: CSV文件路径
+        video_type: 视频类型筛选条件，默认"无码破解"，为None时不筛选
+        title_col: 标题列名，默认"video_title"
+        chunksize: 每块行数
+        stats: 可选的统计字典，读取结束后填入 rows / matched_rows / codes / failed_titles
+
+    Yields:
+        str: 视频编号
+    """
+    seen: Set[str] = set()
+    preview: List[str] = []
+    failed_samples: List[str] = []
+    types_seen: Set[str] = set()
+    rows = matched_rows = failed_count = 0
+
+    for chunk in iter_actor_csv(csv_path, title_col, chunksize):
+        rows += len(chunk)
+        if video_type is not None:
+            if len(types_seen) < 20:
+                types_seen.update(chunk['video_type'].dropna().unique().tolist())
+            chunk = chunk[_type_mask(chunk['video_type'], video_type)]
+        matched_rows += len(chunk)
+
+        titles = chunk[title_col].dropna()
+        matches = extract_code_matches(titles)
+        failed = titles[~titles.index.isin(matches.index)]
+        failed_count += len(failed)
+        if len(failed_samples) < 3:
+            failed_samples.extend(failed.head(3 - len(failed_samples)).tolist())
+
+        for code in matches.drop_duplicates():
+            if code in seen:
+                continue
+            seen.add(code)
+            if len(preview) < 10:
+                preview.append(code)
+            yield code
+
+    print(f"🔍 筛选条件: {f'video_type == {video_type!r}' if video_type is not None else '无筛选'}")
+    print(f"📋 筛选结果: {matched_rows} 行 (原始: {rows} 行)")
+    if video_type is not None and matched_rows == 0 and rows:
+        print(f"⚠️ 未找到匹配的记录，现有video_type值: {sorted(types_seen)}")
+    _print_extract_summary(len(seen), failed_count, failed_samples, preview)
+    if stats is not None:
+        stats.update(rows=rows, matched_rows=matched_rows, codes=len(seen), failed_titles=failed_count)
+
+
 def get_video_codes_from_csv(csv_path: str, video_type: Optional[str] = "无码破解", title_col: str = "video_title") -> List[str]:
     """
     一站式函数：从CSV文件中提取指定类型的视频编号
-    
+
     Args:
         csv_path: CSV文件路径
         video_type: 视频类型筛选条件，默认"无码破解"
         title_col: 标题列名，默认"video_title"
-        
+
     Returns:
         List[str]: 提取的视频编号列表
     """
     print(f"🚀 开始处理CSV文件: {csv_path}")
-    
-    # 1. 加载CSV
-    df = load_actor_csv(csv_path)
-    
-    # 2. 筛选类型
-    df_filtered = filter_by_type(df, video_type)
-    
-    # 3. 提取编号
-    codes = extract_codes(df_filtered, title_col)
-    
+
+    codes = list(iter_video_codes_from_csv(csv_path, video_type, title_col))
+
     print(f"✅ 处理完成，共提取 {len(codes)} 个视频编号")
     return codes
 
@@ -166,6 +282,6 @@ if __name__ == "__main__":
     test_csv_path = "./output/actor_七海蒂娜.csv"
     try:
         codes = get_video_codes_from_csv(test_csv_path)
-        print(f"\n📋 最终结果: {codes}")
+        print(f"\n📋 最终结果: 共 {len(codes)} 个编号，前10个: {codes[:10]}")
     except Exception as e:
-        print(f"❌ 测试失败: {e}")
\ No newline at end of file
+        print(f"❌ 测试失败: {e}")
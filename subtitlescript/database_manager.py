@@ -8,10 +8,35 @@ import json
 import os
 import re
 from typing import List, Dict, Any, Optional, Tuple
-from datetime import datetime
+from datetime import datetime, timedelta
 from pathlib import Path
 
 
+# 字幕搜索连续无结果后的复查间隔：从1天起逐次翻倍，最长60天
+SUBTITLE_RECHECK_BASE = timedelta(days=1)
+SUBTITLE_RECHECK_MAX = timedelta(days=60)
+# 新片发行后字幕通常很快出现：发行N天内的编号复查间隔不超过对应上限
+SUBTITLE_RECENT_RELEASE_CAPS = [
+    (30, timedelta(days=1)),
+    (90, timedelta(days=7)),
+]
+
+
+def subtitle_recheck_delay(miss_count: int, release_date: Optional[str] = None,
+                           now: Optional[datetime] = None) -> timedelta:
+    """第 miss_count 次连续无结果后的复查间隔，发行日期较近（或尚未发行）的编号缩短间隔"""
+    delay = min(SUBTITLE_RECHECK_BASE * (2 ** max(miss_count - 1, 0)), SUBTITLE_RECHECK_MAX)
+    try:
+        released = datetime.strptime((release_date or "").strip()[:10], "%Y-%m-%d")
+    except ValueError:
+        return delay
+    age_days = ((now or datetime.now()) - released).days
+    for max_age_days, cap in SUBTITLE_RECENT_RELEASE_CAPS:
+        if age_days <= max_age_days:
+            return min(delay, cap)
+    return delay
+
+
 class DatabaseManager:
     """数据库管理器，处理所有数据存储和进度管理"""
     
@@ -84,6 +109,57 @@ class DatabaseManager:
             """)
             
             conn.commit()
+        
+        self.ensure_actress_crawl_columns()
+        self.ensure_crawl_workers_table()
+        self.ensure_subtitle_search_state_table()
+    
+    def ensure_actress_crawl_columns(self):
+        """确保actress_status表包含增量抓取相关字段"""
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.execute("PRAGMA table_info(actress_status)")
+            existing_columns = {row[1] for row in cursor.fetchall()}
+            
+            new_columns = {
+                'last_full_crawl_at': 'TEXT',   # 最近一次全量抓取完成时间
+                'last_delta_crawl_at': 'TEXT',  # 最近一次增量抓取完成时间
+                'first_completed_at': 'TEXT',   # 首次全量抓取完成时间（新作频率统计起点）
+                'crawl_attempts': 'INTEGER DEFAULT 0',    # 调度抓取次数
+                'crawl_failures': 'INTEGER DEFAULT 0',    # 调度抓取失败次数
+                'delta_new_videos': 'INTEGER DEFAULT 0',  # 增量抓取累计发现的新作品数
+                'lease_owner': 'TEXT',       # 持有租约的worker
+                'lease_heartbeat': 'TEXT',   # 租约最近一次续期时间
+                'lease_expires_at': 'TEXT',  # 租约过期时间，过期后其他worker可接手
+            }
+            
+            for column_name, column_type in new_columns.items():
+                if column_name not in existing_columns:
+                    try:
+                        conn.execute(f"ALTER TABLE actress_status ADD COLUMN {column_name} {column_type}")
+                    except sqlite3.OperationalError as e:
+                        print(f"添加列 {column_name} 失败: {e}")
+            
+            conn.commit()
+    
+    def ensure_crawl_workers_table(self):
+        """确保分布式抓取的worker登记表存在"""
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS crawl_workers (
+                    worker_id TEXT PRIMARY KEY,
+                    hostname TEXT,
+                    pid INTEGER,
+                    status TEXT NOT NULL,
+                    current_actress TEXT,
+                    started_at TEXT NOT NULL,
+                    last_heartbeat TEXT NOT NULL,
+                    actresses_done INTEGER DEFAULT 0,
+                    actresses_failed INTEGER DEFAULT 0,
+                    videos_written INTEGER DEFAULT 0,
+                    requests INTEGER DEFAULT 0
+                )
+            """)
+            conn.commit()
     
     def sanitize_table_name(self, actress_name: str) -> str:
         """将演员名转换为安全的表名"""
@@ -277,9 +353,10 @@ class DatabaseManager:
         with sqlite3.connect(self.db_path) as conn:
             conn.execute("""
                 UPDATE actress_status 
-                SET status = 'completed', end_time = ?, updated_at = ?
+                SET status = 'completed', end_time = ?, last_full_crawl_at = ?,
+                    first_completed_at = COALESCE(first_completed_at, ?), updated_at = ?
                 WHERE actress_name = ?
-            """, (now, now, actress_name))
+            """, (now, now, now, now, actress_name))
             conn.commit()
         
         # 更新完成的演员数量
@@ -370,6 +447,308 @@ class DatabaseManager:
             # 表不存在，说明还没有保存过作品
             return 1, 0, 0
     
+    # ==================== 增量抓取方法 ====================
+    
+    def mark_actress_crawled(self, actress_name: str, mode: str = 'full', new_videos: int = 0):
+        """记录演员抓取完成时间，mode为'full'或'delta'；增量抓取同时累计新作品数"""
+        now = datetime.now().isoformat()
+        column = 'last_full_crawl_at' if mode == 'full' else 'last_delta_crawl_at'
+        
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute(f"""
+                UPDATE actress_status 
+                SET {column} = ?, delta_new_videos = COALESCE(delta_new_videos, 0) + ?, updated_at = ?
+                WHERE actress_name = ?
+            """, (now, new_videos if mode == 'delta' else 0, now, actress_name))
+            conn.commit()
+    
+    def record_crawl_attempt(self, actress_name: str, failed: bool = False):
+        """记录一次调度抓取（用于计算错误率）"""
+        now = datetime.now().isoformat()
+        
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("""
+                UPDATE actress_status 
+                SET crawl_attempts = COALESCE(crawl_attempts, 0) + 1,
+                    crawl_failures = COALESCE(crawl_failures, 0) + ?, updated_at = ?
+                WHERE actress_name = ?
+            """, (1 if failed else 0, now, actress_name))
+            conn.commit()
+    
+    def get_actress_schedule_stats(self, actress_name: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        获取调度所需的演员统计信息
+        
+        Args:
+            actress_name: 只查询指定演员，None表示全部
+        
+        Returns:
+            Dict[str, Dict]: 演员名 -> 状态、抓取时间、作品数、近一年发行数等
+        """
+        stats: Dict[str, Dict[str, Any]] = {}
+        
+        with sqlite3.connect(self.db_path) as conn:
+            conn.row_factory = sqlite3.Row
+            cursor = conn.execute("""
+                SELECT actress_name, status, total_pages, completed_pages, end_time,
+                       last_full_crawl_at, last_delta_crawl_at, first_completed_at,
+                       crawl_attempts, crawl_failures, delta_new_videos
+                FROM actress_status
+            """ + (" WHERE actress_name = ?" if actress_name else ""), (actress_name,) if actress_name else ())
+            for row in cursor.fetchall():
+                item = dict(row)
+                item['catalog_size'] = 0
+                item['recent_releases'] = None
+                stats[row['actress_name']] = item
+            
+            try:
+                cursor = conn.execute("PRAGMA table_info(videos)")
+                video_columns = {r[1] for r in cursor.fetchall()}
+                
+                # 有详情数据时统计近一年发行数，否则只统计作品总数
+                if 'release_date' in video_columns:
+                    cursor = conn.execute("""
+                        SELECT actress_name, COUNT(*),
+                               SUM(CASE WHEN release_date >= date('now', '-365 days') THEN 1 ELSE 0 END),
+                               SUM(CASE WHEN release_date IS NOT NULL AND release_date != '' THEN 1 ELSE 0 END)
+                        FROM videos
+                    """ + (" WHERE actress_name = ?" if actress_name else "") + " GROUP BY actress_name",
+                        (actress_name,) if actress_name else ())
+                else:
+                    cursor = conn.execute(
+                        "SELECT actress_name, COUNT(*), NULL, 0 FROM videos"
+                        + (" WHERE actress_name = ?" if actress_name else "") + " GROUP BY actress_name",
+                        (actress_name,) if actress_name else ())
+                
+                for name, total, recent, dated in cursor.fetchall():
+                    item = stats.get(name)
+                    if item is None:
+                        continue
+                    item['catalog_size'] = total or 0
+                    item['recent_releases'] = recent if dated else None
+            except sqlite3.OperationalError:
+                # videos表尚不存在
+                pass
+        
+        return stats
+    
+    def needs_full_crawl(self, actress_name: str, full_interval_days: float) -> bool:
+        """判断演员是否需要强制全量抓取（距上次全量抓取超过N天）"""
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.execute("""
+                SELECT last_full_crawl_at, end_time FROM actress_status WHERE actress_name = ?
+            """, (actress_name,))
+            row = cursor.fetchone()
+        
+        if not row:
+            return True
+        
+        # 旧数据没有last_full_crawl_at时，以完成时间作为最近一次全量抓取时间
+        last_full = row[0] or row[1]
+        if not last_full:
+            return True
+        
+        try:
+            elapsed = datetime.now() - datetime.fromisoformat(last_full)
+        except ValueError:
+            return True
+        return elapsed.total_seconds() >= full_interval_days * 86400
+    
+    def reset_actress_progress(self, actress_name: str):
+        """重置演员页级进度，用于强制全量重抓"""
+        now = datetime.now().isoformat()
+        
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("""
+                UPDATE actress_status 
+                SET status = 'processing', start_time = ?, end_time = NULL,
+                    completed_pages = 0, last_page = 0, last_position_in_page = 0, updated_at = ?
+                WHERE actress_name = ?
+            """, (now, now, actress_name))
+            conn.commit()
+    
+    def get_known_video_urls(self, actress_name: str) -> set:
+        """获取演员已入库的视频URL集合"""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.execute(
+                    "SELECT video_url FROM videos WHERE actress_name = ? AND video_url IS NOT NULL",
+                    (actress_name,)
+                )
+                return {row[0] for row in cursor.fetchall()}
+        except sqlite3.OperationalError:
+            return set()
+    
+    # ==================== 分布式抓取租约方法 ====================
+    
+    def _lease_connection(self) -> sqlite3.Connection:
+        """租约操作使用的连接：手动事务 + 较长的锁等待，多进程同时抢占时保证原子性"""
+        return sqlite3.connect(self.db_path, timeout=30.0, isolation_level=None)
+    
+    def enable_shared_access(self):
+        """多个抓取进程共享同一数据库文件时启用WAL，减少读写互相阻塞（仅适用于本地路径）"""
+        with sqlite3.connect(self.db_path, timeout=30.0) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+    
+    def register_worker(self, worker_id: str, hostname: str, pid: int):
+        """登记抓取worker"""
+        now = datetime.now().isoformat()
+        
+        with sqlite3.connect(self.db_path, timeout=30.0) as conn:
+            conn.execute("""
+                INSERT INTO crawl_workers (worker_id, hostname, pid, status, started_at, last_heartbeat)
+                VALUES (?, ?, ?, 'running', ?, ?)
+                ON CONFLICT(worker_id) DO UPDATE SET
+                    hostname = excluded.hostname, pid = excluded.pid, status = 'running',
+                    current_actress = NULL, started_at = excluded.started_at,
+                    last_heartbeat = excluded.last_heartbeat,
+                    actresses_done = 0, actresses_failed = 0, videos_written = 0, requests = 0
+            """, (worker_id, hostname, pid, now, now))
+            conn.commit()
+    
+    def heartbeat_worker(self, worker_id: str, current_actress: Optional[str] = None):
+        """更新worker心跳"""
+        now = datetime.now().isoformat()
+        
+        with sqlite3.connect(self.db_path, timeout=30.0) as conn:
+            conn.execute("""
+                UPDATE crawl_workers SET last_heartbeat = ?, current_actress = ?
+                WHERE worker_id = ?
+            """, (now, current_actress, worker_id))
+            conn.commit()
+    
+    def record_worker_result(self, worker_id: str, failed: bool = False,
+                             videos_written: int = 0, requests: int = 0):
+        """累计worker完成的演员数、视频数和请求数"""
+        now = datetime.now().isoformat()
+        
+        with sqlite3.connect(self.db_path, timeout=30.0) as conn:
+            conn.execute("""
+                UPDATE crawl_workers
+                SET actresses_done = actresses_done + ?, actresses_failed = actresses_failed + ?,
+                    videos_written = videos_written + ?, requests = requests + ?, last_heartbeat = ?
+                WHERE worker_id = ?
+            """, (0 if failed else 1, 1 if failed else 0, videos_written, requests, now, worker_id))
+            conn.commit()
+    
+    def stop_worker(self, worker_id: str):
+        """标记worker退出并释放其持有的全部租约"""
+        now = datetime.now().isoformat()
+        
+        with sqlite3.connect(self.db_path, timeout=30.0) as conn:
+            conn.execute("""
+                UPDATE crawl_workers SET status = 'stopped', current_actress = NULL, last_heartbeat = ?
+                WHERE worker_id = ?
+            """, (now, worker_id))
+            conn.execute("""
+                UPDATE actress_status
+                SET lease_owner = NULL, lease_heartbeat = NULL, lease_expires_at = NULL
+                WHERE lease_owner = ?
+            """, (worker_id,))
+            conn.commit()
+    
+    def claim_actress(self, actress_name: str, actress_url: str, worker_id: str,
+                      lease_seconds: float = 300) -> bool:
+        """
+        抢占演员租约
+        
+        演员未被持有、租约已过期或本来就由该worker持有时抢占成功。
+        
+        Returns:
+            bool: 是否抢占成功
+        """
+        now_dt = datetime.now()
+        now = now_dt.isoformat()
+        expires = (now_dt + timedelta(seconds=lease_seconds)).isoformat()
+        
+        conn = self._lease_connection()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            # 尚未开始的演员先建立状态记录，租约才有落点
+            conn.execute("""
+                INSERT OR IGNORE INTO actress_status 
+                (actress_name, url, status, total_pages, completed_pages, total_videos,
+                 last_page, last_position_in_page, errors, updated_at)
+                VALUES (?, ?, 'pending', 0, 0, 0, 0, 0, '[]', ?)
+            """, (actress_name, actress_url, now))
+            cursor = conn.execute("""
+                UPDATE actress_status
+                SET lease_owner = ?, lease_heartbeat = ?, lease_expires_at = ?
+                WHERE actress_name = ?
+                  AND (lease_owner IS NULL OR lease_owner = ? OR lease_expires_at IS NULL OR lease_expires_at < ?)
+            """, (worker_id, now, expires, actress_name, worker_id, now))
+            claimed = cursor.rowcount == 1
+            conn.execute("COMMIT")
+            return claimed
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+    
+    def renew_lease(self, actress_name: str, worker_id: str, lease_seconds: float = 300) -> bool:
+        """续期租约，返回False表示租约已被其他worker接手"""
+        now_dt = datetime.now()
+        expires = (now_dt + timedelta(seconds=lease_seconds)).isoformat()
+        
+        with sqlite3.connect(self.db_path, timeout=30.0) as conn:
+            cursor = conn.execute("""
+                UPDATE actress_status SET lease_heartbeat = ?, lease_expires_at = ?
+                WHERE actress_name = ? AND lease_owner = ?
+            """, (now_dt.isoformat(), expires, actress_name, worker_id))
+            conn.commit()
+            return cursor.rowcount == 1
+    
+    def release_lease(self, actress_name: str, worker_id: str):
+        """释放租约"""
+        with sqlite3.connect(self.db_path, timeout=30.0) as conn:
+            conn.execute("""
+                UPDATE actress_status
+                SET lease_owner = NULL, lease_heartbeat = NULL, lease_expires_at = NULL
+                WHERE actress_name = ? AND lease_owner = ?
+            """, (actress_name, worker_id))
+            conn.commit()
+    
+    def requeue_expired_leases(self) -> int:
+        """清除已过期的租约（对应worker崩溃），返回清除数量"""
+        now = datetime.now().isoformat()
+        
+        with sqlite3.connect(self.db_path, timeout=30.0) as conn:
+            cursor = conn.execute("""
+                UPDATE actress_status
+                SET lease_owner = NULL, lease_heartbeat = NULL, lease_expires_at = NULL
+                WHERE lease_owner IS NOT NULL AND lease_expires_at < ?
+            """, (now,))
+            conn.commit()
+            return cursor.rowcount
+    
+    def delete_stopped_workers(self) -> int:
+        """删除已退出worker的记录，返回删除数量"""
+        with sqlite3.connect(self.db_path, timeout=30.0) as conn:
+            cursor = conn.execute("DELETE FROM crawl_workers WHERE status = 'stopped'")
+            conn.commit()
+            return cursor.rowcount
+    
+    def get_crawl_workers(self) -> List[Dict[str, Any]]:
+        """获取全部worker记录"""
+        with sqlite3.connect(self.db_path, timeout=30.0) as conn:
+            conn.row_factory = sqlite3.Row
+            cursor = conn.execute("SELECT * FROM crawl_workers ORDER BY started_at")
+            return [dict(row) for row in cursor.fetchall()]
+    
+    def get_active_leases(self) -> List[Dict[str, Any]]:
+        """获取当前持有中的租约"""
+        with sqlite3.connect(self.db_path, timeout=30.0) as conn:
+            conn.row_factory = sqlite3.Row
+            cursor = conn.execute("""
+                SELECT actress_name, status, lease_owner, lease_heartbeat, lease_expires_at,
+                       completed_pages, total_pages
+                FROM actress_status
+                WHERE lease_owner IS NOT NULL
+                ORDER BY lease_owner, lease_heartbeat
+            """)
+            return [dict(row) for row in cursor.fetchall()]
+    
     def get_completed_actresses_count(self) -> int:
         """获取已完成的演员数量"""
         with sqlite3.connect(self.db_path) as conn:
@@ -740,6 +1119,95 @@ class DatabaseManager:
             
         return False
     
+    # ==================== 字幕搜索复查方法 ====================
+    
+    def ensure_subtitle_search_state_table(self):
+        """确保字幕搜索复查状态表存在（按大写编号记录连续无结果次数与下次可搜索时间）"""
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS subtitle_search_state (
+                    video_id TEXT PRIMARY KEY,
+                    miss_count INTEGER DEFAULT 0,
+                    last_result TEXT,
+                    last_searched_at TEXT,
+                    next_eligible_at TEXT
+                )
+            """)
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_subtitle_search_next
+                ON subtitle_search_state(next_eligible_at)
+            """)
+            conn.commit()
+    
+    def _video_release_date(self, conn: sqlite3.Connection, video_id: str) -> Optional[str]:
+        try:
+            row = conn.execute("""
+                SELECT MAX(release_date) FROM videos
+                WHERE video_id = ? AND release_date IS NOT NULL AND release_date != ''
+            """, (video_id,)).fetchone()
+        except sqlite3.OperationalError:
+            # videos表尚未创建或没有详情字段
+            return None
+        return row[0] if row else None
+    
+    def record_subtitle_search(self, video_id: str, found: bool) -> Optional[datetime]:
+        """
+        记录一次确定结论的字幕搜索
+        
+        Args:
+            video_id: 视频编号
+            found: 是否搜到可用的字幕帖子；搜到时清零连续无结果次数
+            
+        Returns:
+            datetime: 无结果时返回下次可搜索时间，搜到时返回 None
+        """
+        video_id = (video_id or "").strip().upper()
+        if not video_id:
+            return None
+        now_dt = datetime.now()
+        
+        conn = self._lease_connection()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            if found:
+                conn.execute("""
+                    INSERT OR REPLACE INTO subtitle_search_state
+                    (video_id, miss_count, last_result, last_searched_at, next_eligible_at)
+                    VALUES (?, 0, 'found', ?, NULL)
+                """, (video_id, now_dt.isoformat()))
+                conn.execute("COMMIT")
+                return None
+            row = conn.execute(
+                "SELECT miss_count FROM subtitle_search_state WHERE video_id = ?", (video_id,)
+            ).fetchone()
+            misses = (row[0] if row else 0) + 1
+            next_eligible = now_dt + subtitle_recheck_delay(misses, self._video_release_date(conn, video_id), now_dt)
+            conn.execute("""
+                INSERT OR REPLACE INTO subtitle_search_state
+                (video_id, miss_count, last_result, last_searched_at, next_eligible_at)
+                VALUES (?, ?, 'not_found', ?, ?)
+            """, (video_id, misses, now_dt.isoformat(), next_eligible.isoformat()))
+            conn.execute("COMMIT")
+            return next_eligible
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+    
+    def get_subtitle_search_stats(self) -> Dict[str, int]:
+        """字幕搜索复查状态统计"""
+        now = datetime.now().isoformat()
+        with sqlite3.connect(self.db_path, timeout=30.0) as conn:
+            waiting, due, found = conn.execute("""
+                SELECT
+                    COALESCE(SUM(CASE WHEN last_result = 'not_found' AND next_eligible_at > ? THEN 1 ELSE 0 END), 0),
+                    COALESCE(SUM(CASE WHEN last_result = 'not_found' AND next_eligible_at <= ? THEN 1 ELSE 0 END), 0),
+                    COALESCE(SUM(CASE WHEN last_result = 'found' THEN 1 ELSE 0 END), 0)
+                FROM subtitle_search_state
+            """, (now, now)).fetchone()
+        return {"waiting": waiting, "due": due, "found": found}
+    
     # ==================== 统计和查询方法 ====================
     
     def get_statistics(self) -> Dict[str, Any]:
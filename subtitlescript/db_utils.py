@@ -5,11 +5,14 @@
 提供与csv_utils.py相同的接口，确保向后兼容性
 """
 
+import os
 import sqlite3
 import re
+from datetime import datetime
 from typing import List, Optional, Dict, Any
 from pathlib import Path
 from database_manager import DatabaseManager
+from download_jobs import jobs_db_path
 
 
 class DatabaseUtils:
@@ -57,6 +60,11 @@ class DatabaseUtils:
             conditions = []
             params = []
             
+            # 未有字幕筛选时同时排除任务队列中已完成的编号
+            jobs_db = jobs_db_path() if has_subtitle is False else None
+            if jobs_db:
+                cursor.execute("ATTACH DATABASE ? AS jobs", (jobs_db,))
+            
             # 视频类型筛选
             if video_type is not None:
                 conditions.append("video_type = ?")
@@ -79,6 +87,19 @@ class DatabaseUtils:
                         FROM videos 
                         WHERE subtitle_downloaded = 1
                     )""")
+                    if jobs_db:
+                        # 反连接：按主键查找已完成的下载任务
+                        conditions.append("""NOT EXISTS (
+                        SELECT 1 FROM jobs.download_jobs j
+                        WHERE j.code = UPPER(TRIM(videos.video_id)) AND j.state = 'done'
+                    )""")
+                    if os.getenv("SUBTITLE_RECHECK_DISABLED") != "1":
+                        # 连续无结果的编号在复查时间之前不再搜索
+                        conditions.append("""NOT EXISTS (
+                        SELECT 1 FROM subtitle_search_state s
+                        WHERE s.video_id = UPPER(TRIM(videos.video_id)) AND s.next_eligible_at > ?
+                    )""")
+                        params.append(datetime.now().isoformat())
             
             # 构建SQL查询
             base_query = "SELECT DISTINCT video_id FROM videos"
@@ -100,6 +121,10 @@ class DatabaseUtils:
             video_codes = [row[0] for row in results if row[0]]
             
             print(f"📊 查询结果: 共找到 {len(video_codes)} 个视频编号")
+            if has_subtitle is False and os.getenv("SUBTITLE_RECHECK_DISABLED") != "1":
+                recheck = self.db_manager.get_subtitle_search_stats()
+                if recheck["waiting"]:
+                    print(f"⏭️ 已排除 {recheck['waiting']} 个连续无结果、未到复查时间的编号")
             if len(video_codes) > 0:
                 print(f"🎬 示例编号: {video_codes[:5]}{'...' if len(video_codes) > 5 else ''}")
             
@@ -4,27 +4,36 @@ import os
 import time
 import sys
 import argparse
+import threading
 from playwright.sync_api import Playwright, sync_playwright, expect
 from playwright_stealth.stealth import stealth_sync
 from urllib.parse import urljoin, urlparse, quote_plus
 from database_manager import DatabaseManager
+from rate_limiter import acquire_for_url
+from browser_fleet import FORUM_BASE_URL, lease_fleet_page
+from forum_search import search_forum_http, NO_RESULT_MESSAGES
+from subtitle_cache import get_subtitle_cache, normalize_keyword
+from tracing import span, trace_job, traced
+from http_download import DIRECT_FILE_EXTS, download_direct_link, is_direct_file_url
+from session_health import SessionHealth, detect_login
+from session_pool import SessionPool, bind_account, can_afford, note_purchase, pool_owner_name
+from post_download import finish_post_download, submit_download
+from forum_snapshot import (
+    SEARCH_RESULT_SELECTOR, ATTACHMENT_SELECTORS, BUY_TOPIC_SELECTOR, ATTACHPAY_SELECTOR,
+    DIRECT_ATTACHMENT_SELECTOR, SUBTITLE_EXTS, take_snapshot, snapshot_frames, find_link, has_ext,
+)
 
 # 全局搜索关键字配置：直接修改此处值即可
 #特殊番号FC2PPV-4620098
 SEARCH_KEYWORD = "HMN-733"
+# 论坛地址可用 FORUM_BASE_URL 指向本地替身论坛（forum_standin.py）做基准测试，由 browser_fleet 统一读取
+FORUM_HOME_URL = f"{FORUM_BASE_URL}/forum.php"
+DEFAULT_SESSION_FILE = "./session.json"
+# 设置 FORUM_HEADLESS=1 以无头模式启动浏览器
+FORUM_HEADLESS = os.getenv("FORUM_HEADLESS") == "1"
 
 
 # 工具函数
-def first_text(loc):
-    """获取定位器的第一个元素的文本内容"""
-    try:
-        if loc.count() > 0:
-            return loc.first.inner_text().strip()
-    except Exception:
-        pass
-    return ""
-
-
 def norm(s):
     """标准化字符串，去除特殊字符并转为小写"""
     if not s:
@@ -33,18 +42,6 @@ def norm(s):
     return s.lower()
 
 
-def text_of(el):
-    """获取元素的文本内容"""
-    try:
-        t = el.inner_text().strip()
-        return t if t else (el.text_content() or "").strip()
-    except Exception:
-        try:
-            return (el.text_content() or "").strip()
-        except Exception:
-            return ""
-
-
 def still_exists_check(hit_frame, sel, kind, exts2):
     """
     检查购买后原命中元素是否还存在
@@ -58,35 +55,19 @@ def still_exists_check(hit_frame, sel, kind, exts2):
     Returns:
         bool: 元素是否仍然存在
     """
-    frs = [hit_frame]
-    try:
-        frs += getattr(hit_frame, 'frames', []) or []
-    except Exception:
-        pass
-    for fr2 in frs:
-        l2 = fr2.locator(sel)
-        c2 = l2.count()
-        if c2 == 0:
-            continue
-        for j in range(min(c2, 10)):
-            try:
-                tj = text_of(l2.nth(j))
-            except Exception:
-                tj = ""
-            lj = (tj or '').lower().strip()
-            if kind == 'buy':
-                if (tj or '').strip() == '购买':
-                    return True
-            elif kind == 'attachpay_file':
-                if (tj or '').strip() != '购买' and any(lj.endswith(ext) for ext in exts2):
-                    return True
-            elif kind == 'direct_attachment':
-                if any(lj.endswith(ext) for ext in exts2):
-                    return True
-            else:
-                if '购买主题' in (tj or ''):
-                    return True
-    return False
+    def matches(link):
+        tj = (link.get("text") or "").strip()
+        if kind == 'buy':
+            return tj == '购买'
+        if kind == 'attachpay_file':
+            return tj != '购买' and has_ext(tj, exts2)
+        if kind == 'direct_attachment':
+            return has_ext(tj, exts2)
+        return '购买主题' in tj
+
+    # 每个frame一次快照，只检查前10个匹配元素
+    snapshots = snapshot_frames(hit_frame, [sel], max_links=10)
+    return find_link(snapshots, [sel], matches) is not None
 
 
 def handle_route(route):
@@ -188,74 +169,48 @@ def handle_request_failed(request):
 
 
 def scan_in_root(r):
+        """按优先级返回命中元素的文本：购买主题 > 购买 > 付费附件文件名 > 直链附件文件名"""
         # 短暂等待潜在的异步渲染
         try:
             r.wait_for_timeout(200)
         except Exception:
             pass
 
-        # 优先级 1：购买主题（misc/pay）
+        # 一次快照取回四类链接，优先级判断在Python中完成
         try:
-            sel1 = "a.viewpay[title='购买主题'], a.y.viewpay[title='购买主题'], a[href*='mod=misc'][href*='action=pay']"
-            loc1 = r.locator(sel1)
-            c1 = loc1.count()
-            for i in range(c1):
-                el = loc1.nth(i)
-                txt = text_of(el)
-                # 更稳妥：如果不是购买主题，也允许文本包含“购买主题”
-                if '购买主题' in (txt or '购买主题'):
-                    return txt
+            snap = take_snapshot(r, [BUY_TOPIC_SELECTOR, ATTACHPAY_SELECTOR, DIRECT_ATTACHMENT_SELECTOR])
         except Exception:
-            pass
+            return None
+        groups = snap["groups"]
 
-        # 优先级 2：购买（attachpay 的购买按钮）
-        try:
-            sel2 = "a[href*='mod=misc'][href*='action=attachpay']"
-            loc2 = r.locator(sel2)
-            c2 = loc2.count()
-            for i in range(c2):
-                el = loc2.nth(i)
-                txt = text_of(el)
-                if txt.strip() == '购买':
-                    return txt
-        except Exception:
-            pass
+        # 优先级 1：购买主题（misc/pay）
+        for link in groups.get(BUY_TOPIC_SELECTOR, []):
+            txt = link.get("text") or ""
+            # 更稳妥：如果不是购买主题，也允许文本包含“购买主题”
+            if '购买主题' in (txt or '购买主题'):
+                return txt
 
-        # 常见文件后缀
-        exts = ['.zip', '.rar', '.7z', '.ass', '.srt', '.ssa', '.vtt', '.lrc', '.sub']
+        # 优先级 2：购买（attachpay 的购买按钮）
+        for link in groups.get(ATTACHPAY_SELECTOR, []):
+            txt = link.get("text") or ""
+            if txt.strip() == '购买':
+                return txt
 
         # 优先级 3：付费附件项（attachpay 的文件名按钮，排除“购买”字样）
-        try:
-            sel3 = "a[href*='mod=misc'][href*='action=attachpay']"
-            loc3 = r.locator(sel3)
-            c3 = loc3.count()
-            for i in range(c3):
-                el = loc3.nth(i)
-                txt = text_of(el)
-                low = txt.lower()
-                if txt and txt.strip() != '购买' and any(low.endswith(ext) for ext in exts):
-                    return txt
-        except Exception:
-            pass
+        for link in groups.get(ATTACHPAY_SELECTOR, []):
+            txt = link.get("text") or ""
+            if txt and txt.strip() != '购买' and has_ext(txt, SUBTITLE_EXTS):
+                return txt
 
         # 优先级 4：直链附件（mod=attachment&aid=...）
-        try:
-            sel4 = "a[href*='mod=attachment'][href*='aid=']"
-            loc4 = r.locator(sel4)
-            c4 = loc4.count()
-            for i in range(c4):
-                el = loc4.nth(i)
-                txt = text_of(el)
-                low = txt.lower()
-                if txt and any(low.endswith(ext) for ext in exts):
-                    return txt
-        except Exception:
-            pass
+        for link in groups.get(DIRECT_ATTACHMENT_SELECTOR, []):
+            txt = link.get("text") or ""
+            if txt and has_ext(txt, SUBTITLE_EXTS):
+                return txt
         return None
-        
-def load_session_if_exists():
+
+def load_session_if_exists(session_file=DEFAULT_SESSION_FILE):
     """加载已保存的session状态"""
-    session_file = "./session.json"
     if os.path.exists(session_file):
         try:
             with open(session_file, 'r', encoding='utf-8') as f:
@@ -265,48 +220,26 @@ def load_session_if_exists():
     return None
 
 
+@traced("login_check", outcome=lambda ok: "logged_in" if ok else "logged_out")
 def check_login_status(page):
-    """检查是否已经登录"""
-    try:
-        # 检查页面是否包含登录用户信息，比如用户名或退出链接
-        page.wait_for_selector("a[href*='logout']", timeout=3000)
-        print("检测到退出链接，已登录")
-        return True
-    except:
-        try:
-            # 或者检查是否存在用户相关的元素
-            page.wait_for_selector(".vwmy", timeout=3000)
-            print("检测到用户相关元素，已登录")
-            return True
-        except:
-            try:
-                # 检查是否存在用户名显示
-                page.wait_for_selector("strong a[href*='space-uid']", timeout=3000)
-                print("检测到用户名链接，已登录")
-                return True
-            except:
-                try:
-                    # 检查登录表单是否存在，如果存在说明未登录
-                    page.wait_for_selector("#ls_username", timeout=3000)
-                    print("检测到登录表单，未登录")
-                    return False
-                except:
-                    print("无法确定登录状态，假设未登录")
-                    return False
+    """检查是否已经登录（合并选择器只等待一次，不再逐个选择器等待超时）"""
+    return detect_login(page, "forum")
+
 
 # 解析搜索结果列表，提取 标题、链接、发布时间、用户名、所属专区，并打印
+@traced("parse_results", outcome=lambda results: "ok" if results else "empty")
 def scrape_search_results(root, max_items=30):
     # root 可以是 Page 或 Frame
     results = []
     # 优先尝试当前 root；若未命中，则在所有 frame 中寻找结果容器
     try:
-        root.wait_for_selector("a.xst, a[href*='viewthread'], th > a[href*='thread'], h3 a, .pbw a[href*='thread']", timeout=8000)
+        root.wait_for_selector(SEARCH_RESULT_SELECTOR, timeout=8000)
     except Exception:
         # 在 frame 中寻找
         try:
             for fr in root.frames if hasattr(root, 'frames') else []:
                 try:
-                    fr.wait_for_selector("a.xst, a[href*='viewthread'], th > a[href*='thread'], h3 a, .pbw a[href*='thread']", timeout=3000)
+                    fr.wait_for_selector(SEARCH_RESULT_SELECTOR, timeout=3000)
                     root = fr
                     break
                 except Exception:
@@ -315,124 +248,50 @@ def scrape_search_results(root, max_items=30):
             pass
     # 再次检测一次
     try:
-        root.wait_for_selector("a.xst, a[href*='viewthread'], th > a[href*='thread'], h3 a, .pbw a[href*='thread']", timeout=4000)
+        root.wait_for_selector(SEARCH_RESULT_SELECTOR, timeout=4000)
     except Exception:
         print(f"未检测到搜索结果标题元素，可能无结果或页面结构变更。当前URL: {getattr(root, 'url', '')}")
         return results
 
     try:
-        titles = root.locator("a.xst, a[href*='viewthread'], th > a[href*='thread'], h3 a, .pbw a[href*='thread']")
-        total = titles.count()
-        count = min(total, max_items)
-        parsed = urlparse(getattr(root, 'url', '') or (root.page.url if hasattr(root, 'page') else ''))
-        base = f"{parsed.scheme}://{parsed.netloc}" if parsed.netloc else "https://37ub.w7zvq.net"
-
-        for i in range(count):
-            t = titles.nth(i)
-            try:
-                title = t.inner_text().strip()
-            except Exception:
-                title = ""
-            try:
-                href = t.get_attribute("href") or ""
-            except Exception:
-                href = ""
-            link = urljoin(base, href) if href else ""
-
-            cont = t.locator("xpath=ancestor::tbody[starts-with(@id,'normalthread_')][1]")
-            if cont.count() == 0:
-                cont = t.locator("xpath=ancestor::tr[1]")
-            if cont.count() == 0:
-                cont = t.locator("xpath=ancestor::li[1]")
-            if cont.count() == 0:
-                cont = t.locator("xpath=ancestor::div[1]")
-
-            author = ""
-            for sel in [
-                "xpath=.//p//a[contains(@href,'mod=space') and contains(@href,'uid=')]",
-                "xpath=.//a[contains(@href,'mod=space') and contains(@href,'uid=')]",
-                "xpath=.//a[contains(@href,'space-uid')]",
-                "xpath=.//td[contains(@class,'by')]//cite//a",
-                "xpath=.//cite/a",
-            ]:
-                author = first_text(cont.locator(sel))
-                if author:
-                    break
-            if not author:
-                for sel in [
-                    "xpath=ancestor::tr[1]//p//a[contains(@href,'mod=space') and contains(@href,'uid=')]",
-                    "xpath=ancestor::li[1]//p//a[contains(@href,'mod=space') and contains(@href,'uid=')]",
-                    "xpath=ancestor::div[1]//p//a[contains(@href,'mod=space') and contains(@href,'uid=')]",
-                ]:
-                    author = first_text(t.locator(sel))
-                    if author:
-                        break
-
-            pub_time = ""
-            for sel in [
-                "xpath=.//td[contains(@class,'by')]//em//span",
-                "xpath=.//em[contains(@class,'xg1')]//span",
-                "xpath=.//p[contains(@class,'xg1')]//span",
-                "xpath=.//em//span",
-            ]:
-                pub_time = first_text(cont.locator(sel))
-                if pub_time:
-                    break
-            if not pub_time:
-                try:
-                    block_text = cont.first.inner_text()
-                    m = re.search(r"(20\d{2}-\d{1,2}-\d{1,2}(?:\s+\d{1,2}:\d{2})?)", block_text)
-                    if m:
-                        pub_time = m.group(1)
-                except Exception:
-                    pass
-
-            section = ""
-            for sel in [
-                "xpath=.//a[contains(@class,'xi1') and contains(@href,'mod=forumdisplay') and contains(@href,'fid=')]",
-                "xpath=.//p//a[contains(@href,'mod=forumdisplay') and contains(@href,'fid=')]",
-                "xpath=.//a[contains(@href,'mod=forumdisplay') and contains(@href,'fid=')]",
-                "xpath=.//td[contains(@class,'forum')]//a",
-                "xpath=.//a[contains(@href,'forum-') and contains(@href,'.html')]",
-                "xpath=.//a[contains(@href,'/forum-')]",
-            ]:
-                section = first_text(cont.locator(sel))
-                if section:
-                    break
-            if not section:
-                for sel in [
-                    "xpath=ancestor::tr[1]//p//a[contains(@href,'mod=forumdisplay') and contains(@href,'fid=')]",
-                    "xpath=ancestor::li[1]//p//a[contains(@href,'mod=forumdisplay') and contains(@href,'fid=')]",
-                    "xpath=ancestor::div[1]//p//a[contains(@href,'mod=forumdisplay') and contains(@href,'fid=')]",
-                ]:
-                    section = first_text(t.locator(sel))
-                    if section:
-                        break
-
+        # 一次 evaluate 取回全部结果行（标题、链接、作者、时间、专区），避免逐条逐字段的IPC往返
+        snapshot = take_snapshot(root, result_selector=SEARCH_RESULT_SELECTOR, max_items=max_items)
+        total = snapshot["result_total"]
+        parsed = urlparse(snapshot.get("url") or getattr(root, 'url', ''))
+        base = f"{parsed.scheme}://{parsed.netloc}" if parsed.netloc else FORUM_BASE_URL
+
+        for row in snapshot["results"]:
+            href = row.get("href") or ""
             results.append({
-                "title": title,
-                "link": link,
-                "time": pub_time,
-                "user": author,
-                "section": section,
+                "title": row.get("title", ""),
+                "link": urljoin(base, href) if href else "",
+                "time": row.get("time", ""),
+                "user": row.get("user", ""),
+                "section": row.get("section", ""),
             })
 
-        print(f"当前URL: {getattr(root, 'url', '')}")
-        print(f"匹配到结果条目数量: {total}, 实际提取: {len(results)}")
-        if results:
-            for idx, item in enumerate(results, 1):
-                print(f"[{idx}] 标题: {item['title']}")
-                print(f"    链接: {item['link']}")
-                print(f"    发布时间: {item['time']}")
-                print(f"    用户名: {item['user']}")
-                print(f"    所属专区: {item['section']}")
-        else:
-            print("未抓取到任何结果")
+        print_search_results(results, getattr(root, 'url', ''), total)
     except Exception as e:
         print(f"解析搜索结果时出错: {e}")
     return results
 
 
+def print_search_results(results, url, total):
+    """打印解析出的搜索结果"""
+    print(f"当前URL: {url}")
+    print(f"匹配到结果条目数量: {total}, 实际提取: {len(results)}")
+    if results:
+        for idx, item in enumerate(results, 1):
+            print(f"[{idx}] 标题: {item['title']}")
+            print(f"    链接: {item['link']}")
+            print(f"    发布时间: {item['time']}")
+            print(f"    用户名: {item['user']}")
+            print(f"    所属专区: {item['section']}")
+    else:
+        print("未抓取到任何结果")
+
+
+@traced("search_browser", outcome=lambda _: "done")
 def perform_search(page, keyword=SEARCH_KEYWORD):
      """登录成功后执行站内搜索"""
      try:
@@ -449,6 +308,7 @@ def perform_search(page, keyword=SEARCH_KEYWORD):
         # 点击搜索按钮
         page.wait_for_selector("#scbar_btn", state="attached", timeout=5000)
         pages_before = len(page.context.pages)
+        acquire_for_url(page.url)
         page.click("#scbar_btn")
 
         # 如果点击后新开了标签页，则切换到新页作为目标页
@@ -492,7 +352,7 @@ def perform_search(page, keyword=SEARCH_KEYWORD):
         # 等待结果标题元素出现
         found = True
         try:
-            target_page.wait_for_selector("a.xst, a[href*='viewthread'], th > a[href*='thread'], h3 a, .pbw a[href*='thread']", timeout=8000)
+            target_page.wait_for_selector(SEARCH_RESULT_SELECTOR, timeout=8000)
         except Exception:
             found = False
 
@@ -502,6 +362,7 @@ def perform_search(page, keyword=SEARCH_KEYWORD):
             base = f"{parsed.scheme}://{parsed.netloc}"
             fallback = f"{base}/search.php?mod=forum&searchsubmit=yes&kw={quote_plus(keyword)}"
             try:
+                acquire_for_url(fallback)
                 target_page.goto(fallback, wait_until="domcontentloaded", timeout=15000)
                 try:
                     target_page.wait_for_selector("a.xst, a[href*='viewthread']", timeout=8000)
@@ -518,29 +379,35 @@ def perform_search(page, keyword=SEARCH_KEYWORD):
          print(f"搜索操作失败: {e}")
 
 
-def choose_best_result(results):
-    priorities = [
-        ("自译字幕区", ["自译", "自译字幕"]),
-        ("自提字幕区", ["自提", "自提字幕"]),
-        ("新作区", ["新作"]),
-        ("字幕分享区", ["字幕分享"]),
-    ]
-    
-    # 按优先级顺序查找，确保严格按照优先级选择
-    for official, keys in priorities:
-        # 收集当前优先级的所有匹配结果
-        matching_results = []
+SECTION_PRIORITIES = [
+    ("自译字幕区", ["自译", "自译字幕"]),
+    ("自提字幕区", ["自提", "自提字幕"]),
+    ("新作区", ["新作"]),
+    ("字幕分享区", ["字幕分享"]),
+]
+
+
+def rank_results(results):
+    """
+    按专区优先级对搜索结果排序，同一专区内保持搜索结果原有顺序
+
+    Returns:
+        list: [(结果字典, 官方专区名称)]，不属于任何优先专区的结果被排除，同一链接只保留一次
+    """
+    ranked = []
+    seen_links = set()
+    for official, keys in SECTION_PRIORITIES:
         for item in results:
             section = norm(item.get("section", ""))
-            if any(k in section for k in keys):
-                matching_results.append(item)
-        
-        # 如果找到匹配结果，返回第一个（保持原有的选择逻辑）
-        if matching_results:
-            print(f"🎯 找到 {len(matching_results)} 个 '{official}' 的匹配结果，选择第一个")
-            return matching_results[0], official
-    
-    return None, None
+            if not any(k in section for k in keys):
+                continue
+            link = item.get("link", "")
+            if link in seen_links:
+                continue
+            seen_links.add(link)
+            ranked.append((item, official))
+    return ranked
+
 
 # === 统一下载调度入口与分区实现（A/B/D占位，C复用现有新作区逻辑） ===
 
@@ -557,6 +424,7 @@ def get_zone_code(section):
     return "UNKNOWN"
 
 
+@traced("zone_a")
 def download_zone_a(page_or_frame, keyword, save_root=None, options=None):
     """
     Zone A（自译字幕区）下载逻辑：
@@ -585,6 +453,14 @@ def download_zone_a(page_or_frame, keyword, save_root=None, options=None):
             save_root = os.path.join(os.path.dirname(__file__), "output", "downloads", keyword)
         os.makedirs(save_root, exist_ok=True)
         
+        # 帖子缓存记录本帖已购买时先直接下载；缓存的购买状态可能属于其他账号，下载不成再走购买检测
+        if _cached_purchased(options):
+            print("📦 缓存：该帖子已购买，跳过购买检测直接下载")
+            result = _zone_a_download_file(current_frame, current_page, keyword, save_root)
+            if result.get("success") and result.get("message") != "password_only":
+                return result
+            print("ℹ️ 按缓存直接下载未成功，回到购买检测")
+        
         # 3. 检查购买主题按钮是否存在
         purchase_button_selector = "div.locked a.viewpay[title='购买主题']"
         
@@ -644,6 +520,24 @@ def download_zone_a(page_or_frame, keyword, save_root=None, options=None):
         return {"success": False, "zone": "A", "message": f"download_error: {e}", "payload": None}
 
 
+def _cached_purchased(options):
+    """下载调度传入的帖子缓存（options["cached_thread"]）是否记录该帖子已购买"""
+    thread = (options or {}).get("cached_thread") or {}
+    return bool(thread.get("purchased"))
+
+
+def _pay_dialog_text(current_frame):
+    """读取购买弹窗文字（售价、购买后余额），用于判断余额并记录账号消费"""
+    try:
+        dialog = current_frame.locator("form#payform, form#attachpayform")
+        if dialog.count() > 0:
+            return dialog.first.inner_text(timeout=2000)
+    except Exception:
+        pass
+    return ""
+
+
+@traced("purchase")
 def _zone_a_handle_purchase(current_frame, current_page):
     """处理A区购买流程"""
     try:
@@ -654,11 +548,15 @@ def _zone_a_handle_purchase(current_frame, current_page):
         
         # 2. 等待弹窗出现并处理
         current_frame.wait_for_timeout(1000)  # 等待弹窗加载
+        pay_text = _pay_dialog_text(current_frame)
+        if not can_afford(pay_text):
+            return False
         
         # 3. 在弹窗中点击提交按钮
         submit_button = current_frame.locator("form#payform button[name='paysubmit']")
         submit_button.click(timeout=5000)
         print("✅ 已点击提交按钮")
+        note_purchase(pay_text, "thread")
         
         return True
         
@@ -667,6 +565,7 @@ def _zone_a_handle_purchase(current_frame, current_page):
         return False
 
 
+@traced("purchase")
 def _zone_a_handle_attachment_purchase(current_frame, current_page, selector):
     """处理A区附件购买流程"""
     try:
@@ -706,8 +605,12 @@ def _zone_a_handle_attachment_purchase(current_frame, current_page, selector):
                 continue
         
         if confirm_button:
+            pay_text = _pay_dialog_text(current_frame)
+            if not can_afford(pay_text):
+                return False
             confirm_button.click(timeout=5000)
             print("✅ 已点击确认购买按钮")
+            note_purchase(pay_text, "attachment")
             
             # 4. 等待购买完成
             current_frame.wait_for_timeout(3000)  # 等待购买处理完成
@@ -722,70 +625,73 @@ def _zone_a_handle_attachment_purchase(current_frame, current_page, selector):
         return False
 
 
+def _stream_direct_download(page_or_frame, href, save_root, filename=None):
+    """
+    链接是文件直链时用HTTP流式下载（文件保存为本编号自己的文件；与其他编号内容相同的情况由
+    DownloadJobQueue.complete 按哈希记录，流式下载与浏览器下载一视同仁）
+
+    Returns:
+        dict: {"path", "size", "sha256", ...}；不是直链或下载失败时返回 None
+    """
+    base = getattr(page_or_frame, "url", "") or FORUM_HOME_URL
+    url = urljoin(base, href or "")
+    if not is_direct_file_url(url):
+        return None
+    if filename and not has_ext(filename, DIRECT_FILE_EXTS):
+        filename = None
+    with span("stream_download") as s:
+        info = download_direct_link(page_or_frame, url, save_root, filename)
+        s.set("ok" if info else "fallback", resumed=bool(info and info["resumed_bytes"]))
+    return info
+
+
+def _direct_payload(info):
+    """流式下载结果中需要写入下载任务的字段"""
+    if not info:
+        return {}
+    return {"file_size": info["size"], "sha256": info["sha256"]}
+
+
+@traced("download_file")
 def _zone_a_download_file(current_frame, current_page, keyword, save_root):
     """处理A区文件下载"""
     try:
-        # 1. 查找下载链接（参考D区的附件选择器）
-        download_selectors = [
-            "dl.tattl dd p.attnm a",                         # 优先匹配压缩包链接
-            "a[href*='mod=attachment'][id^='aid']",
-            "dl.tattl a[id^='aid']",
-            "a[href*='forum.php'][href*='mod=attachment']",
-            "ignore_js_op a[href*='mod=misc'][href*='action=attachpay']",  # ignore_js_op内的付费附件
-            "a[href*='mod=misc'][href*='action=attachpay']",               # 付费附件链接（attachpay）
-            "span[id^='attach_'] a[href*='attachpay']",                    # span包装的附件链接
-            "ignore_js_op span a",                                         # ignore_js_op内span中的链接
-            "div.blockcode a",                                             # blockcode中的链接
-        ]
+        # 1. 查找下载链接（D区的附件选择器 + blockcode 中的链接），一次快照取回全部候选
+        download_selectors = ATTACHMENT_SELECTORS + ["div.blockcode a"]
         
         download_link = None
+        download_href = None
         target_filename = None
         
+        try:
+            groups = take_snapshot(current_frame, download_selectors)["groups"]
+        except Exception as e:
+            print(f"⚠️ 获取下载链接快照失败: {e}")
+            groups = {}
+        
         for selector in download_selectors:
-            try:
-                elements = current_frame.locator(selector)
-                count = elements.count()
-                
-                if count > 0:
-                    print(f"🔍 找到 {count} 个潜在下载链接 (选择器: {selector})")
-                    
-                    for i in range(count):
-                        element = elements.nth(i)
-                        try:
-                            link_text = element.text_content() or ""
-                            link_href = element.get_attribute('href') or ""
-                            
-                            #print(f"🔍 检查链接[{i}]: 文本='{link_text}', href='{link_href}'")
-                            
-                            # 排除图片文件
-                            if any(link_text.lower().endswith(ext) for ext in ['.jpg', '.jpeg', '.png', '.gif']):
-                                #print(f"⏭️ 跳过图片文件: {link_text}")
-                                continue
-                            
-                            # 优先选择压缩文件
-                            if any(link_text.lower().endswith(ext) for ext in ['.zip', '.rar', '.7z', '.7zip']):
-                                download_link = element
-                                target_filename = link_text
-                                #print(f"✅ 找到压缩文件链接: {link_text}")
-                                break
-                            
-                            # 如果包含关键词，也考虑
-                            if keyword.lower() in link_text.lower() and link_href:
-                                download_link = element
-                                target_filename = link_text
-                                #print(f"✅ 找到包含关键词的链接: {link_text}")
-                                break
-                                
-                        except Exception as e:
-                            print(f"⚠️ 检查链接时出错: {e}")
-                            continue
-                    
-                    if download_link:
-                        break
-                        
-            except Exception as e:
-                print(f"⚠️ 选择器 {selector} 查找失败: {e}")
+            links = groups.get(selector, [])
+            if not links:
                 continue
+            print(f"🔍 找到 {len(links)} 个潜在下载链接 (选择器: {selector})")
+            
+            for link in links:
+                link_text = link.get("text_content") or ""
+                link_href = link.get("href") or ""
+                
+                # 排除图片文件
+                if has_ext(link_text, ['.jpg', '.jpeg', '.png', '.gif']):
+                    continue
+                
+                # 优先选择压缩文件；其次是包含关键词的链接
+                if has_ext(link_text, ['.zip', '.rar', '.7z', '.7zip']) or (keyword.lower() in link_text.lower() and link_href):
+                    download_link = current_frame.locator(selector).nth(link["index"])
+                    download_href = link_href
+                    target_filename = link_text
+                    break
+            
+            if download_link:
+                break
         
         if not download_link:
             print("❌ 未找到下载链接")
@@ -818,23 +724,27 @@ def _zone_a_download_file(current_frame, current_page, keyword, save_root):
             verbose=True
         )
         
-        # 3. 执行下载
+        # 3. 执行下载：直链走HTTP流式下载（断点续传、原子写入），否则由浏览器下载
         print(f"🚀 开始下载文件: {target_filename}")
-        with current_page.expect_download(timeout=30000) as download_info:
-            download_link.click(timeout=5000)
-        
-        download = download_info.value
-        
-        # 4. 保存文件
-        if not target_filename:
-            target_filename = download.suggested_filename
-        
-        # 确保文件名有正确的扩展名
-        if not any(target_filename.lower().endswith(ext) for ext in ['.zip', '.rar', '.7z', '.7zip']):
-            target_filename += '.zip'  # 默认添加.zip扩展名
-        
-        save_path = os.path.join(save_root, target_filename)
-        download.save_as(save_path)
+        direct = _stream_direct_download(current_page, download_href, save_root, target_filename)
+        if direct:
+            save_path = direct["path"]
+        else:
+            with current_page.expect_download(timeout=30000) as download_info:
+                download_link.click(timeout=5000)
+            
+            download = download_info.value
+            
+            # 4. 保存文件
+            if not target_filename:
+                target_filename = download.suggested_filename
+            
+            # 确保文件名有正确的扩展名
+            if not any(target_filename.lower().endswith(ext) for ext in ['.zip', '.rar', '.7z', '.7zip']):
+                target_filename += '.zip'  # 默认添加.zip扩展名
+            
+            save_path = os.path.join(save_root, target_filename)
+            download.save_as(save_path)
         
         print(f"✅ 文件下载成功: {save_path}")
         
@@ -845,11 +755,13 @@ def _zone_a_download_file(current_frame, current_page, keyword, save_root):
                 f.write(extracted_password)
             print(f"✅ 密码已写入: {password_file}")
         
+        payload = {"file_path": save_path, "password": extracted_password}
+        payload.update(_direct_payload(direct))
         return {
             "success": True, 
             "zone": "A", 
             "message": "download_completed", 
-            "payload": {"file_path": save_path, "password": extracted_password}
+            "payload": payload
         }
         
     except Exception as e:
@@ -857,6 +769,7 @@ def _zone_a_download_file(current_frame, current_page, keyword, save_root):
         return {"success": False, "zone": "A", "message": f"download_error: {e}", "payload": None}
 
 
+@traced("zone_b")
 def download_zone_b(page_or_frame, keyword, save_root=None, options=None):
     """
     Zone B（自提字幕区）下载逻辑：
@@ -907,9 +820,11 @@ def download_zone_b(page_or_frame, keyword, save_root=None, options=None):
         
         # 同时监听下载事件和可能的购买对话框
         download_started = False
+        # 帖子缓存记录已购买时点击即应开始下载，多等一会，避免下载慢被误判为需要购买
+        first_wait = 30000 if _cached_purchased(options) else 5000
         try:
             # 尝试监听立即下载（已购买情况）
-            with current_page.expect_download(timeout=5000) as download_info:
+            with current_page.expect_download(timeout=first_wait) as download_info:
                 download_link.click(timeout=3000)
             
             # 如果到这里说明立即开始下载，附件已购买
@@ -1028,8 +943,9 @@ def _zone_b_find_download_link(current_frame, keyword):
         # B区特有的attachpay链接选择器
         attachpay_selector = "a[href*='action=attachpay']"
         
-        elements = current_frame.locator(attachpay_selector)
-        count = elements.count()
+        # 一次快照取回全部attachpay链接
+        links = take_snapshot(current_frame, [attachpay_selector])["groups"].get(attachpay_selector, [])
+        count = len(links)
         
         if count == 0:
             print("❌ 未找到attachpay下载链接")
@@ -1040,36 +956,31 @@ def _zone_b_find_download_link(current_frame, keyword):
         # 筛选符合条件的链接
         valid_links = []
         
-        for i in range(count):
-            element = elements.nth(i)
-            try:
-                link_text = element.text_content() or ""
-                link_href = element.get_attribute('href') or ""
-                
-                print(f"🔍 检查链接[{i}]: 文本='{link_text}', href='{link_href}'")
-                
-                # 过滤掉包含ed2k的文件（大小写不敏感）
-                if 'ed2k' in link_text.lower():
-                    print(f"⏭️ 跳过ed2k文件: {link_text}")
-                    continue
-                
-                #排除"购买"文本的链接
-                if link_text.strip() == '购买':
-                    print(f"⏭️ 跳过购买按钮链接: {link_text}")
-                    continue
-                
-                # 排除图片文件
-                if any(link_text.lower().endswith(ext) for ext in ['.jpg', '.jpeg', '.png', '.gif']):
-                    print(f"⏭️ 跳过图片文件: {link_text}")
-                    continue
-                
-                # 添加到有效链接列表
-                valid_links.append((element, link_text))
-                print(f"✅ 有效链接: {link_text}")
-                
-            except Exception as e:
-                print(f"⚠️ 检查链接时出错: {e}")
+        for link in links:
+            i = link["index"]
+            link_text = link.get("text_content") or ""
+            link_href = link.get("href") or ""
+            
+            print(f"🔍 检查链接[{i}]: 文本='{link_text}', href='{link_href}'")
+            
+            # 过滤掉包含ed2k的文件（大小写不敏感）
+            if 'ed2k' in link_text.lower():
+                print(f"⏭️ 跳过ed2k文件: {link_text}")
+                continue
+            
+            #排除"购买"文本的链接
+            if link_text.strip() == '购买':
+                print(f"⏭️ 跳过购买按钮链接: {link_text}")
                 continue
+            
+            # 排除图片文件
+            if has_ext(link_text, ['.jpg', '.jpeg', '.png', '.gif']):
+                print(f"⏭️ 跳过图片文件: {link_text}")
+                continue
+            
+            # 添加到有效链接列表
+            valid_links.append((current_frame.locator(attachpay_selector).nth(i), link_text))
+            print(f"✅ 有效链接: {link_text}")
         
         if not valid_links:
             print("❌ 未找到有效的下载链接")
@@ -1086,6 +997,7 @@ def _zone_b_find_download_link(current_frame, keyword):
         return None, None
 
 
+@traced("purchase")
 def _zone_b_handle_purchase(current_frame, current_page):
     """处理B区购买确认对话框"""
     try:
@@ -1112,9 +1024,14 @@ def _zone_b_handle_purchase(current_frame, current_page):
             print("❌ 未找到购买按钮")
             return False
         
+        pay_text = _pay_dialog_text(current_frame)
+        if not can_afford(pay_text):
+            return False
+        
         # 点击购买按钮
         purchase_button.click(timeout=5000)
         print("✅ 已点击购买按钮")
+        note_purchase(pay_text, "attachment")
         
         # 等待页面刷新
         print("⏳ 等待页面刷新...")
@@ -1130,10 +1047,11 @@ def _zone_b_handle_purchase(current_frame, current_page):
         return False
 
 
+@traced("zone_c")
 def download_zone_c(page_or_frame, keyword, save_root=None, options=None):
     # 复用现有新作区逻辑（包含购买+下载）
     try:
-        file_path = find_and_print_priority_element(page_or_frame, section="新作区", do_purchase=True)
+        file_path = find_and_print_priority_element(page_or_frame, section="新作区", do_purchase=True, search_keyword=keyword)
         if file_path:
             return {"success": True, "zone": "C", "message": "download_completed", "payload": {"file_path": file_path}}
         else:
@@ -1143,6 +1061,7 @@ def download_zone_c(page_or_frame, keyword, save_root=None, options=None):
         return {"success": False, "zone": "C", "message": str(e), "payload": None}
 
 
+@traced("zone_d")
 def download_zone_d(page_or_frame, keyword, save_root=None, options=None, verbose=True):
     """
     D区（字幕分享区）下载逻辑：
@@ -1171,107 +1090,70 @@ def download_zone_d(page_or_frame, keyword, save_root=None, options=None, verbos
         print(f"❌ 获取页面上下文失败: {e}")
         return {"success": False, "zone": "D", "message": f"context_error: {e}", "payload": None}
     
-    # 3) 扫描附件链接
-    attachment_selectors = [
-        "dl.tattl dd p.attnm a",                         # 优先匹配压缩包链接
-        "a[href*='mod=attachment'][id^='aid']",
-        "dl.tattl a[id^='aid']",
-        "a[href*='forum.php'][href*='mod=attachment']",
-        # 新增：支持ignore_js_op格式的附件链接
-        "ignore_js_op a[href*='mod=misc'][href*='action=attachpay']",  # ignore_js_op内的付费附件
-        "a[href*='mod=misc'][href*='action=attachpay']",               # 付费附件链接（attachpay）
-        "span[id^='attach_'] a[href*='attachpay']",                    # span包装的附件链接
-        "ignore_js_op span a",                                         # ignore_js_op内span中的链接
-    ]
-    
+    # 3) 扫描附件链接：一次快照取回全部候选，按第一个有匹配的选择器挑选
     target_link = None
     target_filename = None
     
-    for selector in attachment_selectors:
-        try:
-            links = current_frame.locator(selector)
-            count = links.count()
-            if count > 0:
-                print(f"🔍 找到 {count} 个附件链接")
-                # 优先选择包含关键词且非图片的链接
-                for i in range(count):
-                    link = links.nth(i)
-                    try:
-                        link_text = link.text_content() or ""
-                        link_href = link.get_attribute('href') or ""
-                        
-                        if verbose:
-                            print(f"🔍 检查链接[{i}]: 文本='{link_text}', href='{link_href}'")
-                        
-                        # 排除图片文件
-                        if any(link_text.lower().endswith(ext) for ext in ['.jpg', '.jpeg', '.png', '.gif']):
-                            if verbose:
-                                print(f"⏭️ 跳过图片文件: {link_text}")
-                            continue
-                        
-                        # 优先选择包含关键词的链接
-                        if keyword.upper() in link_text.upper():
-                            target_link = link
-                            target_filename = link_text.strip()
-                            print(f"✅ 选中包含关键词的附件: {target_filename}")
-                            break
-                        
-                        # 对于attachpay链接，也检查是否包含压缩包后缀
-                        if 'attachpay' in link_href and any(link_text.lower().endswith(ext) for ext in ['.rar', '.zip', '.7z']):
-                            target_link = link
-                            target_filename = link_text.strip()
-                            print(f"✅ 选中付费压缩包附件: {target_filename}")
-                            break
-                            
-                    except Exception as e:
-                        if verbose:
-                            print(f"⚠️ 处理链接[{i}]时出错: {e}")
-                        continue
-                
-                # 如果没有找到包含关键词的，选择第一个非图片文件
-                if target_link is None:
-                    for i in range(count):
-                        link = links.nth(i)
-                        try:
-                            link_text = link.text_content() or f"{keyword}.zip"
-                            link_href = link.get_attribute('href') or ""
-                            
-                            # 排除图片文件
-                            if any(link_text.lower().endswith(ext) for ext in ['.jpg', '.jpeg', '.png', '.gif']):
-                                continue
-                            
-                            # 优先选择压缩包文件
-                            if any(link_text.lower().endswith(ext) for ext in ['.rar', '.zip', '.7z']):
-                                target_link = link
-                                target_filename = link_text.strip()
-                                print(f"✅ 选中第一个压缩包附件: {target_filename}")
-                                break
-                            
-                            # 或者选择attachpay链接
-                            if 'attachpay' in link_href:
-                                target_link = link
-                                target_filename = link_text.strip()
-                                print(f"✅ 选中第一个付费附件: {target_filename}")
-                                break
-                                
-                        except Exception as e:
-                            if verbose:
-                                print(f"⚠️ 处理备选链接[{i}]时出错: {e}")
-                            continue
-                
-                # 兜底：如果还没找到，选择第一个
-                if target_link is None:
-                    target_link = links.first
-                    try:
-                        target_filename = target_link.text_content() or f"{keyword}.zip"
-                    except Exception:
-                        target_filename = f"{keyword}.zip"
-                    print(f"✅ 兜底选择第一个附件: {target_filename}")
-                break
-        except Exception as e:
-            if verbose:
-                print(f"⚠️ 使用选择器 '{selector}' 时出错: {e}")
+    try:
+        groups = take_snapshot(current_frame, ATTACHMENT_SELECTORS)["groups"]
+    except Exception as e:
+        print(f"⚠️ 获取附件快照失败: {e}")
+        groups = {}
+    
+    image_exts = ['.jpg', '.jpeg', '.png', '.gif']
+    archive_exts = ['.rar', '.zip', '.7z']
+    for selector in ATTACHMENT_SELECTORS:
+        links = groups.get(selector, [])
+        if not links:
             continue
+        print(f"🔍 找到 {len(links)} 个附件链接")
+        chosen = None
+        
+        # 优先选择包含关键词且非图片的链接
+        for link in links:
+            link_text = link.get("text_content") or ""
+            link_href = link.get("href") or ""
+            if verbose:
+                print(f"🔍 检查链接[{link['index']}]: 文本='{link_text}', href='{link_href}'")
+            # 排除图片文件
+            if has_ext(link_text, image_exts):
+                if verbose:
+                    print(f"⏭️ 跳过图片文件: {link_text}")
+                continue
+            # 优先选择包含关键词的链接
+            if keyword.upper() in link_text.upper():
+                chosen = link
+                print(f"✅ 选中包含关键词的附件: {link_text.strip()}")
+                break
+            # 对于attachpay链接，也检查是否包含压缩包后缀
+            if 'attachpay' in link_href and has_ext(link_text, archive_exts):
+                chosen = link
+                print(f"✅ 选中付费压缩包附件: {link_text.strip()}")
+                break
+        
+        # 如果没有找到包含关键词的，选择第一个压缩包或付费附件
+        if chosen is None:
+            for link in links:
+                link_text = link.get("text_content") or f"{keyword}.zip"
+                if has_ext(link_text, image_exts):
+                    continue
+                if has_ext(link_text, archive_exts):
+                    chosen = link
+                    print(f"✅ 选中第一个压缩包附件: {link_text.strip()}")
+                    break
+                if 'attachpay' in (link.get("href") or ""):
+                    chosen = link
+                    print(f"✅ 选中第一个付费附件: {link_text.strip()}")
+                    break
+        
+        # 兜底：如果还没找到，选择第一个
+        if chosen is None:
+            chosen = links[0]
+            print(f"✅ 兜底选择第一个附件: {chosen.get('text_content') or f'{keyword}.zip'}")
+        
+        target_link = current_frame.locator(selector).nth(chosen["index"])
+        target_filename = (chosen.get("text_content") or "").strip() or f"{keyword}.zip"
+        break
     
     if target_link is None:
         print("❌ 未找到附件链接")
@@ -1402,6 +1284,36 @@ def update_subtitle_downloaded_if_file_ok(video_id, file_path):
         return False
 
 
+def record_subtitle_search(video_id, found):
+    """
+    记录一次确定结论的搜索到 subtitle_search_state：连续无结果时按指数间隔推迟下次搜索。
+    下次可搜索时间是复查调度的唯一依据：批量模式查询未有字幕的编号、无结果搜索缓存与任务队列的重试时间都以它为准
+    
+    Args:
+        video_id: 视频ID（大小写不敏感）
+        found: 是否搜到符合优先级的字幕帖子
+
+    Returns:
+        float: 无结果时返回下次可搜索时间（时间戳）；搜到或记录失败时返回 None
+    """
+    try:
+        db_manager = DatabaseManager("./database/actresses.db")
+        next_eligible = db_manager.record_subtitle_search(video_id, found)
+    except Exception as e:
+        print(f"⚠️ 记录搜索复查状态失败: {e}")
+        return None
+    if next_eligible is None:
+        return None
+    print(f"🗓️ {video_id.strip().upper()} 连续无结果，{next_eligible:%Y-%m-%d %H:%M} 之前不再搜索")
+    return next_eligible.timestamp()
+
+
+def _no_results(message, next_eligible_at):
+    """无结果的调度结果；payload 带上下次可搜索时间，供任务队列安排重试"""
+    payload = {"next_eligible_at": next_eligible_at} if next_eligible_at else None
+    return {"success": False, "zone": None, "message": message, "payload": payload}
+
+
 def download_handler(section, page_or_frame, keyword, save_root=None, options=None):
     if page_or_frame is None:
         return {"success": False, "zone": None, "message": "invalid_page_or_frame", "payload": None}
@@ -1431,6 +1343,8 @@ def download_handler(section, page_or_frame, keyword, save_root=None, options=No
             if file_path:
                 # 更新数据库中该video_id的subtitle_downloaded状态
                 update_subtitle_downloaded_if_file_ok(keyword, file_path)
+                # 交给下载后处理流水线：解压、整理、转码、归档并上传
+                submit_download(keyword, file_path, payload.get("password"))
             else:
                 print(f"⚠️ 成功下载但未找到文件路径，跳过数据库更新")
         
@@ -1478,38 +1392,35 @@ def find_and_print_priority_element(root, section=None, do_purchase=False, searc
                             ('direct_attachment', "a[href*='mod=attachment'][href*='aid=']"),
                         ]
                         exts2 = ['.zip', '.rar', '.7z', '.ass', '.srt', '.ssa', '.vtt', '.lrc', '.sub']
-                        frames_to_scan = [fr]
-                        frames_to_scan += (getattr(fr, 'frames', []) or [])
+                        # 每个frame一次快照，按 frame → 选择器类型 → 序号 重新定位命中元素
+                        frames_to_scan = [fr] + list(getattr(fr, 'child_frames', []) or [])
+                        snapshots = []
+                        for frx in frames_to_scan:
+                            try:
+                                snapshots.append((frx, take_snapshot(frx, [s for _, s in seldefs])))
+                            except Exception:
+                                continue
+                        found_text = (found or "").strip()
                         kind = sel = None
                         idx = -1
                         hit_frame = None
-                        for frx in frames_to_scan:
+                        for frx, snap in snapshots:
                             for k, s in seldefs:
-                                locx = frx.locator(s)
-                                cx = locx.count()
-                                for i in range(cx):
-                                    el = locx.nth(i)
-                                    try:
-                                        txt = text_of(el)
-                                    except Exception:
-                                        txt = ""
-                                    low = (txt or "").lower().strip()
-                                    if (txt or "").strip() == (found or "").strip():
-                                        if k == 'buy':
-                                            if (txt or '').strip() == '购买':
-                                                kind, sel, idx, hit_frame = 'buy', s, i, frx
-                                                break
-                                        elif k == 'attachpay_file':
-                                            if (txt or '').strip() != '购买' and any(low.endswith(ext) for ext in exts2):
-                                                kind, sel, idx, hit_frame = 'attachpay_file', s, i, frx
-                                                break
-                                        elif k == 'direct_attachment':
-                                            if any(low.endswith(ext) for ext in exts2):
-                                                kind, sel, idx, hit_frame = 'direct_attachment', s, i, frx
-                                                break
-                                        else:
-                                            kind, sel, idx, hit_frame = 'buy_topic', s, i, frx
-                                            break
+                                for link in snap["groups"].get(s, []):
+                                    txt = (link.get("text") or "").strip()
+                                    if txt != found_text:
+                                        continue
+                                    if k == 'buy':
+                                        ok = txt == '购买'
+                                    elif k == 'attachpay_file':
+                                        ok = txt != '购买' and has_ext(txt, exts2)
+                                    elif k == 'direct_attachment':
+                                        ok = has_ext(txt, exts2)
+                                    else:
+                                        ok = True
+                                    if ok:
+                                        kind, sel, idx, hit_frame = k, s, link["index"], frx
+                                        break
                                 if kind:
                                     break
                             if kind:
@@ -1565,7 +1476,10 @@ def find_and_print_priority_element(root, section=None, do_purchase=False, searc
                                     "[onclick*='attachpay'] button",  # 包含attachpay的按钮
                                 ]
                                 btn_clicked = False
-                                for bs in btn_selectors:
+                                # 余额不足时不提交购买（会话池账号随之轮换下线）
+                                pay_text = _pay_dialog_text(hit_frame)
+                                affordable = can_afford(pay_text)
+                                for bs in (btn_selectors if affordable else []):
                                     bl = hit_frame.locator(bs)
                                     if bl.count() > 0:
                                         try:
@@ -1578,12 +1492,13 @@ def find_and_print_priority_element(root, section=None, do_purchase=False, searc
                                             print(f"⚠️ 点击购买按钮失败 {bs}: {e}")
                                             continue
                                 if btn_clicked:
+                                    note_purchase(pay_text, "attachment")
                                     print("🛒 已点击购买附件，等待页面刷新…")
                                     try:
                                         (hit_frame.page if hasattr(hit_frame, 'page') else fr.page).wait_for_load_state('networkidle', timeout=10000)
                                     except Exception:
                                         hit_frame.wait_for_timeout(1500)
-                                else:
+                                elif affordable:
                                     print("⚠️ 未找到可点击的购买按钮")
                             exists = still_exists_check(hit_frame, sel, kind, exts2)
                             if not exists:
@@ -1624,6 +1539,30 @@ def find_and_print_priority_element(root, section=None, do_purchase=False, searc
         return None
 
 
+def _remember_thread(cache, url, keyword, section, thread, result_obj):
+    """把帖子的购买状态与解压密码写入缓存；缓存中已有密码时补写到下载文件旁"""
+    payload = result_obj.get("payload") or {}
+    file_path = payload.get("file_path") or payload.get("save_path")
+    password = payload.get("password")
+    cached_password = (thread or {}).get("password")
+    if result_obj.get("success") and file_path and not password and cached_password:
+        txt_path = os.path.splitext(file_path)[0] + ".txt"
+        if not os.path.exists(txt_path):
+            try:
+                with open(txt_path, "w", encoding="utf-8") as f:
+                    f.write(cached_password)
+                print(f"📦 使用缓存的解压密码写入: {txt_path}")
+            except Exception as e:
+                print(f"⚠️ 写入缓存的解压密码失败: {e}")
+    purchased = bool(result_obj.get("success"))
+    try:
+        cache.put_thread(
+            url, keyword=keyword, section=section, purchased=True if purchased else None, password=password, file_path=file_path,
+        )
+    except Exception as e:
+        print(f"⚠️ 写入帖子缓存失败: {e}")
+
+
 def open_result_link(target_page, result, official_section, keyword=None):
     """
     打开搜索结果链接并执行下载流程
@@ -1633,25 +1572,45 @@ def open_result_link(target_page, result, official_section, keyword=None):
         result: 搜索结果字典
         official_section: 官方专区名称
         keyword: 搜索关键词，如果为None则使用全局SEARCH_KEYWORD
+
+    Returns:
+        dict: 下载调度结果 {"success", "zone", "message", "payload"}
     """
     # 支持显式传递keyword参数，批量模式下取消对全局变量的依赖
     search_keyword = keyword if keyword is not None else SEARCH_KEYWORD
     
+    cache = get_subtitle_cache()
     try:
         title = result.get("title", "")
         link = result.get("link", "")
         print(f"✅ 已选择结果: [{official_section}] {title}")
         print(f"🔍 使用关键词: {search_keyword}")
+
+        thread = cache.get_thread(link) if cache else None
+        # 只有同一关键词下载过的帖子才能直接复用文件；其他编号的结果里出现同一帖子时照常进入帖子
+        same_keyword = bool(thread) and thread.get("keyword") == normalize_keyword(search_keyword)
+        cached_file = (thread or {}).get("file_path") if same_keyword else None
+        if cached_file and os.path.exists(cached_file) and os.path.getsize(cached_file) > 0:
+            print(f"📦 缓存：该帖子的字幕已下载，跳过进入: {cached_file}")
+            payload = {"file_path": cached_file, "password": thread.get("password")}
+            update_subtitle_downloaded_if_file_ok(search_keyword, cached_file)
+            return {"success": True, "zone": get_zone_code(official_section), "message": "cached", "payload": payload}
+
         print(f"➡️ 正在进入: {link}")
-        target_page.goto(link, wait_until="domcontentloaded", timeout=20000)
-        try:
-            target_page.wait_for_load_state("networkidle", timeout=10000)
-        except Exception:
-            pass
+        with span("thread_open", zone=get_zone_code(official_section)):
+            acquire_for_url(link)
+            target_page.goto(link, wait_until="domcontentloaded", timeout=20000)
+            try:
+                target_page.wait_for_load_state("networkidle", timeout=10000)
+            except Exception:
+                pass
         print("🎉 进入成功")
         # 统一通过下载调度入口，根据专区路由执行下载流程
         try:
-            result_obj = download_handler(official_section, target_page, search_keyword, save_root=None, options=None)
+            result_obj = download_handler(official_section, target_page, search_keyword, save_root=None,
+                                          options={"cached_thread": thread})
+            if cache:
+                _remember_thread(cache, link, search_keyword, official_section, thread, result_obj)
             ok = bool(result_obj.get("success"))
             zone = result_obj.get("zone")
             msg = result_obj.get("message")
@@ -1659,15 +1618,25 @@ def open_result_link(target_page, result, official_section, keyword=None):
                 print(f"✅ 下载流程完成: zone={zone} msg={msg}")
             else:
                 print(f"ℹ️ 下载流程未完成: zone={zone} msg={msg}")
+            return result_obj
         except Exception as e:
             print(f"⚠️ 下载流程异常: {e}")
-        return True
+            return {"success": False, "zone": get_zone_code(official_section), "message": str(e), "payload": None}
     except Exception as e:
         print(f"❌ 进入失败: {e}")
-        return False
+        return {"success": False, "zone": None, "message": f"open_failed: {e}", "payload": None}
 
 
-def do_prioritized_open(page, keyword=SEARCH_KEYWORD):
+def search_in_browser(page, keyword):
+    """浏览器搜索流程：输入框搜索并在结果页解析，返回 (承载结果的页面, 结果列表)"""
+    # 当前页面没有搜索框时先回到首页
+    try:
+        if page.locator("#scbar_txt").count() == 0:
+            acquire_for_url(FORUM_HOME_URL)
+            page.goto(FORUM_HOME_URL, wait_until="domcontentloaded", timeout=30000)
+    except Exception as e:
+        print(f"打开论坛首页失败: {e}")
+
     # 执行站内搜索
     perform_search(page, keyword)
 
@@ -1686,31 +1655,106 @@ def do_prioritized_open(page, keyword=SEARCH_KEYWORD):
 
     # 确保搜索结果元素已出现
     try:
-        target_page.wait_for_selector("a.xst, a[href*='viewthread'], th > a[href*='thread'], h3 a, .pbw a[href*='thread']", timeout=8000)
+        target_page.wait_for_selector(SEARCH_RESULT_SELECTOR, timeout=8000)
     except Exception:
         pass
 
-    results = scrape_search_results(target_page)
+    return target_page, scrape_search_results(target_page)
 
-    print("🎯 根据优先级选择专区: 自译字幕区 > 自提字幕区 > 新作区 > 字幕分享区")
-    if not results:
-        print("❌ 未找到符合优先级的搜索结果，退出")
-        return False
 
-    chosen, official = choose_best_result(results)
-    if not chosen:
-        print("❌ 未找到符合优先级的搜索结果，退出")
+def _page_says_no_results(page):
+    """结果页是否带有论坛的无结果提示（用于区分确定的无结果与加载失败）"""
+    try:
+        html = page.content()
+    except Exception:
         return False
+    return any(message in html for message in NO_RESULT_MESSAGES)
 
-    return open_result_link(target_page, chosen, official)
 
+@traced("prioritized_open")
+def do_prioritized_open(page, keyword=SEARCH_KEYWORD):
+    """搜索关键词、按专区优先级选择结果并执行下载，返回下载调度结果字典"""
+    target_page = page
+    cache = get_subtitle_cache()
+    cached = cache.get_search(keyword) if cache else None
+    confirmed_miss = False
+    if cached is not None:
+        results = cached["results"]
+        if not results:
+            print(f"📦 缓存：{keyword} 近期已确认无搜索结果（连续 {cached['miss_count']} 次），跳过搜索")
+            return _no_results("no_results_cached", cached["expires_at"])
+        print(f"📦 使用缓存的搜索结果：{keyword}（{len(results)} 条）")
+    else:
+        # 优先直接请求 search.php 并在Python中解析；遇到反爬/formhash页面时回退到浏览器搜索
+        with span("search_http") as s:
+            fast = search_forum_http(page.context, keyword, page.url if page.url.startswith("http") else FORUM_HOME_URL)
+            s.set("fallback" if fast is None else ("ok" if fast["results"] else "empty"))
+        if fast is not None:
+            print(f"⚡ 快速搜索完成：{keyword}")
+            results = fast["results"]
+            print_search_results(results, fast["url"], fast["result_total"])
+            # 快速通道只有在页面带无结果提示时才会返回空列表
+            confirmed_miss = not results
+        else:
+            target_page, results = search_in_browser(page, keyword)
+            confirmed_miss = not results and _page_says_no_results(target_page)
 
-def run(playwright: Playwright) -> None:
+    print("🎯 根据优先级选择专区: 自译字幕区 > 自提字幕区 > 新作区 > 字幕分享区")
+    candidates = rank_results(results) if results else []
+    next_eligible_at = None
+    if cached is None and (results or confirmed_miss):
+        # 只有实际搜索过才更新复查状态；结果都不在优先专区时同样按无结果处理
+        next_eligible_at = record_subtitle_search(keyword, found=bool(candidates))
+        if cache:
+            try:
+                if candidates:
+                    cache.put_results(keyword, results)
+                elif next_eligible_at is not None:
+                    # 无结果缓存与复查状态同时到期
+                    ttl = cache.put_miss(keyword, next_eligible_at)
+                    print(f"📦 已缓存无结果：{keyword}（{ttl / 3600:.0f} 小时内不再搜索）")
+            except Exception as e:
+                print(f"⚠️ 写入搜索缓存失败: {e}")
+    if not candidates:
+        print("❌ 未找到符合优先级的搜索结果，退出")
+        return _no_results("no_results", next_eligible_at)
+
+    # 按排序依次尝试候选帖子，失败时在同一会话中直接尝试下一个，无需重新搜索
+    print(f"🎯 共 {len(candidates)} 个候选帖子")
+    attempts = []
+    outcome = None
+    for index, (chosen, official) in enumerate(candidates, 1):
+        if index > 1:
+            print(f"🔁 尝试第 {index}/{len(candidates)} 个候选帖子")
+        outcome = open_result_link(target_page, chosen, official, keyword)
+        attempts.append({
+            "title": chosen.get("title", ""),
+            "link": chosen.get("link", ""),
+            "section": official,
+            "success": bool(outcome.get("success")),
+            "zone": outcome.get("zone"),
+            "message": outcome.get("message"),
+        })
+        if outcome.get("success"):
+            break
+
+    if len(attempts) > 1 or not outcome.get("success"):
+        print("📋 候选帖子尝试结果:")
+        for i, attempt in enumerate(attempts, 1):
+            mark = "✅" if attempt["success"] else "❌"
+            print(f"  {mark} [{i}] [{attempt['section']}] {attempt['title']} -> {attempt['message']}")
+    outcome = dict(outcome)
+    outcome["attempts"] = attempts
+    return outcome
+
+
+def launch_forum_page(playwright: Playwright, session_file=DEFAULT_SESSION_FILE):
+    """本地启动浏览器并用会话文件登录，返回 (browser, context, page)；会话文件不存在时返回 None"""
     # 启动浏览器 - 使用真实Chrome浏览器而非Chromium
     try:
         # 尝试使用系统安装的Chrome浏览器
         browser = playwright.chromium.launch(
-            headless=False,
+            headless=FORUM_HEADLESS,
             channel="msedge",  # 使用真实edge浏览器
             args=[
                 "--no-sandbox",
@@ -1759,7 +1803,7 @@ def run(playwright: Playwright) -> None:
         print(f"⚠️ Chrome浏览器启动失败，回退到Chromium: {e}")
         # 回退到Chromium
         browser = playwright.chromium.launch(
-            headless=False,
+            headless=FORUM_HEADLESS,
             args=[
                 "--no-sandbox",
                 "--disable-blink-features=AutomationControlled",
@@ -1775,14 +1819,14 @@ def run(playwright: Playwright) -> None:
         )
     
     # 尝试加载已保存的session
-    session_state = load_session_if_exists()
+    session_state = load_session_if_exists(session_file)
 
-    # 仅允许使用当前目录下的 session.json 进行 Cookie 登录；不存在则提示并退出
+    # 仅允许使用已保存的会话文件进行 Cookie 登录；不存在则提示并退出
     if not session_state:
-        print("未发现 ./session.json，请先使用 Playwright codegen 登录并保存会话到 ./session.json 后重试。")
+        print(f"未发现 {session_file}，请先使用 Playwright codegen 登录并保存会话到 {session_file} 后重试。")
         print("示例：python -m playwright codegen --channel=msedge --save-storage=./session.json https://37ub.w7zvq.net/forum.php")
         browser.close()
-        return
+        return None
 
     print("发现已保存的session，使用 Cookie 登录...")
     context = browser.new_context(
@@ -1798,7 +1842,11 @@ def run(playwright: Playwright) -> None:
     )
     
     page = context.new_page()
-    
+    return browser, context, page
+
+
+def prepare_forum_page(page):
+    """为论坛页面应用stealth、路由拦截、事件监听与反检测脚本（新建或回收页面后调用）"""
     # 应用stealth模式隐藏自动化特征
     stealth_sync(page)
     
@@ -2047,88 +2095,431 @@ def run(playwright: Playwright) -> None:
             });
         };
     """)
-    
-    
-    
-    # 访问网站
-    try:
-        print("正在访问网站...")
-        # 使用 domcontentloaded 等待策略，不等待所有资源加载完成
-        page.goto("https://37ub.w7zvq.net/forum.php", 
-                 wait_until="domcontentloaded", 
-                 timeout=30000)
-        print("网站访问成功")
-        
-        # 快速检测是否已登录（例如 Edge 记住密码后自动登录）
+
+
+_session_file_lock = threading.Lock()
+
+
+# 会话池模式下，与账号无关的启动失败（网络、浏览器启动）最多重试的次数
+SESSION_START_ATTEMPTS = 3
+
+
+class SubtitleSession:
+    """
+    论坛字幕下载会话
+    整个批次只启动一次浏览器、加载一次 session.json 并验证一次登录，
+    之后每个编号只执行 搜索 → 进入帖子 → 购买/下载；
+    仅在下载失败时重新验证登录，页面异常时回收重建
+    """
+
+    def __init__(self, playwright: Playwright, session_file=DEFAULT_SESSION_FILE, pool=None, worker=0):
+        """
+        Args:
+            playwright: 当前线程的Playwright实例（同步API不能跨线程共享）
+            session_file: 会话文件，多账号并发时每个worker使用各自的会话文件
+            pool: 账号会话池（SessionPool）；提供时忽略 session_file，从池中租用账号，账号受限时轮换
+            worker: worker序号，用于会话池租约标识
+        """
+        self.playwright = playwright
+        self.session_file = session_file
+        self.pool = pool
+        self.owner = pool_owner_name(worker)
+        self.account = None
+        self.fleet_lease = None
+        self.browser = None
+        self.context = None
+        self.page = None
+        self.logged_in = False
+        # 最近一次启动失败时页面上的认证错误（登录表单/登录提示）；网络、浏览器等其他原因失败时为 None
+        self.start_auth_error = None
+        # 登录状态按TTL缓存，流程出现认证错误时才重新检查
+        self.health = SessionHealth("forum", session_file, detector=check_login_status)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @traced("session_start", outcome=lambda ok: "logged_in" if ok else "failed")
+    def start(self) -> bool:
+        """启动浏览器（浏览器池运行时直接租用）、访问论坛首页并验证登录；使用会话池时依次租用账号直到登录成功"""
+        if self.pool is None:
+            return self._start_browser()
+        transient_failures = 0
+        while True:
+            self.account = self.pool.lease(self.owner)
+            if self.account is None:
+                print("👥 会话池中没有可用账号（均在使用中、冷却中、已达每日上限或余额不足）")
+                return False
+            print(f"👥 租用账号: {self.account.name}（{self.account.session_file}）")
+            self.session_file = self.account.session_file
+            self.health = SessionHealth("forum", self.session_file, detector=check_login_status)
+            bind_account(self.account)
+            if self._start_browser():
+                return True
+            name = self.account.name
+            if self.start_auth_error:
+                # 页面确认未登录（会话文件失效）的账号冷却一小时，换下一个账号
+                self.pool.cooldown(name, "login_failed", 3600)
+                self.close()
+                continue
+            # 网络、浏览器启动等与账号无关的失败：只归还账号不冷却，重试有限次
+            self.close()
+            transient_failures += 1
+            if transient_failures >= SESSION_START_ATTEMPTS:
+                print(f"❌ 会话启动连续失败 {transient_failures} 次（非登录问题），放弃启动")
+                return False
+            print(f"⚠️ 账号 {name} 启动失败但未发现登录问题，不冷却该账号，重试启动")
+
+    def _start_browser(self) -> bool:
+        self.start_auth_error = None
+        # 浏览器池的论坛槽位使用默认会话文件，其他账号始终本地启动
+        if os.path.abspath(self.session_file) == os.path.abspath(DEFAULT_SESSION_FILE):
+            self.fleet_lease = lease_fleet_page(self.playwright, "forum")
+        if self.fleet_lease is not None:
+            self.context, self.page = self.fleet_lease.context, self.fleet_lease.page
+        else:
+            launched = launch_forum_page(self.playwright, self.session_file)
+            if launched is None:
+                # 会话文件不存在或无法读取，与会话失效同样处理
+                self.start_auth_error = "会话文件不可用"
+                return False
+            self.browser, self.context, self.page = launched
+        prepare_forum_page(self.page)
+
         try:
-            if check_login_status(page):
-                print("检测到已登录（浏览器自动登录），跳过登录流程")
-                try:
-                    context.storage_state(path="./session.json")
-                    print("已保存session状态")
-                except Exception as e:
-                    print(f"保存session失败: {e}")
-                # 结束流程前执行搜索
-                try:
-                    do_prioritized_open(page, SEARCH_KEYWORD)
-                except Exception:
-                    pass
-                # 结束流程
-                try:
-                    page.wait_for_load_state("networkidle", timeout=5000)
-                except Exception:
-                    pass
-                time.sleep(5)
-                page.close()
-                context.close()
-                browser.close()
-                return
-        except Exception:
-            pass
-        
-        # 等待页面稳定，但不强制等待所有资源
+            print("正在访问网站...")
+            self._goto_home()
+            print("网站访问成功")
+        except Exception as e:
+            print(f"访问网站失败: {e}")
+            print("尝试访问备用地址或检查网络连接")
+            return False
+
+        # 仅使用 Cookie 登录，不做密码登录回退
+        self.logged_in = self.health.check(self.page, force=True)
+        self.health.print_report()
+        if self.logged_in:
+            print("Cookie 登录成功")
+            self.save_session()
+        else:
+            # 只有页面出现登录表单/登录提示才算会话失效，页面未正常渲染等情况不归咎于账号
+            self.start_auth_error = self.health.auth_error(self.page)
+            if self.start_auth_error:
+                print(f"Cookie 登录失败或未登录（{self.start_auth_error}）。请更新 {self.session_file} 后重试。")
+            else:
+                print("登录状态未能确认，页面未出现登录表单或登录提示")
+        return self.logged_in
+
+    def _goto_home(self):
+        """打开论坛首页（domcontentloaded 即可用，不强制等待所有资源）"""
+        acquire_for_url(FORUM_HOME_URL)
+        self.page.goto(FORUM_HOME_URL, wait_until="domcontentloaded", timeout=30000)
         try:
-            page.wait_for_load_state("networkidle", timeout=10000)
-        except:
+            self.page.wait_for_load_state("networkidle", timeout=10000)
+        except Exception:
             print("部分资源仍在加载中，但页面已可用")
-            
-    except Exception as e:
-        print(f"访问网站失败: {e}")
-        print("尝试访问备用地址或检查网络连接")
-        browser.close()
-        return
-    
-    # 仅使用 Cookie 登录，不做密码登录回退
-    if check_login_status(page):
-        print("Cookie 登录成功")
-        # 执行搜索
+
+    def _recycle_page(self):
+        """关闭异常页面，新建页面重新注入反检测脚本并回到首页"""
+        print("♻️ 回收异常页面并重新打开论坛首页")
         try:
-            do_prioritized_open(page, SEARCH_KEYWORD)
+            if not self.page.is_closed():
+                self.page.close()
         except Exception:
             pass
+        self.page = self.context.new_page()
+        if self.fleet_lease is not None:
+            self.fleet_lease.page = self.page
+        prepare_forum_page(self.page)
+        self._goto_home()
+
+    def _close_extra_pages(self):
+        """关闭搜索/帖子等新开的标签页，只保留主页面"""
+        for extra in list(self.context.pages):
+            if extra != self.page:
+                try:
+                    extra.close()
+                except Exception:
+                    pass
+
+    def _restore_login(self) -> bool:
+        """登录状态丢失时从会话文件重新加载Cookie并验证"""
+        print(f"⚠️ 登录状态丢失，尝试从 {self.session_file} 重新加载Cookie...")
+        session_state = load_session_if_exists(self.session_file)
+        if session_state and session_state.get("cookies"):
+            try:
+                self.context.add_cookies(session_state["cookies"])
+                self._goto_home()
+            except Exception as e:
+                print(f"重新加载Cookie失败: {e}")
+        self.logged_in = self.health.check(self.page, force=True)
+        return self.logged_in
+
+    def download(self, keyword: str) -> dict:
+        """
+        搜索并下载单个编号的字幕
+
+        Args:
+            keyword: 搜索关键词（视频编号）
+
+        Returns:
+            dict: {"keyword", "success", "status", "zone", "message", "payload", "attempts", "elapsed"}，
+                  status 为 downloaded / not_found / skipped / failed / login_lost，
+                  attempts 为每个候选帖子的尝试结果
+        """
+        # 每个编号的各阶段耗时写为一行追踪记录
+        with trace_job(keyword) as trace:
+            result = self._download(keyword)
+            if result["message"] == "account_limited" and self._rotate_account():
+                # 账号中途受限：换账号后重试本编号一次
+                result = self._download(keyword)
+            trace.outcome = result["status"]
+            return result
+
+    def _download(self, keyword: str) -> dict:
+        started = time.time()
+        if self.account is not None:
+            reason = self.account.exhausted_reason()
+            if reason:
+                print(f"👥 账号 {self.account.name} {reason}，轮换下线")
+                if not self._rotate_account():
+                    return _session_result(keyword, {"success": False, "zone": None, "message": "accounts_exhausted", "payload": None}, started)
+            self.account.code = keyword
+            self.account.renew()
+        if not self.logged_in:
+            return _session_result(keyword, {"success": False, "zone": None, "message": "login_lost", "payload": None}, started)
+
+        outcome = None
+        for attempt in range(2):
+            try:
+                # 页面已关闭时先回收（需要浏览器搜索时由 search_in_browser 回到首页）
+                if self.page.is_closed():
+                    self._recycle_page()
+                outcome = do_prioritized_open(self.page, keyword)
+            except SystemExit:
+                # find_and_print_priority_element 在附件已购买时可能调用 sys.exit
+                outcome = {"success": False, "zone": None, "message": "already_purchased", "payload": None}
+            except Exception as e:
+                print(f"⚠️ 下载流程异常: {e}")
+                outcome = {"success": False, "zone": None, "message": f"error: {e}", "payload": None}
+                try:
+                    self._recycle_page()
+                except Exception as recycle_error:
+                    print(f"回收页面失败: {recycle_error}")
+            finally:
+                self._close_extra_pages()
+
+            # 缓存命中的无结果没有访问论坛，无需验证登录
+            if outcome.get("success") or outcome.get("message") in ("already_purchased", "no_results_cached"):
+                break
+
+            # 会话池账号：页面提示余额不足/下载次数用尽，或购买时发现余额不足，交由 download() 换账号
+            if self.account is not None and (self.account.check_page(self.page) or self.account.exhausted_reason()):
+                outcome = {"success": False, "zone": outcome.get("zone"), "message": "account_limited",
+                           "payload": None, "attempts": outcome.get("attempts", [])}
+                break
+
+            # 失败时先零等待检查页面是否出现登录表单/登录提示，只有认证错误才让登录缓存失效；
+            # 掉线后恢复成功则重试一次
+            auth_error = self.health.auth_error(self.page)
+            if auth_error:
+                self.health.invalidate(auth_error)
+            try:
+                still_logged_in = self.health.check(self.page)
+            except Exception:
+                still_logged_in = False
+            if still_logged_in:
+                break
+            if attempt == 0 and self._restore_login():
+                continue
+            self.logged_in = False
+            outcome = {"success": False, "zone": None, "message": "login_lost", "payload": None}
+            break
+
+        if self.account is not None and outcome.get("success") and outcome.get("message") != "cached":
+            self.account.record_download()
+        return _session_result(keyword, outcome, started)
+
+    def _rotate_account(self) -> bool:
+        """关闭当前账号的浏览器并归还账号，租用下一个可用账号重新登录"""
+        if self.pool is None:
+            return False
+        self.close()
+        self.logged_in = self.start()
+        return self.logged_in
+
+    def _release_account(self):
+        if self.account is not None:
+            self.account.release()
+            self.account = None
+            bind_account(None)
+
+    def save_session(self):
+        """保持会话文件为最新（若站点刷新了 cookie）"""
+        try:
+            # 多个worker可能共用同一个会话文件，写入需串行
+            with _session_file_lock:
+                self.context.storage_state(path=self.session_file)
+            print("已保存session状态")
+        except Exception as e:
+            print(f"保存session失败: {e}")
+
+    def close(self):
+        """保存会话并关闭浏览器（租用的浏览器池槽位只归还不关闭），归还会话池账号"""
+        if self.context is None:
+            self._release_account()
+            return
+        if self.logged_in:
+            self.save_session()
+        if self.fleet_lease is not None:
+            self.fleet_lease.release()
+            self.fleet_lease = None
+        else:
+            try:
+                self.page.close()
+            except Exception:
+                pass
+            self.context.close()
+            self.browser.close()
+        self.context = None
+        self._release_account()
+
+
+def _session_result(keyword, outcome, started):
+    """把下载流程结果整理为统一的结果字典"""
+    message = outcome.get("message")
+    if outcome.get("success"):
+        status = "downloaded"
+    elif message in ("no_results", "no_results_cached"):
+        status = "not_found"
+    elif message == "already_purchased":
+        status = "skipped"
+    elif message in ("login_lost", "accounts_exhausted", "account_limited"):
+        # 账号不可用时编号交还队列，不计入尝试次数
+        status = "login_lost"
     else:
-        print("Cookie 登录失败或未登录。请更新 ./session.json 后重试。")
-        browser.close()
+        status = "failed"
+    return {
+        "keyword": keyword,
+        "success": bool(outcome.get("success")),
+        "status": status,
+        "zone": outcome.get("zone"),
+        "message": message,
+        "payload": outcome.get("payload"),
+        "attempts": outcome.get("attempts", []),
+        "elapsed": round(time.time() - started, 2),
+    }
+
+
+def open_session_pool(session_dir):
+    """登记会话目录中的账号并返回会话池；目录中没有会话文件时返回 None"""
+    pool = SessionPool(os.getenv("SESSION_POOL_DB") or None)
+    count = pool.sync_dir(session_dir)
+    if count == 0:
+        print(f"❌ 会话目录中没有会话文件: {session_dir}")
+        return None
+    print(f"👥 会话池: {session_dir}（{count} 个账号）")
+    return pool
+
+
+def run(playwright: Playwright, session_dir=None) -> None:
+    """单次下载：搜索并下载 SEARCH_KEYWORD；提供 session_dir 时从会话池租用账号"""
+    pool = open_session_pool(session_dir) if session_dir else None
+    if session_dir and pool is None:
         return
-    
-    # 等待页面加载完成后再进行后续操作（如有）
+    session = SubtitleSession(playwright, pool=pool)
     try:
-        page.wait_for_load_state("networkidle")
-    except Exception:
-        pass
-    time.sleep(5)
-    page.close()
+        with trace_job(SEARCH_KEYWORD), span("run"):
+            if session.start():
+                session.download(SEARCH_KEYWORD)
+                # 等待页面加载完成后再进行后续操作（如有）
+                try:
+                    session.page.wait_for_load_state("networkidle", timeout=5000)
+                except Exception:
+                    pass
+                time.sleep(5)
+    finally:
+        session.close()
+        if pool is not None:
+            pool.print_report()
+        finish_post_download()
+
+
+def run_subtitle_batch(video_codes, max_downloads=None, delay=2.0, workers=1, session_files=None, session_dir=None,
+                       scheduler=None, task_timeout=-1):
+    """
+    批量下载字幕：每个worker在自己的线程内启动独立的浏览器会话，从共享队列领取编号；
+    单worker时整个批次共用一个浏览器会话
+
+    Args:
+        video_codes: 视频编号列表
+        max_downloads: 最大下载数量限制
+        delay: 每个worker的下载间隔（秒），跨worker的请求频率由共享限速控制
+        workers: 并发worker数
+        session_files: 会话文件列表，多账号时按worker轮流分配，默认全部使用 ./session.json
+        session_dir: 会话目录（多账号会话池）；提供时忽略 session_files，worker从池中租用账号，受限账号自动轮换
+        scheduler: 可选的 code_priority.PriorityScheduler，提供时按优先级分数顺序处理编号
+        task_timeout: 单个编号的时限（秒），None 不限时，默认取 BATCH_TASK_TIMEOUT 或 600 秒
+
+    Returns:
+        dict: 下载统计；单worker模式下论坛登录失败时返回None
+    """
+    from download_jobs import get_job_queue
 
-    # 保持会话文件为最新（若站点刷新了 cookie）
+    session_files = session_files or [DEFAULT_SESSION_FILE]
+    pool = open_session_pool(session_dir) if session_dir else None
+    if session_dir and pool is None:
+        return None
+    # 编号写入 download_jobs 任务队列，中断后重新运行从中断处继续
+    job_queue = get_job_queue()
     try:
-        context.storage_state(path="./session.json")
-    except Exception:
-        pass
-    context.close()
-    browser.close()
+        return _run_batch(video_codes, max_downloads, delay, workers, session_files, pool, job_queue, scheduler,
+                          task_timeout)
+    finally:
+        if pool is not None:
+            pool.print_report()
+        finish_post_download()
+
+
+def _run_batch(video_codes, max_downloads, delay, workers, session_files, pool, job_queue, scheduler=None,
+               task_timeout=-1):
+    """
+    run_subtitle_batch 的执行部分：每个worker在自己的线程内启动浏览器会话，单worker也走同一编排循环，
+    单个编号超时后放弃该worker并启动替补
+    """
+    from batch_downloader import create_batch_downloader
+
+    def worker_factory(index):
+        # Playwright同步API不是线程安全的，每个worker线程各自启动实例
+        playwright = sync_playwright().start()
+        session = SubtitleSession(playwright, session_file=session_files[index % len(session_files)],
+                                  pool=pool, worker=index)
+        if not session.start():
+            session.close()
+            playwright.stop()
+            return None
+
+        def close():
+            session.close()
+            playwright.stop()
+
+        return session.download, close
+
+    downloader = create_batch_downloader(None, delay=delay, job_queue=job_queue, scheduler=scheduler,
+                                         task_timeout=task_timeout)
+    stats = downloader.download_concurrently(video_codes, worker_factory, workers=workers,
+                                             max_downloads=max_downloads)
+    if workers == 1 and downloader.workers_started == 0 and stats['total']:
+        # 单会话模式下论坛登录失败（没有可处理的编号时不启动浏览器）
+        return None
+    return stats
 
 
 # 新增：从页面/Frame提取压缩包解压密码并写入与下载文件同名的txt
+@traced("password_extract", outcome=lambda password: "found" if password else "none")
 def extract_and_write_password(contexts, downloaded_path, timeout_ms=5000, verbose=True):
     import os
     try:
@@ -2155,27 +2546,19 @@ def extract_and_write_password(contexts, downloaded_path, timeout_ms=5000, verbo
             try:
                 # 方法1: 原有的 blockcode 方法
                 try:
-                    blockcode_sel = "div.blockcode"
-                    loc = None
+                    # 一次快照取回全部 div.blockcode 的 innerText
                     try:
-                        loc = ctx.locator(blockcode_sel)
+                        blockcode_texts = take_snapshot(ctx, blockcodes=True)["blockcodes"]
                     except Exception:
-                        loc = None
-                    
-                    cnt = 0
-                    try:
-                        cnt = loc.count() if loc else 0
-                    except Exception:
-                        cnt = 0
+                        blockcode_texts = []
+                    cnt = len(blockcode_texts)
 
                     if verbose:
                         print(f"🔍 回退方法：找到 {cnt} 个 div.blockcode 元素")
 
-                    # 遍历所有 blockcode 元素，获取 innerText
-                    for i in range(cnt):
+                    # 遍历所有 blockcode 元素的 innerText
+                    for i, inner_text in enumerate(blockcode_texts):
                         try:
-                            blockcode_element = loc.nth(i)
-                            inner_text = blockcode_element.inner_text().strip()
                             
                             if verbose:
                                 print(f"📄 blockcode[{i}] innerText: {inner_text}")
@@ -2539,6 +2922,7 @@ def extract_and_write_password(contexts, downloaded_path, timeout_ms=5000, verbo
         return None
 
 
+@traced("download_after_purchase")
 def try_download_after_purchase(hit_frame, parent_context, search_keyword, save_root=None, candidate_domains=None, candidate_selectors=None, timeout_download_ms=20000, click_timeout_ms=8000, skip_password_extraction=False, verbose=True):
     import os
     # 1) 计算保存目录
@@ -2616,15 +3000,25 @@ def try_download_after_purchase(hit_frame, parent_context, search_keyword, save_
                     cnt = 0
                 if cnt > 0:
                     try:
-                        with click_page.expect_download(timeout=timeout_download_ms) as di:
-                            loc.first.click(timeout=click_timeout_ms, force=True)
-                        download = di.value
+                        # 直链（如 tu.ymawv.la 上的压缩包）优先走HTTP流式下载，失败再点击由浏览器下载
+                        direct = None
                         try:
-                            fn = download.suggested_filename
-                        except Exception:
-                            fn = f"{search_keyword}.rar"
-                        save_path = os.path.join(save_root, fn)
-                        download.save_as(save_path)
+                            direct = _stream_direct_download(click_page, loc.first.get_attribute("href"), save_root)
+                        except Exception as e:
+                            if verbose:
+                                print(f"⚠️ 流式下载异常，改为浏览器下载: {e}")
+                        if direct:
+                            save_path = direct["path"]
+                        else:
+                            with click_page.expect_download(timeout=timeout_download_ms) as di:
+                                loc.first.click(timeout=click_timeout_ms, force=True)
+                            download = di.value
+                            try:
+                                fn = download.suggested_filename
+                            except Exception:
+                                fn = f"{search_keyword}.rar"
+                            save_path = os.path.join(save_root, fn)
+                            download.save_as(save_path)
                         if verbose:
                             print(f"✅ 下载完成: {save_path}")
                         # 新增：下载成功后提取页面解压密码并写入同名txt（可通过参数跳过）
@@ -2673,7 +3067,8 @@ def try_download_after_purchase(hit_frame, parent_context, search_keyword, save_
     return False, None, last_error or "未找到直链下载链接，或点击未触发下载"
 
 # 批量下载功能入口
-def batch_download_from_csv(csv_file_path, video_type_filter=None, max_downloads=None, delay=2.0):
+def batch_download_from_csv(csv_file_path, video_type_filter=None, max_downloads=None, delay=2.0, workers=1, session_files=None,
+                            session_dir=None, task_timeout=-1):
     """
     从CSV文件批量下载字幕
     
@@ -2682,56 +3077,41 @@ def batch_download_from_csv(csv_file_path, video_type_filter=None, max_downloads
         video_type_filter: 视频类型筛选条件，如"无码"、"有码"等
         max_downloads: 最大下载数量限制
         delay: 下载间隔时间（秒）
+        workers: 并发worker数
+        session_files: 会话文件列表（多账号并发），默认 ./session.json
+        session_dir: 会话目录（多账号会话池），提供时忽略 session_files
+        task_timeout: 单个编号的时限（秒），None 不限时，默认取 BATCH_TASK_TIMEOUT 或 600 秒
     
     Returns:
         dict: 下载统计结果
     """
     try:
         # 导入批量下载模块
-        from db_utils import get_video_codes_from_csv  # 使用数据库模式替代CSV
-        from batch_downloader import create_batch_downloader
+        import itertools
+        from csv_utils import iter_video_codes_from_csv
         
         print(f"🚀 开始批量下载任务")
         print(f"📁 CSV文件: {csv_file_path}")
         print(f"🎯 视频类型筛选: {video_type_filter or '全部'}")
         print(f"📊 最大下载数: {max_downloads or '无限制'}")
         print(f"⏱️ 下载间隔: {delay}秒")
+        print(f"👷 并发数: {workers}")
         print("-" * 60)
         
-        # 从CSV提取视频编号
-        video_codes = get_video_codes_from_csv(csv_file_path, video_type_filter)
-        
-        if not video_codes:
+        # 从CSV按块流式提取视频编号，边读边写入任务队列；预读第一个编号以尽早发现空文件
+        video_codes = iter_video_codes_from_csv(csv_file_path, video_type_filter)
+        first = next(video_codes, None)
+        if first is None:
             print("❌ 未从CSV文件中提取到任何视频编号")
             return {"success": False, "message": "无有效视频编号"}
+        video_codes = itertools.chain([first], video_codes)
         
-        print(f"✅ 成功提取 {len(video_codes)} 个视频编号")
-        for i, code in enumerate(video_codes[:10], 1):  # 显示前10个
-            print(f"   {i}. {code}")
-        if len(video_codes) > 10:
-            print(f"   ... 还有 {len(video_codes) - 10} 个")
-        print("-" * 60)
-        
-        # 定义单次下载函数
-        def single_download(keyword: str):
-            """执行单次下载流程"""
-            print(f"🔍 开始下载: {keyword}")
-            with sync_playwright() as playwright:
-                # 临时修改全局关键词
-                global SEARCH_KEYWORD
-                original_keyword = SEARCH_KEYWORD
-                SEARCH_KEYWORD = keyword
-                try:
-                    run(playwright)
-                finally:
-                    # 恢复原始关键词
-                    SEARCH_KEYWORD = original_keyword
-        
-        # 创建批量下载器
-        downloader = create_batch_downloader(single_download, delay=delay)
-        
-        # 执行批量下载
-        stats = downloader.download_from_codes(video_codes, max_downloads=max_downloads)
+        # 整个批次共用一个浏览器会话，每个编号只执行搜索与下载
+        stats = run_subtitle_batch(video_codes, max_downloads=max_downloads, delay=delay,
+                                   workers=workers, session_files=session_files,
+                                   session_dir=session_dir, task_timeout=task_timeout)
+        if stats is None:
+            return {"success": False, "message": "论坛登录失败"}
         
         print("=" * 60)
         print("📊 批量下载完成统计:")
@@ -2757,7 +3137,12 @@ def batch_download_from_db(
     actress_filter=None,
     no_subtitle=False,
     max_downloads=None, 
-    delay=2.0
+    delay=2.0,
+    workers=1,
+    session_files=None,
+    session_dir=None,
+    prioritize=True,
+    task_timeout=-1
 ):
     """
     从数据库批量下载字幕
@@ -2768,6 +3153,12 @@ def batch_download_from_db(
         no_subtitle: 是否只下载未有字幕的视频
         max_downloads: 最大下载数量限制
         delay: 下载间隔时间（秒）
+        workers: 并发worker数
+        session_files: 会话文件列表（多账号并发），默认 ./session.json
+        session_dir: 会话目录（多账号会话池），提供时忽略 session_files
+        prioritize: 按优先级分数（发行时间、同演员/片商命中率、无结果历史、类型）处理编号，
+                    否则按编号顺序
+        task_timeout: 单个编号的时限（秒），None 不限时，默认取 BATCH_TASK_TIMEOUT 或 600 秒
     
     Returns:
         dict: 下载统计结果
@@ -2775,7 +3166,7 @@ def batch_download_from_db(
     try:
         # 导入数据库工具模块
         from db_utils import get_video_codes_from_db
-        from batch_downloader import create_batch_downloader
+        from code_priority import build_scheduler
         
         print(f"🚀 开始数据库批量下载任务")
         print(f"🎯 视频类型筛选: {video_type_filter or '全部'}")
@@ -2783,6 +3174,10 @@ def batch_download_from_db(
         print(f"📝 字幕状态: {'仅未有字幕' if no_subtitle else '全部'}")
         print(f"📊 最大下载数: {max_downloads or '无限制'}")
         print(f"⏱️ 下载间隔: {delay}秒")
+        print(f"👷 并发数: {workers}")
+        # 按优先级处理时取全部候选编号，--max 只限制本次处理的数量
+        scheduler = build_scheduler() if prioritize else None
+        print(f"📈 处理顺序: {'优先级分数' if scheduler is not None else '编号顺序'}")
         print("-" * 60)
         
         # 从数据库获取视频编号
@@ -2790,7 +3185,7 @@ def batch_download_from_db(
             video_type=video_type_filter,
             actress_name=actress_filter,
             has_subtitle=False if no_subtitle else None,
-            limit=max_downloads
+            limit=None if scheduler is not None else max_downloads
         )
         
         if not video_codes:
@@ -2804,26 +3199,13 @@ def batch_download_from_db(
             print(f"   ... 还有 {len(video_codes) - 10} 个")
         print("-" * 60)
         
-        # 定义单次下载函数
-        def single_download(keyword: str):
-            """执行单次下载流程"""
-            print(f"🔍 开始下载: {keyword}")
-            with sync_playwright() as playwright:
-                # 临时修改全局关键词
-                global SEARCH_KEYWORD
-                original_keyword = SEARCH_KEYWORD
-                SEARCH_KEYWORD = keyword
-                try:
-                    run(playwright)
-                finally:
-                    # 恢复原始关键词
-                    SEARCH_KEYWORD = original_keyword
-        
-        # 创建批量下载器
-        downloader = create_batch_downloader(single_download, delay=delay)
-        
-        # 执行批量下载
-        stats = downloader.download_from_codes(video_codes, max_downloads=max_downloads)
+        # 整个批次共用一个浏览器会话，每个编号只执行搜索与下载
+        stats = run_subtitle_batch(video_codes, max_downloads=max_downloads, delay=delay,
+                                   workers=workers, session_files=session_files,
+                                   session_dir=session_dir, scheduler=scheduler,
+                                   task_timeout=task_timeout)
+        if stats is None:
+            return {"success": False, "message": "论坛登录失败"}
         
         print("=" * 60)
         print("📊 数据库批量下载完成统计:")
@@ -2844,7 +3226,8 @@ def batch_download_from_db(
         return {"success": False, "message": f"下载失败: {e}"}
 
 
-def batch_download_from_codes(video_codes, max_downloads=None, delay=2.0):
+def batch_download_from_codes(video_codes, max_downloads=None, delay=2.0, workers=1, session_files=None, session_dir=None,
+                              task_timeout=-1):
     """
     从视频编号列表批量下载字幕
     
@@ -2852,18 +3235,20 @@ def batch_download_from_codes(video_codes, max_downloads=None, delay=2.0):
         video_codes: 视频编号列表
         max_downloads: 最大下载数量限制
         delay: 下载间隔时间（秒）
+        workers: 并发worker数
+        session_files: 会话文件列表（多账号并发），默认 ./session.json
+        session_dir: 会话目录（多账号会话池），提供时忽略 session_files
+        task_timeout: 单个编号的时限（秒），None 不限时，默认取 BATCH_TASK_TIMEOUT 或 600 秒
     
     Returns:
         dict: 下载统计结果
     """
     try:
-        # 导入批量下载模块
-        from batch_downloader import create_batch_downloader
-        
         print(f"🚀 开始批量下载任务")
         print(f"📊 视频编号数量: {len(video_codes)}")
         print(f"📊 最大下载数: {max_downloads or '无限制'}")
         print(f"⏱️ 下载间隔: {delay}秒")
+        print(f"👷 并发数: {workers}")
         print("-" * 60)
         
         # 显示编号列表
@@ -2873,26 +3258,12 @@ def batch_download_from_codes(video_codes, max_downloads=None, delay=2.0):
             print(f"   ... 还有 {len(video_codes) - 10} 个")
         print("-" * 60)
         
-        # 定义单次下载函数
-        def single_download(keyword: str):
-            """执行单次下载流程"""
-            print(f"🔍 开始下载: {keyword}")
-            with sync_playwright() as playwright:
-                # 临时修改全局关键词
-                global SEARCH_KEYWORD
-                original_keyword = SEARCH_KEYWORD
-                SEARCH_KEYWORD = keyword
-                try:
-                    run(playwright)
-                finally:
-                    # 恢复原始关键词
-                    SEARCH_KEYWORD = original_keyword
-        
-        # 创建批量下载器
-        downloader = create_batch_downloader(single_download, delay=delay)
-        
-        # 执行批量下载
-        stats = downloader.download_from_codes(video_codes, max_downloads=max_downloads)
+        # 整个批次共用一个浏览器会话，每个编号只执行搜索与下载
+        stats = run_subtitle_batch(video_codes, max_downloads=max_downloads, delay=delay,
+                                   workers=workers, session_files=session_files,
+                                   session_dir=session_dir, task_timeout=task_timeout)
+        if stats is None:
+            return {"success": False, "message": "论坛登录失败"}
         
         print("=" * 60)
         print("📊 批量下载完成统计:")
@@ -2927,6 +3298,7 @@ def parse_arguments():
     python download-subtitle.py --db --type "无码破解" --max 10
     python download-subtitle.py --db --actress "波多野结衣" --interval 3.0
     python download-subtitle.py --db --no-subtitle --max 20
+    python download-subtitle.py --db --no-subtitle --max 20 --no-priority
     
   从CSV文件批量下载（兼容模式）:
     python download-subtitle.py --csv videos.csv --type "SSIS"
@@ -2935,6 +3307,14 @@ def parse_arguments():
   从视频编号列表批量下载:
     python download-subtitle.py --codes "SSIS-001,MIDV-002,STARS-003"
     python download-subtitle.py --codes "SSIS-001,SSIS-002" --interval 1.5 --max 5
+    
+  并发下载（多账号时每个worker轮流使用各自的会话文件）:
+    python download-subtitle.py --db --no-subtitle --workers 4
+    python download-subtitle.py --db --workers 2 --session-files "session.json,session_b.json"
+    python download-subtitle.py --db --no-subtitle --workers 2 --task-timeout 300
+    
+  多账号会话池（余额、每日上限与消费按账号记录，受限账号自动轮换）:
+    python download-subtitle.py --db --no-subtitle --workers 3 --session-dir ./sessions
         """
     )
     
@@ -2972,6 +3352,11 @@ def parse_arguments():
         action='store_true',
         help='只下载未有字幕的视频（仅数据库模式）'
     )
+    parser.add_argument(
+        '--no-priority',
+        action='store_true',
+        help='按编号顺序处理，不按优先级分数排序（仅数据库模式）'
+    )
     parser.add_argument(
         '--max', 
         type=int, 
@@ -2983,12 +3368,36 @@ def parse_arguments():
         default=2.0,
         help='下载间隔时间（秒），默认2.0秒'
     )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=1,
+        help='并发worker数（每个worker独立的浏览器会话），默认1'
+    )
+    parser.add_argument(
+        '--session-files',
+        type=str,
+        help='逗号分隔的会话文件列表，多账号并发时按worker轮流分配，默认 ./session.json'
+    )
+    parser.add_argument(
+        '--session-dir',
+        type=str,
+        help='会话目录（每个账号一个 storage_state 文件），worker从会话池租用账号，受限账号自动轮换'
+    )
+    parser.add_argument(
+        '--task-timeout',
+        type=float,
+        help='单个编号的时限（秒），超时记为失败并启动替补worker；0 表示不限时，默认600秒（BATCH_TASK_TIMEOUT）'
+    )
     
     return parser.parse_args()
 
 
 if __name__ == "__main__":
     args = parse_arguments()
+    session_files = [f.strip() for f in args.session_files.split(',') if f.strip()] if args.session_files else None
+    # 未指定时取 BATCH_TASK_TIMEOUT 或默认值，0 表示不限时
+    task_timeout = -1 if args.task_timeout is None else (args.task_timeout or None)
     
     # 数据库模式
     if args.db:
@@ -2998,7 +3407,12 @@ if __name__ == "__main__":
             actress_filter=args.actress,
             no_subtitle=args.no_subtitle,
             max_downloads=args.max,
-            delay=args.interval
+            delay=args.interval,
+            workers=args.workers,
+            session_files=session_files,
+            session_dir=args.session_dir,
+            prioritize=not args.no_priority,
+            task_timeout=task_timeout
         )
     # CSV模式（兼容）
     elif args.csv:
@@ -3007,7 +3421,11 @@ if __name__ == "__main__":
             csv_file_path=args.csv,
             video_type_filter=args.type,
             max_downloads=args.max,
-            delay=args.interval
+            delay=args.interval,
+            workers=args.workers,
+            session_files=session_files,
+            session_dir=args.session_dir,
+            task_timeout=task_timeout
         )
     elif args.codes:
         # 编号列表批量下载模式
@@ -3015,9 +3433,13 @@ if __name__ == "__main__":
         batch_download_from_codes(
             video_codes=codes,
             max_downloads=args.max,
-            delay=args.interval
+            delay=args.interval,
+            workers=args.workers,
+            session_files=session_files,
+            session_dir=args.session_dir,
+            task_timeout=task_timeout
         )
     else:
         # 单次下载模式
         with sync_playwright() as playwright:
-            run(playwright)
\ No newline at end of file
+            run(playwright, session_dir=args.session_dir)
\ No newline at end of file
@@ -0,0 +1,526 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+字幕下载任务队列
+把批量下载的每个编号记录为 download_jobs 表中的一条任务（状态、尝试次数、最后错误、专区、文件路径、耗时），
+批量入口先入队再由worker领取，进程崩溃或中断后重新运行会从中断处继续，已完成的编号不会重复处理。
+
+任务状态:
+- pending: 等待领取
+- running: 已被worker领取（领取者进程退出或租约过期后可被重新领取）
+- retry:   失败后按失败类型等待重试（next_attempt_at 之后可再次领取）
+- done:    已下载
+- dead:    重试次数用尽，不再自动领取（可用 --revive 重新入队）
+
+论坛暂无字幕（not_found）的编号不计重试次数、不会进入 dead：下次领取时间取自 subtitle_search_state 的
+下次可搜索时间（由 database_manager.subtitle_recheck_delay 决定，结果 payload 中的 next_eligible_at），
+没有该时间时（复查状态写入失败、搜索未得出确定结论）1 天后重试。
+
+其他失败类型的重试间隔从基础间隔起按尝试次数翻倍:
+- skipped:   附件已购买等被跳过，1 天起，最多 2 次
+- failed:    下载流程失败，10 分钟起，最多 5 次
+- exit:      流程中途调用 sys.exit，30 分钟起，最多 3 次
+- timeout:   单个编号超过批量下载的单任务时限，30 分钟起，最多 3 次
+登录失效的任务直接交还队列，不计入尝试次数。
+
+设置环境变量 DOWNLOAD_JOBS_DISABLED=1 可关闭任务队列，批量下载退回为仅内存计数。
+
+用法示例:
+  python download_jobs.py --status
+  python download_jobs.py --list retry
+  python download_jobs.py --revive
+  python download_jobs.py --reset HMN-733
+"""
+
+import argparse
+import os
+import socket
+import sqlite3
+import sys
+import time
+import uuid
+from itertools import islice
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+
+DEFAULT_DB_PATH = Path(__file__).parent / "database" / "download_jobs.db"
+
+# 失败类型 → (基础重试间隔秒, 最大尝试次数)
+RETRY_POLICIES = {
+    "skipped": (24 * 3600, 2),
+    "failed": (10 * 60, 5),
+    "exit": (30 * 60, 3),
+    "timeout": (30 * 60, 3),
+}
+
+# not_found 没有下次可搜索时间时的重试间隔
+NOT_FOUND_FALLBACK_DELAY = 24 * 3600
+
+LEASE_TTL = 30 * 60
+
+# 入队时每个事务写入的编号数，编号来源是生成器时边读边写，不必先收集完整列表
+ENQUEUE_CHUNK = 500
+
+JOB_STATES = ("pending", "running", "retry", "done", "dead")
+
+
+def normalize_code(code: str) -> str:
+    """编号统一为去空格大写"""
+    return (code or "").strip().upper()
+
+
+def retry_delay(failure: str, attempts: int) -> Optional[float]:
+    """第 attempts 次失败后的重试间隔；超过最大尝试次数返回 None"""
+    base, max_attempts = RETRY_POLICIES.get(failure, RETRY_POLICIES["failed"])
+    if attempts >= max_attempts:
+        return None
+    return base * (2 ** max(attempts - 1, 0))
+
+
+def _owner_alive(owner: str) -> bool:
+    """领取者是否仍在运行（仅能判断本机进程，其他主机按租约过期处理）"""
+    try:
+        host, pid, _ = owner.split(":", 2)
+        pid = int(pid)
+    except (AttributeError, ValueError):
+        return False
+    if host != socket.gethostname():
+        return True
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+
+class DownloadJobQueue:
+    """基于SQLite的下载任务队列（每次操作独立连接，可在多线程/多进程间共享）"""
+
+    def __init__(self, db_path: Optional[str] = None, lease_ttl: float = LEASE_TTL):
+        self.db_path = str(db_path or DEFAULT_DB_PATH)
+        self.lease_ttl = lease_ttl
+        self.batch = None
+        self.ensure_database_dir()
+        self.init_database()
+
+    def ensure_database_dir(self):
+        """确保数据库目录存在"""
+        db_dir = os.path.dirname(self.db_path)
+        if db_dir and not os.path.exists(db_dir):
+            os.makedirs(db_dir, exist_ok=True)
+
+    def _connect(self) -> sqlite3.Connection:
+        # 手动管理事务，配合 BEGIN IMMEDIATE 保证跨进程原子性
+        conn = sqlite3.connect(self.db_path, timeout=30.0, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def init_database(self):
+        """初始化任务表结构"""
+        conn = self._connect()
+        try:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS download_jobs (
+                    code TEXT PRIMARY KEY,
+                    state TEXT NOT NULL DEFAULT 'pending',
+                    batch TEXT,
+                    attempts INTEGER DEFAULT 0,
+                    last_status TEXT,
+                    last_error TEXT,
+                    zone TEXT,
+                    file_path TEXT,
+                    file_size INTEGER,
+                    sha256 TEXT,
+                    duplicate_of TEXT,
+                    lease_owner TEXT,
+                    lease_expires_at REAL,
+                    next_attempt_at REAL DEFAULT 0,
+                    enqueued_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL,
+                    elapsed REAL
+                )
+            """)
+            # 旧库补充文件大小、哈希与重复来源列
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(download_jobs)")}
+            for column, ddl in (("file_size", "INTEGER"), ("sha256", "TEXT"), ("duplicate_of", "TEXT")):
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE download_jobs ADD COLUMN {column} {ddl}")
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_download_jobs_claim "
+                "ON download_jobs (batch, state, next_attempt_at)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_download_jobs_sha256 ON download_jobs (sha256)")
+            # 旧版本会让多次无结果的编号进入 dead，现改为按复查状态重试
+            conn.execute("UPDATE download_jobs SET state = 'retry' WHERE state = 'dead' AND last_status = 'not_found'")
+        finally:
+            conn.close()
+
+    @staticmethod
+    def owner_name(worker: Any = 0) -> str:
+        """当前进程/worker的领取者标识"""
+        return f"{socket.gethostname()}:{os.getpid()}:{worker}"
+
+    def _transaction(self, fn):
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            result = fn(conn)
+            conn.execute("COMMIT")
+            return result
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    # ==================== 入队与领取 ====================
+
+    def enqueue(self, codes: Iterable[str], batch: Optional[str] = None) -> Dict[str, int]:
+        """
+        把编号加入本批次：新编号入队，未完成的旧任务归入本批次（保留其重试时间），已完成/已放弃的任务保持不变
+
+        Returns:
+            Dict: {"added", "resumed", "done", "dead"}
+        """
+        self.batch = batch or f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        now = time.time()
+        counts = {"added": 0, "resumed": 0, "done": 0, "dead": 0}
+        seen = set()
+
+        def work(conn, chunk):
+            for code in chunk:
+                row = conn.execute("SELECT state FROM download_jobs WHERE code = ?", (code,)).fetchone()
+                if row is None:
+                    conn.execute(
+                        "INSERT INTO download_jobs (code, state, batch, enqueued_at) VALUES (?, 'pending', ?, ?)",
+                        (code, self.batch, now),
+                    )
+                    counts["added"] += 1
+                elif row[0] in ("done", "dead"):
+                    counts[row[0]] += 1
+                else:
+                    conn.execute("UPDATE download_jobs SET batch = ? WHERE code = ?", (self.batch, code))
+                    counts["resumed"] += 1
+
+        def unique():
+            for raw in codes:
+                code = normalize_code(raw)
+                if code and code not in seen:
+                    seen.add(code)
+                    yield code
+
+        pending = unique()
+        while True:
+            chunk = list(islice(pending, ENQUEUE_CHUNK))
+            if not chunk:
+                return counts
+            self._transaction(lambda conn: work(conn, chunk))
+
+    def _reclaim_orphans(self, conn, now: float):
+        """把领取者进程已退出或租约过期的 running 任务交还队列"""
+        rows = conn.execute(
+            "SELECT code, lease_owner, lease_expires_at FROM download_jobs WHERE state = 'running' AND batch = ?",
+            (self.batch,),
+        ).fetchall()
+        for code, owner, expires_at in rows:
+            if (expires_at or 0) < now or not _owner_alive(owner):
+                conn.execute(
+                    "UPDATE download_jobs SET state = 'pending', lease_owner = NULL, lease_expires_at = NULL "
+                    "WHERE code = ?",
+                    (code,),
+                )
+
+    def claim(self, owner: str, code: Optional[str] = None) -> Optional[str]:
+        """
+        领取本批次中一条到期的任务，返回编号；没有可领取的任务时返回 None
+
+        Args:
+            owner: 领取者
+            code: 只领取指定编号（由优先级调度器选定）；该编号不可领取时返回 None
+        """
+        if self.batch is None:
+            raise RuntimeError("请先调用 enqueue() 建立批次")
+        now = time.time()
+        only_code = "AND code = ? " if code else ""
+        params = (self.batch, now, normalize_code(code)) if code else (self.batch, now)
+
+        def work(conn):
+            self._reclaim_orphans(conn, now)
+            row = conn.execute(
+                "SELECT code FROM download_jobs "
+                "WHERE batch = ? AND state IN ('pending', 'retry') AND next_attempt_at <= ? " + only_code +
+                "ORDER BY state = 'retry', next_attempt_at, enqueued_at, code LIMIT 1",
+                params,
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE download_jobs SET state = 'running', lease_owner = ?, lease_expires_at = ?, started_at = ? "
+                "WHERE code = ?",
+                (owner, now + self.lease_ttl, now, row[0]),
+            )
+            return row[0]
+
+        return self._transaction(work)
+
+    def ready_codes(self) -> List[str]:
+        """本批次当前可领取的编号"""
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT code FROM download_jobs WHERE batch = ? AND state IN ('pending', 'retry') "
+                "AND next_attempt_at <= ?",
+                (self.batch, time.time()),
+            ).fetchall()
+            return [row[0] for row in rows]
+        finally:
+            conn.close()
+
+    def ready_count(self) -> int:
+        """本批次当前可领取的任务数"""
+        conn = self._connect()
+        try:
+            return conn.execute(
+                "SELECT COUNT(*) FROM download_jobs WHERE batch = ? AND "
+                "(state IN ('pending', 'retry') AND next_attempt_at <= ? OR state = 'running')",
+                (self.batch, time.time()),
+            ).fetchone()[0]
+        finally:
+            conn.close()
+
+    # ==================== 结果记录 ====================
+
+    def complete(self, code: str, zone: Optional[str] = None, file_path: Optional[str] = None,
+                 elapsed: Optional[float] = None, file_size: Optional[int] = None, sha256: Optional[str] = None):
+        """
+        记录下载成功；未提供大小/哈希时从文件计算
+
+        与其他编号已下载的文件内容相同时在 duplicate_of 记录对方编号。流式下载与浏览器下载都经过这里，
+        本编号的文件保留原样（路径仍是本编号自己的文件），该编号照常计为下载成功：论坛为它提供的附件就是这份内容
+        """
+        if file_path and sha256 is None and os.path.isfile(file_path):
+            from http_download import sha256_file
+            try:
+                file_size, sha256 = os.path.getsize(file_path), sha256_file(file_path)
+            except OSError:
+                pass
+        duplicate = self.find_by_sha256(sha256, exclude_code=code) if sha256 else None
+        if duplicate:
+            print(f"♻️ {normalize_code(code)} 的文件与 {duplicate['code']} 已下载的文件内容相同: {duplicate['file_path']}")
+        now = time.time()
+        self._transaction(lambda conn: conn.execute(
+            "UPDATE download_jobs SET state = 'done', attempts = attempts + 1, last_status = 'downloaded', "
+            "last_error = NULL, zone = COALESCE(?, zone), file_path = COALESCE(?, file_path), "
+            "file_size = COALESCE(?, file_size), sha256 = COALESCE(?, sha256), duplicate_of = ?, "
+            "lease_owner = NULL, lease_expires_at = NULL, finished_at = ?, "
+            "elapsed = COALESCE(?, ? - started_at) WHERE code = ?",
+            (zone, file_path, file_size, sha256, duplicate["code"] if duplicate else None,
+             now, elapsed, now, normalize_code(code)),
+        ))
+
+    def find_by_sha256(self, sha256: str, exclude_code: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """查找已下载的同哈希文件（文件仍在磁盘上），返回 {"code", "file_path"}"""
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT code, file_path FROM download_jobs WHERE sha256 = ? AND state = 'done' AND code != ?",
+                (sha256, normalize_code(exclude_code or "")),
+            ).fetchall()
+        finally:
+            conn.close()
+        for code, file_path in rows:
+            if file_path and os.path.isfile(file_path):
+                return {"code": code, "file_path": file_path}
+        return None
+
+    def fail(self, code: str, failure: str, error: Optional[str] = None, zone: Optional[str] = None,
+             elapsed: Optional[float] = None, retry_at: Optional[float] = None) -> Optional[float]:
+        """
+        记录一次失败，按失败类型安排重试
+
+        Args:
+            retry_at: not_found 的下次可搜索时间（时间戳），由复查状态给出
+
+        Returns:
+            float: 距下次重试的秒数；重试次数用尽（任务进入 dead）时返回 None
+        """
+        code = normalize_code(code)
+        now = time.time()
+
+        def work(conn):
+            row = conn.execute("SELECT attempts FROM download_jobs WHERE code = ?", (code,)).fetchone()
+            attempts = (row[0] if row else 0) + 1
+            if failure == "not_found":
+                # 复查间隔以 subtitle_search_state 为准，不会用尽重试次数
+                delay = max(retry_at - now, 0.0) if retry_at else NOT_FOUND_FALLBACK_DELAY
+            else:
+                delay = retry_delay(failure, attempts)
+            conn.execute(
+                "UPDATE download_jobs SET state = ?, attempts = ?, last_status = ?, last_error = ?, "
+                "zone = COALESCE(?, zone), next_attempt_at = ?, lease_owner = NULL, lease_expires_at = NULL, "
+                "finished_at = ?, elapsed = COALESCE(?, ? - started_at) WHERE code = ?",
+                ("dead" if delay is None else "retry", attempts, failure, (error or "")[:500], zone,
+                 0 if delay is None else now + delay, now, elapsed, now, code),
+            )
+            return delay
+
+        return self._transaction(work)
+
+    def release(self, code: str):
+        """交还任务（登录失效等与编号无关的原因），不计入尝试次数"""
+        self._transaction(lambda conn: conn.execute(
+            "UPDATE download_jobs SET state = 'pending', lease_owner = NULL, lease_expires_at = NULL "
+            "WHERE code = ? AND state = 'running'",
+            (normalize_code(code),),
+        ))
+
+    def record_result(self, code: str, result: Any) -> Optional[float]:
+        """
+        按批量下载的结果字典（status / zone / message / payload / elapsed）更新任务
+
+        Returns:
+            float: 失败时距下次重试的秒数，其余情况返回 None
+        """
+        if not isinstance(result, dict):
+            self.complete(code)
+            return None
+        status = result.get("status")
+        zone = result.get("zone")
+        elapsed = result.get("elapsed")
+        if status == "downloaded":
+            payload = result.get("payload") or {}
+            self.complete(code, zone, payload.get("file_path") or payload.get("save_path"), elapsed,
+                          payload.get("file_size"), payload.get("sha256"))
+            return None
+        if status == "login_lost":
+            self.release(code)
+            return None
+        failure = status if status in ("not_found", "skipped") else "failed"
+        retry_at = (result.get("payload") or {}).get("next_eligible_at") if failure == "not_found" else None
+        return self.fail(code, failure, result.get("message"), zone, elapsed, retry_at)
+
+    # ==================== 管理 ====================
+
+    def stats(self, batch: Optional[str] = None) -> Dict[str, int]:
+        """按状态统计任务数"""
+        conn = self._connect()
+        try:
+            if batch:
+                rows = conn.execute(
+                    "SELECT state, COUNT(*) FROM download_jobs WHERE batch = ? GROUP BY state", (batch,)
+                ).fetchall()
+            else:
+                rows = conn.execute("SELECT state, COUNT(*) FROM download_jobs GROUP BY state").fetchall()
+        finally:
+            conn.close()
+        counts = {state: 0 for state in JOB_STATES}
+        counts.update(dict(rows))
+        return counts
+
+    def list_jobs(self, state: str, limit: int = 50) -> List[Dict[str, Any]]:
+        """列出指定状态的任务"""
+        conn = self._connect()
+        try:
+            conn.row_factory = sqlite3.Row
+            rows = conn.execute(
+                "SELECT code, attempts, last_status, last_error, zone, file_path, next_attempt_at, elapsed "
+                "FROM download_jobs WHERE state = ? ORDER BY next_attempt_at, code LIMIT ?",
+                (state, limit),
+            ).fetchall()
+        finally:
+            conn.close()
+        return [dict(row) for row in rows]
+
+    def revive(self) -> int:
+        """把已放弃的任务重新入队（清零尝试次数），返回条数"""
+        return self._transaction(lambda conn: conn.execute(
+            "UPDATE download_jobs SET state = 'pending', attempts = 0, next_attempt_at = 0 WHERE state = 'dead'"
+        ).rowcount)
+
+    def reset(self, code: str) -> int:
+        """把指定编号重置为待处理"""
+        return self._transaction(lambda conn: conn.execute(
+            "UPDATE download_jobs SET state = 'pending', attempts = 0, next_attempt_at = 0, "
+            "lease_owner = NULL, lease_expires_at = NULL WHERE code = ?",
+            (normalize_code(code),),
+        ).rowcount)
+
+    def print_status(self):
+        """打印任务队列状态"""
+        counts = self.stats()
+        print("=" * 60)
+        print("🗂️ 字幕下载任务队列")
+        print("=" * 60)
+        labels = {"pending": "⏳ 待处理", "running": "🔄 进行中", "retry": "🔁 等待重试",
+                  "done": "✅ 已完成", "dead": "💀 已放弃"}
+        for state in JOB_STATES:
+            print(f"{labels[state]}: {counts[state]}")
+        retries = self.list_jobs("retry", limit=5)
+        if retries:
+            print("-" * 60)
+            print("最近到期的重试:")
+            for job in retries:
+                wait = max(job["next_attempt_at"] - time.time(), 0)
+                print(f"  {job['code']}: 第{job['attempts']}次 {job['last_status']} "
+                      f"({job['last_error'] or '-'})，{wait / 3600:.1f} 小时后重试")
+        print("=" * 60)
+
+
+# ==================== 批量入口使用 ====================
+
+def get_job_queue() -> Optional[DownloadJobQueue]:
+    """为一次批量下载创建任务队列（批次状态保存在实例上）；设置 DOWNLOAD_JOBS_DISABLED=1 可关闭"""
+    if os.getenv("DOWNLOAD_JOBS_DISABLED") == "1":
+        return None
+    try:
+        return DownloadJobQueue(os.getenv("DOWNLOAD_JOBS_DB") or None)
+    except sqlite3.Error as e:
+        print(f"⚠️ 初始化下载任务队列失败，将只在内存中计数: {e}")
+        return None
+
+
+def jobs_db_path() -> Optional[str]:
+    """任务数据库路径（用于其他库 ATTACH 做反连接）；队列关闭或数据库不存在时返回 None"""
+    if os.getenv("DOWNLOAD_JOBS_DISABLED") == "1":
+        return None
+    path = os.getenv("DOWNLOAD_JOBS_DB") or str(DEFAULT_DB_PATH)
+    return path if os.path.exists(path) else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="字幕下载任务队列查看与管理")
+    parser.add_argument("--db", help="任务数据库路径，默认 ./database/download_jobs.db")
+    parser.add_argument("--status", action="store_true", help="查看各状态任务数")
+    parser.add_argument("--list", choices=JOB_STATES, help="列出指定状态的任务")
+    parser.add_argument("--limit", type=int, default=50, help="配合 --list 的最大条数")
+    parser.add_argument("--revive", action="store_true", help="把已放弃的任务重新入队")
+    parser.add_argument("--reset", metavar="CODE", help="把指定编号重置为待处理")
+    args = parser.parse_args()
+
+    jobs = DownloadJobQueue(args.db)
+
+    if args.revive:
+        print(f"✅ 已重新入队 {jobs.revive()} 个已放弃的任务")
+    if args.reset:
+        if jobs.reset(args.reset):
+            print(f"✅ 已重置: {normalize_code(args.reset)}")
+        else:
+            print(f"⚠️ 未找到任务: {normalize_code(args.reset)}")
+    if args.list:
+        for job in jobs.list_jobs(args.list, args.limit):
+            print(f"{job['code']}\t第{job['attempts']}次\t{job['last_status'] or '-'}\t"
+                  f"{job['zone'] or '-'}\t{job['file_path'] or job['last_error'] or '-'}")
+    if args.status or not (args.revive or args.reset or args.list):
+        jobs.print_status()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
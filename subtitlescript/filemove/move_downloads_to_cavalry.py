@@ -171,6 +171,11 @@ class SubtitleFileMover:
             for root, dirs, filenames in os.walk(self.source_dir):
                 root_path = Path(root)
                 
+                # 已由下载后处理流水线（post_download.py）归档的目录不再移动
+                if '.post_download.json' in filenames:
+                    dirs[:] = []
+                    continue
+                
                 for filename in filenames:
                     file_path = root_path / filename
                     # 只处理字幕文件和压缩文件
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+论坛站内搜索快速通道
+直接用浏览器上下文的Cookie请求 search.php?mod=forum&searchsubmit=yes&kw=... 并在Python中解析结果列表，
+省去输入框输入、点击、等待新标签页与 networkidle 的浏览器流程（最坏约20秒 → 通常不到1秒）。
+
+请求通过 context.request 发出，与浏览器共用Cookie与请求头，请求频率仍受共享限速控制。
+返回 None 表示需要回退到浏览器搜索流程：
+- 非200响应或请求异常
+- 反爬/验证页面（需要浏览器执行脚本）
+- 返回的是需要提交 formhash 的搜索表单或登录页，而不是结果页
+- 论坛搜索频率限制提示
+
+设置环境变量 FORUM_HTTP_SEARCH_DISABLED=1 可始终使用浏览器搜索。
+"""
+
+import os
+import re
+from typing import Any, Dict, List, Optional
+from urllib.parse import quote_plus, urljoin, urlparse
+
+from bs4 import BeautifulSoup
+
+from forum_snapshot import SEARCH_RESULT_SELECTOR
+from rate_limiter import acquire_for_url
+
+
+# 反爬/验证页面特征
+ANTI_BOT_MARKERS = [
+    "cf-browser-verification",
+    "challenge-platform",
+    "cf_chl_",
+    "Just a moment...",
+    "安全验证",
+    "请开启JavaScript",
+    "防CC",
+]
+
+# 需要回退到浏览器的论坛提示
+FALLBACK_MESSAGES = [
+    "只能进行一次搜索",       # 搜索频率限制
+    "您需要先登录",
+    "尚未登录",
+    "没有权限",
+]
+
+# 结果页中真正的结果行：搜索结果列表项、版块列表中的主题行。
+# 只在行内取标题链接，导航栏、侧栏里的 viewthread 链接不计入结果
+RESULT_ROW_SELECTOR = "#threadlist li.pbw, tbody[id^='normalthread_']"
+
+# 无结果提示（有效的结果页，不需要回退）
+NO_RESULT_MESSAGES = ["没有找到匹配结果", "对不起，没有找到匹配结果"]
+
+_AUTHOR_SELECTORS = [
+    "p a[href*='mod=space'][href*='uid=']",
+    "a[href*='mod=space'][href*='uid=']",
+    "a[href*='space-uid']",
+    "td[class*='by'] cite a",
+    "cite a",
+]
+_TIME_SELECTORS = [
+    "td[class*='by'] em span",
+    "em[class*='xg1'] span",
+    "p[class*='xg1'] span",
+    "em span",
+]
+_SECTION_SELECTORS = [
+    "a[class*='xi1'][href*='mod=forumdisplay'][href*='fid=']",
+    "p a[href*='mod=forumdisplay'][href*='fid=']",
+    "a[href*='mod=forumdisplay'][href*='fid=']",
+    "td[class*='forum'] a",
+    "a[href*='forum-'][href*='.html']",
+    "a[href*='/forum-']",
+]
+
+
+def http_search_enabled() -> bool:
+    """快速通道是否启用"""
+    return os.environ.get("FORUM_HTTP_SEARCH_DISABLED") != "1"
+
+
+def build_search_url(base_url: str, keyword: str) -> str:
+    """构造论坛搜索URL"""
+    parsed = urlparse(base_url)
+    base = f"{parsed.scheme}://{parsed.netloc}"
+    return f"{base}/search.php?mod=forum&searchsubmit=yes&kw={quote_plus(keyword)}"
+
+
+def _first_text(root, selectors: List[str]) -> str:
+    if root is None:
+        return ""
+    for sel in selectors:
+        try:
+            el = root.select_one(sel)
+        except Exception:
+            el = None
+        text = el.get_text(strip=True) if el else ""
+        if text:
+            return text
+    return ""
+
+
+def _closest(tag, name: str, id_prefix: Optional[str] = None):
+    for parent in tag.parents:
+        if parent.name == name and (id_prefix is None or (parent.get("id") or "").startswith(id_prefix)):
+            return parent
+    return None
+
+
+def parse_search_results_html(html: str, base_url: str, max_items: int = 30) -> Dict[str, Any]:
+    """
+    解析搜索结果页HTML（字段与浏览器快照 forum_snapshot 一致）
+
+    Returns:
+        Dict: {"results": [{"title","link","time","user","section"}], "result_total"}
+    """
+    soup = BeautifulSoup(html, "html.parser")
+    # 每个结果行取一个标题链接
+    anchors = []
+    for row in soup.select(RESULT_ROW_SELECTOR):
+        a = row.select_one(SEARCH_RESULT_SELECTOR)
+        if a is not None:
+            anchors.append(a)
+    results = []
+    for a in anchors[:max_items]:
+        cont = _closest(a, "tbody", "normalthread_") or _closest(a, "tr") or _closest(a, "li") or a.parent
+        near = [_closest(a, "tr"), _closest(a, "li"), a.parent]
+
+        author = _first_text(cont, _AUTHOR_SELECTORS)
+        for n in near:
+            if author:
+                break
+            author = _first_text(n, ["p a[href*='mod=space'][href*='uid=']"])
+
+        pub_time = _first_text(cont, _TIME_SELECTORS)
+        if not pub_time and cont is not None:
+            m = re.search(r"(20\d{2}-\d{1,2}-\d{1,2}(?:\s+\d{1,2}:\d{2})?)", cont.get_text(" "))
+            if m:
+                pub_time = m.group(1)
+
+        section = _first_text(cont, _SECTION_SELECTORS)
+        for n in near:
+            if section:
+                break
+            section = _first_text(n, ["p a[href*='mod=forumdisplay'][href*='fid=']"])
+
+        href = a.get("href") or ""
+        results.append({
+            "title": a.get_text(strip=True),
+            "link": urljoin(base_url, href) if href else "",
+            "time": pub_time,
+            "user": author,
+            "section": section,
+        })
+    return {"results": results, "result_total": len(anchors)}
+
+
+def needs_browser(html: str, result_total: int) -> Optional[str]:
+    """
+    判断响应是否需要回退到浏览器流程
+
+    Returns:
+        str: 回退原因；None 表示可以直接使用解析结果
+    """
+    # 先排除验证页与论坛提示：这类页面也可能带有帖子链接
+    for marker in ANTI_BOT_MARKERS:
+        if marker in html:
+            return f"反爬验证页面({marker})"
+    for message in FALLBACK_MESSAGES:
+        if message in html:
+            return f"论坛提示: {message}"
+    if result_total > 0:
+        return None
+    if any(message in html for message in NO_RESULT_MESSAGES):
+        return None
+    # 没有结果也没有无结果提示：多半是需要带 formhash 提交的搜索表单
+    if 'name="formhash"' in html or "name='formhash'" in html:
+        return "返回了需要formhash的搜索表单"
+    return "无法识别的搜索响应"
+
+
+def search_forum_http(context, keyword: str, base_url: str, max_items: int = 30,
+                      timeout_ms: int = 15000) -> Optional[Dict[str, Any]]:
+    """
+    通过HTTP直接搜索论坛
+
+    Args:
+        context: Playwright BrowserContext（使用其 request 与Cookie）
+        keyword: 搜索关键词
+        base_url: 论坛任意页面URL，用于确定站点地址
+        max_items: 最多解析的结果条数
+        timeout_ms: 请求超时（毫秒）
+
+    Returns:
+        Dict: {"url", "results", "result_total"}；需要回退到浏览器流程时返回 None
+    """
+    if not http_search_enabled():
+        return None
+
+    url = build_search_url(base_url, keyword)
+    try:
+        acquire_for_url(url)
+        response = context.request.get(url, timeout=timeout_ms, headers={"Referer": base_url})
+    except Exception as e:
+        print(f"⚡ 快速搜索请求失败，回退到浏览器搜索: {e}")
+        return None
+
+    if response.status != 200:
+        print(f"⚡ 快速搜索返回状态码 {response.status}，回退到浏览器搜索")
+        return None
+
+    try:
+        html = response.text()
+    except Exception as e:
+        print(f"⚡ 快速搜索读取响应失败，回退到浏览器搜索: {e}")
+        return None
+
+    final_url = response.url or url
+    parsed = parse_search_results_html(html, final_url, max_items=max_items)
+    reason = needs_browser(html, parsed["result_total"])
+    if reason:
+        print(f"⚡ 快速搜索不可用（{reason}），回退到浏览器搜索")
+        return None
+
+    parsed["url"] = final_url
+    return parsed
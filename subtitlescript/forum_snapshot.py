@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+论坛页面DOM快照
+逐个 locator(...).count() / nth(i).inner_text() 查询时，每次调用都是一次与浏览器之间的IPC往返，
+解析一页搜索结果或扫描一组附件选择器需要数百次往返。本模块对每个frame只执行一次 page.evaluate，
+一次性取回搜索结果、附件/购买链接与 blockcode 文本，之后的筛选逻辑全部在Python中完成。
+
+快照中的链接记录了所属选择器与序号，需要点击时用 frame.locator(selector).nth(index) 重新定位，
+与原先逐个查询得到的元素一致（同一选择器下按文档顺序编号）。
+
+选择器必须是标准CSS（querySelectorAll 可识别），不能使用 :has-text 等Playwright扩展语法。
+"""
+
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+
+# 搜索结果标题链接
+SEARCH_RESULT_SELECTOR = "a.xst, a[href*='viewthread'], th > a[href*='thread'], h3 a, .pbw a[href*='thread']"
+
+# 帖子页附件链接（D区/A区共用，A区额外包含 blockcode 内的链接）
+ATTACHMENT_SELECTORS = [
+    "dl.tattl dd p.attnm a",                                        # 优先匹配压缩包链接
+    "a[href*='mod=attachment'][id^='aid']",
+    "dl.tattl a[id^='aid']",
+    "a[href*='forum.php'][href*='mod=attachment']",
+    "ignore_js_op a[href*='mod=misc'][href*='action=attachpay']",   # ignore_js_op内的付费附件
+    "a[href*='mod=misc'][href*='action=attachpay']",                # 付费附件链接（attachpay）
+    "span[id^='attach_'] a[href*='attachpay']",                     # span包装的附件链接
+    "ignore_js_op span a",                                          # ignore_js_op内span中的链接
+]
+
+# 购买相关链接
+BUY_TOPIC_SELECTOR = "a.viewpay[title='购买主题'], a.y.viewpay[title='购买主题'], a[href*='mod=misc'][href*='action=pay']"
+ATTACHPAY_SELECTOR = "a[href*='mod=misc'][href*='action=attachpay']"
+DIRECT_ATTACHMENT_SELECTOR = "a[href*='mod=attachment'][href*='aid=']"
+
+# 字幕/压缩包常见后缀
+SUBTITLE_EXTS = ['.zip', '.rar', '.7z', '.ass', '.srt', '.ssa', '.vtt', '.lrc', '.sub']
+
+
+_SNAPSHOT_JS = r"""
+(opts) => {
+    const textOf = (el) => {
+        if (!el) return "";
+        const t = (el.innerText || "").trim();
+        return t ? t : (el.textContent || "").trim();
+    };
+    const firstText = (root, sels) => {
+        if (!root) return "";
+        for (const sel of sels) {
+            let el = null;
+            try { el = root.querySelector(sel); } catch (e) { el = null; }
+            const t = el ? textOf(el) : "";
+            if (t) return t;
+        }
+        return "";
+    };
+
+    const groups = {};
+    for (const sel of opts.selectors || []) {
+        let nodes = [];
+        try { nodes = Array.from(document.querySelectorAll(sel)); } catch (e) { nodes = []; }
+        groups[sel] = nodes.slice(0, opts.maxLinks).map((a, i) => ({
+            index: i,
+            text: textOf(a),
+            text_content: (a.textContent || ""),
+            href: a.getAttribute("href") || "",
+            title: a.getAttribute("title") || "",
+        }));
+    }
+
+    const results = [];
+    let resultTotal = 0;
+    if (opts.resultSelector) {
+        let anchors = [];
+        try { anchors = Array.from(document.querySelectorAll(opts.resultSelector)); } catch (e) { anchors = []; }
+        resultTotal = anchors.length;
+        const authorSels = [
+            "p a[href*='mod=space'][href*='uid=']",
+            "a[href*='mod=space'][href*='uid=']",
+            "a[href*='space-uid']",
+            "td[class*='by'] cite a",
+            "cite a",
+        ];
+        const timeSels = [
+            "td[class*='by'] em span",
+            "em[class*='xg1'] span",
+            "p[class*='xg1'] span",
+            "em span",
+        ];
+        const sectionSels = [
+            "a[class*='xi1'][href*='mod=forumdisplay'][href*='fid=']",
+            "p a[href*='mod=forumdisplay'][href*='fid=']",
+            "a[href*='mod=forumdisplay'][href*='fid=']",
+            "td[class*='forum'] a",
+            "a[href*='forum-'][href*='.html']",
+            "a[href*='/forum-']",
+        ];
+        for (const a of anchors.slice(0, opts.maxItems)) {
+            const cont = a.closest("tbody[id^='normalthread_']") || a.closest("tr") || a.closest("li") || a.parentElement;
+            const near = [a.closest("tr"), a.closest("li"), a.parentElement];
+            let author = firstText(cont, authorSels);
+            for (const n of near) {
+                if (author) break;
+                author = firstText(n, ["p a[href*='mod=space'][href*='uid=']"]);
+            }
+            let time = firstText(cont, timeSels);
+            if (!time && cont) {
+                const m = (cont.innerText || "").match(/(20\d{2}-\d{1,2}-\d{1,2}(?:\s+\d{1,2}:\d{2})?)/);
+                if (m) time = m[1];
+            }
+            let section = firstText(cont, sectionSels);
+            for (const n of near) {
+                if (section) break;
+                section = firstText(n, ["p a[href*='mod=forumdisplay'][href*='fid=']"]);
+            }
+            results.push({
+                title: (a.innerText || "").trim(),
+                href: a.getAttribute("href") || "",
+                time: time,
+                user: author,
+                section: section,
+            });
+        }
+    }
+
+    const blockcodes = opts.blockcodes
+        ? Array.from(document.querySelectorAll("div.blockcode")).map((el) => (el.innerText || "").trim())
+        : [];
+
+    return {url: location.href, groups: groups, results: results, result_total: resultTotal, blockcodes: blockcodes};
+}
+"""
+
+
+def take_snapshot(root,
+                  selectors: Iterable[str] = (),
+                  result_selector: Optional[str] = None,
+                  max_items: int = 30,
+                  max_links: int = 200,
+                  blockcodes: bool = False) -> Dict[str, Any]:
+    """
+    对单个 Page/Frame 执行一次 evaluate，返回结构化快照
+
+    Args:
+        root: Page 或 Frame
+        selectors: 需要收集的链接选择器，结果按选择器分组
+        result_selector: 搜索结果标题选择器，提供时解析搜索结果行
+        max_items: 最多解析的搜索结果条数
+        max_links: 每个选择器最多收集的链接数
+        blockcodes: 是否收集 div.blockcode 文本
+
+    Returns:
+        Dict: {"url", "groups": {selector: [{"index","text","text_content","href","title"}]},
+               "results": [{"title","href","time","user","section"}], "result_total", "blockcodes"}
+    """
+    return root.evaluate(_SNAPSHOT_JS, {
+        "selectors": list(selectors),
+        "resultSelector": result_selector,
+        "maxItems": max_items,
+        "maxLinks": max_links,
+        "blockcodes": blockcodes,
+    })
+
+
+def iter_frames(root, include_children: bool = True) -> List[Any]:
+    """root 及其子frame（Page 取 frames，其中已包含主frame；Frame 取 child_frames），按id去重"""
+    frames = [root]
+    if include_children:
+        try:
+            if hasattr(root, 'main_frame'):
+                frames = list(root.frames) or [root]
+            else:
+                frames += list(getattr(root, 'child_frames', None) or [])
+        except Exception:
+            pass
+    unique, seen = [], set()
+    for fr in frames:
+        if id(fr) not in seen:
+            seen.add(id(fr))
+            unique.append(fr)
+    return unique
+
+
+def snapshot_frames(root, selectors: Iterable[str], include_children: bool = True,
+                    **kwargs) -> List[Tuple[Any, Dict[str, Any]]]:
+    """
+    对 root 及其子frame各执行一次快照，跳过已分离或跨域失败的frame
+
+    Returns:
+        List[(frame, snapshot)]
+    """
+    selectors = list(selectors)
+    snapshots = []
+    for fr in iter_frames(root, include_children):
+        try:
+            snapshots.append((fr, take_snapshot(fr, selectors, **kwargs)))
+        except Exception:
+            continue
+    return snapshots
+
+
+def find_link(snapshots: List[Tuple[Any, Dict[str, Any]]], selectors: Iterable[str],
+              predicate) -> Optional[Tuple[Any, str, Dict[str, Any]]]:
+    """
+    按 frame → 选择器 → 序号 的顺序返回第一个满足 predicate(link) 的链接
+
+    Returns:
+        (frame, selector, link) 或 None
+    """
+    for fr, snap in snapshots:
+        for sel in selectors:
+            for link in snap["groups"].get(sel, []):
+                if predicate(link):
+                    return fr, sel, link
+    return None
+
+
+def has_ext(text: str, exts: Iterable[str]) -> bool:
+    """文本（文件名）是否以指定后缀结尾"""
+    low = (text or "").lower().strip()
+    return any(low.endswith(ext) for ext in exts)
@@ -0,0 +1,534 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+本地 Discuz 替身论坛与字幕下载基准测试
+字幕下载流程只能对线上论坛运行，改动 perform_search、scrape_search_results、rank_results 或各专区下载流程后
+无法回归测试，也无法测量吞吐。本模块提供一个本地HTTP替身论坛，按与线上一致的Discuz页面结构提供：
+- 首页（#scbar_txt 搜索框、登录标记）与 search.php 搜索结果页（标题、作者、时间、所属专区；无结果提示）
+- 四个专区的帖子：免费、购买主题（div.locked a.viewpay + form#payform 弹窗）、付费附件（attachpay + 购买附件弹窗）
+- dl.tattl 附件列表、div.blockcode 解压密码、可下载的压缩包（forum.php?mod=attachment&aid=...）
+页面默认按编号模板生成，也可用 --pages 目录中录制的页面覆盖（search-<编号>.html、thread-<tid>.html）。
+
+基准测试在临时工作目录中启动替身论坛，用真实的 run_subtitle_batch 流程跑 N 个编号，
+汇总吞吐量、各结果数量与各阶段 p50/p95 耗时（tracing.py 的追踪记录）。
+
+用法示例:
+  python forum_standin.py serve --count 50 --port 8765
+  python forum_standin.py serve --pages ./recorded --browser-search
+  python forum_standin.py bench --count 20 --workers 2 --latency-ms 150
+  python forum_standin.py bench --count 10 --browser-search --headed
+"""
+
+import argparse
+import glob
+import importlib.util
+import io
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+from html import escape
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, quote, urlparse
+
+
+BENCH_PREFIX = "BENCH"
+AUTH_COOKIE = "standin_auth"
+DEFAULT_BALANCE = 1000
+
+# 专区名称 → 论坛 fid
+SECTIONS = {
+    "自译字幕区": 36,
+    "自提字幕区": 37,
+    "新作区": 38,
+    "字幕分享区": 39,
+}
+
+# 默认的帖子分布（None 表示搜索无结果）
+DEFAULT_MIX = [
+    ("自译字幕区", 0.35),
+    ("自提字幕区", 0.15),
+    ("新作区", 0.10),
+    ("字幕分享区", 0.20),
+    (None, 0.20),
+]
+
+# 帖子锁定方式分布：免费 / 购买主题 / 付费附件
+LOCK_MIX = [("free", 0.5), ("thread_pay", 0.25), ("attach_pay", 0.25)]
+
+
+def _cycle(rng: random.Random, mix: List[Tuple[Any, float]], slots: int = 20) -> List[Any]:
+    """按权重展开为 slots 个取值并打乱；按编号循环取用，编号较少时也覆盖每种情况"""
+    values = [value for value, weight in mix for _ in range(max(1, round(weight * slots)))]
+    rng.shuffle(values)
+    return values
+
+
+def build_catalogue(count: int, seed: int = 733, prefix: str = BENCH_PREFIX) -> Dict[str, Dict[str, Any]]:
+    """
+    按固定随机种子生成编号 → 帖子的目录
+
+    Returns:
+        Dict: {编号: {"code","section","tid","aid","lock","price","password"}}，无结果的编号 section 为 None
+    """
+    rng = random.Random(seed)
+    sections = _cycle(rng, DEFAULT_MIX)
+    locks = _cycle(rng, LOCK_MIX, slots=4)
+    catalogue = {}
+    for i in range(1, count + 1):
+        code = f"{prefix}-{i:03d}"
+        section = sections[(i - 1) % len(sections)]
+        catalogue[code] = {
+            "code": code,
+            "section": section,
+            "tid": 100000 + i,
+            "aid": 500000 + i,
+            "lock": locks[(i - 1) % len(locks)] if section else None,
+            "price": rng.randint(1, 5),
+            "password": f"www.98T.la@{rng.randrange(16 ** 6):06x}" if rng.random() < 0.7 else None,
+        }
+    return catalogue
+
+
+def make_archive(code: str) -> bytes:
+    """生成包含一个字幕文件的压缩包"""
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zf:
+        lines = ["[Script Info]", f"Title: {code}", "", "[Events]"]
+        lines += [f"Dialogue: 0,0:00:{i:02d}.00,0:00:{i + 1:02d}.00,Default,,0,0,0,,{code} 第{i}句" for i in range(40)]
+        zf.writestr(f"{code}.ass", "\n".join(lines))
+    return buf.getvalue()
+
+
+_SCRIPT = """
+<script>
+function showWindow(k, url) {
+    fetch(url + (url.indexOf('?') < 0 ? '?' : '&') + 'inajax=1', {credentials: 'same-origin'})
+        .then(function (r) { return r.text(); })
+        .then(function (html) {
+            var win = document.getElementById('fwin_' + k);
+            if (!win) {
+                win = document.createElement('div');
+                win.id = 'fwin_' + k;
+                win.className = 'fwin';
+                document.body.appendChild(win);
+            }
+            win.innerHTML = '<div class="f_c">' + html + '</div>';
+        });
+    return false;
+}
+</script>
+"""
+
+
+class StandinState:
+    """替身论坛的目录与购买状态（进程内，重启后重置）"""
+
+    def __init__(self, catalogue: Dict[str, Dict[str, Any]], latency: float = 0.0,
+                 browser_search: bool = False, pages_dir: Optional[str] = None,
+                 balance: int = DEFAULT_BALANCE):
+        self.catalogue = catalogue
+        self.by_tid = {entry["tid"]: entry for entry in catalogue.values()}
+        self.by_aid = {entry["aid"]: entry for entry in catalogue.values()}
+        self.latency = latency
+        self.browser_search = browser_search
+        self.pages_dir = pages_dir
+        self.balance = balance
+        self.paid_threads = set()
+        self.paid_attachments = set()
+        self.requests = 0
+        self.downloads = 0
+        self._archives: Dict[str, bytes] = {}
+        self.lock = threading.Lock()
+
+    def archive(self, code: str) -> bytes:
+        with self.lock:
+            if code not in self._archives:
+                self._archives[code] = make_archive(code)
+            return self._archives[code]
+
+    def recorded(self, name: str) -> Optional[str]:
+        """读取录制的页面，不存在时返回 None"""
+        if not self.pages_dir:
+            return None
+        path = os.path.join(self.pages_dir, name)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read()
+
+    def pay(self, price: int) -> bool:
+        with self.lock:
+            if self.balance < price:
+                return False
+            self.balance -= price
+            return True
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+    """按Discuz页面结构响应首页、搜索、帖子、购买弹窗与附件下载"""
+
+    server_version = "DiscuzStandin/1.0"
+
+    @property
+    def state(self) -> StandinState:
+        return self.server.state
+
+    def log_message(self, format, *args):
+        pass
+
+    # ==================== 响应工具 ====================
+
+    def _send_html(self, html: str, status: int = 200):
+        body = html.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _redirect(self, location: str):
+        self.send_response(302)
+        self.send_header("Location", location)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def _logged_in(self) -> bool:
+        return f"{AUTH_COOKIE}=" in (self.headers.get("Cookie") or "")
+
+    def _page(self, title: str, content: str) -> str:
+        if self._logged_in():
+            user = ('<div id="um"><strong class="vwmy"><a href="home.php?mod=space&amp;uid=1">bench</a></strong>'
+                    ' <a href="member.php?mod=logging&amp;action=logout">退出</a></div>')
+        else:
+            user = '<form id="lsform"><input id="ls_username" name="username"></form>'
+        formhash = '<input type="hidden" name="formhash" value="standin">' if self.state.browser_search else ""
+        search = ('<form id="scbar_form" method="get" action="search.php">'
+                  '<input type="hidden" name="mod" value="forum"><input type="hidden" name="searchsubmit" value="yes">'
+                  f'{formhash}<input id="scbar_txt" name="kw" type="text">'
+                  '<button id="scbar_btn" type="submit">搜索</button></form>')
+        return (f'<!DOCTYPE html><html><head><meta charset="utf-8"><title>{escape(title)} - 替身论坛</title>'
+                f'{_SCRIPT}</head><body><div id="hd">{user}<div id="scbar">{search}</div></div>'
+                f'<div id="wp" class="wp">{content}</div></body></html>')
+
+    # ==================== 路由 ====================
+
+    def do_GET(self):
+        self._route("GET")
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+        self._route("POST")
+
+    def _route(self, method: str):
+        with self.state.lock:
+            self.state.requests += 1
+        if self.state.latency:
+            time.sleep(self.state.latency)
+        parsed = urlparse(self.path)
+        query = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+        path = parsed.path.rstrip("/") or "/forum.php"
+        mod = query.get("mod")
+
+        if path == "/search.php":
+            return self._search(query)
+        if path in ("/", "/forum.php"):
+            if mod == "viewthread":
+                return self._thread(int(query.get("tid", 0)))
+            if mod == "misc" and query.get("action") == "pay":
+                return self._pay_thread(method, int(query.get("tid", 0)), query)
+            if mod == "misc" and query.get("action") == "attachpay":
+                return self._pay_attachment(method, int(query.get("aid", 0)), query)
+            if mod == "attachment":
+                return self._attachment(int(query.get("aid", 0)))
+            if mod == "forumdisplay":
+                return self._send_html(self._page("版块", '<div id="threadlist"></div>'))
+            return self._send_html(self._page("首页", '<div id="ct">替身论坛首页</div>'))
+        self._send_html(self._page("404", "<p>页面不存在</p>"), 404)
+
+    def _search(self, query: Dict[str, str]):
+        keyword = (query.get("kw") or query.get("srchtxt") or "").strip().upper()
+        if self.state.browser_search and "formhash" not in query:
+            # 模拟需要 formhash 的搜索：HTTP快速通道回退到浏览器搜索
+            return self._send_html(self._page("搜索", '<form method="post"><input name="formhash" value="standin"></form>'))
+        recorded = self.state.recorded(f"search-{keyword}.html")
+        if recorded is not None:
+            return self._send_html(recorded)
+        entry = self.state.catalogue.get(keyword)
+        if not keyword or not entry or not entry["section"]:
+            return self._send_html(self._page("搜索", '<div id="threadlist"><p class="emp">对不起，没有找到匹配结果。</p></div>'))
+        fid = SECTIONS[entry["section"]]
+        item = (f'<li class="pbw" id="{entry["tid"]}">'
+                f'<h3 class="xs3"><a href="forum.php?mod=viewthread&amp;tid={entry["tid"]}&amp;highlight=" target="_blank">'
+                f'<strong><font color="#ff0000">{escape(entry["code"])}</font></strong> 中文字幕</a></h3>'
+                f'<p class="xg1">3 个回复 - 120 次查看</p>'
+                f'<p><span>2024-05-01 12:00</span> - <span><a href="home.php?mod=space&amp;uid=2">uploader</a></span>'
+                f' - <span><a href="forum.php?mod=forumdisplay&amp;fid={fid}" class="xi1">{entry["section"]}</a></span></p></li>')
+        self._send_html(self._page("搜索", f'<div class="tl"><div class="sttl mbn"><h2>结果: <em>找到 1 个</em></h2></div>'
+                                           f'<div id="threadlist" class="slst mtw"><ul>{item}</ul></div></div>'))
+
+    def _attachment_html(self, entry: Dict[str, Any]) -> str:
+        filename = f"{entry['code']}.zip"
+        aid, tid = entry["aid"], entry["tid"]
+        if entry["lock"] == "attach_pay" and aid not in self.state.paid_attachments:
+            pay_href = f"forum.php?mod=misc&amp;action=attachpay&amp;aid={aid}&amp;tid={tid}"
+            return (f'<ignore_js_op><dl class="tattl"><dt></dt><dd><p class="attnm">'
+                    f'<a href="{pay_href}" onclick="return showWindow(\'attachpay\', this.href)">{filename}</a></p>'
+                    f'<p>售价: {entry["price"]} 金钱 [<a href="{pay_href}" onclick="return showWindow(\'attachpay\', this.href)">购买</a>]</p>'
+                    f'</dd></dl></ignore_js_op>')
+        return (f'<ignore_js_op><dl class="tattl"><dt></dt><dd><p class="attnm">'
+                f'<a href="forum.php?mod=attachment&amp;aid={aid}" id="aid{aid}">{filename}</a></p>'
+                f'<p>24.5 KB, 下载次数: 3</p></dd></dl></ignore_js_op>')
+
+    def _thread(self, tid: int):
+        recorded = self.state.recorded(f"thread-{tid}.html")
+        if recorded is not None:
+            return self._send_html(recorded)
+        entry = self.state.by_tid.get(tid)
+        if entry is None:
+            return self._send_html(self._page("提示信息", '<div class="alert_error">抱歉，指定的主题不存在或已被删除</div>'), 404)
+        fid = SECTIONS[entry["section"]]
+        if entry["lock"] == "thread_pay" and tid not in self.state.paid_threads:
+            body = (f'<div class="locked">本主题需向作者支付 <strong>{entry["price"]} 金钱</strong> 才能浏览'
+                    f'<a href="forum.php?mod=misc&amp;action=pay&amp;tid={tid}" class="y viewpay" title="购买主题"'
+                    f' onclick="return showWindow(\'pay\', this.href)">购买主题</a></div>')
+        else:
+            body = f'<p>{escape(entry["code"])} 中文字幕，解压后即可使用。</p>'
+            if entry["password"]:
+                body += (f'<p>解压密码：</p><div class="blockcode"><div id="code_{tid}"><ol><li>'
+                         f'{escape(entry["password"])}</li></ol></div></div>')
+            body += self._attachment_html(entry)
+        content = (f'<div id="pt" class="bm cl"><a href="forum.php">首页</a> › '
+                   f'<a href="forum.php?mod=forumdisplay&amp;fid={fid}">{entry["section"]}</a></div>'
+                   f'<div id="postlist"><div id="post_{tid}"><table class="plhin"><tr><td class="plc">'
+                   f'<h1 class="ts"><span id="thread_subject">{escape(entry["code"])} 中文字幕</span></h1>'
+                   f'<div class="pcb"><div class="t_fsz"><table><tr><td class="t_f" id="postmessage_{tid}">'
+                   f'{body}</td></tr></table></div></div></td></tr></table></div></div>')
+        self._send_html(self._page(entry["section"], content))
+
+    def _pay_table(self, price: int) -> str:
+        return (f'<table class="list"><tr><td>作者</td><td>uploader</td></tr>'
+                f'<tr><td>售价(金钱)</td><td>{price}</td></tr>'
+                f'<tr><td>作者所得(金钱)</td><td>{max(price - 1, 0)}</td></tr>'
+                f'<tr><td>购买后余额(金钱)</td><td>{self.state.balance - price}</td></tr></table>')
+
+    def _pay_thread(self, method: str, tid: int, query: Dict[str, str]):
+        entry = self.state.by_tid.get(tid)
+        if entry is None:
+            return self._send_html(self._page("提示信息", "<p>主题不存在</p>"), 404)
+        if method == "POST":
+            if not self.state.pay(entry["price"]):
+                return self._send_html(self._page("提示信息", '<div class="alert_error">对不起，您的金钱不足，无法购买</div>'))
+            self.state.paid_threads.add(tid)
+            return self._redirect(f"/forum.php?mod=viewthread&tid={tid}")
+        form = (f'<form id="payform" method="post" action="forum.php?mod=misc&amp;action=pay&amp;paysubmit=yes&amp;tid={tid}">'
+                f'<h3 class="flb"><em>购买主题</em></h3>{self._pay_table(entry["price"])}'
+                f'<p class="o pns"><button type="submit" name="paysubmit" value="true" class="pn pnc"><span>购买主题</span></button></p></form>')
+        self._send_html(form if query.get("inajax") else self._page("购买主题", form))
+
+    def _pay_attachment(self, method: str, aid: int, query: Dict[str, str]):
+        entry = self.state.by_aid.get(aid)
+        if entry is None:
+            return self._send_html(self._page("提示信息", "<p>附件不存在</p>"), 404)
+        if method == "POST":
+            if not self.state.pay(entry["price"]):
+                return self._send_html(self._page("提示信息", '<div class="alert_error">对不起，您的金钱不足，无法购买</div>'))
+            self.state.paid_attachments.add(aid)
+            return self._redirect(f"/forum.php?mod=viewthread&tid={entry['tid']}")
+        form = (f'<form id="attachpayform" method="post" '
+                f'action="forum.php?mod=misc&amp;action=attachpay&amp;paysubmit=yes&amp;aid={aid}&amp;tid={entry["tid"]}">'
+                f'<h3 class="flb"><em>购买附件</em></h3>{self._pay_table(entry["price"])}'
+                f'<div class="o pns"><button type="submit" name="paysubmit" value="true" class="pn pnc"><span>购买附件</span></button></div></form>')
+        self._send_html(form if query.get("inajax") else self._page("购买附件", form))
+
+    def _attachment(self, aid: int):
+        entry = self.state.by_aid.get(aid)
+        if entry is None:
+            return self._send_html(self._page("提示信息", "<p>附件不存在</p>"), 404)
+        if entry["lock"] == "attach_pay" and aid not in self.state.paid_attachments:
+            return self._send_html(self._page("提示信息", '<div class="alert_info">本附件需要购买后才能下载</div>'))
+        data = self.state.archive(entry["code"])
+        with self.state.lock:
+            self.state.downloads += 1
+        filename = f"{entry['code']}.zip"
+        self.send_response(200)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Disposition", f"attachment; filename=\"{filename}\"; filename*=UTF-8''{quote(filename)}")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def start_standin(state: StandinState, host: str = "127.0.0.1", port: int = 0) -> Tuple[ThreadingHTTPServer, str]:
+    """在后台线程启动替身论坛，返回 (server, 站点地址)；port 为 0 时自动选择端口"""
+    server = ThreadingHTTPServer((host, port), StandinHandler)
+    server.daemon_threads = True
+    server.state = state
+    threading.Thread(target=server.serve_forever, name="forum-standin", daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def write_session_file(path: str, host: str = "127.0.0.1"):
+    """写入替身论坛的会话文件（storage_state 格式，带登录Cookie）"""
+    state = {"cookies": [{"name": AUTH_COOKIE, "value": "1", "domain": host, "path": "/",
+                          "expires": time.time() + 30 * 86400, "httpOnly": False, "secure": False, "sameSite": "Lax"}],
+             "origins": []}
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+
+
+# ==================== 基准测试 ====================
+
+def _load_downloader():
+    """加载 download-subtitle.py（文件名带连字符，不能直接 import）"""
+    path = Path(__file__).parent / "download-subtitle.py"
+    spec = importlib.util.spec_from_file_location("download_subtitle", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def run_benchmark(count: int = 20, workers: int = 1, latency_ms: float = 0.0, browser_search: bool = False,
+                  headed: bool = False, pages_dir: Optional[str] = None, seed: int = 733,
+                  keep: bool = False) -> Dict[str, Any]:
+    """
+    在临时工作目录中对替身论坛运行完整的批量下载流程
+
+    Returns:
+        Dict: {"codes","elapsed","throughput","stats","requests","downloads","trace_dir"}
+    """
+    catalogue = build_catalogue(count, seed)
+    state = StandinState(catalogue, latency_ms / 1000.0, browser_search, pages_dir)
+    server, base_url = start_standin(state)
+    workdir = tempfile.mkdtemp(prefix="forum-bench-")
+    trace_dir = os.path.join(workdir, "traces")
+    download_root = Path(__file__).parent / "output" / "downloads"
+    previous_cwd = os.getcwd()
+
+    # 所有状态写入临时目录：会话文件、actresses.db（相对路径）、缓存/任务/追踪库；关闭共享限速只测量流程本身。
+    # 合成字幕不能进入下载后处理（骑兵目录归档、上传后端），也不能租用正在运行的浏览器池
+    # （临时目录中的 ./session.json 与默认会话文件同名）
+    env = {
+        "FORUM_BASE_URL": base_url,
+        "FORUM_HEADLESS": "0" if headed else "1",
+        "SUBTITLE_CACHE_DB": os.path.join(workdir, "subtitle_cache.db"),
+        "DOWNLOAD_JOBS_DB": os.path.join(workdir, "download_jobs.db"),
+        "SUBTITLE_TRACE_DIR": trace_dir,
+        "RATE_BUDGET_DISABLED": "1",
+        "POST_DOWNLOAD_DISABLED": "1",
+        "BROWSER_FLEET_DISABLED": "1",
+    }
+    saved_env = {k: os.environ.get(k) for k in env}
+    os.environ.update(env)
+    try:
+        os.chdir(workdir)
+        write_session_file(os.path.join(workdir, "session.json"))
+        downloader = _load_downloader()
+        print(f"🧪 替身论坛: {base_url}，{count} 个编号，{workers} 个worker，每个请求延迟 {latency_ms:.0f}ms")
+        started = time.perf_counter()
+        stats = downloader.run_subtitle_batch(list(catalogue), delay=0.0, workers=workers)
+        elapsed = time.perf_counter() - started
+    finally:
+        os.chdir(previous_cwd)
+        for key, value in saved_env.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+        server.shutdown()
+        if not keep:
+            for code in catalogue:
+                shutil.rmtree(download_root / code, ignore_errors=True)
+
+    report = {
+        "codes": count,
+        "elapsed": elapsed,
+        "throughput": count / elapsed if elapsed > 0 else 0.0,
+        "stats": stats or {},
+        "requests": state.requests,
+        "downloads": state.downloads,
+        "trace_dir": trace_dir,
+        "workdir": workdir,
+    }
+    print_benchmark(report, catalogue)
+    if not keep:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return report
+
+
+def print_benchmark(report: Dict[str, Any], catalogue: Dict[str, Dict[str, Any]]):
+    """打印吞吐量、预期/实际结果与各阶段耗时"""
+    from tracing import load_records, print_summary
+
+    expected = sum(1 for entry in catalogue.values() if entry["section"])
+    stats = report["stats"]
+    print("=" * 96)
+    print("🧪 替身论坛基准测试")
+    print("=" * 96)
+    print(f"编号: {report['codes']}（有帖子 {expected}，无结果 {report['codes'] - expected}）")
+    print(f"耗时: {report['elapsed']:.1f}s  吞吐: {report['throughput'] * 60:.1f} 个/分钟")
+    print(f"结果: 成功 {stats.get('success', 0)}，失败 {stats.get('failed', 0)}，跳过 {stats.get('skipped', 0)}")
+    print(f"替身论坛: {report['requests']} 个请求，{report['downloads']} 次附件下载")
+    records = load_records(sorted(glob.glob(os.path.join(report["trace_dir"], "*.jsonl"))))
+    if records:
+        print_summary(records)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地 Discuz 替身论坛与字幕下载基准测试")
+    sub = parser.add_subparsers(dest="command")
+
+    serve = sub.add_parser("serve", help="启动替身论坛")
+    serve.add_argument("--count", type=int, default=50, help="模板生成的编号数量")
+    serve.add_argument("--port", type=int, default=8765, help="监听端口")
+    serve.add_argument("--session", default="./session_standin.json", help="写入的会话文件路径")
+
+    bench = sub.add_parser("bench", help="对替身论坛运行完整下载流程并汇总耗时")
+    bench.add_argument("--count", type=int, default=20, help="编号数量")
+    bench.add_argument("--workers", type=int, default=1, help="并发worker数")
+    bench.add_argument("--headed", action="store_true", help="显示浏览器窗口")
+    bench.add_argument("--keep", action="store_true", help="保留临时目录与下载的文件")
+
+    for p in (serve, bench):
+        p.add_argument("--latency-ms", type=float, default=0.0, help="每个请求的模拟延迟（毫秒）")
+        p.add_argument("--browser-search", action="store_true", help="搜索需要formhash，强制走浏览器搜索流程")
+        p.add_argument("--pages", help="录制页面目录（search-<编号>.html、thread-<tid>.html）")
+        p.add_argument("--seed", type=int, default=733, help="目录生成的随机种子")
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        catalogue = build_catalogue(args.count, args.seed)
+        state = StandinState(catalogue, args.latency_ms / 1000.0, args.browser_search, args.pages)
+        server, base_url = start_standin(state, port=args.port)
+        write_session_file(args.session)
+        print(f"🧪 替身论坛已启动: {base_url}/forum.php（{len(catalogue)} 个编号）")
+        print(f"   会话文件: {args.session}")
+        print(f"   示例: FORUM_BASE_URL={base_url} python download-subtitle.py --codes "
+              f"\"{','.join(list(catalogue)[:3])}\" --session-files {args.session}")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            server.shutdown()
+        return 0
+    if args.command == "bench":
+        report = run_benchmark(args.count, args.workers, args.latency_ms, args.browser_search,
+                               args.headed, args.pages, args.seed, args.keep)
+        if args.keep:
+            print(f"📁 临时目录: {report['workdir']}")
+        return 0
+    parser.print_help()
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+HAR 录制与回放
+extract_video_items、detect_pagination_style_and_max_pages、extract_video_metadata 等解析逻辑的改动
+只能对线上站点验证。本模块借助 Playwright 的 HAR 路由（context.route_from_har）：
+- 录制：--record-har 把一次抓取的全部请求与响应写入 HAR 文件（上下文关闭时落盘）
+- 回放：--replay-har 所有请求都从 HAR 文件应答，未录制的请求直接中止，不会访问站点；
+  回放时关闭共享限速与翻页抖动，耗时只取决于抓取流程本身
+- 回放时数据库写入回放专用的数据库（默认 HAR 文件旁的 <HAR>.replay.db，每次回放前重建；
+  可用 --replay-db 指定），不会改动 ./database/actresses.db
+- 基准测试：bench 子命令用爬虫的真实流程（crawl_actress_full 的翻页循环、流水线与解析服务）
+  回放 HAR 中录制的演员，输出 页/秒 与单个演员耗时
+
+录制与回放使用本地启动的浏览器，不租用浏览器池（browser_fleet）中的上下文。
+
+用法示例:
+  python videoID-spider-playwright-api.py --record-har ./har/crawl.har --actresses-max-pages 2 --max-actress-pages 3
+  python videoID-spider-playwright-api.py --replay-har ./har/crawl.har --delay 0
+  python video_detail_scraper.py --batch --limit 20 --record-har ./har/detail.har
+  python video_detail_scraper.py --url "https://missav.live/cn/umso-612" --no-save --replay-har ./har/detail.har
+  python har_replay.py list ./har/crawl.har
+  python har_replay.py bench ./har/crawl.har --rounds 3
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import re
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlparse, urlunparse
+
+
+_record_path: Optional[str] = None
+_replay_path: Optional[str] = None
+_replay_db: Optional[str] = None
+
+
+def default_replay_db(replay: str) -> str:
+    """回放默认使用的数据库：HAR 文件旁的 <HAR>.replay.db"""
+    return f"{os.path.splitext(replay)[0]}.replay.db"
+
+
+def reset_replay_db():
+    """删除回放数据库（含 WAL 文件），下次打开时重建为空库"""
+    if not _replay_db:
+        return
+    for suffix in ("", "-wal", "-shm"):
+        try:
+            os.remove(_replay_db + suffix)
+        except FileNotFoundError:
+            pass
+
+
+def configure_har(record: Optional[str] = None, replay: Optional[str] = None, replay_db: Optional[str] = None):
+    """
+    设置本进程的 HAR 模式（由脚本的 --record-har / --replay-har 参数调用）
+
+    回放时数据库改用 replay_db；未指定时使用 default_replay_db 并在开始前重建为空库
+
+    Raises:
+        ValueError: 同时指定录制与回放，或未回放时指定 replay_db
+        FileNotFoundError: 回放文件不存在
+    """
+    global _record_path, _replay_path, _replay_db
+    if record and replay:
+        raise ValueError("--record-har 与 --replay-har 不能同时使用")
+    if replay_db and not replay:
+        raise ValueError("--replay-db 只能与 --replay-har 一起使用")
+    if replay and not os.path.exists(replay):
+        raise FileNotFoundError(f"HAR文件不存在: {replay}")
+    _record_path, _replay_path = record, replay
+    _replay_db = (replay_db or default_replay_db(replay)) if replay else None
+    if replay:
+        # 回放不访问站点，共享限速只会拖慢回放
+        os.environ["RATE_BUDGET_DISABLED"] = "1"
+        if not replay_db:
+            reset_replay_db()
+        print(f"📼 回放数据库: {_replay_db}")
+
+
+def _existing_har(path: str) -> str:
+    if not os.path.exists(path):
+        raise argparse.ArgumentTypeError(f"HAR文件不存在: {path}")
+    return path
+
+
+def add_har_arguments(parser: argparse.ArgumentParser):
+    """为脚本添加 --record-har / --replay-har 参数"""
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--record-har", metavar="HAR", default=None, help="把本次抓取的请求与响应录制到HAR文件")
+    group.add_argument("--replay-har", metavar="HAR", type=_existing_har, default=None, help="从HAR文件回放，不访问站点")
+    parser.add_argument("--replay-db", metavar="DB", default=None,
+                        help="回放时写入的数据库（默认 <HAR>.replay.db，每次回放前重建）")
+
+
+def configure_from_args(args: argparse.Namespace):
+    """按命令行参数设置 HAR 模式"""
+    configure_har(getattr(args, "record_har", None), getattr(args, "replay_har", None),
+                  getattr(args, "replay_db", None))
+
+
+def replay_db_path() -> Optional[str]:
+    """回放模式下使用的数据库路径，未回放时返回 None"""
+    return _replay_db
+
+
+def database_path(default: str) -> str:
+    """脚本应使用的数据库路径：回放时为回放数据库，否则为 default"""
+    return _replay_db or default
+
+
+def har_active() -> bool:
+    """是否处于录制或回放模式"""
+    return bool(_record_path or _replay_path)
+
+
+def har_replaying() -> bool:
+    """是否处于回放模式"""
+    return bool(_replay_path)
+
+
+def apply_har(context):
+    """在新建的浏览器上下文上挂载 HAR 路由（未启用时不做任何事）"""
+    if _replay_path:
+        context.route_from_har(_replay_path, not_found="abort")
+        print(f"📼 HAR回放: {_replay_path}（未录制的请求将被中止）")
+    elif _record_path:
+        har_dir = os.path.dirname(_record_path)
+        if har_dir:
+            os.makedirs(har_dir, exist_ok=True)
+        context.route_from_har(_record_path, update=True, update_content="embed", update_mode="minimal")
+        print(f"📼 HAR录制: {_record_path}（浏览器上下文关闭时写入）")
+
+
+# ==================== 读取HAR ====================
+
+def load_har_entries(har_path: str) -> List[Dict[str, Any]]:
+    """读取 HAR 文件中的请求记录"""
+    with open(har_path, "r", encoding="utf-8") as f:
+        return json.load(f).get("log", {}).get("entries", [])
+
+
+def document_urls(har_path: str) -> List[str]:
+    """按录制顺序返回成功的 HTML 页面地址（去重）"""
+    urls = []
+    seen = set()
+    for entry in load_har_entries(har_path):
+        request = entry.get("request", {})
+        response = entry.get("response", {})
+        mime = (response.get("content", {}).get("mimeType") or "").lower()
+        if request.get("method") != "GET" or response.get("status") != 200 or "text/html" not in mime:
+            continue
+        url = request.get("url")
+        if url and url not in seen:
+            seen.add(url)
+            urls.append(url)
+    return urls
+
+
+def task_type_for_url(url: str) -> str:
+    """按地址判断解析任务类型（与 html_parsers.parse_html 的任务类型一致）"""
+    path = urlparse(url).path.rstrip("/")
+    if path.endswith("/actresses"):
+        return "list"
+    if "/actresses/" in path:
+        return "actress"
+    return "detail"
+
+
+# ==================== 基准测试 ====================
+
+def _percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def actress_page_groups(urls: List[str]) -> Dict[str, int]:
+    """按演员归并作品页（去掉 ?page=N 与 /page/N），返回 {演员页地址: 录制的页数}，保持录制顺序"""
+    groups: Dict[str, int] = {}
+    for url in urls:
+        if task_type_for_url(url) != "actress":
+            continue
+        parsed = urlparse(url)
+        root = urlunparse(parsed._replace(path=re.sub(r"/page/\d+/?$", "", parsed.path), query="", fragment=""))
+        groups[root] = groups.get(root, 0) + 1
+    return groups
+
+
+def _load_spider():
+    """加载 videoID-spider-playwright-api.py（文件名带连字符，不能直接 import）"""
+    path = Path(__file__).parent / "videoID-spider-playwright-api.py"
+    spec = importlib.util.spec_from_file_location("videoid_spider", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def run_replay_benchmark(har_path: str, rounds: int = 1, limit: Optional[int] = None,
+                         headless: bool = True, timeout: int = 30) -> Dict[str, Any]:
+    """
+    回放 HAR，用爬虫的真实流程抓取其中录制的演员：crawl_actress_full 的翻页循环、
+    iter_pages_pipelined 流水线与解析服务，写入回放数据库（每轮重建），统计吞吐与耗时
+
+    Args:
+        limit: 最多回放的演员数
+
+    Returns:
+        Dict: {"actresses","pages","failed","elapsed","pages_per_sec","actress_p50_s","actress_p95_s","videos"}
+    """
+    from playwright.sync_api import sync_playwright
+    from browser_fleet import USER_AGENT
+    from html_parsers import derive_actor_name_from_url
+
+    groups = actress_page_groups(document_urls(har_path))
+    actresses = list(groups.items())[:limit] if limit else list(groups.items())
+    if not actresses:
+        raise ValueError(f"HAR文件中没有可回放的演员页面: {har_path}")
+
+    configure_har(replay=har_path)
+    spider = _load_spider()
+    actress_s: List[float] = []
+    videos = 0
+    failed = 0
+
+    with sync_playwright() as playwright:
+        browser = playwright.chromium.launch(headless=headless)
+        context = browser.new_context(user_agent=USER_AGENT, viewport={"width": 1920, "height": 1080})
+        apply_har(context)
+        page = context.new_page()
+        requests_start = spider.get_page_request_count()
+        started = time.perf_counter()
+        try:
+            for round_no in range(1, rounds + 1):
+                # 每轮从空库开始，断点续传不会让后续轮次跳过页面
+                reset_replay_db()
+                progress_manager = spider.ProgressManager()
+                for actress_url, recorded_pages in actresses:
+                    t0 = time.perf_counter()
+                    try:
+                        videos += spider.crawl_actress_full(page, progress_manager,
+                                                            derive_actor_name_from_url(actress_url), actress_url,
+                                                            timeout, 0, 0, recorded_pages)
+                    except Exception as e:
+                        failed += 1
+                        print(f"⚠️ 回放失败 {actress_url}: {e}")
+                        continue
+                    actress_s.append(time.perf_counter() - t0)
+                print(f"🔁 第 {round_no}/{rounds} 轮完成：{len(actresses)} 个演员")
+            elapsed = time.perf_counter() - started
+        finally:
+            context.close()
+            browser.close()
+
+    pages = spider.get_page_request_count() - requests_start
+    return {
+        "actresses": len(actress_s),
+        "pages": pages,
+        "failed": failed,
+        "elapsed": elapsed,
+        "pages_per_sec": pages / elapsed if elapsed > 0 else 0.0,
+        "actress_p50_s": _percentile(actress_s, 50),
+        "actress_p95_s": _percentile(actress_s, 95),
+        "videos": videos,
+    }
+
+
+def print_benchmark(har_path: str, report: Dict[str, Any]):
+    """打印回放基准测试结果"""
+    print("=" * 72)
+    print(f"📼 HAR回放基准测试: {har_path}")
+    print("=" * 72)
+    print(f"演员: {report['actresses']}（失败 {report['failed']}）  页面: {report['pages']}  "
+          f"耗时: {report['elapsed']:.2f}s  吞吐: {report['pages_per_sec']:.2f} 页/秒")
+    print(f"单个演员: p50 {report['actress_p50_s']:.2f}s  p95 {report['actress_p95_s']:.2f}s")
+    print(f"写入视频: {report['videos']}（回放数据库 {replay_db_path()}）")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HAR 录制回放工具")
+    sub = parser.add_subparsers(dest="command")
+
+    list_cmd = sub.add_parser("list", help="列出HAR中可回放的页面")
+    list_cmd.add_argument("har", help="HAR文件路径")
+
+    bench = sub.add_parser("bench", help="用爬虫流程回放HAR中的演员并统计 页/秒")
+    bench.add_argument("har", help="HAR文件路径")
+    bench.add_argument("--rounds", type=int, default=1, help="回放轮数")
+    bench.add_argument("--limit", type=int, default=None, help="最多回放的演员数")
+    bench.add_argument("--timeout", type=int, default=30, help="页面加载超时时间（秒）")
+    bench.add_argument("--headed", action="store_true", help="显示浏览器窗口")
+    bench.add_argument("--json", action="store_true", help="以JSON输出结果")
+    args = parser.parse_args()
+
+    if args.command == "list":
+        urls = document_urls(args.har)
+        for url in urls:
+            print(f"{task_type_for_url(url):<8}{url}")
+        print(f"共 {len(urls)} 个页面")
+        return 0
+    if args.command == "bench":
+        report = run_replay_benchmark(args.har, args.rounds, args.limit, not args.headed, args.timeout)
+        if args.json:
+            print(json.dumps(report, ensure_ascii=False, indent=2))
+        else:
+            print_benchmark(args.har, report)
+        return 0 if report["pages"] else 1
+    parser.print_help()
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,435 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+HTML解析模块
+爬虫与详情抓取共用的纯解析函数：输入原始HTML，输出普通的列表/字典，
+不依赖浏览器对象，可以在解析进程池（见 parse_service.py）中执行
+
+任务类型:
+- list:    演员列表页 -> 演员详情页URL列表
+- actress: 演员作品页 -> [(标题, 作品URL), ...]
+- detail:  视频详情页 -> {"description", "metadata", "cover_url"}
+"""
+
+import re
+from typing import Any, Dict, List, Tuple
+from urllib.parse import urljoin, urlparse, urlunparse, parse_qs, urlencode, unquote
+
+from bs4 import BeautifulSoup
+
+
+ACTRESS_LIST_URL = "https://missav.live/cn/actresses"
+
+# 解析前剔除的大块内容（内联脚本/样式/注释），缩小跨进程传输的HTML体积
+_HEAVY_BLOCK_PATTERN = re.compile(r"<script\b[^>]*>.*?</script>|<style\b[^>]*>.*?</style>|<!--.*?-->",
+                                  re.IGNORECASE | re.DOTALL)
+
+
+def shrink_html(html: str) -> str:
+    """剔除脚本、样式和注释，解析所需的标签与属性保持不变"""
+    if not html:
+        return ""
+    return _HEAVY_BLOCK_PATTERN.sub("", html)
+
+
+# ==================== 番号与演员名 ====================
+
+def normalize_video_id(text: str) -> Tuple[str, str]:
+    """从文本中提取并标准化视频ID"""
+    if not text:
+        return "", ""
+    
+    # 常见的视频ID模式
+    patterns = [
+        # FC2-PPV 系列
+        (r'\bFC2[-\s]*PPV[-\s]*(\d+)\b', "FC2-PPV", lambda m: f"FC2-PPV-{m.group(1)}"),
+        # 标准番号格式 (字母-数字)
+        (r'\b([A-Z]{2,10})[-\s]*(\d{3,6})\b', "STANDARD", lambda m: f"{m.group(1)}-{m.group(2).zfill(3)}"),
+        # 纯数字ID
+        (r'\b(\d{6,10})\b', "NUMERIC", lambda m: m.group(1)),
+    ]
+    
+    text_upper = text.upper()
+    
+    for pattern, pattern_type, formatter in patterns:
+        match = re.search(pattern, text_upper)
+        if match:
+            try:
+                return formatter(match), pattern_type
+            except:
+                continue
+    
+    return "", ""
+
+
+def derive_actor_name_from_url(url: str) -> str:
+    """从URL推导演员名"""
+    try:
+        path = urlparse(url).path or ""
+        if path.endswith("/"):
+            path = path[:-1]
+        last = path.rsplit("/", 1)[-1] if path else ""
+        name = unquote(last).strip()
+        return name or "unknown"
+    except Exception:
+        return "unknown"
+
+
+def is_valid_actress_name(actress_name: str) -> bool:
+    """
+    检查演员名是否有效，过滤掉纯数字和字母数字组合的演员名
+    
+    过滤规则:
+    - 纯数字: 如 "123456" -> False
+    - 字母数字组合: 如 "abc123", "123abc", "a1b2c3" -> False
+    - 纯字母: 如 "张三", "田中美奈子", "Yui" -> True
+    - 包含中文、日文、韩文等非ASCII字符: -> True
+    """
+    if not actress_name or actress_name == "unknown":
+        return False
+    
+    # 移除常见的URL编码字符和特殊字符进行检查
+    clean_name = actress_name.replace("-", "").replace("_", "").replace(".", "").strip()
+    
+    if not clean_name:
+        return False
+    
+    # 检查是否为纯数字
+    if clean_name.isdigit():
+        print(f"过滤纯数字演员名: {actress_name}")
+        return False
+    
+    # 检查是否为字母数字组合（同时包含字母和数字）
+    has_letter = any(c.isalpha() for c in clean_name)
+    has_digit = any(c.isdigit() for c in clean_name)
+    
+    if has_letter and has_digit:
+        # 进一步检查是否只包含ASCII字母和数字（排除中文、日文等）
+        ascii_only = all(c.isalnum() for c in clean_name)
+        if ascii_only:
+            print(f"过滤字母数字组合演员名: {actress_name}")
+            return False
+    
+    # 其他情况都认为是有效的演员名
+    return True
+
+
+# ==================== 演员页 ====================
+
+def extract_video_items(soup: BeautifulSoup, base_url: str) -> List[Tuple[str, str]]:
+    """从演员页中提取视频条目"""
+    items = []
+    seen = set()
+
+    # 优先：a 标签文本包含番号
+    for a in soup.find_all("a"):
+        txt = a.get_text(" ", strip=True)
+        if not txt:
+            continue
+        
+        vid, _ = normalize_video_id(txt)
+        if not vid:
+            continue
+        
+        href = a.get("href") or ""
+        abs_url = urljoin(base_url, href) if href else ""
+        if not abs_url:
+            continue
+        
+        path = (urlparse(abs_url).path or "").lower()
+        
+        # 显式忽略非作品链接
+        if "/actresses/ranking" in path:
+            continue
+        
+        # 仅接受与番号对应的作品详情URL
+        slug = vid.lower()
+        candidates = {slug}
+        
+        # FC2 两种常见形式互相兼容
+        if slug.startswith("fc2-ppv-"):
+            candidates.add(slug.replace("fc2-ppv-", "fc2-"))
+        if slug.startswith("fc2-") and not slug.startswith("fc2-ppv-"):
+            candidates.add(slug.replace("fc2-", "fc2-ppv-"))
+        
+        # 匹配基本形式或后缀扩展形式
+        if not any(c in path for c in candidates) and not any((c + "-") in path for c in candidates):
+            continue
+        
+        key = abs_url or (txt + "|" + base_url)
+        if key in seen:
+            continue
+        
+        seen.add(key)
+        items.append((txt, abs_url))
+
+    # 次选：img alt 属性包含番号
+    for img in soup.find_all("img"):
+        alt = img.get("alt", "").strip()
+        if not alt:
+            continue
+        
+        vid, _ = normalize_video_id(alt)
+        if not vid:
+            continue
+        
+        # 查找包含此图片的链接
+        parent_a = img.find_parent("a")
+        if not parent_a:
+            continue
+        
+        href = parent_a.get("href") or ""
+        abs_url = urljoin(base_url, href) if href else ""
+        if not abs_url:
+            continue
+        
+        key = abs_url or (alt + "|" + base_url)
+        if key in seen:
+            continue
+        
+        seen.add(key)
+        items.append((alt, abs_url))
+
+    return items
+
+
+def detect_pagination_style_and_max_pages(soup: BeautifulSoup, actress_url: str, max_pages: int) -> List[str]:
+    """检测分页样式并生成分页URL列表"""
+    numbers = []
+    style = None
+    
+    # 查找分页链接
+    for a in soup.find_all("a"):
+        href = a.get("href", "")
+        if not href:
+            continue
+        
+        # 检查是否为分页链接
+        if re.search(r'/page/\d+', href):
+            style = "path"
+            match = re.search(r'/page/(\d+)', href)
+            if match:
+                numbers.append(int(match.group(1)))
+        elif "page=" in href:
+            style = "query"
+            parsed = urlparse(href)
+            query_params = parse_qs(parsed.query)
+            if "page" in query_params:
+                try:
+                    numbers.append(int(query_params["page"][0]))
+                except (ValueError, IndexError):
+                    pass
+    
+    # 如果没有检测到分页样式，默认使用query风格
+    if style is None:
+        style = "query"
+    
+    max_num = max(numbers) if numbers else 1
+    max_num = min(max_num, max_pages)
+    
+    # 生成完整分页URL列表
+    urls = []
+    if style == "path":
+        # /.../page/N 风格
+        base = urlparse(actress_url)
+        base_path = base.path.rstrip("/")
+        for i in range(1, max_num + 1):
+            if i == 1:
+                urls.append(actress_url)
+            else:
+                new_path = f"{base_path}/page/{i}"
+                urls.append(urlunparse((base.scheme, base.netloc, new_path, "", "", "")))
+    else:
+        # 默认和 MissAV 一致：?page=N 风格
+        parsed = urlparse(actress_url)
+        base_q = parse_qs(parsed.query)
+        base_q.pop("page", None)
+        # page=1 使用原始 URL，其余使用 ?page=i
+        urls.append(urlunparse(parsed._replace(query=urlencode(base_q, doseq=True))))
+        for i in range(2, max_num + 1):
+            q = {**base_q, "page": [i]}
+            urls.append(urlunparse(parsed._replace(query=urlencode(q, doseq=True))))
+    
+    return urls
+
+
+def parse_actress_page(content: str, page_url: str) -> List[Tuple[str, str]]:
+    """解析演员作品页HTML并提取视频条目（可在后台线程中执行）"""
+    soup = BeautifulSoup(content, "html.parser")
+    return extract_video_items(soup, page_url)
+
+
+# ==================== 演员列表页 ====================
+
+def parse_list_page(html: str, base_url: str = ACTRESS_LIST_URL) -> List[str]:
+    """解析演员列表页，返回本页的演员详情页URL（按出现顺序去重，已过滤无效演员名）"""
+    soup = BeautifulSoup(html, "html.parser")
+    urls = []
+    seen = set()
+    
+    for a in soup.find_all("a", href=True):
+        href = a.get("href", "")
+        if not href:
+            continue
+        # 仅保留符合 /actresses/ 的详情页，且排除排行榜
+        if "/actresses/" in href and "/actresses/ranking" not in href:
+            abs_url = urljoin(base_url, href)
+            if abs_url in seen:
+                continue
+            seen.add(abs_url)
+            # 从URL提取演员名并进行过滤
+            if not is_valid_actress_name(derive_actor_name_from_url(abs_url)):
+                continue
+            urls.append(abs_url)
+    
+    return urls
+
+
+# ==================== 视频详情页 ====================
+
+def extract_video_description(soup: BeautifulSoup) -> str:
+    """提取视频详情描述"""
+    # 查找包含 line-clamp-2 类的 div 元素
+    desc_div = soup.find("div", class_=lambda x: x and "line-clamp-2" in x)
+    if desc_div:
+        return desc_div.get_text(strip=True)
+    return ""
+
+
+def extract_cover_url(soup: BeautifulSoup) -> str:
+    """提取视频封面URL - 优化版本"""
+    # 优化：直接查找最常见的情况 - video标签的data-poster属性
+    video_tag = soup.find("video", {"data-poster": True})
+    if video_tag:
+        poster_url = video_tag.get("data-poster")
+        if poster_url and poster_url.strip():
+            return poster_url.strip()
+    
+    # 备用方案1: 查找video标签的poster属性
+    video_tag = soup.find("video", poster=True)
+    if video_tag:
+        poster_url = video_tag.get("poster")
+        if poster_url and poster_url.strip():
+            return poster_url.strip()
+    
+    # 备用方案2: 查找包含 plyr__poster 类的 div 元素
+    poster_div = soup.find("div", class_="plyr__poster")
+    if poster_div:
+        style = poster_div.get("style", "")
+        if "background-image" in style:
+            # 从 style 属性中提取 URL
+            match = re.search(r'url\(&quot;([^&]+)&quot;\)', style)
+            if match:
+                return match.group(1)
+            match = re.search(r'url\(["\']([^"\']+)["\']\)', style)
+            if match:
+                return match.group(1)
+    
+    return ""
+
+
+def extract_video_metadata(soup: BeautifulSoup) -> Dict[str, any]:
+    """提取视频元数据信息"""
+    metadata = {
+        "release_date": "",
+        "video_id": "",
+        "title": "",
+        "actresses": [],
+        "actors": [],
+        "genres": [],
+        "series": "",
+        "maker": "",
+        "director": "",
+        "label": ""
+    }
+    
+    # 查找包含元数据的 div.space-y-2
+    metadata_div = soup.find("div", class_="space-y-2")
+    if not metadata_div:
+        return metadata
+    
+    # 提取各个字段
+    for div in metadata_div.find_all("div", class_="text-secondary"):
+        text = div.get_text(strip=True)
+        
+        if text.startswith("发行日期:"):
+            time_elem = div.find("time")
+            if time_elem:
+                metadata["release_date"] = time_elem.get("datetime", "").split("T")[0]
+        
+        elif text.startswith("番号:"):
+            span = div.find("span", class_="font-medium")
+            if span:
+                metadata["video_id"] = span.get_text(strip=True)
+        
+        elif text.startswith("标题:"):
+            span = div.find("span", class_="font-medium")
+            if span:
+                metadata["title"] = span.get_text(strip=True)
+        
+        elif text.startswith("女优:"):
+            actresses = []
+            for a in div.find_all("a", class_="text-nord13"):
+                actresses.append(a.get_text(strip=True))
+            metadata["actresses"] = actresses
+        
+        elif text.startswith("男优:"):
+            actors = []
+            for a in div.find_all("a", class_="text-nord13"):
+                actors.append(a.get_text(strip=True))
+            metadata["actors"] = actors
+        
+        elif text.startswith("类型:"):
+            genres = []
+            for a in div.find_all("a", class_="text-nord13"):
+                genres.append(a.get_text(strip=True))
+            metadata["genres"] = genres
+        
+        elif text.startswith("系列:"):
+            a = div.find("a", class_="text-nord13")
+            if a:
+                metadata["series"] = a.get_text(strip=True)
+        
+        elif text.startswith("发行商:"):
+            a = div.find("a", class_="text-nord13")
+            if a:
+                metadata["maker"] = a.get_text(strip=True)
+        
+        elif text.startswith("导演:"):
+            a = div.find("a", class_="text-nord13")
+            if a:
+                metadata["director"] = a.get_text(strip=True)
+        
+        elif text.startswith("标籤:"):
+            a = div.find("a", class_="text-nord13")
+            if a:
+                metadata["label"] = a.get_text(strip=True)
+    
+    return metadata
+
+
+def parse_detail_page(html: str, page_url: str = "") -> Dict[str, Any]:
+    """解析视频详情页，返回描述、元数据和封面URL"""
+    soup = BeautifulSoup(html, "html.parser")
+    return {
+        "description": extract_video_description(soup),
+        "metadata": extract_video_metadata(soup),
+        "cover_url": extract_cover_url(soup),
+    }
+
+
+# ==================== 任务分发 ====================
+
+PARSERS = {
+    "list": parse_list_page,
+    "actress": parse_actress_page,
+    "detail": parse_detail_page,
+}
+
+
+def parse_html(task_type: str, html: str, url: str) -> Any:
+    """按任务类型解析HTML（解析进程池的统一入口）"""
+    parser = PARSERS.get(task_type)
+    if parser is None:
+        raise ValueError(f"未知的解析任务类型: {task_type}")
+    return parser(html, url)
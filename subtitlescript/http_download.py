@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+直链附件的HTTP流式下载
+Playwright 的 expect_download + save_as 先把文件下载到浏览器临时目录再复制，下载中断只能从头再来。
+链接本身就是文件地址（如 tu.ymawv.la 上的 .rar/.zip）时，改用 requests 携带浏览器上下文的 Cookie 与 UA 流式下载：
+- 写入 <目标文件>.part，中断后用 Range 请求从已下载的位置继续（服务器不支持 Range 时从头下载）
+- 完成后 fsync、计算 SHA-256 并 os.replace 原子改名，不会留下半个文件
+- 返回文件大小与 SHA-256，由调用方记录到下载任务并按哈希去重
+
+设置环境变量 HTTP_DOWNLOAD_DISABLED=1 可始终使用浏览器下载。
+"""
+
+import hashlib
+import os
+import re
+import time
+from typing import Any, Dict, Optional
+from urllib.parse import unquote, urlparse
+
+import requests
+
+from rate_limiter import acquire_for_url
+
+
+# 直链文件后缀（按URL路径判断）
+DIRECT_FILE_EXTS = ['.zip', '.rar', '.7z', '.ass', '.srt', '.ssa', '.vtt']
+
+CHUNK_SIZE = 256 * 1024
+
+
+def http_download_enabled() -> bool:
+    """流式下载是否启用"""
+    return os.environ.get("HTTP_DOWNLOAD_DISABLED") != "1"
+
+
+def is_direct_file_url(url: str) -> bool:
+    """URL路径是否直接指向文件（论坛 attachment 等需要跳转/鉴权的链接不算）"""
+    if not url:
+        return False
+    parsed = urlparse(url)
+    if parsed.scheme not in ("http", "https"):
+        return False
+    return unquote(parsed.path).lower().endswith(tuple(DIRECT_FILE_EXTS))
+
+
+def filename_from_url(url: str) -> str:
+    """从URL路径取文件名"""
+    name = os.path.basename(unquote(urlparse(url).path))
+    return re.sub(r'[\\/:*?"<>|]', "_", name) or "download.bin"
+
+
+def sha256_file(path: str) -> str:
+    """计算文件SHA-256"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def session_from_context(context, url: str, referer: Optional[str] = None,
+                         user_agent: Optional[str] = None) -> requests.Session:
+    """用浏览器上下文中对应URL的Cookie构造 requests 会话"""
+    session = requests.Session()
+    try:
+        for cookie in context.cookies(url):
+            session.cookies.set(cookie["name"], cookie["value"], domain=cookie.get("domain"), path=cookie.get("path", "/"))
+    except Exception as e:
+        print(f"⚠️ 读取浏览器Cookie失败，尝试无Cookie下载: {e}")
+    if user_agent:
+        session.headers["User-Agent"] = user_agent
+    if referer:
+        session.headers["Referer"] = referer
+    return session
+
+
+def stream_download(session: requests.Session, url: str, save_path: str,
+                    retries: int = 3, timeout: float = 30.0) -> Dict[str, Any]:
+    """
+    流式下载到 save_path，支持断点续传与原子写入
+
+    Args:
+        session: 已携带Cookie的 requests 会话
+        url: 文件直链
+        save_path: 最终保存路径
+        retries: 网络中断后的续传次数
+        timeout: 连接/读取超时（秒）
+
+    Returns:
+        Dict: {"path", "size", "sha256", "resumed_bytes", "elapsed"}
+
+    Raises:
+        requests.RequestException / OSError: 重试用尽仍未完成
+    """
+    part_path = save_path + ".part"
+    os.makedirs(os.path.dirname(save_path) or ".", exist_ok=True)
+    started = time.time()
+    resumed_bytes = 0
+    last_error: Optional[Exception] = None
+
+    for attempt in range(retries + 1):
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+        try:
+            acquire_for_url(url)
+            with session.get(url, headers=headers, stream=True, timeout=timeout, allow_redirects=True) as resp:
+                if resp.status_code == 416 and offset:
+                    # 已下载部分就是完整文件（服务器返回 bytes */总长度）
+                    total = resp.headers.get("Content-Range", "").rpartition("/")[2]
+                    if total.isdigit() and int(total) == offset:
+                        break
+                    os.remove(part_path)
+                    continue
+                resp.raise_for_status()
+                if offset and resp.status_code != 206:
+                    # 服务器不支持 Range，从头下载
+                    print("ℹ️ 服务器不支持断点续传，从头下载")
+                    offset = 0
+                content_type = resp.headers.get("Content-Type", "")
+                if "text/html" in content_type:
+                    raise requests.RequestException(f"返回的是网页而不是文件（{content_type}）")
+                if offset:
+                    resumed_bytes = offset
+                    print(f"⏯️ 从 {offset / 1024:.0f} KB 处继续下载")
+                with open(part_path, "ab" if offset else "wb") as f:
+                    for chunk in resp.iter_content(CHUNK_SIZE):
+                        if chunk:
+                            f.write(chunk)
+                    f.flush()
+                    os.fsync(f.fileno())
+                expected = resp.headers.get("Content-Length")
+                encoded = resp.headers.get("Content-Encoding", "identity") != "identity"
+                if (expected and expected.isdigit() and not encoded
+                        and os.path.getsize(part_path) != offset + int(expected)):
+                    raise requests.RequestException("下载不完整")
+            break
+        except (requests.RequestException, OSError) as e:
+            last_error = e
+            if attempt < retries:
+                wait = 2 ** attempt
+                print(f"⚠️ 下载中断（{e}），{wait} 秒后续传（{attempt + 1}/{retries}）")
+                time.sleep(wait)
+    else:
+        raise last_error or requests.RequestException("下载失败")
+
+    sha256 = sha256_file(part_path)
+    os.replace(part_path, save_path)
+    return {
+        "path": save_path,
+        "size": os.path.getsize(save_path),
+        "sha256": sha256,
+        "resumed_bytes": resumed_bytes,
+        "elapsed": round(time.time() - started, 2),
+    }
+
+
+def download_direct_link(page, url: str, save_root: str, filename: Optional[str] = None,
+                         retries: int = 3) -> Optional[Dict[str, Any]]:
+    """
+    用页面所在浏览器上下文的Cookie流式下载直链
+
+    Args:
+        page: Playwright Page（或 Frame，取其 page）
+        url: 文件直链
+        save_root: 保存目录
+        filename: 保存文件名，默认取URL中的文件名
+
+    Returns:
+        Dict: stream_download 的结果；未启用、不是直链或下载失败时返回 None（调用方回退到浏览器下载）
+    """
+    if not http_download_enabled() or not is_direct_file_url(url):
+        return None
+    page = getattr(page, "page", None) or page
+    try:
+        context = page.context
+        user_agent = page.evaluate("navigator.userAgent")
+        referer = page.url
+    except Exception as e:
+        print(f"⚠️ 无法读取浏览器会话，回退到浏览器下载: {e}")
+        return None
+
+    save_path = os.path.join(save_root, filename or filename_from_url(url))
+    print(f"⬇️ 流式下载直链: {url}")
+    try:
+        result = stream_download(session_from_context(context, url, referer, user_agent), url, save_path, retries=retries)
+    except Exception as e:
+        print(f"⚠️ 流式下载失败，回退到浏览器下载（已下载部分保留以便续传）: {e}")
+        return None
+    print(f"✅ 流式下载完成: {save_path}（{result['size'] / 1024:.0f} KB，sha256 {result['sha256'][:12]}…）")
+    return result
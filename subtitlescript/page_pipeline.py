@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分页预取流水线
+抓取第 N+1 页的同时在后台线程解析第 N 页，浏览器不再因为Python解析而空闲
+
+Playwright同步API的页面对象不是线程安全的，因此抓取始终在调用线程中进行，
+只有解析（BeautifulSoup + 条目提取）交给后台执行器；共享限速仍在抓取函数内生效。
+
+用法示例:
+    for result in iter_pages_pipelined(pages, fetch, parse, lookahead=1):
+        if result["error"]:
+            ...
+        for title, url in result["items"]:
+            ...
+"""
+
+from collections import deque
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Tuple
+
+
+def _failed_future(error: BaseException) -> Future:
+    """构造一个已携带异常的Future，抓取失败的页面与解析失败的页面统一处理"""
+    future: Future = Future()
+    future.set_exception(error)
+    return future
+
+
+def iter_pages_pipelined(pages: Iterable[Tuple[int, str]],
+                         fetch: Callable[[int, str], str],
+                         parse: Callable[[str, str], Any],
+                         lookahead: int = 1,
+                         executor: Optional[Executor] = None) -> Iterator[Dict[str, Any]]:
+    """
+    按顺序返回每一页的解析结果，内部最多提前抓取 lookahead 页
+
+    Args:
+        pages: (页码, 页面URL) 序列，可以是惰性生成器（例如按请求预算提前终止）
+        fetch: 抓取函数 fetch(page_no, page_url) -> html，在调用线程中执行
+        parse: 解析函数 parse(html, page_url) -> 结果，在执行器中执行
+        lookahead: 提前抓取的页数，越大占用内存越多，1 即可让抓取与解析重叠
+        executor: 解析执行器，默认使用单个后台线程
+
+    Yields:
+        Dict: {"page_no", "page_url", "items", "error"}，抓取或解析失败时 items 为 None
+    """
+    own_executor = executor is None
+    if own_executor:
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="page-parse")
+
+    pending: deque = deque()
+
+    def resolve(entry) -> Dict[str, Any]:
+        page_no, page_url, content, future = entry
+        try:
+            return {"page_no": page_no, "page_url": page_url, "items": future.result(), "error": None}
+        except BrokenProcessPool:
+            # 解析进程池中途失效（工作进程被杀等）：页面已抓取，在调用线程中重新解析，不丢弃该页
+            try:
+                return {"page_no": page_no, "page_url": page_url, "items": parse(content, page_url), "error": None}
+            except Exception as e:
+                return {"page_no": page_no, "page_url": page_url, "items": None, "error": e}
+        except Exception as e:
+            return {"page_no": page_no, "page_url": page_url, "items": None, "error": e}
+
+    try:
+        for page_no, page_url in pages:
+            content = None
+            try:
+                content = fetch(page_no, page_url)
+                future = executor.submit(parse, content, page_url)
+            except Exception as e:
+                future = _failed_future(e)
+            pending.append((page_no, page_url, content, future))
+
+            # 超出预取窗口时交付最早的一页，交付期间后台继续解析刚抓取的页面
+            if len(pending) > max(0, lookahead):
+                yield resolve(pending.popleft())
+
+        while pending:
+            yield resolve(pending.popleft())
+    finally:
+        # 消费方提前退出（break/异常）时丢弃未交付的结果
+        for _, _, _, future in pending:
+            future.cancel()
+        if own_executor:
+            executor.shutdown(wait=True)
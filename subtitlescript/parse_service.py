@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+HTML解析服务
+BeautifulSoup解析是纯CPU操作且持有GIL，抓取并发提高后单核解析会成为瓶颈。
+本模块提供基于 ProcessPoolExecutor 的解析服务：主进程只传入原始HTML与任务类型，
+工作进程返回普通的列表/字典结果（见 html_parsers.py）
+
+- 工作进程启动时预先导入解析依赖并常驻复用，避免每个任务重复初始化
+- 发送前剔除脚本/样式/注释，减小跨进程传输的数据量
+- 任务量较小或设置 PARSE_WORKERS=0 时回退为进程内解析（单个后台线程）
+- 接口兼容 Executor.submit，可直接作为 page_pipeline.iter_pages_pipelined 的执行器
+
+环境变量:
+PARSE_WORKERS  解析进程数，默认 CPU核数-1，0 表示始终进程内解析
+"""
+
+import atexit
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Optional
+
+from html_parsers import parse_html, shrink_html
+
+
+# 预计任务数低于该值时不启动进程池
+DEFAULT_MIN_TASKS_FOR_POOL = 8
+
+
+def default_worker_count() -> int:
+    """默认解析进程数：环境变量 PARSE_WORKERS 优先，否则为 CPU核数-1"""
+    value = os.environ.get("PARSE_WORKERS")
+    if value is not None:
+        try:
+            return max(0, int(value))
+        except ValueError:
+            pass
+    return max(1, (os.cpu_count() or 2) - 1)
+
+
+def _warm_worker():
+    """工作进程初始化：预先完成解析器的导入与首次构建"""
+    from bs4 import BeautifulSoup
+    BeautifulSoup("<html><body><a href='/'>warm</a></body></html>", "html.parser")
+
+
+class ParseService:
+    """HTML解析服务（进程池 + 进程内回退）"""
+
+    def __init__(self, workers: Optional[int] = None, min_tasks_for_pool: int = DEFAULT_MIN_TASKS_FOR_POOL):
+        """
+        初始化解析服务
+
+        Args:
+            workers: 解析进程数，None 表示使用 default_worker_count()
+            min_tasks_for_pool: 预计任务数低于该值时使用进程内解析
+        """
+        self.workers = default_worker_count() if workers is None else workers
+        self.min_tasks_for_pool = min_tasks_for_pool
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._inline: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    @property
+    def mode(self) -> str:
+        """当前解析方式：process 或 inline"""
+        return "process" if self._pool is not None else "inline"
+
+    def start(self, expected_tasks: Optional[int] = None):
+        """
+        根据预计任务数决定是否启动进程池（已启动则保持不变）
+
+        Args:
+            expected_tasks: 预计解析任务数，None 表示未知（按大批量处理）
+        """
+        with self._lock:
+            if self._pool is not None or self.workers <= 1:
+                return
+            if expected_tasks is not None and expected_tasks < self.min_tasks_for_pool:
+                return
+            try:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_warm_worker)
+                print(f"解析进程池已启动: {self.workers} 个进程")
+            except (OSError, NotImplementedError) as e:
+                print(f"解析进程池启动失败，使用进程内解析: {e}")
+                self._pool = None
+
+    def _inline_executor(self) -> ThreadPoolExecutor:
+        """进程内解析使用的单个后台线程（保留抓取与解析的重叠）"""
+        with self._lock:
+            if self._inline is None:
+                self._inline = ThreadPoolExecutor(max_workers=1, thread_name_prefix="parse-inline")
+            return self._inline
+
+    def _fallback_to_inline(self, error: BaseException):
+        """进程池异常（工作进程被杀等）时永久回退为进程内解析"""
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            print(f"解析进程池不可用，回退为进程内解析: {error}")
+            pool.shutdown(wait=False)
+
+    def submit(self, fn, *args, **kwargs) -> Future:
+        """
+        提交解析任务（兼容 Executor.submit）
+
+        进程池模式下 fn 必须是可导入的模块级函数（如 html_parsers 中的解析函数），
+        第一个参数为HTML时会先剔除脚本/样式以减小传输量
+        """
+        return self._submit(fn, args, kwargs, html_index=0)
+
+    def submit_parse(self, task_type: str, html: str, url: str) -> Future:
+        """按任务类型（list/actress/detail）提交解析，HTML为第二个参数"""
+        return self._submit(parse_html, (task_type, html, url), {}, html_index=1)
+
+    def _submit(self, fn, args: tuple, kwargs: dict, html_index: int) -> Future:
+        pool = self._pool
+        if pool is not None:
+            if len(args) > html_index and isinstance(args[html_index], str):
+                args = args[:html_index] + (shrink_html(args[html_index]),) + args[html_index + 1:]
+            try:
+                return pool.submit(fn, *args, **kwargs)
+            except (BrokenProcessPool, RuntimeError) as e:
+                self._fallback_to_inline(e)
+        return self._inline_executor().submit(fn, *args, **kwargs)
+
+    def parse(self, task_type: str, html: str, url: str) -> Any:
+        """同步解析，进程池失效时自动在进程内重试"""
+        try:
+            return self.submit_parse(task_type, html, url).result()
+        except BrokenProcessPool as e:
+            self._fallback_to_inline(e)
+            return parse_html(task_type, html, url)
+
+    def shutdown(self, wait: bool = True):
+        """关闭进程池与后台线程"""
+        with self._lock:
+            pool, self._pool = self._pool, None
+            inline, self._inline = self._inline, None
+        if pool is not None:
+            pool.shutdown(wait=wait)
+        if inline is not None:
+            inline.shutdown(wait=wait)
+
+
+_parse_service: Optional[ParseService] = None
+_parse_service_lock = threading.Lock()
+
+
+def get_parse_service(expected_tasks: Optional[int] = None) -> ParseService:
+    """
+    获取进程级共享的解析服务（工作进程在多次调用之间保持常驻）
+
+    Args:
+        expected_tasks: 本次预计的解析任务数，用于判断是否值得启动进程池
+    """
+    global _parse_service
+    with _parse_service_lock:
+        if _parse_service is None:
+            _parse_service = ParseService()
+            atexit.register(_parse_service.shutdown)
+    _parse_service.start(expected_tasks)
+    return _parse_service
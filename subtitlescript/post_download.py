@@ -0,0 +1,642 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+下载后处理流水线
+下载完成的压缩包原本停留在 output/downloads/<编号>/，要依次手动运行 move_downloads_to_cavalry.py、
+rename_subtitle_files.py，再到管理后台的批量上传对话框上传，字幕往往几天后才能上线。
+download_handler 报告 download_completed 后，本模块自动完成：
+1. 解压：使用下载时保存的解压密码（payload 或同名 .txt）；zip 用 zipfile，rar/7z 及 zipfile 不支持的加密方式用 7-Zip
+2. 整理：挑选字幕文件（.srt/.ass/.ssa/.vtt），用 rename_subtitle_files.extract_video_id 规范文件名（无法识别时用下载编号）
+3. 转码：检测编码并统一转为 UTF-8，写入下载目录的 subtitles/ 子目录
+4. 归档：按前缀复制到骑兵字幕目录（<首字母>开头/<前缀>/），目录规则与 move_downloads_to_cavalry.py 一致
+5. 上传：调用后台 /api/admin/subtitles/batch-upload，队列中已就绪的文件合并为一批上传
+
+各阶段在独立线程中并发执行，阶段之间是有界队列：上游过快时提交会阻塞等待，不会无限堆积。
+处理结果写入下载目录的 .post_download.json，--scan 补处理历史下载时跳过已处理的文件，
+move_downloads_to_cavalry.py 也会跳过已处理的目录。
+
+环境变量:
+- POST_DOWNLOAD_DISABLED=1  关闭下载后的自动处理
+- CAVALRY_DIR               骑兵字幕目录（目录不存在时跳过归档）
+- SUBTITLE_UPLOAD_URL       后台地址（默认按 BACKEND_ENV 选择本地/线上）
+- SUBTITLE_ADMIN_TOKEN，或 SUBTITLE_ADMIN_USER + SUBTITLE_ADMIN_PASSWORD  管理员凭据（未配置时跳过上传）
+
+用法示例:
+  python post_download.py --scan output/downloads
+  python post_download.py --scan output/downloads --force --no-upload
+  python post_download.py --file output/downloads/ABP-744/ABP-744.zip --code ABP-744
+"""
+
+import argparse
+import atexit
+import json
+import os
+import queue
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import requests
+
+from rename_subtitle_files import extract_video_id
+
+
+SUBTITLE_EXTENSIONS = {".srt", ".ass", ".ssa", ".vtt"}
+ARCHIVE_EXTENSIONS = {".zip", ".rar", ".7z"}
+
+DEFAULT_CAVALRY_DIR = r"E:\missav\JAV 外挂字幕包\字幕包-新增\骑兵字幕"
+BACKEND_CONFIG = {
+    "local": "http://localhost:8000",
+    "production": "https://api.sub-dog.top",
+}
+
+MARKER_FILE = ".post_download.json"
+SUBTITLE_DIR = "subtitles"
+
+# 各阶段之间的队列长度与单次上传文件数（后台单次最多50个）
+QUEUE_SIZE = 8
+UPLOAD_BATCH = 50
+EXTRACT_TIMEOUT = 60
+# 压缩包内再嵌套压缩包时最多解压的层数
+MAX_NESTING = 2
+
+_STOP = object()
+
+
+def post_download_enabled() -> bool:
+    """下载后自动处理是否启用"""
+    return os.getenv("POST_DOWNLOAD_DISABLED") != "1"
+
+
+# ==================== 解压 ====================
+
+def read_password(archive_path: str) -> Optional[str]:
+    """读取下载时写入的同名 .txt 解压密码"""
+    txt_path = os.path.splitext(archive_path)[0] + ".txt"
+    if not os.path.exists(txt_path):
+        return None
+    try:
+        with open(txt_path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    return line.strip()
+    except OSError as e:
+        print(f"⚠️ 读取解压密码失败: {txt_path}, {e}")
+    return None
+
+
+def _zip_member_name(info: zipfile.ZipInfo) -> str:
+    """未设置UTF-8标志的中文文件名按GBK还原"""
+    if info.flag_bits & 0x800:
+        return info.filename
+    try:
+        return info.filename.encode("cp437").decode("gbk")
+    except (UnicodeEncodeError, UnicodeDecodeError):
+        return info.filename
+
+
+def find_7zip() -> Optional[str]:
+    """查找7-Zip可执行文件"""
+    for path in ("C:/Program Files/7-Zip/7z.exe", "C:/Program Files (x86)/7-Zip/7z.exe"):
+        if os.path.exists(path):
+            return path
+    return shutil.which("7z") or shutil.which("7za")
+
+
+def _extract_with_zipfile(archive_path: str, password: Optional[str]) -> List[Tuple[str, bytes]]:
+    members = []
+    with zipfile.ZipFile(archive_path) as zf:
+        for info in zf.infolist():
+            if info.is_dir():
+                continue
+            data = zf.read(info, pwd=password.encode("utf-8") if password else None)
+            members.append((os.path.basename(_zip_member_name(info)), data))
+    return members
+
+
+def _extract_with_7zip(archive_path: str, password: Optional[str]) -> List[Tuple[str, bytes]]:
+    seven_zip = find_7zip()
+    if not seven_zip:
+        raise RuntimeError("未找到7-Zip，无法解压（请安装7-Zip或把7z加入PATH）")
+    with tempfile.TemporaryDirectory(prefix="post_download_") as out_dir:
+        # 总是传 -p：没有密码时传空密码，避免7-Zip等待输入
+        cmd = [seven_zip, "e", archive_path, f"-o{out_dir}", "-y", "-bd", f"-p{password or ''}"]
+        result = subprocess.run(cmd, capture_output=True, timeout=EXTRACT_TIMEOUT)
+        if result.returncode != 0:
+            stderr = result.stderr.decode("utf-8", "replace")
+            if "password" in stderr.lower():
+                raise RuntimeError("解压密码错误")
+            raise RuntimeError(f"7-Zip解压失败: {stderr.strip()[:200]}")
+        members = []
+        for path in Path(out_dir).iterdir():
+            if path.is_file():
+                members.append((path.name, path.read_bytes()))
+        return members
+
+
+def extract_subtitles(archive_path: str, password: Optional[str], depth: int = 0) -> List[Tuple[str, bytes]]:
+    """
+    解压并挑选字幕文件（嵌套的压缩包继续解压）
+
+    Returns:
+        List[Tuple[str, bytes]]: [(文件名, 内容)]
+    """
+    ext = os.path.splitext(archive_path)[1].lower()
+    if ext == ".zip":
+        try:
+            members = _extract_with_zipfile(archive_path, password)
+        except (NotImplementedError, RuntimeError, zipfile.BadZipFile) as e:
+            # AES 加密等 zipfile 不支持的情况交给7-Zip
+            print(f"ℹ️ zipfile 无法解压（{e}），改用7-Zip")
+            members = _extract_with_7zip(archive_path, password)
+    else:
+        members = _extract_with_7zip(archive_path, password)
+
+    subtitles = []
+    for name, data in members:
+        member_ext = os.path.splitext(name)[1].lower()
+        if member_ext in SUBTITLE_EXTENSIONS:
+            subtitles.append((name, data))
+        elif member_ext in ARCHIVE_EXTENSIONS and depth < MAX_NESTING:
+            with tempfile.TemporaryDirectory(prefix="post_download_") as tmp:
+                inner_path = os.path.join(tmp, name)
+                with open(inner_path, "wb") as f:
+                    f.write(data)
+                subtitles.extend(extract_subtitles(inner_path, password, depth + 1))
+    return subtitles
+
+
+# ==================== 整理与转码 ====================
+
+def decode_subtitle(data: bytes) -> str:
+    """检测编码并解码为文本（去掉BOM）"""
+    if data.startswith(b"\xef\xbb\xbf"):
+        return data[3:].decode("utf-8", "replace")
+    if data.startswith((b"\xff\xfe", b"\xfe\xff")):
+        return data.decode("utf-16", "replace")
+    try:
+        return data.decode("utf-8")
+    except UnicodeDecodeError:
+        pass
+    try:
+        from charset_normalizer import from_bytes
+        best = from_bytes(data).best()
+        if best is not None:
+            return str(best)
+    except ImportError:
+        pass
+    return data.decode("gb18030", "replace")
+
+
+def normalized_video_id(filename: str, fallback_code: str) -> str:
+    """规范化的视频编号（可直接作为后台批量上传的文件名）"""
+    video_id = extract_video_id(filename) or fallback_code.strip().upper()
+    return re.sub(r"[^A-Za-z0-9\-_]", "", video_id) or "UNKNOWN"
+
+
+def unique_path(directory: Path, filename: str) -> Path:
+    """目录中已有同名文件时追加 -2、-3…"""
+    target = directory / filename
+    stem, ext = os.path.splitext(filename)
+    counter = 2
+    while target.exists():
+        target = directory / f"{stem}-{counter}{ext}"
+        counter += 1
+    return target
+
+
+def cavalry_prefix(video_id: str) -> Optional[str]:
+    """骑兵字幕目录的前缀（ABP-744 -> ABP，PONDO-061016_314 -> PONDO）"""
+    m = re.match(r"^([A-Z]+)[-_]?\d", video_id.upper())
+    return m.group(1) if m else None
+
+
+# ==================== 上传 ====================
+
+class SubtitleUploader:
+    """调用后台管理员批量上传接口"""
+
+    def __init__(self, base_url: str, token: Optional[str] = None,
+                 username: Optional[str] = None, password: Optional[str] = None, timeout: float = 60.0):
+        self.base_url = base_url.rstrip("/")
+        self.token = token
+        self.username = username
+        self.password = password
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    @classmethod
+    def from_env(cls) -> Optional["SubtitleUploader"]:
+        """按环境变量创建；未配置管理员凭据时返回 None"""
+        token = os.getenv("SUBTITLE_ADMIN_TOKEN")
+        username = os.getenv("SUBTITLE_ADMIN_USER")
+        password = os.getenv("SUBTITLE_ADMIN_PASSWORD")
+        if not token and not (username and password):
+            return None
+        base_url = os.getenv("SUBTITLE_UPLOAD_URL") or BACKEND_CONFIG.get(
+            os.getenv("BACKEND_ENV", "production"), BACKEND_CONFIG["production"])
+        return cls(base_url, token, username, password)
+
+    def _login(self):
+        if not (self.username and self.password):
+            raise RuntimeError("管理员令牌无效且未配置用户名密码")
+        resp = self.session.post(f"{self.base_url}/api/auth/login", timeout=self.timeout,
+                                 json={"username": self.username, "password": self.password})
+        if resp.status_code != 200:
+            raise RuntimeError(f"管理员登录失败: HTTP {resp.status_code}")
+        self.token = resp.json().get("token")
+
+    def upload(self, files: List[Tuple[str, str]]) -> Dict[str, Any]:
+        """
+        上传一批字幕
+
+        Args:
+            files: [(上传文件名, 本地路径)]，一批不超过50个
+
+        Returns:
+            Dict: 后台返回的 {"summary", "results"}
+        """
+        if not self.token:
+            self._login()
+        for attempt in range(2):
+            handles = [open(path, "rb") for _, path in files]
+            try:
+                multipart = [("files", (name, handle, "text/plain; charset=utf-8"))
+                             for (name, _), handle in zip(files, handles)]
+                resp = self.session.post(f"{self.base_url}/api/admin/subtitles/batch-upload",
+                                         headers={"Authorization": f"Bearer {self.token}"},
+                                         data={"is_paid": "false"}, files=multipart, timeout=self.timeout)
+            finally:
+                for handle in handles:
+                    handle.close()
+            if resp.status_code == 401 and attempt == 0 and self.username:
+                self._login()
+                continue
+            if resp.status_code != 200:
+                raise RuntimeError(f"批量上传失败: HTTP {resp.status_code} {resp.text[:200]}")
+            return resp.json()
+        raise RuntimeError("批量上传失败: 管理员认证失败")
+
+
+# ==================== 流水线 ====================
+
+class PostDownloadPipeline:
+    """解压 → 整理转码 → 归档 → 上传，各阶段一个线程，阶段之间为有界队列"""
+
+    def __init__(self, cavalry_dir: Optional[str] = None, uploader: Optional[SubtitleUploader] = None,
+                 queue_size: int = QUEUE_SIZE, upload_batch: int = UPLOAD_BATCH):
+        cavalry_dir = cavalry_dir or os.getenv("CAVALRY_DIR") or DEFAULT_CAVALRY_DIR
+        self.cavalry_dir = Path(cavalry_dir) if os.path.isdir(cavalry_dir) else None
+        self.uploader = uploader
+        self.upload_batch = upload_batch
+        self.extract_queue: "queue.Queue" = queue.Queue(maxsize=queue_size)
+        self.prepare_queue: "queue.Queue" = queue.Queue(maxsize=queue_size)
+        self.file_queue: "queue.Queue" = queue.Queue(maxsize=queue_size)
+        self.upload_queue: "queue.Queue" = queue.Queue(maxsize=queue_size)
+        self.stats = {"submitted": 0, "subtitles": 0, "filed": 0, "uploaded": 0,
+                      "duplicates": 0, "upload_failed": 0, "errors": 0, "done": 0}
+        self.latencies: List[float] = []
+        self._lock = threading.Lock()
+        self._threads: List[threading.Thread] = []
+        self._closed = False
+
+    def start(self) -> "PostDownloadPipeline":
+        stages = [
+            ("extract", self._extract, self.extract_queue, self.prepare_queue),
+            ("prepare", self._prepare, self.prepare_queue, self.file_queue),
+            ("file", self._file, self.file_queue, self.upload_queue),
+        ]
+        for name, handler, inbox, outbox in stages:
+            self._threads.append(threading.Thread(target=self._stage_loop, args=(name, handler, inbox, outbox),
+                                                  name=f"post-download-{name}", daemon=True))
+        self._threads.append(threading.Thread(target=self._upload_loop, name="post-download-upload", daemon=True))
+        for thread in self._threads:
+            thread.start()
+        print(f"📦 下载后处理已启动（归档: {self.cavalry_dir or '跳过'}，"
+              f"上传: {self.uploader.base_url if self.uploader else '跳过'}）")
+        return self
+
+    def submit(self, code: str, file_path: str, password: Optional[str] = None) -> bool:
+        """提交一个下载完成的文件；队列已满时阻塞等待"""
+        if self._closed or not file_path or not os.path.exists(file_path):
+            return False
+        with self._lock:
+            self.stats["submitted"] += 1
+        self.extract_queue.put({
+            "code": code.strip().upper(),
+            "path": os.path.abspath(file_path),
+            "password": password,
+            "submitted_at": time.time(),
+            "subtitles": [],
+        })
+        return True
+
+    def close(self, wait: bool = True):
+        """不再接收新文件，等待队列中的文件处理完"""
+        if self._closed:
+            return
+        self._closed = True
+        self.extract_queue.put(_STOP)
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+    # ---------- 阶段 ----------
+
+    def _stage_loop(self, name: str, handler, inbox: "queue.Queue", outbox: "queue.Queue"):
+        # 无论本阶段因何退出都把 _STOP 传给下一阶段，否则 close() 会一直等待
+        try:
+            while True:
+                item = inbox.get()
+                if item is _STOP:
+                    return
+                try:
+                    forward = handler(item)
+                except Exception as e:
+                    print(f"❌ 下载后处理[{name}] {item['code']} 失败: {e}")
+                    self._finish(item, error=f"{name}: {e}")
+                    continue
+                if forward:
+                    outbox.put(item)
+        finally:
+            outbox.put(_STOP)
+
+    def _extract(self, item: Dict[str, Any]) -> bool:
+        path = item["path"]
+        ext = os.path.splitext(path)[1].lower()
+        if ext in SUBTITLE_EXTENSIONS:
+            with open(path, "rb") as f:
+                item["members"] = [(os.path.basename(path), f.read())]
+        elif ext in ARCHIVE_EXTENSIONS:
+            password = item["password"] or read_password(path)
+            item["members"] = extract_subtitles(path, password)
+        else:
+            self._finish(item, error=f"不支持的文件类型: {ext}")
+            return False
+        if not item["members"]:
+            self._finish(item, error="没有找到字幕文件")
+            return False
+        return True
+
+    def _prepare(self, item: Dict[str, Any]) -> bool:
+        out_dir = Path(item["path"]).parent / SUBTITLE_DIR
+        out_dir.mkdir(exist_ok=True)
+        seen = set()
+        for name, data in item.pop("members"):
+            text = decode_subtitle(data).replace("\r\n", "\n")
+            if not text.strip() or text in seen:
+                continue
+            seen.add(text)
+            video_id = normalized_video_id(name, item["code"])
+            upload_name = f"{video_id}{os.path.splitext(name)[1].lower()}"
+            target = unique_path(out_dir, upload_name)
+            target.write_text(text, encoding="utf-8")
+            item["subtitles"].append({"source": name, "video_id": video_id,
+                                      "upload_name": upload_name, "path": str(target)})
+        with self._lock:
+            self.stats["subtitles"] += len(item["subtitles"])
+        print(f"📝 {item['code']}: 整理出 {len(item['subtitles'])} 个字幕 "
+              f"({', '.join(s['upload_name'] for s in item['subtitles'])})")
+        return True
+
+    def _file(self, item: Dict[str, Any]) -> bool:
+        if self.cavalry_dir is None:
+            return True
+        for subtitle in item["subtitles"]:
+            prefix = cavalry_prefix(subtitle["video_id"])
+            if not prefix:
+                continue
+            folder = self.cavalry_dir / f"{prefix[0]}开头" / prefix
+            folder.mkdir(parents=True, exist_ok=True)
+            target = unique_path(folder, subtitle["upload_name"])
+            shutil.copy2(subtitle["path"], target)
+            subtitle["filed"] = str(target)
+            with self._lock:
+                self.stats["filed"] += 1
+        return True
+
+    def _upload_loop(self):
+        stopping = False
+        while not stopping:
+            first = self.upload_queue.get()
+            if first is _STOP:
+                return
+            batch = [first]
+            # 合并队列中已就绪的文件，一次请求上传
+            while sum(len(i["subtitles"]) for i in batch) < self.upload_batch:
+                try:
+                    item = self.upload_queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            try:
+                self._upload(batch)
+            except Exception as e:
+                print(f"❌ 下载后处理[upload] 失败: {e}")
+                for item in batch:
+                    self._finish(item, error=f"upload: {e}")
+
+    def _upload(self, batch: List[Dict[str, Any]]):
+        if self.uploader is None:
+            for item in batch:
+                self._finish(item)
+            return
+        subtitles = [s for item in batch for s in item["subtitles"]]
+        for start in range(0, len(subtitles), self.upload_batch):
+            chunk = subtitles[start:start + self.upload_batch]
+            try:
+                response = self.uploader.upload([(s["upload_name"], s["path"]) for s in chunk])
+            except Exception as e:
+                print(f"❌ 批量上传失败: {e}")
+                for s in chunk:
+                    s["upload"] = {"status": "failed", "error": str(e)}
+                continue
+            results = response.get("results", {})
+            outcomes: Dict[str, List[Dict[str, Any]]] = {}
+            for status in ("success", "skipped", "failed"):
+                for entry in results.get(status, []):
+                    outcomes.setdefault(entry.get("filename"), []).append(dict(entry, status=status))
+            for s in chunk:
+                pending = outcomes.get(s["upload_name"])
+                s["upload"] = pending.pop(0) if pending else {"status": "unknown"}
+            summary = response.get("summary", {})
+            print(f"☁️ 批量上传 {len(chunk)} 个字幕: 成功 {summary.get('success', 0)}，"
+                  f"重复 {summary.get('skipped', 0)}，失败 {summary.get('failed', 0)}")
+        for item in batch:
+            # 上传失败或结果未知的字幕记为错误，scan_downloads 下次会重新处理该文件（已上传的由后台判重）
+            unsettled = [s["upload_name"] for s in item["subtitles"]
+                         if (s.get("upload") or {}).get("status") in ("failed", "unknown")]
+            if unsettled:
+                print(f"❌ 下载后处理[upload] {item['code']}: {len(unsettled)} 个字幕上传失败或结果未知")
+                self._finish(item, error=f"upload: {', '.join(unsettled)} 上传失败或结果未知")
+            else:
+                self._finish(item)
+
+    # ---------- 结果 ----------
+
+    def _finish(self, item: Dict[str, Any], error: Optional[str] = None):
+        item.pop("members", None)
+        elapsed = time.time() - item["submitted_at"]
+        with self._lock:
+            self.stats["done"] += 1
+            if error:
+                self.stats["errors"] += 1
+            else:
+                self.latencies.append(elapsed)
+            for s in item["subtitles"]:
+                status = (s.get("upload") or {}).get("status")
+                if status == "success":
+                    self.stats["uploaded"] += 1
+                elif status == "skipped":
+                    self.stats["duplicates"] += 1
+                elif status in ("failed", "unknown"):
+                    self.stats["upload_failed"] += 1
+            # 写入 .post_download.json 失败只提示，不能让阶段线程退出
+            try:
+                write_marker(item["path"], {
+                    "code": item["code"],
+                    "subtitles": item["subtitles"],
+                    "error": error,
+                    "elapsed": round(elapsed, 1),
+                    "finished_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+                })
+            except OSError as e:
+                print(f"⚠️ 写入 {item['code']} 的处理记录失败: {e}")
+        if not error:
+            print(f"✅ 下载后处理完成: {item['code']}（{elapsed:.1f}s）")
+
+    def print_report(self):
+        stats = self.stats
+        print("=" * 60)
+        print("📦 下载后处理统计")
+        print("=" * 60)
+        print(f"文件: 提交 {stats['submitted']}，完成 {stats['done'] - stats['errors']}，失败 {stats['errors']}")
+        print(f"字幕: 整理 {stats['subtitles']}，归档 {stats['filed']}，上传成功 {stats['uploaded']}，"
+              f"重复 {stats['duplicates']}，上传失败 {stats['upload_failed']}")
+        if self.latencies:
+            ordered = sorted(self.latencies)
+            print(f"下载到上线耗时: p50 {ordered[len(ordered) // 2]:.1f}s  最长 {ordered[-1]:.1f}s")
+        print("=" * 60)
+
+
+def read_marker(directory: str) -> Dict[str, Any]:
+    path = os.path.join(directory, MARKER_FILE)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_marker(file_path: str, result: Dict[str, Any]):
+    """把处理结果写入下载目录的 .post_download.json（按文件名记录）"""
+    directory = os.path.dirname(file_path)
+    marker = read_marker(directory)
+    marker[os.path.basename(file_path)] = result
+    tmp_path = os.path.join(directory, MARKER_FILE + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(marker, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, os.path.join(directory, MARKER_FILE))
+
+
+def scan_downloads(root: str, force: bool = False) -> List[Tuple[str, str]]:
+    """
+    扫描下载目录中尚未处理的文件
+
+    Returns:
+        List[Tuple[str, str]]: [(编号, 文件路径)]
+    """
+    found = []
+    for entry in sorted(Path(root).iterdir()):
+        if not entry.is_dir():
+            continue
+        done = set() if force else {name for name, result in read_marker(str(entry)).items()
+                                     if not result.get("error")}
+        for path in sorted(entry.iterdir()):
+            ext = path.suffix.lower()
+            if path.is_file() and ext in SUBTITLE_EXTENSIONS | ARCHIVE_EXTENSIONS and path.name not in done:
+                found.append((entry.name, str(path)))
+    return found
+
+
+# ==================== 进程内单例 ====================
+
+_pipeline: Optional[PostDownloadPipeline] = None
+_pipeline_lock = threading.Lock()
+
+
+def get_post_download_pipeline() -> Optional[PostDownloadPipeline]:
+    """获取进程内的下载后处理流水线（首次调用时启动）；设置 POST_DOWNLOAD_DISABLED=1 可关闭"""
+    global _pipeline
+    if not post_download_enabled():
+        return None
+    with _pipeline_lock:
+        if _pipeline is None:
+            _pipeline = PostDownloadPipeline(uploader=SubtitleUploader.from_env()).start()
+            atexit.register(finish_post_download)
+        return _pipeline
+
+
+def submit_download(code: str, file_path: str, password: Optional[str] = None) -> bool:
+    """提交下载完成的文件到流水线"""
+    pipeline = get_post_download_pipeline()
+    if pipeline is None:
+        return False
+    return pipeline.submit(code, file_path, password)
+
+
+def finish_post_download():
+    """等待流水线处理完已提交的文件并打印统计（未启动时不做任何事）"""
+    global _pipeline
+    with _pipeline_lock:
+        pipeline, _pipeline = _pipeline, None
+    if pipeline is None:
+        return
+    pipeline.close()
+    pipeline.print_report()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="下载后处理：解压、整理、转码、归档并上传字幕")
+    parser.add_argument("--scan", metavar="DIR", help="补处理下载目录（output/downloads）中尚未处理的文件")
+    parser.add_argument("--file", help="处理单个下载文件")
+    parser.add_argument("--code", help="--file 对应的视频编号（默认取所在目录名）")
+    parser.add_argument("--force", action="store_true", help="--scan 时重新处理已处理过的文件")
+    parser.add_argument("--cavalry-dir", default=None, help="骑兵字幕目录（默认 CAVALRY_DIR）")
+    parser.add_argument("--no-upload", action="store_true", help="只解压、整理与归档，不上传")
+    args = parser.parse_args()
+
+    if args.file:
+        jobs = [(args.code or os.path.basename(os.path.dirname(os.path.abspath(args.file))), args.file)]
+    elif args.scan:
+        jobs = scan_downloads(args.scan, force=args.force)
+    else:
+        parser.print_help()
+        return 1
+
+    print(f"📦 待处理文件: {len(jobs)} 个")
+    if not jobs:
+        return 0
+    uploader = None if args.no_upload else SubtitleUploader.from_env()
+    pipeline = PostDownloadPipeline(cavalry_dir=args.cavalry_dir, uploader=uploader).start()
+    for code, path in jobs:
+        pipeline.submit(code, path)
+    pipeline.close()
+    pipeline.print_report()
+    return 0 if pipeline.stats["errors"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
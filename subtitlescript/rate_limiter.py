@@ -0,0 +1,436 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+跨进程共享限速模块
+使用SQLite实现按目标主机划分的令牌桶，爬虫、详情抓取和字幕下载三个脚本
+同时运行时共用同一份请求预算，避免各自休眠叠加后超过站点限制
+
+用法示例:
+python rate_limiter.py --status                      # 查看各主机令牌与各进程消耗
+python rate_limiter.py --status --watch 5            # 每5秒刷新一次
+python rate_limiter.py --set-limit missav.live 1.0 2 # 设置主机速率(个/秒)与突发容量
+python rate_limiter.py --reset                       # 清空消耗记录
+
+公平性:
+- 多个进程同时等待同一主机时，令牌优先分配给最近窗口内消耗最少的进程
+- 只有最近 waiter_timeout 秒内轮询过的等待者参与优先分配；放弃等待、出错或退出的进程立即清除等待标记
+"""
+
+import argparse
+import atexit
+import os
+import sqlite3
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlparse
+
+
+DEFAULT_DB_PATH = Path(__file__).parent / "database" / "rate_budget.db"
+
+# 各主机默认速率（令牌/秒）与突发容量，可通过 --set-limit 持久化修改
+DEFAULT_HOST_LIMITS = {
+    "missav.live": {"rate": 1.0, "capacity": 2},
+    "37ub.w7zvq.net": {"rate": 0.5, "capacity": 3},
+}
+DEFAULT_LIMIT = {"rate": 1.0, "capacity": 3}
+
+# 等待令牌时两次轮询之间的最长休眠（秒）
+MAX_POLL_SLEEP = 2.0
+
+
+def normalize_host(url_or_host: str) -> str:
+    """将URL或主机名标准化为限速使用的主机键"""
+    if not url_or_host:
+        return ""
+    value = url_or_host.strip()
+    if "://" in value:
+        value = urlparse(value).netloc
+    value = value.split("@")[-1].split(":")[0].lower()
+    if value.startswith("www."):
+        value = value[4:]
+    return value
+
+
+def default_owner_name() -> str:
+    """生成当前进程的消费者标识：脚本名:PID"""
+    script = os.path.basename(sys.argv[0]) if sys.argv and sys.argv[0] else "python"
+    return f"{script}:{os.getpid()}"
+
+
+class SharedRateLimiter:
+    """基于SQLite的跨进程令牌桶限速器"""
+
+    def __init__(self,
+                 db_path: Optional[str] = None,
+                 owner: Optional[str] = None,
+                 host_limits: Optional[Dict[str, Dict[str, float]]] = None,
+                 fair_window: float = 60.0,
+                 active_timeout: float = 30.0,
+                 poll_interval: float = 0.2,
+                 waiter_timeout: float = 5.0):
+        """
+        初始化限速器
+
+        Args:
+            db_path: 限速数据库路径，默认 ./database/rate_budget.db
+            owner: 当前消费者标识，默认 "脚本名:PID"
+            host_limits: 主机默认速率配置，仅在主机首次出现时写入数据库
+            fair_window: 公平性统计窗口（秒）
+            active_timeout: 消费者超过该时间未轮询即视为离线（秒）
+            poll_interval: 等待其他进程时的轮询间隔（秒）
+            waiter_timeout: 等待者超过该时间未轮询即不再享有优先分配（秒），应大于 MAX_POLL_SLEEP
+        """
+        self.db_path = str(db_path or DEFAULT_DB_PATH)
+        self.owner = owner or default_owner_name()
+        self.host_limits = dict(DEFAULT_HOST_LIMITS)
+        if host_limits:
+            self.host_limits.update(host_limits)
+        self.fair_window = fair_window
+        self.active_timeout = active_timeout
+        self.poll_interval = poll_interval
+        self.waiter_timeout = waiter_timeout
+        self.ensure_database_dir()
+        self.init_database()
+
+    def ensure_database_dir(self):
+        """确保数据库目录存在"""
+        db_dir = os.path.dirname(self.db_path)
+        if db_dir and not os.path.exists(db_dir):
+            os.makedirs(db_dir, exist_ok=True)
+
+    def _connect(self) -> sqlite3.Connection:
+        # 手动管理事务，配合 BEGIN IMMEDIATE 保证跨进程原子性
+        conn = sqlite3.connect(self.db_path, timeout=30.0, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def init_database(self):
+        """初始化限速表结构"""
+        conn = self._connect()
+        try:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS rate_buckets (
+                    host TEXT PRIMARY KEY,
+                    tokens REAL NOT NULL,
+                    capacity REAL NOT NULL,
+                    rate REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS rate_consumers (
+                    host TEXT NOT NULL,
+                    owner TEXT NOT NULL,
+                    first_seen REAL NOT NULL,
+                    last_seen REAL NOT NULL,
+                    waiting_since REAL,
+                    window_start REAL NOT NULL,
+                    window_count INTEGER DEFAULT 0,
+                    total_acquired INTEGER DEFAULT 0,
+                    total_wait REAL DEFAULT 0,
+                    PRIMARY KEY (host, owner)
+                )
+            """)
+        finally:
+            conn.close()
+
+    def _limit_for(self, host: str) -> Dict[str, float]:
+        """按后缀匹配主机默认配置"""
+        for key, limit in self.host_limits.items():
+            if host == key or host.endswith("." + key):
+                return limit
+        return DEFAULT_LIMIT
+
+    # ==================== 令牌获取 ====================
+
+    def try_acquire(self, host: str, tokens: float = 1.0) -> float:
+        """
+        尝试获取令牌
+
+        Returns:
+            float: 0 表示已获取；否则为建议等待的秒数
+        """
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+
+            row = conn.execute(
+                "SELECT tokens, capacity, rate, updated_at FROM rate_buckets WHERE host = ?",
+                (host,)
+            ).fetchone()
+            if row is None:
+                limit = self._limit_for(host)
+                capacity, rate = float(limit["capacity"]), float(limit["rate"])
+                available = capacity
+            else:
+                available, capacity, rate, updated_at = row
+                available = min(capacity, available + max(0.0, now - updated_at) * rate)
+
+            # 登记/刷新当前消费者
+            consumer = conn.execute("""
+                SELECT waiting_since, window_start, window_count
+                FROM rate_consumers WHERE host = ? AND owner = ?
+            """, (host, self.owner)).fetchone()
+            if consumer is None:
+                waiting_since, window_start, window_count = now, now, 0
+                conn.execute("""
+                    INSERT INTO rate_consumers
+                    (host, owner, first_seen, last_seen, waiting_since, window_start, window_count)
+                    VALUES (?, ?, ?, ?, ?, ?, 0)
+                """, (host, self.owner, now, now, now, now))
+            else:
+                waiting_since, window_start, window_count = consumer
+                if waiting_since is None:
+                    waiting_since = now
+                if now - window_start > self.fair_window:
+                    window_start, window_count = now, 0
+                conn.execute("""
+                    UPDATE rate_consumers
+                    SET last_seen = ?, waiting_since = ?, window_start = ?, window_count = ?
+                    WHERE host = ? AND owner = ?
+                """, (now, waiting_since, window_start, window_count, host, self.owner))
+
+            # 公平性：在最近仍在轮询的等待者中，窗口内消耗最少、等待最久者优先
+            preferred = conn.execute("""
+                SELECT owner FROM rate_consumers
+                WHERE host = ? AND waiting_since IS NOT NULL AND last_seen >= ?
+                ORDER BY CASE WHEN window_start >= ? THEN window_count ELSE 0 END ASC,
+                         waiting_since ASC
+                LIMIT 1
+            """, (host, now - self.waiter_timeout, now - self.fair_window)).fetchone()
+            is_preferred = preferred is None or preferred[0] == self.owner
+
+            wait = 0.0
+            if available >= tokens and is_preferred:
+                available -= tokens
+                conn.execute("""
+                    UPDATE rate_consumers
+                    SET waiting_since = NULL, window_count = window_count + ?,
+                        total_acquired = total_acquired + ?,
+                        total_wait = total_wait + ?
+                    WHERE host = ? AND owner = ?
+                """, (int(tokens), int(tokens), now - waiting_since, host, self.owner))
+            elif available < tokens:
+                wait = max(self.poll_interval, (tokens - available) / rate if rate > 0 else 1.0)
+            else:
+                wait = self.poll_interval
+
+            conn.execute("""
+                INSERT INTO rate_buckets (host, tokens, capacity, rate, updated_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(host) DO UPDATE SET tokens = excluded.tokens, updated_at = excluded.updated_at
+            """, (host, available, capacity, rate, now))
+            conn.execute("COMMIT")
+            return wait
+        except Exception:
+            try:
+                conn.execute("ROLLBACK")
+            except Exception:
+                pass
+            raise
+        finally:
+            conn.close()
+
+    def acquire(self, url_or_host: str, tokens: float = 1.0, max_wait: Optional[float] = None) -> float:
+        """
+        阻塞直到获得令牌
+
+        Args:
+            url_or_host: 目标URL或主机名
+            tokens: 需要的令牌数
+            max_wait: 最长等待时间（秒），None表示不限
+
+        Returns:
+            float: 实际等待的秒数
+        """
+        host = normalize_host(url_or_host)
+        if not host:
+            return 0.0
+
+        started = time.monotonic()
+        acquired = False
+        try:
+            while True:
+                try:
+                    wait = self.try_acquire(host, tokens)
+                except sqlite3.Error as e:
+                    # 限速数据库异常时不阻断抓取流程
+                    print(f"⚠️ 共享限速不可用，跳过本次限速: {e}")
+                    return time.monotonic() - started
+                if wait <= 0:
+                    acquired = True
+                    return time.monotonic() - started
+                if max_wait is not None and time.monotonic() - started + wait > max_wait:
+                    print(f"⚠️ 等待 {host} 令牌超过 {max_wait}s，放弃等待")
+                    return time.monotonic() - started
+                time.sleep(min(wait, MAX_POLL_SLEEP))
+        finally:
+            # 放弃等待、出错或被中断时清除等待标记，否则其他进程会一直让位给本进程
+            if not acquired:
+                self.release_owner(host)
+
+    def release_owner(self, host: Optional[str] = None):
+        """清除本进程（指定主机或全部主机）的等待标记，避免阻塞其他进程；进程退出时自动调用"""
+        try:
+            conn = self._connect()
+            try:
+                if host:
+                    conn.execute("UPDATE rate_consumers SET waiting_since = NULL WHERE owner = ? AND host = ?",
+                                 (self.owner, host))
+                else:
+                    conn.execute("UPDATE rate_consumers SET waiting_since = NULL WHERE owner = ?", (self.owner,))
+            finally:
+                conn.close()
+        except sqlite3.Error:
+            pass
+
+    # ==================== 配置与统计 ====================
+
+    def set_limit(self, host: str, rate: float, capacity: float):
+        """持久化设置主机的速率与容量，对所有进程生效"""
+        host = normalize_host(host)
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("""
+                INSERT INTO rate_buckets (host, tokens, capacity, rate, updated_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(host) DO UPDATE SET
+                    capacity = excluded.capacity, rate = excluded.rate,
+                    tokens = MIN(rate_buckets.tokens, excluded.capacity)
+            """, (host, capacity, capacity, rate, now))
+        finally:
+            conn.close()
+
+    def reset(self):
+        """清空消耗记录（保留速率配置）"""
+        conn = self._connect()
+        try:
+            conn.execute("DELETE FROM rate_consumers")
+            conn.execute("UPDATE rate_buckets SET tokens = capacity, updated_at = ?", (time.time(),))
+        finally:
+            conn.close()
+
+    def get_status(self) -> List[Dict[str, Any]]:
+        """获取各主机令牌与消费者统计"""
+        now = time.time()
+        conn = self._connect()
+        try:
+            hosts = []
+            for host, tokens, capacity, rate, updated_at in conn.execute(
+                "SELECT host, tokens, capacity, rate, updated_at FROM rate_buckets ORDER BY host"
+            ).fetchall():
+                consumers = []
+                for row in conn.execute("""
+                    SELECT owner, first_seen, last_seen, waiting_since, window_start,
+                           window_count, total_acquired, total_wait
+                    FROM rate_consumers WHERE host = ? ORDER BY total_acquired DESC
+                """, (host,)).fetchall():
+                    owner, first_seen, last_seen, waiting_since, window_start, window_count, total, total_wait = row
+                    elapsed = max(1.0, last_seen - first_seen)
+                    consumers.append({
+                        "owner": owner,
+                        "active": now - last_seen <= self.active_timeout,
+                        "waiting": waiting_since is not None,
+                        "window_count": window_count if now - window_start <= self.fair_window else 0,
+                        "total_acquired": total,
+                        "avg_rate": total / elapsed,
+                        "avg_wait": (total_wait / total) if total else 0.0,
+                        "last_seen_ago": now - last_seen,
+                    })
+                hosts.append({
+                    "host": host,
+                    "tokens": min(capacity, tokens + max(0.0, now - updated_at) * rate),
+                    "capacity": capacity,
+                    "rate": rate,
+                    "consumers": consumers,
+                })
+            return hosts
+        finally:
+            conn.close()
+
+    def print_status(self):
+        """打印当前限速状态"""
+        hosts = self.get_status()
+        print("\n" + "=" * 60)
+        print("共享限速状态")
+        print("=" * 60)
+        if not hosts:
+            print("暂无任何主机的限速记录")
+        for h in hosts:
+            print(f"\n🌐 {h['host']}: 速率 {h['rate']:.2f}/s, 容量 {h['capacity']:.0f}, 当前令牌 {h['tokens']:.2f}")
+            active = [c for c in h["consumers"] if c["active"]]
+            print(f"   活跃进程: {len(active)} / 记录进程: {len(h['consumers'])}")
+            for c in h["consumers"]:
+                state = "等待中" if c["waiting"] and c["active"] else ("活跃" if c["active"] else "离线")
+                print(f"   - {c['owner']:<40} [{state}] 窗口内 {c['window_count']} 次, "
+                      f"累计 {c['total_acquired']} 次, 平均 {c['avg_rate']:.2f}/s, "
+                      f"平均等待 {c['avg_wait']:.2f}s, {c['last_seen_ago']:.0f}s 前")
+        print("=" * 60)
+
+
+# ==================== 进程内单例 ====================
+
+_limiter: Optional[SharedRateLimiter] = None
+
+
+def get_rate_limiter() -> Optional[SharedRateLimiter]:
+    """获取进程内共享的限速器；设置 RATE_BUDGET_DISABLED=1 可关闭"""
+    global _limiter
+    if os.getenv("RATE_BUDGET_DISABLED") == "1":
+        return None
+    if _limiter is None:
+        try:
+            _limiter = SharedRateLimiter(os.getenv("RATE_BUDGET_DB") or None)
+            atexit.register(_limiter.release_owner)
+        except sqlite3.Error as e:
+            print(f"⚠️ 初始化共享限速失败，将不限速: {e}")
+            return None
+    return _limiter
+
+
+def acquire_for_url(url: str, tokens: float = 1.0) -> float:
+    """在对目标URL发起请求前获取共享令牌，返回等待秒数"""
+    limiter = get_rate_limiter()
+    if limiter is None:
+        return 0.0
+    return limiter.acquire(url, tokens)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="跨进程共享限速状态查看与配置")
+    parser.add_argument("--db", help="限速数据库路径，默认 ./database/rate_budget.db")
+    parser.add_argument("--status", action="store_true", help="查看当前消耗情况")
+    parser.add_argument("--watch", type=float, help="配合 --status 每隔N秒刷新")
+    parser.add_argument("--set-limit", nargs=3, metavar=("HOST", "RATE", "CAPACITY"),
+                        help="设置主机速率（个/秒）与突发容量")
+    parser.add_argument("--reset", action="store_true", help="清空消耗记录")
+    args = parser.parse_args()
+
+    limiter = SharedRateLimiter(args.db, owner=f"cli:{os.getpid()}")
+
+    if args.set_limit:
+        host, rate, capacity = args.set_limit
+        limiter.set_limit(host, float(rate), float(capacity))
+        print(f"✅ 已设置 {normalize_host(host)}: 速率 {float(rate)}/s, 容量 {float(capacity)}")
+    if args.reset:
+        limiter.reset()
+        print("✅ 已清空消耗记录")
+    if args.status or not (args.set_limit or args.reset):
+        try:
+            while True:
+                limiter.print_status()
+                if not args.watch:
+                    break
+                time.sleep(args.watch)
+        except KeyboardInterrupt:
+            pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
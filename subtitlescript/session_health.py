@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+登录状态检查与缓存
+原先论坛逐个 wait_for_selector 四个选择器（每个3秒超时），页面不明确时每个编号开工前要白等12秒；
+爬虫对 missav 逐个 locator().count() 八次。这里把所有判定选择器合并为一次等待 + 一次 evaluate，
+结果按 (站点, 浏览器上下文) 缓存 TTL 秒，流程只有在页面出现登录表单/登录提示（认证错误）时才让缓存失效。
+
+同时从会话文件（Playwright storage_state）读取保存时间与登录Cookie的过期时间，报告会话年龄与剩余有效期。
+
+设置环境变量 SESSION_HEALTH_TTL=秒数 调整缓存时长（默认600秒，0 表示每次都检查）。
+
+用法示例:
+  python session_health.py
+  python session_health.py --site forum --session ./session.json
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+
+DEFAULT_TTL = 600.0
+
+# 判定规则按顺序匹配，第一组命中的选择器决定结果；都未命中时取 default
+SITE_RULES = {
+    "forum": {
+        "session_file": "./session.json",
+        "rules": [
+            (["a[href*='logout']", ".vwmy", "strong a[href*='space-uid']"], True),
+            (["#ls_username"], False),
+        ],
+        "default": False,
+        "wait_ms": 3000,
+        "auth_messages": ["您需要先登录", "尚未登录", "请先登录", "登录后才能"],
+        "auth_cookie_suffixes": ["_auth"],
+    },
+    "missav": {
+        "session_file": "./session_videoID.json",
+        "rules": [
+            (['a[href*="login"]', 'a[href*="register"]', ".login-form", "#login-form"], False),
+            (['a[href*="profile"]', 'a[href*="user"]', ".user-menu", ".logout"], True),
+        ],
+        "default": True,
+        "wait_ms": 0,
+        "auth_messages": [],
+        "auth_cookie_suffixes": ["remember_web", "session"],
+    },
+}
+
+_MATCH_JS = r"""
+(groups) => {
+    for (let i = 0; i < groups.length; i++) {
+        for (const sel of groups[i]) {
+            try {
+                if (document.querySelector(sel)) return {group: i, selector: sel};
+            } catch (e) {}
+        }
+    }
+    return {group: -1, selector: null};
+}
+"""
+
+_AUTH_ERROR_JS = r"""
+([selectors, messages]) => {
+    for (const sel of selectors) {
+        try { if (document.querySelector(sel)) return sel; } catch (e) {}
+    }
+    const text = document.body ? (document.body.innerText || "") : "";
+    for (const m of messages) {
+        if (text.includes(m)) return m;
+    }
+    return null;
+}
+"""
+
+
+def detect_login(page, site: str = "forum", verbose: bool = True) -> bool:
+    """
+    对当前页面做一次合并选择器判定（最多等待一次 wait_ms）
+
+    Returns:
+        bool: 是否已登录；页面异常时返回 False
+    """
+    config = SITE_RULES[site]
+    groups = [selectors for selectors, _ in config["rules"]]
+    try:
+        if config["wait_ms"]:
+            try:
+                page.wait_for_selector(", ".join(s for g in groups for s in g), timeout=config["wait_ms"])
+            except Exception:
+                pass
+        match = page.evaluate(_MATCH_JS, groups)
+    except Exception as e:
+        if verbose:
+            print(f"检查登录状态失败: {e}")
+        return False
+    if match["group"] < 0:
+        if verbose:
+            print(f"无法确定登录状态，按{'已登录' if config['default'] else '未登录'}处理")
+        return config["default"]
+    logged_in = config["rules"][match["group"]][1]
+    if verbose:
+        print(f"检测到 {match['selector']}，{'已登录' if logged_in else '未登录'}")
+    return logged_in
+
+
+def read_session_file(session_file: str, site: str = "forum") -> Dict[str, Any]:
+    """
+    读取会话文件的保存时间与登录Cookie过期时间
+
+    Returns:
+        Dict: {"site", "session_file", "exists", "saved_at", "age", "auth_cookie", "expires_at", "expires_in"}
+    """
+    info = {"site": site, "session_file": session_file, "exists": os.path.exists(session_file), "saved_at": None,
+            "age": None, "auth_cookie": None, "expires_at": None, "expires_in": None}
+    if not info["exists"]:
+        return info
+    now = time.time()
+    info["saved_at"] = os.path.getmtime(session_file)
+    info["age"] = now - info["saved_at"]
+    try:
+        with open(session_file, "r", encoding="utf-8") as f:
+            cookies = json.load(f).get("cookies", [])
+    except (OSError, ValueError, AttributeError):
+        return info
+    suffixes = SITE_RULES.get(site, {}).get("auth_cookie_suffixes", [])
+    auth = [c for c in cookies if any(s in c.get("name", "") for s in suffixes) and (c.get("expires") or -1) > 0]
+    if auth:
+        cookie = min(auth, key=lambda c: c["expires"])
+        info["auth_cookie"] = cookie["name"]
+        info["expires_at"] = cookie["expires"]
+        info["expires_in"] = cookie["expires"] - now
+    return info
+
+
+def _fmt_duration(seconds: Optional[float]) -> str:
+    if seconds is None:
+        return "未知"
+    sign = "-" if seconds < 0 else ""
+    seconds = abs(seconds)
+    if seconds >= 86400:
+        return f"{sign}{seconds / 86400:.1f}天"
+    if seconds >= 3600:
+        return f"{sign}{seconds / 3600:.1f}小时"
+    return f"{sign}{seconds / 60:.0f}分钟"
+
+
+class SessionHealth:
+    """单个浏览器上下文的登录状态缓存"""
+
+    def __init__(self, site: str = "forum", session_file: Optional[str] = None, ttl: Optional[float] = None,
+                 detector: Optional[Callable[[Any], bool]] = None):
+        """
+        Args:
+            site: SITE_RULES 中的站点
+            session_file: 会话文件，用于报告会话年龄与过期时间
+            ttl: 缓存秒数，默认读取 SESSION_HEALTH_TTL
+            detector: 实际判定函数 detector(page) -> bool，默认 detect_login(page, site)
+        """
+        self.site = site
+        self.detector = detector or (lambda page: detect_login(page, site))
+        self.session_file = session_file or SITE_RULES[site]["session_file"]
+        if ttl is None:
+            ttl = float(os.getenv("SESSION_HEALTH_TTL") or DEFAULT_TTL)
+        self.ttl = ttl
+        self.logged_in: Optional[bool] = None
+        self.checked_at: Optional[float] = None
+        self.checks = 0
+        self.cache_hits = 0
+        self._lock = threading.Lock()
+
+    def check(self, page, force: bool = False) -> bool:
+        """返回登录状态：缓存未过期时直接使用，否则对页面做一次合并判定"""
+        with self._lock:
+            fresh = self.checked_at is not None and time.time() - self.checked_at < self.ttl
+            if fresh and not force:
+                self.cache_hits += 1
+                return self.logged_in
+        logged_in = self.detector(page)
+        with self._lock:
+            self.logged_in = logged_in
+            self.checked_at = time.time()
+            self.checks += 1
+        return logged_in
+
+    def invalidate(self, reason: str = ""):
+        """流程遇到认证错误时让缓存失效"""
+        with self._lock:
+            self.checked_at = None
+        if reason:
+            print(f"🔐 登录状态缓存失效: {reason}")
+
+    def auth_error(self, page) -> Optional[str]:
+        """
+        零等待检查页面是否出现登录表单或登录提示
+
+        Returns:
+            str: 命中的选择器/提示文字；未发现认证错误或页面不可用时返回 None
+        """
+        config = SITE_RULES[self.site]
+        selectors = [s for group, logged_in in config["rules"] if not logged_in for s in group]
+        try:
+            return page.evaluate(_AUTH_ERROR_JS, [selectors, config["auth_messages"]])
+        except Exception:
+            return None
+
+    def report(self) -> Dict[str, Any]:
+        """会话年龄、过期时间与缓存状态"""
+        info = read_session_file(self.session_file, self.site)
+        info.update({
+            "logged_in": self.logged_in,
+            "checked_at": self.checked_at,
+            "checks": self.checks,
+            "cache_hits": self.cache_hits,
+        })
+        return info
+
+    def print_report(self):
+        """打印会话年龄与剩余有效期"""
+        print(format_report(self.report()))
+
+
+def format_report(info: Dict[str, Any]) -> str:
+    if not info["exists"]:
+        return f"🔐 [{info['site']}] 会话文件不存在: {info['session_file']}"
+    line = f"🔐 [{info['site']}] {info['session_file']} 保存于 {_fmt_duration(info['age'])}前"
+    if info["expires_in"] is not None:
+        if info["expires_in"] < 0:
+            line += f"，登录Cookie {info['auth_cookie']} 已过期 {_fmt_duration(-info['expires_in'])}"
+        else:
+            line += f"，登录Cookie {info['auth_cookie']} 剩余 {_fmt_duration(info['expires_in'])}"
+    else:
+        line += "，未找到登录Cookie的过期时间"
+    if info.get("checked_at"):
+        state = "已登录" if info["logged_in"] else "未登录"
+        line += (f"；{_fmt_duration(time.time() - info['checked_at'])}前验证为{state}"
+                 f"（检查 {info['checks']} 次，缓存命中 {info['cache_hits']} 次）")
+    return line
+
+
+def main():
+    parser = argparse.ArgumentParser(description="查看会话文件年龄与登录Cookie有效期")
+    parser.add_argument("--site", choices=sorted(SITE_RULES), help="只查看指定站点")
+    parser.add_argument("--session", help="会话文件路径，默认使用站点对应的会话文件")
+    args = parser.parse_args()
+
+    sites: List[str] = [args.site] if args.site else sorted(SITE_RULES)
+    for site in sites:
+        info = read_session_file(args.session or SITE_RULES[site]["session_file"], site)
+        print(format_report(info))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,542 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+论坛多账号会话池
+一个论坛账号的每日下载次数与金钱余额有限，单个 ./session.json 限制了批量下载的吞吐。
+会话池把一个目录下的 Playwright storage_state 文件（每个账号一个 <账号名>.json）登记到 SQLite，
+每个账号记录金钱余额、每日下载上限、冷却时间与消费：
+- worker 启动时租用一个空闲账号，用该账号的会话文件启动浏览器上下文
+- 每次成功下载计入当日次数，每次购买按弹窗中的售价/购买后余额记录消费并更新余额
+- 达到每日上限、余额不足或页面提示操作过于频繁的账号被轮换下线（冷却），worker 换用下一个账号
+- 报告各账号的余额、当日用量、消费与租用时长（利用率）
+
+租约按领取者进程存活与过期时间回收，多个下载进程可共用同一个会话池。
+
+用法示例:
+  python session_pool.py --dir ./sessions --status
+  python session_pool.py --set account_a --points 120 --quota 50
+  python session_pool.py --clear-cooldown account_a
+  python download-subtitle.py --db --no-subtitle --workers 3 --session-dir ./sessions
+"""
+
+import argparse
+import glob
+import os
+import re
+import socket
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from download_jobs import DownloadJobQueue, _owner_alive
+
+
+DEFAULT_DB_PATH = Path(__file__).parent / "database" / "session_pool.db"
+DEFAULT_SESSION_DIR = "./sessions"
+
+LEASE_TTL = 2 * 3600
+# 已知余额低于此值的账号不再租出（购买一次至少需要1金钱）
+MIN_POINTS = 1
+
+# 页面提示 → (限制类型, 冷却秒数；None 表示冷却到次日零点)
+LIMIT_RULES = [
+    ("points", ["金钱不足", "积分不足", "您的金钱不够", "余额不足"], None),
+    ("quota", ["下载次数已达", "今日下载", "超过了今日", "今天的下载次数"], None),
+    ("throttle", ["刷新过于频繁", "操作过于频繁", "请稍后再试"], 10 * 60),
+]
+
+_LIMIT_JS = r"""
+(messages) => {
+    const text = document.body ? (document.body.innerText || "") : "";
+    for (const m of messages) {
+        if (text.includes(m)) return m;
+    }
+    return null;
+}
+"""
+
+_local = threading.local()
+
+
+def _today() -> str:
+    return datetime.now().strftime("%Y-%m-%d")
+
+
+def _next_midnight() -> float:
+    tomorrow = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+    return tomorrow.timestamp()
+
+
+def parse_pay_dialog(text: str) -> Tuple[Optional[int], Optional[int]]:
+    """
+    从购买弹窗文字中解析售价与购买后余额（Discuz 弹窗为 "售价(金钱) 2 ... 购买后余额(金钱) 118"）
+
+    Returns:
+        Tuple: (售价, 购买后余额)，未找到的项为 None
+    """
+    text = text or ""
+    price = re.search(r"售价[^\d\-]{0,12}(\d+)", text)
+    balance = re.search(r"购买后余额[^\d\-]{0,12}(-?\d+)", text)
+    return (int(price.group(1)) if price else None, int(balance.group(1)) if balance else None)
+
+
+class SessionPool:
+    """账号会话池（每次操作独立连接，可在多线程/多进程间共享）"""
+
+    def __init__(self, db_path: Optional[str] = None, lease_ttl: float = LEASE_TTL):
+        self.db_path = str(db_path or DEFAULT_DB_PATH)
+        self.lease_ttl = lease_ttl
+        self.started_at = time.time()
+        # 本进程内各账号的租用时长（秒），用于计算本次批量的利用率
+        self._busy: Dict[str, float] = {}
+        self._busy_lock = threading.Lock()
+        self._owner_prefix = f"{socket.gethostname()}:{os.getpid()}:"
+        self.ensure_database_dir()
+        self.init_database()
+
+    def ensure_database_dir(self):
+        """确保数据库目录存在"""
+        db_dir = os.path.dirname(self.db_path)
+        if db_dir and not os.path.exists(db_dir):
+            os.makedirs(db_dir, exist_ok=True)
+
+    def _connect(self) -> sqlite3.Connection:
+        # 手动管理事务，配合 BEGIN IMMEDIATE 保证跨进程原子性
+        conn = sqlite3.connect(self.db_path, timeout=30.0, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def init_database(self):
+        """初始化账号表与消费记录表"""
+        conn = self._connect()
+        try:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS accounts (
+                    name TEXT PRIMARY KEY,
+                    session_file TEXT NOT NULL,
+                    enabled INTEGER DEFAULT 1,
+                    points INTEGER,
+                    daily_quota INTEGER,
+                    quota_day TEXT,
+                    used_today INTEGER DEFAULT 0,
+                    cooldown_until REAL DEFAULT 0,
+                    cooldown_reason TEXT,
+                    lease_owner TEXT,
+                    lease_expires_at REAL,
+                    leased_at REAL,
+                    busy_seconds REAL DEFAULT 0,
+                    downloads INTEGER DEFAULT 0,
+                    purchases INTEGER DEFAULT 0,
+                    spent INTEGER DEFAULT 0,
+                    last_used_at REAL,
+                    created_at REAL NOT NULL
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS spend_log (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    account TEXT NOT NULL,
+                    code TEXT,
+                    kind TEXT,
+                    amount INTEGER,
+                    balance_after INTEGER,
+                    created_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_spend_log_account ON spend_log (account, created_at)")
+        finally:
+            conn.close()
+
+    def _transaction(self, fn):
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            result = fn(conn)
+            conn.execute("COMMIT")
+            return result
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    # ==================== 账号登记 ====================
+
+    def sync_dir(self, session_dir: str = DEFAULT_SESSION_DIR) -> int:
+        """把目录下的 *.json 会话文件登记为账号（账号名取文件名），返回目录中的账号数"""
+        files = sorted(glob.glob(os.path.join(session_dir, "*.json")))
+        now = time.time()
+
+        def work(conn):
+            for path in files:
+                name = Path(path).stem
+                conn.execute(
+                    "INSERT OR IGNORE INTO accounts (name, session_file, created_at) VALUES (?, ?, ?)",
+                    (name, path, now),
+                )
+                conn.execute("UPDATE accounts SET session_file = ? WHERE name = ?", (path, name))
+
+        self._transaction(work)
+        return len(files)
+
+    def set_account(self, name: str, points: Optional[int] = None, daily_quota: Optional[int] = None,
+                    enabled: Optional[bool] = None) -> bool:
+        """设置账号的余额、每日下载上限或启用状态；参数为 None 的字段保持不变"""
+        conn = self._connect()
+        try:
+            return conn.execute(
+                "UPDATE accounts SET points = COALESCE(?, points), daily_quota = COALESCE(?, daily_quota), "
+                "enabled = COALESCE(?, enabled) WHERE name = ?",
+                (points, daily_quota, None if enabled is None else int(enabled), name),
+            ).rowcount > 0
+        finally:
+            conn.close()
+
+    def clear_cooldown(self, name: str) -> bool:
+        """解除账号冷却"""
+        conn = self._connect()
+        try:
+            return conn.execute(
+                "UPDATE accounts SET cooldown_until = 0, cooldown_reason = NULL WHERE name = ?", (name,)
+            ).rowcount > 0
+        finally:
+            conn.close()
+
+    # ==================== 租约 ====================
+
+    @staticmethod
+    def _roll_quota_day(conn, today: str):
+        conn.execute("UPDATE accounts SET used_today = 0, quota_day = ? WHERE quota_day IS NOT ?", (today, today))
+
+    def lease(self, owner: str) -> Optional["AccountLease"]:
+        """租用一个空闲、未冷却、当日未达上限且余额充足的账号（当日用量最少者优先）；没有可用账号时返回 None"""
+        now = time.time()
+
+        def work(conn):
+            self._roll_quota_day(conn, _today())
+            # 回收领取者已退出或过期的租约
+            for name, lease_owner, expires_at in conn.execute(
+                "SELECT name, lease_owner, lease_expires_at FROM accounts WHERE lease_owner IS NOT NULL"
+            ).fetchall():
+                if (expires_at or 0) < now or not _owner_alive(lease_owner):
+                    conn.execute(
+                        "UPDATE accounts SET lease_owner = NULL, lease_expires_at = NULL, leased_at = NULL "
+                        "WHERE name = ?", (name,)
+                    )
+            row = conn.execute(
+                "SELECT name, session_file FROM accounts "
+                "WHERE enabled = 1 AND lease_owner IS NULL AND cooldown_until <= ? "
+                "AND (daily_quota IS NULL OR used_today < daily_quota) "
+                "AND (points IS NULL OR points >= ?) "
+                "ORDER BY used_today, COALESCE(last_used_at, 0), name LIMIT 1",
+                (now, MIN_POINTS),
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE accounts SET lease_owner = ?, lease_expires_at = ?, leased_at = ? WHERE name = ?",
+                (owner, now + self.lease_ttl, now, row[0]),
+            )
+            return row
+
+        row = self._transaction(work)
+        if row is None:
+            return None
+        return AccountLease(self, row[0], row[1], owner)
+
+    def renew(self, name: str, owner: str):
+        """续期租约"""
+        conn = self._connect()
+        try:
+            conn.execute(
+                "UPDATE accounts SET lease_expires_at = ? WHERE name = ? AND lease_owner = ?",
+                (time.time() + self.lease_ttl, name, owner),
+            )
+        finally:
+            conn.close()
+
+    def release(self, name: str, owner: str):
+        """归还账号，并累计租用时长"""
+        now = time.time()
+
+        def work(conn):
+            row = conn.execute(
+                "SELECT leased_at FROM accounts WHERE name = ? AND lease_owner = ?", (name, owner)
+            ).fetchone()
+            if row is None:
+                return 0.0
+            busy = max(now - (row[0] or now), 0.0)
+            conn.execute(
+                "UPDATE accounts SET lease_owner = NULL, lease_expires_at = NULL, leased_at = NULL, "
+                "busy_seconds = busy_seconds + ?, last_used_at = ? WHERE name = ?",
+                (busy, now, name),
+            )
+            return busy
+
+        busy = self._transaction(work)
+        with self._busy_lock:
+            self._busy[name] = self._busy.get(name, 0.0) + busy
+
+    # ==================== 用量与消费 ====================
+
+    def record_download(self, name: str):
+        """成功下载一次，计入当日用量"""
+        now = time.time()
+
+        def work(conn):
+            self._roll_quota_day(conn, _today())
+            conn.execute(
+                "UPDATE accounts SET used_today = used_today + 1, downloads = downloads + 1, last_used_at = ? "
+                "WHERE name = ?",
+                (now, name),
+            )
+
+        self._transaction(work)
+
+    def record_purchase(self, name: str, code: Optional[str], amount: Optional[int],
+                        balance_after: Optional[int] = None, kind: str = "attachment"):
+        """记录一次购买：累计消费并更新余额（弹窗给出购买后余额时以其为准）"""
+        now = time.time()
+
+        def work(conn):
+            conn.execute(
+                "INSERT INTO spend_log (account, code, kind, amount, balance_after, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (name, code, kind, amount, balance_after, now),
+            )
+            conn.execute(
+                "UPDATE accounts SET purchases = purchases + 1, spent = spent + ?, "
+                "points = CASE WHEN ? IS NOT NULL THEN ? WHEN points IS NOT NULL THEN points - ? ELSE NULL END, "
+                "last_used_at = ? WHERE name = ?",
+                (amount or 0, balance_after, balance_after, amount or 0, now, name),
+            )
+
+        self._transaction(work)
+
+    def cooldown(self, name: str, reason: str, seconds: Optional[float] = None, points: Optional[int] = None):
+        """让账号冷却（seconds 为 None 时冷却到次日零点），可同时更新已知余额"""
+        until = time.time() + seconds if seconds is not None else _next_midnight()
+        conn = self._connect()
+        try:
+            conn.execute(
+                "UPDATE accounts SET cooldown_until = MAX(cooldown_until, ?), cooldown_reason = ?, "
+                "points = COALESCE(?, points) WHERE name = ?",
+                (until, reason, points, name),
+            )
+        finally:
+            conn.close()
+
+    def exhausted_reason(self, name: str) -> Optional[str]:
+        """账号是否应当轮换下线：返回原因（冷却中/当日达上限/余额不足/已停用），仍可使用时返回 None"""
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                "SELECT enabled, points, daily_quota, quota_day, used_today, cooldown_until, cooldown_reason "
+                "FROM accounts WHERE name = ?", (name,)
+            ).fetchone()
+        finally:
+            conn.close()
+        if row is None:
+            return "账号不存在"
+        enabled, points, quota, quota_day, used_today, cooldown_until, cooldown_reason = row
+        if not enabled:
+            return "已停用"
+        if cooldown_until > time.time():
+            return f"冷却中（{cooldown_reason or '-'}）"
+        if quota is not None and quota_day == _today() and used_today >= quota:
+            return f"今日下载已达上限 {quota}"
+        if points is not None and points < MIN_POINTS:
+            return f"余额不足（{points}）"
+        return None
+
+    # ==================== 报告 ====================
+
+    def accounts(self) -> List[Dict[str, Any]]:
+        """全部账号状态"""
+        conn = self._connect()
+        try:
+            conn.row_factory = sqlite3.Row
+            rows = conn.execute("SELECT * FROM accounts ORDER BY name").fetchall()
+        finally:
+            conn.close()
+        today = _today()
+        accounts = []
+        for row in rows:
+            account = dict(row)
+            if account["quota_day"] != today:
+                account["used_today"] = 0
+            accounts.append(account)
+        return accounts
+
+    def print_report(self):
+        """打印各账号余额、当日用量、消费与利用率"""
+        now = time.time()
+        elapsed = max(now - self.started_at, 1e-6)
+        with self._busy_lock:
+            busy = dict(self._busy)
+        print("=" * 96)
+        print("👥 论坛账号会话池")
+        print("=" * 96)
+        print(f"{'账号':<16}{'状态':<22}{'余额':>6}{'今日/上限':>12}{'下载':>6}{'购买':>6}{'消费':>6}"
+              f"{'累计租用(h)':>12}{'本次利用率':>10}")
+        for account in self.accounts():
+            if not account["enabled"]:
+                state = "已停用"
+            elif account["lease_owner"]:
+                state = "使用中"
+            elif account["cooldown_until"] > now:
+                state = f"冷却({account['cooldown_reason'] or '-'})"
+            else:
+                state = "空闲"
+            quota = f"{account['used_today']}/{account['daily_quota'] if account['daily_quota'] is not None else '∞'}"
+            points = account["points"] if account["points"] is not None else "?"
+            in_use = busy.get(account["name"], 0.0)
+            if account["lease_owner"] and account["lease_owner"].startswith(self._owner_prefix):
+                # 本进程仍在租用的账号计入进行中的时长
+                in_use += now - max(account["leased_at"] or now, self.started_at)
+            utilisation = in_use / elapsed
+            print(f"{account['name']:<16}{state[:20]:<22}{points:>6}{quota:>12}{account['downloads']:>6}"
+                  f"{account['purchases']:>6}{account['spent']:>6}{account['busy_seconds'] / 3600:>12.2f}"
+                  f"{utilisation:>10.0%}")
+        print("=" * 96)
+
+
+class AccountLease:
+    """worker 当前租用的账号"""
+
+    def __init__(self, pool: SessionPool, name: str, session_file: str, owner: str):
+        self.pool = pool
+        self.name = name
+        self.session_file = session_file
+        self.owner = owner
+        # 当前处理的编号，购买记录据此关联
+        self.code: Optional[str] = None
+
+    def renew(self):
+        self.pool.renew(self.name, self.owner)
+
+    def release(self):
+        self.pool.release(self.name, self.owner)
+
+    def record_download(self):
+        self.pool.record_download(self.name)
+
+    def record_purchase(self, amount: Optional[int], balance_after: Optional[int] = None, kind: str = "attachment"):
+        self.pool.record_purchase(self.name, self.code, amount, balance_after, kind)
+
+    def exhausted_reason(self) -> Optional[str]:
+        return self.pool.exhausted_reason(self.name)
+
+    def check_page(self, page) -> Optional[str]:
+        """
+        零等待检查页面是否提示余额不足、下载次数用尽或操作过于频繁，命中时让账号冷却
+
+        Returns:
+            str: 命中的提示文字；未命中或页面不可用时返回 None
+        """
+        messages = [m for _, group, _ in LIMIT_RULES for m in group]
+        try:
+            hit = page.evaluate(_LIMIT_JS, messages)
+        except Exception:
+            return None
+        if not hit:
+            return None
+        for kind, group, seconds in LIMIT_RULES:
+            if hit in group:
+                self.pool.cooldown(self.name, kind, seconds, points=0 if kind == "points" else None)
+                print(f"👥 账号 {self.name} 受限（{hit}），轮换下线")
+                break
+        return hit
+
+
+# ==================== 当前线程的账号 ====================
+
+def bind_account(lease: Optional[AccountLease]):
+    """把租用的账号绑定到当前线程（购买流程据此记录消费）"""
+    _local.lease = lease
+
+
+def current_account() -> Optional[AccountLease]:
+    return getattr(_local, "lease", None)
+
+
+def can_afford(pay_text: str) -> bool:
+    """
+    提交购买前调用：弹窗显示购买后余额为负时让当前账号冷却
+
+    Returns:
+        bool: 余额足够（或无法判断）返回 True；余额不足返回 False，调用方不应再提交购买
+    """
+    price, balance_after = parse_pay_dialog(pay_text)
+    if balance_after is None or balance_after >= 0:
+        return True
+    lease = current_account()
+    balance = balance_after + (price or 0)
+    if lease is not None:
+        lease.pool.cooldown(lease.name, "points", points=balance)
+        print(f"👥 账号 {lease.name} 余额不足（售价 {price}，余额 {balance}），轮换下线")
+    else:
+        print(f"❌ 余额不足（售价 {price}，余额 {balance}）")
+    return False
+
+
+def note_purchase(pay_text: str, kind: str = "attachment"):
+    """提交购买后调用：按弹窗中的售价/购买后余额记录当前账号的消费（未使用会话池时忽略）"""
+    lease = current_account()
+    if lease is None:
+        return
+    price, balance_after = parse_pay_dialog(pay_text)
+    try:
+        lease.record_purchase(price, balance_after, kind)
+    except sqlite3.Error as e:
+        print(f"⚠️ 记录账号消费失败: {e}")
+    else:
+        print(f"👥 账号 {lease.name} 消费 {price if price is not None else '?'}，"
+              f"余额 {balance_after if balance_after is not None else '?'}")
+
+
+def pool_owner_name(worker: Any = 0) -> str:
+    """租用者标识（与下载任务队列相同的 host:pid:worker 格式）"""
+    return DownloadJobQueue.owner_name(f"pool-{worker}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="论坛多账号会话池管理")
+    parser.add_argument("--db", help="会话池数据库路径，默认 ./database/session_pool.db")
+    parser.add_argument("--dir", help="会话文件目录，登记其中的 *.json 为账号")
+    parser.add_argument("--status", action="store_true", help="查看各账号状态")
+    parser.add_argument("--set", metavar="NAME", help="设置指定账号的余额/每日上限/启用状态")
+    parser.add_argument("--points", type=int, help="配合 --set：当前金钱余额")
+    parser.add_argument("--quota", type=int, help="配合 --set：每日下载上限")
+    parser.add_argument("--disable", action="store_true", help="配合 --set：停用账号")
+    parser.add_argument("--enable", action="store_true", help="配合 --set：启用账号")
+    parser.add_argument("--clear-cooldown", metavar="NAME", help="解除指定账号的冷却")
+    args = parser.parse_args()
+
+    pool = SessionPool(args.db or os.getenv("SESSION_POOL_DB") or None)
+
+    if args.dir:
+        print(f"✅ 已登记 {pool.sync_dir(args.dir)} 个会话文件: {args.dir}")
+    if args.set:
+        enabled = False if args.disable else (True if args.enable else None)
+        if pool.set_account(args.set, args.points, args.quota, enabled):
+            print(f"✅ 已更新账号: {args.set}")
+        else:
+            print(f"⚠️ 未找到账号: {args.set}（请先用 --dir 登记会话文件）")
+    if args.clear_cooldown:
+        if pool.clear_cooldown(args.clear_cooldown):
+            print(f"✅ 已解除冷却: {args.clear_cooldown}")
+        else:
+            print(f"⚠️ 未找到账号: {args.clear_cooldown}")
+    if args.status or not (args.set or args.clear_cooldown):
+        pool.print_report()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+字幕下载搜索结果与帖子缓存
+批量任务重跑时，大部分番号在前一晚已经搜索过：要么没有结果，要么命中同一个帖子。
+本模块把两类结果持久化到 SQLite，重跑时直接复用，避免重复搜索和重复进入帖子。
+
+- search_cache: 关键词 → 解析后的搜索结果（title、link、section、time）
+  有结果的条目缓存 7 天；无结果的条目缓存到 subtitle_search_state 记录的下次可搜索时间
+  （复查间隔只由 database_manager.subtitle_recheck_delay 决定，本模块不另算TTL）
+- thread_cache: 帖子URL → 购买状态、解压密码、已下载文件路径，缓存 30 天
+  （购买状态供专区下载跳过购买检测，已下载文件供同一编号重跑时跳过进入帖子）
+
+只缓存确定的结论：请求失败、反爬页面等情况不会写入无结果缓存。
+设置环境变量 SUBTITLE_CACHE_DISABLED=1 可关闭缓存。
+
+用法示例:
+  python subtitle_cache.py --stats
+  python subtitle_cache.py --clear-misses
+  python subtitle_cache.py --forget HMN-733
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+
+DEFAULT_DB_PATH = Path(__file__).parent / "database" / "subtitle_cache.db"
+
+HIT_TTL = 7 * 24 * 3600
+THREAD_TTL = 30 * 24 * 3600
+
+_RESULT_FIELDS = ("title", "link", "section", "time", "user")
+
+
+def normalize_keyword(keyword: str) -> str:
+    """关键词统一为去空格大写，与数据库中的 video_id 处理一致"""
+    return (keyword or "").strip().upper()
+
+
+class SubtitleCache:
+    """搜索结果与帖子状态缓存（每次操作独立连接，可在多线程/多进程间共享）"""
+
+    def __init__(self, db_path: Optional[str] = None):
+        self.db_path = str(db_path or DEFAULT_DB_PATH)
+        self.ensure_database_dir()
+        self.init_database()
+
+    def ensure_database_dir(self):
+        """确保数据库目录存在"""
+        db_dir = os.path.dirname(self.db_path)
+        if db_dir and not os.path.exists(db_dir):
+            os.makedirs(db_dir, exist_ok=True)
+
+    def _connect(self) -> sqlite3.Connection:
+        # 手动管理事务，配合 BEGIN IMMEDIATE 保证跨进程原子性
+        conn = sqlite3.connect(self.db_path, timeout=30.0, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def init_database(self):
+        """初始化缓存表结构"""
+        conn = self._connect()
+        try:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS search_cache (
+                    keyword TEXT PRIMARY KEY,
+                    results_json TEXT NOT NULL,
+                    result_count INTEGER NOT NULL,
+                    searched_at REAL NOT NULL,
+                    expires_at REAL NOT NULL,
+                    miss_count INTEGER DEFAULT 0
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS thread_cache (
+                    url TEXT PRIMARY KEY,
+                    keyword TEXT,
+                    section TEXT,
+                    purchased INTEGER DEFAULT 0,
+                    password TEXT,
+                    file_path TEXT,
+                    updated_at REAL NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+            """)
+        finally:
+            conn.close()
+
+    # ==================== 搜索结果 ====================
+
+    def get_search(self, keyword: str) -> Optional[Dict[str, Any]]:
+        """
+        读取未过期的搜索缓存
+
+        Returns:
+            Dict: {"results", "miss_count", "searched_at", "expires_at"}；无缓存或已过期返回 None
+        """
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                "SELECT results_json, miss_count, searched_at, expires_at FROM search_cache "
+                "WHERE keyword = ? AND expires_at > ?",
+                (normalize_keyword(keyword), time.time()),
+            ).fetchone()
+        finally:
+            conn.close()
+        if not row:
+            return None
+        return {"results": json.loads(row[0]), "miss_count": row[1], "searched_at": row[2], "expires_at": row[3]}
+
+    def put_results(self, keyword: str, results: List[Dict[str, Any]]):
+        """写入有结果的搜索缓存，并清零未命中计数"""
+        slim = [{k: item.get(k, "") for k in _RESULT_FIELDS} for item in results]
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO search_cache "
+                "(keyword, results_json, result_count, searched_at, expires_at, miss_count) "
+                "VALUES (?, ?, ?, ?, ?, 0)",
+                (normalize_keyword(keyword), json.dumps(slim, ensure_ascii=False), len(slim), now, now + HIT_TTL),
+            )
+        finally:
+            conn.close()
+
+    def put_miss(self, keyword: str, expires_at: float) -> float:
+        """
+        记录一次确定的无结果搜索，缓存到 expires_at（subtitle_search_state 的下次可搜索时间）
+
+        Returns:
+            float: 本次缓存的秒数
+        """
+        key = normalize_keyword(keyword)
+        now = time.time()
+        ttl = max(expires_at - now, 0.0)
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT miss_count, result_count FROM search_cache WHERE keyword = ?", (key,)
+            ).fetchone()
+            # 之前有结果的条目重新从第一次未命中开始计数
+            misses = (row[0] if row and row[1] == 0 else 0) + 1
+            conn.execute(
+                "INSERT OR REPLACE INTO search_cache "
+                "(keyword, results_json, result_count, searched_at, expires_at, miss_count) "
+                "VALUES (?, '[]', 0, ?, ?, ?)",
+                (key, now, now + ttl, misses),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        return ttl
+
+    def forget(self, keyword: str):
+        """删除关键词的搜索缓存"""
+        conn = self._connect()
+        try:
+            conn.execute("DELETE FROM search_cache WHERE keyword = ?", (normalize_keyword(keyword),))
+        finally:
+            conn.close()
+
+    def clear_misses(self) -> int:
+        """清空所有无结果缓存，返回删除条数"""
+        conn = self._connect()
+        try:
+            return conn.execute("DELETE FROM search_cache WHERE result_count = 0").rowcount
+        finally:
+            conn.close()
+
+    # ==================== 帖子状态 ====================
+
+    def get_thread(self, url: str) -> Optional[Dict[str, Any]]:
+        """
+        读取未过期的帖子缓存
+
+        Returns:
+            Dict: {"url","keyword","section","purchased","password","file_path","updated_at"}
+        """
+        if not url:
+            return None
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                "SELECT keyword, section, purchased, password, file_path, updated_at "
+                "FROM thread_cache WHERE url = ? AND expires_at > ?",
+                (url, time.time()),
+            ).fetchone()
+        finally:
+            conn.close()
+        if not row:
+            return None
+        return {
+            "url": url,
+            "keyword": row[0],
+            "section": row[1],
+            "purchased": bool(row[2]),
+            "password": row[3],
+            "file_path": row[4],
+            "updated_at": row[5],
+        }
+
+    def put_thread(self, url: str, keyword: str = None, section: str = None, purchased: bool = None,
+                   password: str = None, file_path: str = None):
+        """写入帖子缓存；参数为 None 的字段保留原值"""
+        if not url:
+            return
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "INSERT OR IGNORE INTO thread_cache (url, updated_at, expires_at) VALUES (?, ?, ?)",
+                (url, now, now + THREAD_TTL),
+            )
+            conn.execute(
+                """
+                UPDATE thread_cache SET
+                    keyword = COALESCE(?, keyword),
+                    section = COALESCE(?, section),
+                    purchased = COALESCE(?, purchased),
+                    password = COALESCE(?, password),
+                    file_path = COALESCE(?, file_path),
+                    updated_at = ?,
+                    expires_at = ?
+                WHERE url = ?
+                """,
+                (
+                    normalize_keyword(keyword) if keyword else None,
+                    section,
+                    None if purchased is None else int(bool(purchased)),
+                    password or None,
+                    file_path or None,
+                    now, now + THREAD_TTL, url,
+                ),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    # ==================== 统计 ====================
+
+    def stats(self) -> Dict[str, int]:
+        """缓存条目统计"""
+        now = time.time()
+        conn = self._connect()
+        try:
+            hits, misses, expired = conn.execute(
+                "SELECT "
+                "COALESCE(SUM(CASE WHEN result_count > 0 AND expires_at > ? THEN 1 ELSE 0 END), 0), "
+                "COALESCE(SUM(CASE WHEN result_count = 0 AND expires_at > ? THEN 1 ELSE 0 END), 0), "
+                "COALESCE(SUM(CASE WHEN expires_at <= ? THEN 1 ELSE 0 END), 0) "
+                "FROM search_cache",
+                (now, now, now),
+            ).fetchone()
+            threads, purchased, with_password = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(purchased), 0), "
+                "COALESCE(SUM(CASE WHEN password IS NOT NULL THEN 1 ELSE 0 END), 0) "
+                "FROM thread_cache WHERE expires_at > ?",
+                (now,),
+            ).fetchone()
+        finally:
+            conn.close()
+        return {
+            "search_hits": hits,
+            "search_misses": misses,
+            "search_expired": expired,
+            "threads": threads,
+            "threads_purchased": purchased,
+            "threads_with_password": with_password,
+        }
+
+    def print_stats(self):
+        """打印缓存统计"""
+        s = self.stats()
+        print("=" * 60)
+        print("📦 字幕搜索缓存")
+        print("=" * 60)
+        print(f"有结果的关键词: {s['search_hits']}")
+        print(f"无结果的关键词: {s['search_misses']}")
+        print(f"已过期的关键词: {s['search_expired']}")
+        print(f"帖子: {s['threads']}（已购买 {s['threads_purchased']}，有解压密码 {s['threads_with_password']}）")
+        print("=" * 60)
+
+
+# ==================== 进程内单例 ====================
+
+_cache: Optional[SubtitleCache] = None
+
+
+def get_subtitle_cache() -> Optional[SubtitleCache]:
+    """获取进程内共享的缓存；设置 SUBTITLE_CACHE_DISABLED=1 可关闭"""
+    global _cache
+    if os.getenv("SUBTITLE_CACHE_DISABLED") == "1":
+        return None
+    if _cache is None:
+        try:
+            _cache = SubtitleCache(os.getenv("SUBTITLE_CACHE_DB") or None)
+        except sqlite3.Error as e:
+            print(f"⚠️ 初始化字幕缓存失败，将不使用缓存: {e}")
+            return None
+    return _cache
+
+
+def main():
+    parser = argparse.ArgumentParser(description="字幕搜索结果与帖子缓存管理")
+    parser.add_argument("--db", help="缓存数据库路径，默认 ./database/subtitle_cache.db")
+    parser.add_argument("--stats", action="store_true", help="查看缓存统计")
+    parser.add_argument("--clear-misses", action="store_true", help="清空所有无结果缓存")
+    parser.add_argument("--forget", metavar="KEYWORD", help="删除指定关键词的搜索缓存")
+    args = parser.parse_args()
+
+    cache = SubtitleCache(args.db)
+
+    if args.forget:
+        cache.forget(args.forget)
+        print(f"✅ 已删除搜索缓存: {normalize_keyword(args.forget)}")
+    if args.clear_misses:
+        print(f"✅ 已清空 {cache.clear_misses()} 条无结果缓存")
+    if args.stats or not (args.forget or args.clear_misses):
+        cache.print_stats()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
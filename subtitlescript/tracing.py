@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+字幕下载流程分阶段耗时追踪
+用上下文管理器 span("阶段名") 或装饰器 @traced("阶段名") 记录每个阶段的耗时（time.perf_counter）与结果标签。
+每个任务（一个编号）的全部 span 在任务结束时作为一行 JSON 追加到 output/traces/subtitle-YYYYMMDD.jsonl：
+  {"job", "standalone", "started_at", "elapsed_ms", "outcome", "spans": [{"stage", "parent", "offset_ms", "duration_ms", "outcome", "tags"}]}
+不在任务内的 span（如会话启动）单独写为一行，job 为阶段名。
+
+当前任务保存在线程本地变量中，多worker并发时互不干扰。
+设置环境变量 SUBTITLE_TRACE_DISABLED=1 可关闭追踪，SUBTITLE_TRACE_DIR 可指定输出目录。
+
+用法示例:
+  python tracing.py summary
+  python tracing.py summary output/traces/subtitle-20250101.jsonl --job HMN-733
+"""
+
+import argparse
+import functools
+import glob
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+
+DEFAULT_TRACE_DIR = Path(__file__).parent / "output" / "traces"
+
+_local = threading.local()
+_write_lock = threading.Lock()
+
+
+def tracing_enabled() -> bool:
+    """追踪是否启用"""
+    return os.getenv("SUBTITLE_TRACE_DISABLED") != "1"
+
+
+def trace_dir() -> str:
+    return os.getenv("SUBTITLE_TRACE_DIR") or str(DEFAULT_TRACE_DIR)
+
+
+def trace_file_for_today() -> str:
+    return os.path.join(trace_dir(), f"subtitle-{time.strftime('%Y%m%d')}.jsonl")
+
+
+def outcome_of(result: Any) -> str:
+    """
+    从函数返回值推断结果标签：
+    结果字典看 success/message，(bool, ...) 元组看第一项，None 记为 none，其余记为 ok
+    """
+    if isinstance(result, dict) and "success" in result:
+        return "ok" if result.get("success") else str(result.get("message") or "failed")[:80]
+    if isinstance(result, tuple) and result and isinstance(result[0], bool):
+        return "ok" if result[0] else "failed"
+    if result is None:
+        return "none"
+    if result is False:
+        return "false"
+    return "ok"
+
+
+class Span:
+    """单个阶段的计时记录"""
+
+    def __init__(self, trace: "Trace", stage: str, parent: Optional[str], tags: Dict[str, Any]):
+        self.trace = trace
+        self.stage = stage
+        self.parent = parent
+        self.tags = dict(tags)
+        self.outcome = None
+        self._start = time.perf_counter()
+
+    def set(self, outcome: Optional[str] = None, **tags):
+        """设置结果标签或附加标签"""
+        if outcome is not None:
+            self.outcome = outcome
+        self.tags.update(tags)
+
+    def finish(self, outcome: Optional[str] = None):
+        end = time.perf_counter()
+        self.trace.spans.append({
+            "stage": self.stage,
+            "parent": self.parent,
+            "offset_ms": round((self._start - self.trace.start) * 1000, 1),
+            "duration_ms": round((end - self._start) * 1000, 1),
+            "outcome": self.outcome or outcome or "ok",
+            "tags": self.tags,
+        })
+
+
+class Trace:
+    """一个任务的全部 span"""
+
+    def __init__(self, job: str, standalone: bool = False):
+        self.job = str(job)
+        self.standalone = standalone
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        self.spans: List[Dict[str, Any]] = []
+        self.stack: List[Span] = []
+        self.outcome = None
+
+    def to_record(self) -> Dict[str, Any]:
+        return {
+            "job": self.job,
+            "standalone": self.standalone,
+            "started_at": round(self.started_at, 3),
+            "elapsed_ms": round((time.perf_counter() - self.start) * 1000, 1),
+            "outcome": self.outcome or "ok",
+            "spans": self.spans,
+        }
+
+
+class _NullSpan:
+    """追踪关闭时的空实现"""
+
+    def set(self, outcome: Optional[str] = None, **tags):
+        pass
+
+
+def _write_record(record: Dict[str, Any]):
+    path = trace_file_for_today()
+    try:
+        with _write_lock:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    except OSError as e:
+        print(f"⚠️ 写入追踪记录失败: {e}")
+
+
+def current_trace() -> Optional[Trace]:
+    return getattr(_local, "trace", None)
+
+
+@contextmanager
+def trace_job(job: str):
+    """
+    开始一个任务的追踪，退出时把全部 span 写为一行JSONL
+
+    用法:
+        with trace_job(keyword) as trace:
+            ...
+            trace.outcome = "downloaded"
+    """
+    if not tracing_enabled() or current_trace() is not None:
+        # 关闭追踪或已在任务内时不嵌套新任务
+        yield current_trace() or Trace(job)
+        return
+    trace = Trace(job)
+    _local.trace = trace
+    try:
+        yield trace
+    except BaseException as e:
+        trace.outcome = trace.outcome or type(e).__name__
+        raise
+    finally:
+        _local.trace = None
+        _write_record(trace.to_record())
+
+
+@contextmanager
+def span(stage: str, **tags):
+    """
+    记录一个阶段的耗时；不在任务内时单独写为一行
+
+    用法:
+        with span("search", mode="http") as s:
+            ...
+            s.set("no_results")
+    """
+    if not tracing_enabled():
+        yield _NullSpan()
+        return
+    standalone = current_trace() is None
+    if standalone:
+        _local.trace = Trace(stage, standalone=True)
+    trace = _local.trace
+    parent = trace.stack[-1].stage if trace.stack else None
+    s = Span(trace, stage, parent, tags)
+    trace.stack.append(s)
+    try:
+        yield s
+    except BaseException as e:
+        s.finish(type(e).__name__)
+        raise
+    else:
+        s.finish()
+    finally:
+        trace.stack.pop()
+        if standalone:
+            _local.trace = None
+            trace.outcome = trace.spans[-1]["outcome"] if trace.spans else None
+            _write_record(trace.to_record())
+
+
+def traced(stage: str, outcome: Callable[[Any], str] = outcome_of):
+    """装饰器：整个函数作为一个阶段，结果标签由返回值推断"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(stage) as s:
+                result = func(*args, **kwargs)
+                s.set(outcome(result))
+                return result
+        return wrapper
+    return decorator
+
+
+# ==================== 汇总 ====================
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    k = (len(ordered) - 1) * pct / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def load_records(paths: List[str], job: Optional[str] = None) -> List[Dict[str, Any]]:
+    """读取JSONL追踪记录，跳过损坏的行"""
+    records = []
+    for path in paths:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    if job is None or str(record.get("job", "")).upper() == job.upper():
+                        records.append(record)
+        except OSError as e:
+            print(f"⚠️ 读取追踪文件失败: {path} - {e}")
+    return records
+
+
+def summarize(records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """按阶段统计次数、p50、p95、最大耗时、总耗时与结果分布，按总耗时降序"""
+    stages: Dict[str, Dict[str, Any]] = {}
+    for record in records:
+        for s in record.get("spans", []):
+            entry = stages.setdefault(s["stage"], {"durations": [], "outcomes": {}})
+            entry["durations"].append(s["duration_ms"])
+            entry["outcomes"][s["outcome"]] = entry["outcomes"].get(s["outcome"], 0) + 1
+    rows = []
+    for stage, entry in stages.items():
+        durations = entry["durations"]
+        rows.append({
+            "stage": stage,
+            "count": len(durations),
+            "p50_ms": _percentile(durations, 50),
+            "p95_ms": _percentile(durations, 95),
+            "max_ms": max(durations),
+            "total_ms": sum(durations),
+            "outcomes": entry["outcomes"],
+        })
+    rows.sort(key=lambda r: r["total_ms"], reverse=True)
+    return rows
+
+
+def print_summary(records: List[Dict[str, Any]]):
+    """打印各阶段耗时分布"""
+    jobs = [r for r in records if not r.get("standalone")]
+    print("=" * 96)
+    print(f"⏱️ 字幕下载阶段耗时（{len(records)} 条记录，其中任务 {len(jobs)} 个）")
+    print("=" * 96)
+    if jobs:
+        elapsed = [r["elapsed_ms"] for r in jobs]
+        print(f"任务总耗时: p50 {_percentile(elapsed, 50) / 1000:.2f}s  p95 {_percentile(elapsed, 95) / 1000:.2f}s")
+        print("-" * 96)
+    print(f"{'阶段':<28}{'次数':>6}{'p50(s)':>10}{'p95(s)':>10}{'最大(s)':>10}{'合计(s)':>10}  结果")
+    for row in summarize(records):
+        outcomes = ", ".join(f"{k}:{v}" for k, v in sorted(row["outcomes"].items(), key=lambda kv: -kv[1])[:4])
+        print(f"{row['stage']:<28}{row['count']:>6}{row['p50_ms'] / 1000:>10.2f}{row['p95_ms'] / 1000:>10.2f}"
+              f"{row['max_ms'] / 1000:>10.2f}{row['total_ms'] / 1000:>10.1f}  {outcomes}")
+    print("=" * 96)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="字幕下载阶段耗时汇总")
+    sub = parser.add_subparsers(dest="command")
+    summary = sub.add_parser("summary", help="按阶段打印 p50/p95 耗时")
+    summary.add_argument("files", nargs="*", help="JSONL追踪文件，默认 output/traces/ 下全部文件")
+    summary.add_argument("--job", help="只统计指定编号")
+    args = parser.parse_args()
+
+    if args.command != "summary":
+        parser.print_help()
+        return 1
+    files = args.files or sorted(glob.glob(os.path.join(trace_dir(), "*.jsonl")))
+    if not files:
+        print(f"❌ 未找到追踪文件: {trace_dir()}")
+        return 1
+    records = load_records(files, args.job)
+    if not records:
+        print("❌ 没有可汇总的追踪记录")
+        return 1
+    print_summary(records)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,6 +5,8 @@ MissAV 演员页面视频ID抓取脚本 (Playwright版本)
 
 用法示例:
 python videoID-spider-playwright.py --actress-url "https://missav.live/actresses/七海蒂娜" --concurrency 3 --delay 2.0 --retries 3 --max-pages 10
+python videoID-spider-playwright-api.py --record-har ./har/crawl.har --actresses-max-pages 2 --max-actress-pages 3
+python videoID-spider-playwright-api.py --replay-har ./har/crawl.har --delay 0   # 离线回放录制的抓取（见 har_replay.py）
 
 功能:
 - 输入: 演员页面URL
@@ -21,11 +23,9 @@ import argparse
 import json
 import os
 import random
-import re
 import sqlite3
 import time
-from typing import List, Tuple, Optional, Dict, Any
-from urllib.parse import urljoin, urlparse, urlunparse, parse_qs, urlencode, unquote
+from typing import Callable, List, Tuple, Optional, Dict, Any
 
 from playwright.sync_api import Playwright, sync_playwright, Page, BrowserContext
 from playwright_stealth.stealth import stealth_sync
@@ -33,13 +33,33 @@ from bs4 import BeautifulSoup
 from datetime import datetime
 from pathlib import Path
 
+from rate_limiter import acquire_for_url
+from crawl_scheduler import CrawlScheduler
+from crawl_coordinator import CrawlWorker, DEFAULT_LEASE_SECONDS, LeaseLostError
+from browser_fleet import open_page, close_page
+from har_replay import add_har_arguments, apply_har, configure_from_args, database_path, har_replaying
+from page_pipeline import iter_pages_pipelined
+from session_health import detect_login, format_report, read_session_file
+from parse_service import get_parse_service
+from html_parsers import (
+    normalize_video_id,
+    derive_actor_name_from_url,
+    extract_video_items,
+    detect_pagination_style_and_max_pages,
+    parse_actress_page,
+    parse_list_page,
+)
+
+
+DEFAULT_DB_PATH = "./database/actresses.db"
+
 
 class ProgressManager:
-    """进度管理器，使用数据库存储进度信息"""
+    """进度管理器，使用数据库存储进度信息（HAR回放时使用回放数据库）"""
     
-    def __init__(self, db_path: str = "./database/actresses.db"):
+    def __init__(self, db_path: Optional[str] = None):
         from database_manager import DatabaseManager
-        self.db_manager = DatabaseManager(db_path)
+        self.db_manager = DatabaseManager(db_path or database_path(DEFAULT_DB_PATH))
         # 初始化抓取会话
         self.session_id = self.db_manager.init_crawl_session()
     
@@ -75,6 +95,22 @@ class ProgressManager:
         """获取演员的恢复信息 (last_page, total_videos)"""
         return self.db_manager.get_actress_resume_info(actress_name)
     
+    def needs_full_crawl(self, actress_name: str, full_interval_days: float) -> bool:
+        """检查已完成的演员是否到了强制全量抓取的时间"""
+        return self.db_manager.needs_full_crawl(actress_name, full_interval_days)
+    
+    def reset_actress_progress(self, actress_name: str):
+        """重置演员页级进度，准备全量重抓"""
+        self.db_manager.reset_actress_progress(actress_name)
+    
+    def mark_actress_crawled(self, actress_name: str, mode: str, new_videos: int = 0):
+        """记录演员的全量/增量抓取时间"""
+        self.db_manager.mark_actress_crawled(actress_name, mode, new_videos)
+    
+    def get_known_video_urls(self, actress_name: str) -> set:
+        """获取演员已入库的视频URL集合"""
+        return self.db_manager.get_known_video_urls(actress_name)
+    
     def print_progress(self):
         """打印当前进度"""
         self.db_manager.print_progress()
@@ -83,10 +119,10 @@ class ProgressManager:
 class DatabaseWriter:
     """数据库写入器，用于将数据存储到数据库"""
     
-    def __init__(self, actress_name: str, db_path: str = "./database/actresses.db", batch_size: int = 10):
+    def __init__(self, actress_name: str, db_path: Optional[str] = None, batch_size: int = 10):
         from database_manager import DatabaseManager
         self.actress_name = actress_name
-        self.db_manager = DatabaseManager(db_path)
+        self.db_manager = DatabaseManager(db_path or database_path(DEFAULT_DB_PATH))
         self.batch_size = batch_size
         self.buffer = []
         self.total_written = 0
@@ -137,35 +173,10 @@ def load_session_if_exists(session_file: str = "./session_videoID.json") -> Opti
 
 
 def check_login_status(page: Page) -> bool:
-    """检查页面是否已登录"""
-    try:
-        # 检查是否存在登录相关的元素
-        login_indicators = [
-            'a[href*="login"]',
-            'a[href*="register"]', 
-            '.login-form',
-            '#login-form'
-        ]
-        
-        for selector in login_indicators:
-            if page.locator(selector).count() > 0:
-                return False
-        
-        # 检查是否存在用户相关的元素
-        user_indicators = [
-            'a[href*="profile"]',
-            'a[href*="user"]',
-            '.user-menu',
-            '.logout'
-        ]
-        
-        for selector in user_indicators:
-            if page.locator(selector).count() > 0:
-                return True
-                
-        return True  # 默认认为已登录
-    except Exception:
-        return False
+    """检查页面是否已登录（全部登录/未登录选择器合并为一次 evaluate）"""
+    logged_in = detect_login(page, "missav", verbose=False)
+    print(format_report(read_session_file("./session_videoID.json", "missav")))
+    return logged_in
 
 
 def setup_playwright_page(playwright: Playwright, session_file: str = "./session_videoID.json") -> Tuple[Page, BrowserContext]:
@@ -242,6 +253,7 @@ def setup_playwright_page(playwright: Playwright, session_file: str = "./session
             browser.close()
             raise RuntimeError(f"无法创建浏览器上下文: {e2}")
     
+    apply_har(context)
     page = context.new_page()
     stealth_sync(page)
     
@@ -275,15 +287,47 @@ def sleep_delay(delay: float):
         time.sleep(1.0)
 
 
+# 本进程发出的页面请求数（含重试），供调度器统计请求预算
+_page_request_count = 0
+
+# 本进程上一次发出页面请求的时间（monotonic），用于保证 --delay 的最小请求间隔
+_last_request_at: Optional[float] = None
+
+
+def get_page_request_count() -> int:
+    """获取本进程累计的页面请求数"""
+    return _page_request_count
+
+
+def pace_request(url: str, delay: float, extra_wait: float = 0.0):
+    """
+    发出页面请求前的限速：先取跨进程共享令牌桶，再等待 extra_wait 秒，
+    最后补足距本进程上一次请求的 --delay 最小间隔
+    """
+    global _last_request_at
+    acquire_for_url(url)
+    sleep_delay(extra_wait)
+    if _last_request_at is not None:
+        sleep_delay(_last_request_at + max(0.0, float(delay)) - time.monotonic())
+    _last_request_at = time.monotonic()
+
+
 def get_page_content(page: Page, url: str, timeout: int, delay: float, retries: int, referer: Optional[str] = None) -> str:
-    """使用Playwright获取页面内容"""
+    """
+    使用Playwright获取页面内容
+    
+    delay 为本进程两次页面请求之间的最小间隔（秒），在跨进程共享令牌桶之外额外生效；
+    为0时只受令牌桶限速。
+    """
+    global _page_request_count
     last_err = None
     
     for attempt in range(retries + 1):
-        # 基础限速 + 抖动 + 轻度退避
-        jitter = random.uniform(0.15, 0.45)
+        # 基础限速由跨进程共享令牌桶控制，本地再叠加抖动 + 轻度退避，--delay 作为请求间隔下限
+        jitter = 0.0 if har_replaying() else random.uniform(0.15, 0.45)
         backoff = min(2.0, 0.4 * attempt)
-        sleep_delay(max(0.0, float(delay) + jitter + backoff))
+        pace_request(url, delay, jitter + backoff)
+        _page_request_count += 1
         
         try:
             # 设置Referer
@@ -312,34 +356,6 @@ def get_page_content(page: Page, url: str, timeout: int, delay: float, retries:
     raise last_err if last_err else RuntimeError("Unknown error")
 
 
-def normalize_video_id(text: str) -> Tuple[str, str]:
-    """从文本中提取并标准化视频ID"""
-    if not text:
-        return "", ""
-    
-    # 常见的视频ID模式
-    patterns = [
-        # FC2-PPV 系列
-        (r'\bFC2[-\s]*PPV[-\s]*(\d+)\b', "FC2-PPV", lambda m: f"FC2-PPV-{m.group(1)}"),
-        # 标准番号格式 (字母-数字)
-        (r'\b([A-Z]{2,10})[-\s]*(\d{3,6})\b', "STANDARD", lambda m: f"{m.group(1)}-{m.group(2).zfill(3)}"),
-        # 纯数字ID
-        (r'\b(\d{6,10})\b', "NUMERIC", lambda m: m.group(1)),
-    ]
-    
-    text_upper = text.upper()
-    
-    for pattern, pattern_type, formatter in patterns:
-        match = re.search(pattern, text_upper)
-        if match:
-            try:
-                return formatter(match), pattern_type
-            except:
-                continue
-    
-    return "", ""
-
-
 def extract_actress_name(soup: BeautifulSoup) -> str:
     """从页面中提取演员名称"""
     # og:title 优先
@@ -360,193 +376,25 @@ def extract_actress_name(soup: BeautifulSoup) -> str:
     return ""
 
 
-def extract_video_items(soup: BeautifulSoup, base_url: str) -> List[Tuple[str, str]]:
-    """从演员页中提取视频条目"""
-    items = []
-    seen = set()
-
-    # 优先：a 标签文本包含番号
-    for a in soup.find_all("a"):
-        txt = a.get_text(" ", strip=True)
-        if not txt:
-            continue
-        
-        vid, _ = normalize_video_id(txt)
-        if not vid:
-            continue
-        
-        href = a.get("href") or ""
-        abs_url = urljoin(base_url, href) if href else ""
-        if not abs_url:
-            continue
-        
-        path = (urlparse(abs_url).path or "").lower()
-        
-        # 显式忽略非作品链接
-        if "/actresses/ranking" in path:
-            continue
-        
-        # 仅接受与番号对应的作品详情URL
-        slug = vid.lower()
-        candidates = {slug}
-        
-        # FC2 两种常见形式互相兼容
-        if slug.startswith("fc2-ppv-"):
-            candidates.add(slug.replace("fc2-ppv-", "fc2-"))
-        if slug.startswith("fc2-") and not slug.startswith("fc2-ppv-"):
-            candidates.add(slug.replace("fc2-", "fc2-ppv-"))
-        
-        # 匹配基本形式或后缀扩展形式
-        if not any(c in path for c in candidates) and not any((c + "-") in path for c in candidates):
-            continue
-        
-        key = abs_url or (txt + "|" + base_url)
-        if key in seen:
-            continue
-        
-        seen.add(key)
-        items.append((txt, abs_url))
-
-    # 次选：img alt 属性包含番号
-    for img in soup.find_all("img"):
-        alt = img.get("alt", "").strip()
-        if not alt:
-            continue
-        
-        vid, _ = normalize_video_id(alt)
-        if not vid:
-            continue
-        
-        # 查找包含此图片的链接
-        parent_a = img.find_parent("a")
-        if not parent_a:
-            continue
-        
-        href = parent_a.get("href") or ""
-        abs_url = urljoin(base_url, href) if href else ""
-        if not abs_url:
-            continue
-        
-        key = abs_url or (alt + "|" + base_url)
-        if key in seen:
-            continue
-        
-        seen.add(key)
-        items.append((alt, abs_url))
-
-    return items
-
-
-def detect_pagination_style_and_max_pages(soup: BeautifulSoup, actress_url: str, max_pages: int) -> List[str]:
-    """检测分页样式并生成分页URL列表"""
-    numbers = []
-    style = None
+def build_video_row(title: str, url: str, page_no: int) -> Dict[str, Any]:
+    """将视频条目转换为数据库行"""
+    video_id, pattern_type = normalize_video_id(title)
     
-    # 查找分页链接
-    for a in soup.find_all("a"):
-        href = a.get("href", "")
-        if not href:
-            continue
-        
-        # 检查是否为分页链接
-        if re.search(r'/page/\d+', href):
-            style = "path"
-            match = re.search(r'/page/(\d+)', href)
-            if match:
-                numbers.append(int(match.group(1)))
-        elif "page=" in href:
-            style = "query"
-            parsed = urlparse(href)
-            query_params = parse_qs(parsed.query)
-            if "page" in query_params:
-                try:
-                    numbers.append(int(query_params["page"][0]))
-                except (ValueError, IndexError):
-                    pass
-    
-    # 如果没有检测到分页样式，默认使用query风格
-    if style is None:
-        style = "query"
-    
-    max_num = max(numbers) if numbers else 1
-    max_num = min(max_num, max_pages)
-    
-    # 生成完整分页URL列表
-    urls = []
-    if style == "path":
-        # /.../page/N 风格
-        base = urlparse(actress_url)
-        base_path = base.path.rstrip("/")
-        for i in range(1, max_num + 1):
-            if i == 1:
-                urls.append(actress_url)
-            else:
-                new_path = f"{base_path}/page/{i}"
-                urls.append(urlunparse((base.scheme, base.netloc, new_path, "", "", "")))
-    else:
-        # 默认和 MissAV 一致：?page=N 风格
-        parsed = urlparse(actress_url)
-        base_q = parse_qs(parsed.query)
-        base_q.pop("page", None)
-        # page=1 使用原始 URL，其余使用 ?page=i
-        urls.append(urlunparse(parsed._replace(query=urlencode(base_q, doseq=True))))
-        for i in range(2, max_num + 1):
-            q = {**base_q, "page": [i]}
-            urls.append(urlunparse(parsed._replace(query=urlencode(q, doseq=True))))
+    # 确定视频类型 - 与videoID-spider.py保持一致
+    video_type = "普通"
+    if url and "uncensored-leak" in url:
+        video_type = "无码破解"
+    elif url and "chinese-subtitle" in url:
+        video_type = "中文字幕"
     
-    return urls
-
-
-def derive_actor_name_from_url(url: str) -> str:
-    """从URL推导演员名"""
-    try:
-        path = urlparse(url).path or ""
-        if path.endswith("/"):
-            path = path[:-1]
-        last = path.rsplit("/", 1)[-1] if path else ""
-        name = unquote(last).strip()
-        return name or "unknown"
-    except Exception:
-        return "unknown"
-
-
-def is_valid_actress_name(actress_name: str) -> bool:
-    """
-    检查演员名是否有效，过滤掉纯数字和字母数字组合的演员名
-    
-    过滤规则:
-    - 纯数字: 如 "123456" -> False
-    - 字母数字组合: 如 "abc123", "123abc", "a1b2c3" -> False
-    - 纯字母: 如 "张三", "田中美奈子", "Yui" -> True
-    - 包含中文、日文、韩文等非ASCII字符: -> True
-    """
-    if not actress_name or actress_name == "unknown":
-        return False
-    
-    # 移除常见的URL编码字符和特殊字符进行检查
-    clean_name = actress_name.replace("-", "").replace("_", "").replace(".", "").strip()
-    
-    if not clean_name:
-        return False
-    
-    # 检查是否为纯数字
-    if clean_name.isdigit():
-        print(f"过滤纯数字演员名: {actress_name}")
-        return False
-    
-    # 检查是否为字母数字组合（同时包含字母和数字）
-    has_letter = any(c.isalpha() for c in clean_name)
-    has_digit = any(c.isdigit() for c in clean_name)
-    
-    if has_letter and has_digit:
-        # 进一步检查是否只包含ASCII字母和数字（排除中文、日文等）
-        ascii_only = all(c.isalnum() for c in clean_name)
-        if ascii_only:
-            print(f"过滤字母数字组合演员名: {actress_name}")
-            return False
-    
-    # 其他情况都认为是有效的演员名
-    return True
+    return {
+        "video_title": title,
+        "video_url": url,
+        "video_type": video_type,
+        "video_id": video_id,
+        "id_pattern_type": pattern_type,
+        "page_no": page_no,
+    }
 
 
 def sanitize_filename(name: str, max_len: int = 80) -> str:
@@ -580,12 +428,12 @@ def save_debug_html(content: str, actress_name: str, page_no: int, retry_count:
 def crawl_actress_playwright(actress_url: str, concurrency: int, delay: float, retries: int, timeout: int, max_pages: int):
     """使用Playwright抓取演员页面"""
     with sync_playwright() as playwright:
-        page, context = setup_playwright_page(playwright)
+        page, context, fleet_lease = open_page(playwright, "missav", setup_playwright_page)
         
         try:
             # 访问首页进行预热
             try:
-                sleep_delay(delay)
+                pace_request("https://missav.live/", delay)
                 page.goto("https://missav.live/", wait_until="domcontentloaded", timeout=timeout * 1000)
                 print("网站预热成功")
             except Exception as e:
@@ -601,7 +449,7 @@ def crawl_actress_playwright(actress_url: str, concurrency: int, delay: float, r
             # 如果是dm18路径，进行额外预热
             if "/dm18/" in actress_url:
                 try:
-                    sleep_delay(delay)
+                    pace_request("https://missav.live/dm18/", delay)
                     page.goto("https://missav.live/dm18/", wait_until="domcontentloaded", timeout=timeout * 1000)
                     print("dm18路径预热成功")
                 except Exception as e:
@@ -649,24 +497,7 @@ def crawl_actress_playwright(actress_url: str, concurrency: int, delay: float, r
                 
                 # 转换为数据行
                 for title, url in items:
-                    video_id, pattern_type = normalize_video_id(title)
-                    
-                    # 确定视频类型 - 与videoID-spider.py保持一致
-                    video_type = "普通"
-                    if url and "uncensored-leak" in url:
-                        video_type = "无码破解"
-                    elif url and "chinese-subtitle" in url:
-                        video_type = "中文字幕"
-                    
-                    row = {
-                        "video_title": title,
-                        "video_url": url,
-                        "video_type": video_type,
-                        "video_id": video_id,
-                        "id_pattern_type": pattern_type,
-                        "page_no": page_no,
-                    }
-                    all_rows.append(row)
+                    all_rows.append(build_video_row(title, url, page_no))
             
             print(f"\n抓取完成!")
             print(f"总共找到 {len(all_rows)} 个视频")
@@ -680,26 +511,284 @@ def crawl_actress_playwright(actress_url: str, concurrency: int, delay: float, r
                 print(f"保存session失败: {e}")
         
         finally:
-            page.close()
-            context.close()
+            close_page(page, context, fleet_lease)
 
 
-def crawl_all_actresses_with_resume(concurrency: int = 1, delay: float = 1.0, retries: int = 3, timeout: int = 30, max_actress_pages: int = 999, actresses_max_pages: int = 50):
+def crawl_actress_delta(page: Page, progress_manager: ProgressManager, actress_name: str, actress_url: str,
+                        timeout: int, delay: float, retries: int, max_pages: int,
+                        stop_after_known: int = 12, request_limit: Optional[int] = None,
+                        check_lease: Optional[Callable[[], None]] = None) -> int:
+    """
+    增量抓取演员的新作品
+    
+    演员页默认按发行时间倒序排列，从第一页开始逐页抓取，
+    连续遇到 stop_after_known 个已入库的 video_url 即认为后续均已抓取过，立即停止翻页。
+    只有遇到已入库作品或翻到最后一页时才记录本次增量抓取；request_limit（本次最多发出的页面请求数）
+    用尽或某页抓取失败时，已写入的新作品保留，但不记录抓取时间，下次重新增量抓取。
+    check_lease 在每页写入前调用，租约被其他worker接手时抛出 LeaseLostError，演员不标记为已抓取。
+    
+    Returns:
+        int: 新增的视频数量
+    """
+    known_urls = progress_manager.get_known_video_urls(actress_name)
+    db_writer = DatabaseWriter(actress_name, batch_size=10)
+    state = {"new_count": 0, "known_run": 0, "stopped": False, "exhausted_at": None}
+    requests_start = get_page_request_count()
+    
+    def take_page(page_no: int, total_pages: int, items):
+        """写入一页中的新作品，连续遇到 stop_after_known 个已入库作品时标记停止"""
+        if check_lease is not None:
+            check_lease()
+        page_new = 0
+        for title, url in items:
+            if url in known_urls:
+                state["known_run"] += 1
+                if state["known_run"] >= stop_after_known:
+                    break
+                continue
+            
+            state["known_run"] = 0
+            known_urls.add(url)
+            db_writer.add_row(build_video_row(title, url, page_no))
+            page_new += 1
+        
+        state["new_count"] += page_new
+        print(f"增量抓取 {actress_name}: 第 {page_no}/{total_pages} 页新增 {page_new} 个视频")
+        if state["known_run"] >= stop_after_known:
+            print(f"连续遇到 {state['known_run']} 个已入库作品，停止翻页 (共请求 {page_no} 页)")
+            state["stopped"] = True
+    
+    try:
+        content = get_page_content(page, actress_url, timeout, delay, retries)
+        soup = BeautifulSoup(content, "html.parser")
+        page_urls = detect_pagination_style_and_max_pages(soup, actress_url, max_pages)
+        
+        # 第一页已为检测分页解析过，直接提取；多数演员在第一页就遇到已入库作品，不必启动流水线
+        take_page(1, len(page_urls), extract_video_items(soup, actress_url))
+        
+        def pages_to_crawl():
+            for page_no, page_url in enumerate(page_urls[1:], 2):
+                # 已遇到足够多的已入库作品时不再翻页（流水线最多多预取一页）
+                if state["stopped"]:
+                    return
+                if request_limit is not None and get_page_request_count() - requests_start >= request_limit:
+                    state["exhausted_at"] = page_no
+                    return
+                yield page_no, page_url
+        
+        def fetch_page(page_no: int, page_url: str) -> str:
+            return get_page_content(page, page_url, timeout, delay, retries)
+        
+        # 流水线：抓取第 N+1 页的同时由解析服务解析第 N 页
+        if not state["stopped"] and len(page_urls) > 1:
+            parse_executor = get_parse_service(expected_tasks=len(page_urls) - 1)
+            for result in iter_pages_pipelined(pages_to_crawl(), fetch_page, parse_actress_page, lookahead=1,
+                                               executor=parse_executor):
+                if result["error"] is not None:
+                    # 某页抓取失败：已写入的新作品保留，不记录抓取时间，由调用方按失败处理
+                    raise result["error"]
+                take_page(result["page_no"], len(page_urls), result["items"])
+                if state["stopped"]:
+                    break
+        
+        db_writer.close()
+        new_count = state["new_count"]
+        # 预算用尽前已交付的页面里遇到已入库作品时照常记录
+        if state["exhausted_at"] is not None and not state["stopped"]:
+            print(f"请求预算已用尽，演员 {actress_name} 的增量抓取停在第 {state['exhausted_at']}/{len(page_urls)} 页，"
+                  f"本次新增 {new_count} 个视频，下次重新增量抓取")
+            return new_count
+        if check_lease is not None:
+            check_lease()
+        progress_manager.mark_actress_crawled(actress_name, 'delta', new_count)
+        return new_count
+    except BaseException:
+        db_writer.close()
+        raise
+
+
+def crawl_actress_full(page: Page, progress_manager: ProgressManager, actress_name: str, actress_url: str,
+                       timeout: int, delay: float, retries: int, max_actress_pages: int,
+                       request_limit: Optional[int] = None, check_lease: Optional[Callable[[], None]] = None) -> int:
+    """
+    全量抓取演员的全部作品，支持页级/作品级断点续传
+    
+    request_limit 为本次最多发出的页面请求数，用尽后保留进度直接返回，下次从断点续抓。
+    check_lease 在处理每页前调用，租约被其他worker接手时抛出 LeaseLostError，已写入的进度保留，演员不标记完成。
+    
+    Returns:
+        int: 本次写入的视频数量
+    """
+    print(f"\n开始处理演员: {actress_name}")
+    print(f"演员页面: {actress_url}")
+    
+    # 开始处理演员
+    progress_manager.start_actress(actress_name, actress_url)
+    
+    # 准备数据库写入器
+    db_writer = DatabaseWriter(actress_name, batch_size=10)
+    new_count = 0
+    requests_start = get_page_request_count()
+    
+    try:
+        # 获取演员的恢复信息（作品级别）
+        last_page, last_position, existing_videos = progress_manager.db_manager.get_actress_last_video_info(actress_name)
+        
+        if last_page > 1 or last_position > 0:
+            # 检查是否需要显示断点恢复信息
+            if last_position == 12:  # 假设每页12个作品，页面已完成
+                print(f"从第 {last_page + 1} 页开始继续抓取 (已有 {existing_videos} 个视频)")
+            else:
+                print(f"从第 {last_page} 页第 {last_position + 1} 个作品继续抓取 (已有 {existing_videos} 个视频)")
+        
+        # 已入库作品URL，用于全量重抓时去重
+        known_urls = progress_manager.get_known_video_urls(actress_name)
+        
+        # 访问演员页面
+        content = get_page_content(page, actress_url, timeout, delay, retries)
+        soup = BeautifulSoup(content, "html.parser")
+        save_debug_html(content, actress_name, 1)
+        
+        # 检测总页数
+        page_urls = detect_pagination_style_and_max_pages(soup, actress_url, max_actress_pages)
+        total_pages = len(page_urls)
+        print(f"检测到 {total_pages} 个分页")
+        progress_manager.update_actress_pages(actress_name, total_pages)
+        
+        # 断点页之前的页面已完成；断点页本身重新抓取，已处理的作品在下方按位置跳过
+        # 请求预算用尽时停止产出页面，保留进度，不标记完成
+        budget_state = {"exhausted_at": None}
+        
+        def pages_to_crawl():
+            for page_no, page_url in enumerate(page_urls, 1):
+                if page_no < last_page:
+                    continue
+                if page_no > 1 and request_limit is not None and get_page_request_count() - requests_start >= request_limit:
+                    budget_state["exhausted_at"] = page_no
+                    return
+                yield page_no, page_url
+        
+        def fetch_page(page_no: int, page_url: str) -> str:
+            # 第一页已在检测分页时获取
+            if page_no == 1:
+                return content
+            page_content = get_page_content(page, page_url, timeout, delay, retries)
+            save_debug_html(page_content, actress_name, page_no)
+            return page_content
+        
+        # 流水线：抓取第 N+1 页的同时由解析服务（进程池或后台线程）解析第 N 页
+        parse_executor = get_parse_service(expected_tasks=total_pages)
+        for result in iter_pages_pipelined(pages_to_crawl(), fetch_page, parse_actress_page, lookahead=1,
+                                           executor=parse_executor):
+            page_no = result["page_no"]
+            if check_lease is not None:
+                check_lease()
+            
+            if result["error"] is not None:
+                error_msg = f"获取第 {page_no} 页失败: {result['error']}"
+                print(error_msg)
+                progress_manager.add_error(actress_name, error_msg)
+                continue
+            
+            # 提取视频条目
+            items = result["items"]
+            print(f"第 {page_no}/{total_pages} 页找到 {len(items)} 个视频")
+            
+            if page_no == last_page and last_position > 0:
+                # 如果last_position等于或大于页面作品数，说明该页面已完成
+                if last_position >= len(items):
+                    print(f"第 {page_no} 页已完成 ({last_position}/{len(items)} 个作品)，跳过")
+                    continue
+                print(f"第 {page_no} 页部分完成 ({last_position}/{len(items)} 个作品)，继续处理")
+            
+            # 处理每个视频
+            for position, (title, url) in enumerate(items):
+                # 如果是当前恢复页面，跳过已处理的作品
+                if page_no == last_page and position < last_position:
+                    continue
+                
+                # 全量重抓时跳过已入库的作品，避免重复写入
+                if url and url in known_urls:
+                    progress_manager.complete_page(actress_name, page_no, position + 1)
+                    continue
+                known_urls.add(url)
+                
+                # 增量写入数据库
+                db_writer.add_row(build_video_row(title, url, page_no))
+                new_count += 1
+                
+                # 作品级进度更新：每保存一个作品后立即更新进度
+                # position是从0开始的，所以当前位置是position+1
+                progress_manager.complete_page(actress_name, page_no, position + 1)
+                
+                # 强制刷新，确保进度立即保存到数据库
+                db_writer.flush()
+            
+            # 页面完全处理完成后，确保进度正确记录为页面完成状态
+            # 这里传入页面的总作品数，确保记录页面已完成
+            progress_manager.complete_page(actress_name, page_no, len(items))
+            
+            # 在每页结束后强制刷新，确保缓冲区内容全部落盘，避免中断造成漏写
+            db_writer.flush()
+            
+            print(f"演员 {actress_name}: 第 {page_no}/{total_pages} 页完成，本页 {len(items)} 个视频")
+            # 页面间延时由 get_page_content 中的共享限速统一控制
+        
+        if budget_state["exhausted_at"] is not None:
+            db_writer.close()
+            print(f"请求预算已用尽，演员 {actress_name} 停在第 {budget_state['exhausted_at']}/{total_pages} 页，下次继续")
+            return new_count
+    
+        # 确保所有数据都写入
+        db_writer.close()
+        if check_lease is not None:
+            check_lease()
+        
+        # 完成演员处理
+        progress_manager.complete_actress(actress_name)
+        
+        total_videos = progress_manager.db_manager.get_actress_video_count(actress_name)
+        print(f"演员 {actress_name} 抓取完成! 总共找到 {total_videos} 个视频")
+        print(f"结果已保存到数据库")
+        return new_count
+        
+    except KeyboardInterrupt:
+        # 捕获用户中断，先将缓冲区写入磁盘再退出，避免漏写
+        print(f"\n用户中断，正在保存已抓取的数据...")
+        try:
+            db_writer.close()
+        except Exception as close_error:
+            print(f"关闭数据库写入器时出错: {close_error}")
+        raise  # 重新抛出KeyboardInterrupt
+    except Exception:
+        db_writer.close()  # 确保关闭写入器，错误由调用方记录
+        raise
+
+
+def crawl_all_actresses_with_resume(concurrency: int = 1, delay: float = 1.0, retries: int = 3, timeout: int = 30, max_actress_pages: int = 999, actresses_max_pages: int = 50,
+                                    delta_mode: bool = True, full_crawl_interval_days: float = 30, delta_stop_after_known: int = 12,
+                                    request_budget: Optional[int] = None, worker_id: Optional[str] = None,
+                                    lease_seconds: float = DEFAULT_LEASE_SECONDS):
     """
     批量抓取所有演员页面，支持断点续传和增量写入
+    
+    演员按 CrawlScheduler 的优先级顺序抓取，request_budget 限制本次运行的演员页请求总数。
+    每个演员先通过 CrawlWorker 抢占租约再抓取，多个进程可共享同一数据库并行工作。
+    delta_mode 开启时，已完成的演员只抓取新作品（见 crawl_actress_delta），
+    距上次全量抓取超过 full_crawl_interval_days 天的演员会重新全量抓取。
     """
     # 初始化进度管理器
     progress_manager = ProgressManager()
     progress_manager.print_progress()
     
     with sync_playwright() as playwright:
-        page, context = setup_playwright_page(playwright)
+        page, context, fleet_lease = open_page(playwright, "missav", setup_playwright_page)
         
         try:
             # 网站预热
             print("正在预热网站...")
+            pace_request("https://missav.live/cn", delay)
             page.goto("https://missav.live/cn", timeout=timeout * 1000)
-            time.sleep(delay)
             
             # 检查登录状态
             if not check_login_status(page):
@@ -715,170 +804,90 @@ def crawl_all_actresses_with_resume(concurrency: int = 1, delay: float = 1.0, re
             # 设置总演员数
             progress_manager.set_total_actresses(len(actresses_urls))
             
-            # 遍历每个演员
-            for actress_url in actresses_urls:
-                actress_name = derive_actor_name_from_url(actress_url)
-                
-                # 检查是否已完成
-                if progress_manager.is_actress_completed(actress_name):
-                    print(f"演员 {actress_name} 已完成，跳过")
-                    continue
-                
-                print(f"\n开始处理演员: {actress_name}")
-                print(f"演员页面: {actress_url}")
-                
-                # 开始处理演员
-                progress_manager.start_actress(actress_name, actress_url)
-                
-                # 准备数据库写入器
-                db_writer = DatabaseWriter(actress_name, batch_size=10)
-                
-                try:
-                    # 获取演员的恢复信息（作品级别）
-                    last_page, last_position, existing_videos = progress_manager.db_manager.get_actress_last_video_info(actress_name)
+            # 按优先级调度演员（新作概率高的优先），并遵守本次运行的请求预算
+            scheduler = CrawlScheduler(progress_manager.db_manager, actresses_urls,
+                                       request_budget=request_budget,
+                                       include_completed=delta_mode,
+                                       full_interval_days=full_crawl_interval_days)
+            scheduler.print_plan()
+            
+            worker = CrawlWorker(progress_manager.db_manager, worker_id=worker_id, lease_seconds=lease_seconds)
+            worker.start()
+            try:
+                while True:
+                    task = scheduler.next_task()
+                    if task is None:
+                        break
                     
-                    if last_page > 1 or last_position > 0:
-                        # 检查是否需要显示断点恢复信息
-                        if last_position == 12:  # 假设每页12个作品，页面已完成
-                            print(f"从第 {last_page + 1} 页开始继续抓取 (已有 {existing_videos} 个视频)")
-                        else:
-                            print(f"从第 {last_page} 页第 {last_position + 1} 个作品继续抓取 (已有 {existing_videos} 个视频)")
+                    actress_name = task['actress_name']
+                    actress_url = task['actress_url']
                     
-                    # 访问演员页面
-                    content = get_page_content(page, actress_url, timeout, delay, retries)
-                    soup = BeautifulSoup(content, "html.parser")
-                    save_debug_html(content, actress_name, 1)
+                    # 抢占租约：其他worker正在处理的演员直接跳过
+                    if not worker.claim(actress_name, actress_url):
+                        print(f"演员 {actress_name} 正由其他worker处理，跳过")
+                        continue
                     
-                    # 检测总页数
-                    page_urls = detect_pagination_style_and_max_pages(soup, actress_url, max_actress_pages)
-                    total_pages = len(page_urls)
-                    print(f"检测到 {total_pages} 个分页")
-                    progress_manager.update_actress_pages(actress_name, total_pages)
+                    # 租约抢到后按最新状态复核（可能刚被其他worker完成）
+                    task = scheduler.refresh_task(task)
+                    if task is None:
+                        worker.release(actress_name, skipped=True)
+                        print(f"演员 {actress_name} 已被其他worker抓取，跳过")
+                        continue
                     
-                    # 遍历所有页面
-                    for page_no, page_url in enumerate(page_urls, 1):
-                        # 跳过已完成的页面
-                        # 如果当前页面小于last_page，直接跳过
-                        # 如果当前页面等于last_page，需要检查该页面是否已完全处理完成
-                        if page_no < last_page:
-                            continue
-                        elif page_no == last_page:
-                            # 检查该页面是否已完全处理完成
-                            # 如果last_position_in_page等于该页面的作品总数，说明该页面已完成，跳过
-                            # 否则需要继续处理该页面的剩余作品
-                            # 这里我们先获取页面内容来确定作品数量
-                            if last_position > 0:
-                                # 获取页面内容检查作品数量
-                                temp_content = get_page_content(page, page_url, timeout, delay, retries)
-                                temp_soup = BeautifulSoup(temp_content, "html.parser")
-                                temp_items = extract_video_items(temp_soup, page_url)
-                                
-                                # 如果last_position等于或大于页面作品数，说明该页面已完成
-                                if last_position >= len(temp_items):
-                                    print(f"第 {page_no} 页已完成 ({last_position}/{len(temp_items)} 个作品)，跳过")
-                                    continue
-                                else:
-                                    print(f"第 {page_no} 页部分完成 ({last_position}/{len(temp_items)} 个作品)，继续处理")
-                            # 如果last_position为0，说明该页面还没开始处理
-                            
-                        print(f"正在处理第 {page_no}/{total_pages} 页...")
-                        
-                        # 如果不是第一页，需要重新获取内容
-                        if page_no > 1:
-                            try:
-                                content = get_page_content(page, page_url, timeout, delay, retries)
-                                soup = BeautifulSoup(content, "html.parser")
-                                save_debug_html(content, actress_name, page_no)
-                            except Exception as e:
-                                error_msg = f"获取第 {page_no} 页失败: {e}"
-                                print(error_msg)
-                                progress_manager.add_error(actress_name, error_msg)
-                                continue
-                        
-                        # 提取视频条目
-                        items = extract_video_items(soup, page_url)
-                        print(f"第 {page_no} 页找到 {len(items)} 个视频")
-                        
-                        # 处理每个视频
-                        for position, (title, url) in enumerate(items):
-                            # 如果是当前恢复页面，跳过已处理的作品
-                            if page_no == last_page and position < last_position:
-                                continue
-                            
-                            video_id, pattern_type = normalize_video_id(title)
-                            
-                            # 确定视频类型
-                            video_type = "普通"
-                            if url and "uncensored-leak" in url:
-                                video_type = "无码破解"
-                            elif url and "chinese-subtitle" in url:
-                                video_type = "中文字幕"
-                          
-                            row = {
-                                "video_title": title,
-                                "video_url": url,
-                                "video_type": video_type,
-                                "video_id": video_id,
-                                "id_pattern_type": pattern_type,
-                                "page_no": page_no,
-                            }
-                            
-                            # 增量写入数据库
-                            db_writer.add_row(row)
-                            
-                            # 作品级进度更新：每保存一个作品后立即更新进度
-                            # position是从0开始的，所以当前位置是position+1
-                            progress_manager.complete_page(actress_name, page_no, position + 1)
-                            
-                            # 强制刷新，确保进度立即保存到数据库
-                            db_writer.flush()
-                        
-                        # 页面完全处理完成后，确保进度正确记录为页面完成状态
-                        # 这里传入页面的总作品数，确保记录页面已完成
-                        progress_manager.complete_page(actress_name, page_no, len(items))
-                        
-                        # 在每页结束后强制刷新，确保缓冲区内容全部落盘，避免中断造成漏写
-                        db_writer.flush()
-                        
-                        # 显示当前进度 - 使用累计计数而不是数据库查询
-                        # 避免因为complete_page中的total_videos更新导致的计数混乱
-                        cumulative_videos = (page_no - 1) * 12 + len(items)  # 假设每页12个视频
-                        print(f"演员 {actress_name}: 第 {page_no}/{total_pages} 页完成，本页 {len(items)} 个视频")
-                        
-                        # 页面间延时
-                        if page_no < total_pages:
-                            time.sleep(delay)
-                
-                    # 确保所有数据都写入
-                    db_writer.close()
+                    # 预算有限时，单个演员最多消耗剩余预算（未完成部分下次续抓）
+                    remaining = scheduler.remaining_budget()
                     
-                    # 完成演员处理
-                    progress_manager.complete_actress(actress_name)
+                    requests_before = get_page_request_count()
+                    new_count = 0
+                    failed = False
+                    lease_lost = False
+                    check_lease = lambda name=actress_name: worker.ensure_lease(name)
+                    try:
+                        if task['mode'] == 'delta':
+                            print(f"\n演员 {actress_name} 已完成，执行增量抓取（仅新作品）")
+                            new_count = crawl_actress_delta(page, progress_manager, actress_name, actress_url,
+                                                            timeout, delay, retries,
+                                                            max_actress_pages,
+                                                            stop_after_known=delta_stop_after_known,
+                                                            request_limit=remaining, check_lease=check_lease)
+                            print(f"演员 {actress_name} 增量抓取结束，新增 {new_count} 个视频")
+                        else:
+                            if task['mode'] == 'full':
+                                print(f"\n演员 {actress_name} 距上次全量抓取已超过 {full_crawl_interval_days} 天，重新全量抓取")
+                                progress_manager.reset_actress_progress(actress_name)
+                            new_count = crawl_actress_full(page, progress_manager, actress_name, actress_url,
+                                                           timeout, delay, retries, max_actress_pages,
+                                                           request_limit=remaining, check_lease=check_lease)
+                    except KeyboardInterrupt:
+                        raise
+                    except LeaseLostError as e:
+                        # 其他worker已接手：放弃该演员，不标记完成，也不释放对方的租约
+                        lease_lost = True
+                        print(f"⚠️ {e}，放弃该演员")
+                    except Exception as e:
+                        failed = True
+                        error_msg = f"处理演员 {actress_url} 时出错: {e}"
+                        print(error_msg)
+                        progress_manager.add_error(actress_name, error_msg)
+                    finally:
+                        requests_used = get_page_request_count() - requests_before
+                        scheduler.report(task, requests_used, new_count, failed)
+                        worker.release(actress_name, failed=failed or lease_lost, videos_written=new_count,
+                                       requests=requests_used)
                     
-                    total_videos = progress_manager.db_manager.get_actress_video_count(actress_name)
-                    print(f"演员 {actress_name} 抓取完成! 总共找到 {total_videos} 个视频")
-                    print(f"结果已保存到数据库")
+                    if failed or lease_lost:
+                        continue
                     
-                except KeyboardInterrupt:
-                    # 捕获用户中断，先将缓冲区写入磁盘再退出，避免漏写
-                    print(f"\n用户中断，正在保存已抓取的数据...")
-                    try:
-                        db_writer.close()
-                    except Exception as close_error:
-                        print(f"关闭数据库写入器时出错: {close_error}")
-                    raise  # 重新抛出KeyboardInterrupt
-                except Exception as e:
-                    error_msg = f"处理演员 {actress_url} 时出错: {e}"
-                    print(error_msg)
-                    progress_manager.add_error(actress_name, error_msg)
-                    db_writer.close()  # 确保关闭写入器
-                    continue
-                
-                # 演员间延时
-                time.sleep(delay)
-                
-                # 每处理完一个演员显示总体进度
-                progress_manager.print_progress()
+                    # 演员间延时
+                    time.sleep(delay)
+                    
+                    # 每处理完一个演员显示总体进度
+                    progress_manager.print_progress()
+            finally:
+                # 释放全部租约；进程崩溃时租约过期后由其他worker接手
+                worker.stop()
+            
+            scheduler.print_summary()
             
             print(f"\n{'='*60}")
             print("所有演员抓取完成!")
@@ -893,8 +902,7 @@ def crawl_all_actresses_with_resume(concurrency: int = 1, delay: float = 1.0, re
                 print(f"保存session失败: {e}")
         
         finally:
-            page.close()
-            context.close()
+            close_page(page, context, fleet_lease)
 
 
 
@@ -933,25 +941,14 @@ def get_all_actresses_urls(page: Page, timeout: int, delay: float, retries: int,
             print(f"正在获取演员列表第 {current_page} 页: {list_url}")
             
             content = get_page_content(page, list_url, timeout, delay, retries)
-            soup = BeautifulSoup(content, "html.parser")
             
+            # 是否翻下一页取决于本页解析结果，抓取与解析无法重叠，直接在进程内解析（已过滤排行榜与无效演员名）
             page_new = 0
-            for a in soup.find_all("a", href=True):
-                href = a.get("href", "")
-                if not href:
-                    continue
-                # 仅保留符合 /actresses/ 的详情页，且排除排行榜
-                if "/actresses/" in href and "/actresses/ranking" not in href:
-                    abs_url = urljoin(base_list_url, href)
-                    if abs_url not in seen:
-                        # 从URL提取演员名并进行过滤
-                        actress_name = derive_actor_name_from_url(abs_url)
-                        if not is_valid_actress_name(actress_name):
-                            continue  # 跳过无效的演员名
-                        
-                        seen.add(abs_url)
-                        actress_urls.append(abs_url)
-                        page_new += 1
+            for abs_url in parse_list_page(content, base_list_url):
+                if abs_url not in seen:
+                    seen.add(abs_url)
+                    actress_urls.append(abs_url)
+                    page_new += 1
             print(f"第 {current_page} 页新增 {page_new} 个演员，总计 {len(actress_urls)}")
             
             # 增量保存：每页抓取完成后立即保存新增的演员URL
@@ -984,7 +981,6 @@ def get_all_actresses_urls(page: Page, timeout: int, delay: float, retries: int,
                 break
             
             current_page += 1
-            time.sleep(delay)
         except Exception as e:
             print(f"获取演员列表第 {current_page} 页失败: {e}")
             # 第一页失败则直接返回；后续页失败视作到达末尾
@@ -1014,14 +1010,33 @@ def get_all_actresses_urls(page: Page, timeout: int, delay: float, retries: int,
     return actress_urls
 
 
+def parse_arguments():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="MissAV 演员页面视频ID批量抓取脚本 (Playwright版本)")
+    parser.add_argument("--delay", type=float, default=1.0, help="两次页面请求之间的最小间隔（秒），在共享限速之外额外生效")
+    parser.add_argument("--retries", type=int, default=3, help="重试次数")
+    parser.add_argument("--timeout", type=int, default=30, help="页面加载超时时间（秒）")
+    parser.add_argument("--max-actress-pages", type=int, default=300, help="每个演员的最大作品页数")
+    parser.add_argument("--actresses-max-pages", type=int, default=1500, help="演员列表最大页数")
+    parser.add_argument("--no-delta", action="store_true", help="关闭增量模式，已完成的演员直接跳过")
+    parser.add_argument("--full-interval-days", type=float, default=30, help="强制全量抓取的间隔天数")
+    parser.add_argument("--delta-stop-after", type=int, default=12, help="增量模式下连续遇到多少个已知作品后停止翻页")
+    parser.add_argument("--request-budget", type=int, default=None, help="本次运行的演员页请求预算（默认不限）")
+    parser.add_argument("--worker-id", default=None, help="分布式抓取的worker标识（默认 主机名:进程号）")
+    parser.add_argument("--lease-seconds", type=float, default=DEFAULT_LEASE_SECONDS, help="演员租约时长（秒）")
+    add_har_arguments(parser)
+    return parser.parse_args()
+
+
 def main():
-    # 设置默认参数，不再解析命令行参数
+    args = parse_arguments()
+    configure_from_args(args)
     concurrency = 1
-    delay = 1.0
-    retries = 3
-    timeout = 30
-    max_actress_pages = 300  # 每个演员的最大作品页数（测试用）
-    actresses_max_pages = 1500  # 演员列表最大页数（测试用）
+    delay = args.delay
+    retries = args.retries
+    timeout = args.timeout
+    max_actress_pages = args.max_actress_pages  # 每个演员的最大作品页数
+    actresses_max_pages = args.actresses_max_pages  # 演员列表最大页数
     
     print("MissAV 演员页面视频ID批量抓取脚本 (Playwright版本)")
     print(f"并发数: {concurrency}")
@@ -1030,12 +1045,20 @@ def main():
     print(f"超时: {timeout}s")
     print(f"每个演员最大页数: {max_actress_pages}")
     print(f"演员列表最大页数: {actresses_max_pages}")
+    print(f"增量模式: {'关闭' if args.no_delta else f'开启 (每 {args.full_interval_days} 天强制全量)'}")
+    print(f"请求预算: {args.request_budget if args.request_budget is not None else '不限'}")
     print(f"支持断点续传和增量写入 (每10个视频写入一次)")
     print("-" * 50)
     
     try:
         # 使用支持断点续传的函数
-        crawl_all_actresses_with_resume(concurrency, delay, retries, timeout, max_actress_pages, actresses_max_pages)
+        crawl_all_actresses_with_resume(concurrency, delay, retries, timeout, max_actress_pages, actresses_max_pages,
+                                        delta_mode=not args.no_delta,
+                                        full_crawl_interval_days=args.full_interval_days,
+                                        delta_stop_after_known=args.delta_stop_after,
+                                        request_budget=args.request_budget,
+                                        worker_id=args.worker_id,
+                                        lease_seconds=args.lease_seconds)
     except Exception as e:
         print(f"抓取失败: {e}")
         return 1
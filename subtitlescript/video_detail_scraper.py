@@ -9,6 +9,8 @@ python video_detail_scraper.py --batch --limit 50  # 批量处理未抓取的视
 python video_detail_scraper.py --batch  # 批量处理所有未抓取的视频
 python video_detail_scraper.py --url "..." --no-save  # 仅测试不保存
 python video_detail_scraper.py --update-subtitle-status  # 更新所有视频的字幕存在状态
+python video_detail_scraper.py --batch --limit 20 --record-har ./har/detail.har  # 录制HAR
+python video_detail_scraper.py --url "..." --no-save --replay-har ./har/detail.har  # 离线回放（见 har_replay.py）
 
 
 功能:
@@ -25,7 +27,6 @@ python video_detail_scraper.py --update-subtitle-status  # 更新所有视频的
 import argparse
 import json
 import os
-import re
 import time
 import requests
 from typing import Dict, List, Optional
@@ -41,6 +42,12 @@ from bs4 import BeautifulSoup
 
 # 导入数据库管理器
 from database_manager import DatabaseManager
+from rate_limiter import acquire_for_url
+from html_parsers import extract_video_description, extract_cover_url, extract_video_metadata, parse_detail_page
+from page_pipeline import iter_pages_pipelined
+from parse_service import get_parse_service
+from browser_fleet import open_page, close_page
+from har_replay import add_har_arguments, apply_har, configure_from_args, database_path
 
 # 配置管理
 BACKEND_CONFIG = {
@@ -246,6 +253,7 @@ def setup_playwright_page(playwright: Playwright, session_file: str = "./session
             browser.close()
             raise RuntimeError(f"无法创建浏览器上下文: {e2}")
     
+    apply_har(context)
     page = context.new_page()
     stealth_sync(page)
     
@@ -271,128 +279,6 @@ def setup_playwright_page(playwright: Playwright, session_file: str = "./session
     return page, context
 
 
-def extract_video_description(soup: BeautifulSoup) -> str:
-    """提取视频详情描述"""
-    # 查找包含 line-clamp-2 类的 div 元素
-    desc_div = soup.find("div", class_=lambda x: x and "line-clamp-2" in x)
-    if desc_div:
-        return desc_div.get_text(strip=True)
-    return ""
-
-
-def extract_cover_url(soup: BeautifulSoup) -> str:
-    """提取视频封面URL - 优化版本"""
-    # 优化：直接查找最常见的情况 - video标签的data-poster属性
-    video_tag = soup.find("video", {"data-poster": True})
-    if video_tag:
-        poster_url = video_tag.get("data-poster")
-        if poster_url and poster_url.strip():
-            return poster_url.strip()
-    
-    # 备用方案1: 查找video标签的poster属性
-    video_tag = soup.find("video", poster=True)
-    if video_tag:
-        poster_url = video_tag.get("poster")
-        if poster_url and poster_url.strip():
-            return poster_url.strip()
-    
-    # 备用方案2: 查找包含 plyr__poster 类的 div 元素
-    poster_div = soup.find("div", class_="plyr__poster")
-    if poster_div:
-        style = poster_div.get("style", "")
-        if "background-image" in style:
-            import re
-            # 从 style 属性中提取 URL
-            match = re.search(r'url\(&quot;([^&]+)&quot;\)', style)
-            if match:
-                return match.group(1)
-            match = re.search(r'url\(["\']([^"\']+)["\']\)', style)
-            if match:
-                return match.group(1)
-    
-    return ""
-
-
-def extract_video_metadata(soup: BeautifulSoup) -> Dict[str, any]:
-    """提取视频元数据信息"""
-    metadata = {
-        "release_date": "",
-        "video_id": "",
-        "title": "",
-        "actresses": [],
-        "actors": [],
-        "genres": [],
-        "series": "",
-        "maker": "",
-        "director": "",
-        "label": ""
-    }
-    
-    # 查找包含元数据的 div.space-y-2
-    metadata_div = soup.find("div", class_="space-y-2")
-    if not metadata_div:
-        return metadata
-    
-    # 提取各个字段
-    for div in metadata_div.find_all("div", class_="text-secondary"):
-        text = div.get_text(strip=True)
-        
-        if text.startswith("发行日期:"):
-            time_elem = div.find("time")
-            if time_elem:
-                metadata["release_date"] = time_elem.get("datetime", "").split("T")[0]
-        
-        elif text.startswith("番号:"):
-            span = div.find("span", class_="font-medium")
-            if span:
-                metadata["video_id"] = span.get_text(strip=True)
-        
-        elif text.startswith("标题:"):
-            span = div.find("span", class_="font-medium")
-            if span:
-                metadata["title"] = span.get_text(strip=True)
-        
-        elif text.startswith("女优:"):
-            actresses = []
-            for a in div.find_all("a", class_="text-nord13"):
-                actresses.append(a.get_text(strip=True))
-            metadata["actresses"] = actresses
-        
-        elif text.startswith("男优:"):
-            actors = []
-            for a in div.find_all("a", class_="text-nord13"):
-                actors.append(a.get_text(strip=True))
-            metadata["actors"] = actors
-        
-        elif text.startswith("类型:"):
-            genres = []
-            for a in div.find_all("a", class_="text-nord13"):
-                genres.append(a.get_text(strip=True))
-            metadata["genres"] = genres
-        
-        elif text.startswith("系列:"):
-            a = div.find("a", class_="text-nord13")
-            if a:
-                metadata["series"] = a.get_text(strip=True)
-        
-        elif text.startswith("发行商:"):
-            a = div.find("a", class_="text-nord13")
-            if a:
-                metadata["maker"] = a.get_text(strip=True)
-        
-        elif text.startswith("导演:"):
-            a = div.find("a", class_="text-nord13")
-            if a:
-                metadata["director"] = a.get_text(strip=True)
-        
-        elif text.startswith("标籤:"):
-            a = div.find("a", class_="text-nord13")
-            if a:
-                metadata["label"] = a.get_text(strip=True)
-    
-    return metadata
-
-
 def extract_video_id_from_url(url: str) -> Optional[str]:
     """从URL中提取视频ID"""
     try:
@@ -434,7 +320,7 @@ def extract_video_id_from_url(url: str) -> Optional[str]:
 def save_video_details_to_db(video_id: str, metadata: Dict, cover_url: str, description: str, video_url: str = None):
     """将视频详情保存到数据库"""
     try:
-        db_manager = DatabaseManager("./database/actresses.db")
+        db_manager = DatabaseManager(database_path("./database/actresses.db"))
         
         # 如果提供了video_url，优先按URL查找记录；否则按video_id查找
         if video_url:
@@ -500,11 +386,12 @@ def scrape_single_video(url: str, timeout: int = 30, save_to_db: bool = True) ->
     print(f"提取到视频ID: {video_id}")
     
     with sync_playwright() as playwright:
-        page, context = setup_playwright_page(playwright)
+        page, context, fleet_lease = open_page(playwright, "missav", setup_playwright_page)
         
         try:
             # 访问页面并获取内容
             print(f"正在访问: {url}")
+            acquire_for_url(url)
             response = page.goto(url, wait_until="domcontentloaded", timeout=timeout * 1000)
             
             if response and response.status != 200:
@@ -544,13 +431,13 @@ def scrape_single_video(url: str, timeout: int = 30, save_to_db: bool = True) ->
             return False
         
         finally:
-            context.close()
+            close_page(page, context, fleet_lease)
 
 
 def scrape_batch_videos(limit: int = 100) -> Dict[str, int]:
     """批量抓取未处理的视频详情"""
     try:
-        db_manager = DatabaseManager("./database/actresses.db")
+        db_manager = DatabaseManager(database_path("./database/actresses.db"))
         
         # 获取统计信息
         stats = db_manager.get_video_details_stats()
@@ -567,42 +454,54 @@ def scrape_batch_videos(limit: int = 100) -> Dict[str, int]:
         success_count = 0
         failed_count = 0
         
+        # 解析交给解析服务：任务多时使用进程池，少量任务在进程内解析
+        parse_executor = get_parse_service(expected_tasks=len(unscraped_videos))
+        
         with sync_playwright() as playwright:
-            page, context = setup_playwright_page(playwright)
+            page, context, fleet_lease = open_page(playwright, "missav", setup_playwright_page)
+            
+            def fetch_detail(index: int, video_url: str) -> str:
+                video = unscraped_videos[index - 1]
+                print(f"\n[{index}/{len(unscraped_videos)}] 处理视频: {video['video_id']}")
+                
+                # 访问页面并获取内容（请求频率由跨进程共享限速控制）
+                acquire_for_url(video_url)
+                response = page.goto(video_url, wait_until="domcontentloaded", timeout=30000)
+                
+                if response and response.status != 200:
+                    raise RuntimeError(f"页面访问失败，状态码: {response.status}")
+                
+                # 优化：使用domcontentloaded替代networkidle，减少等待时间
+                page.wait_for_load_state('domcontentloaded', timeout=5000)
+                
+                # 优化：直接尝试查找video元素，减少不必要的等待
+                try:
+                    page.wait_for_selector('video', timeout=2000)
+                except:
+                    pass  # 如果没有video元素也继续执行
+                
+                return page.content()
+            
+            # 构建视频URL（假设使用missav.live域名）
+            video_pages = [(i, f"https://missav.live/cn/{video['video_id'].lower()}")
+                           for i, video in enumerate(unscraped_videos, 1)]
             
             try:
-                for i, video in enumerate(unscraped_videos, 1):
-                    print(f"\n[{i}/{len(unscraped_videos)}] 处理视频: {video['video_id']}")
+                # 抓取下一个视频的同时解析当前视频
+                for result in iter_pages_pipelined(video_pages, fetch_detail, parse_detail_page,
+                                                   lookahead=1, executor=parse_executor):
+                    video = unscraped_videos[result["page_no"] - 1]
+                    
+                    if result["error"] is not None:
+                        failed_count += 1
+                        print(f"✗ 处理失败: {video['video_id']} - {result['error']}")
+                        continue
                     
                     try:
-                        # 构建视频URL（假设使用missav.live域名）
-                        video_url = f"https://missav.live/cn/{video['video_id'].lower()}"
-                        
-                        # 访问页面并获取内容
-                        response = page.goto(video_url, wait_until="domcontentloaded", timeout=30000)
-                        
-                        if response and response.status != 200:
-                            print(f"页面访问失败，状态码: {response.status}")
-                            failed_count += 1
-                            continue
-                        
-                        # 优化：使用domcontentloaded替代networkidle，减少等待时间
-                        page.wait_for_load_state('domcontentloaded', timeout=5000)
-                        
-                        # 优化：直接尝试查找video元素，减少不必要的等待
-                        try:
-                            page.wait_for_selector('video', timeout=2000)
-                        except:
-                            pass  # 如果没有video元素也继续执行
-                        
-                        # 获取页面内容
-                        content = page.content()
-                        soup = BeautifulSoup(content, 'html.parser')
-                        
                         # 抓取详情
-                        description = extract_video_description(soup)
-                        metadata = extract_video_metadata(soup)
-                        cover_url = extract_cover_url(soup)
+                        description = result["items"]["description"]
+                        metadata = result["items"]["metadata"]
+                        cover_url = result["items"]["cover_url"]
                         
                         # 检查字幕是否存在
                         subtitle_exists = check_subtitle_exists(video['video_id'])
@@ -627,16 +526,13 @@ def scrape_batch_videos(limit: int = 100) -> Dict[str, int]:
                         subtitle_status = "有字幕" if subtitle_exists else "无字幕"
                         print(f"✓ 成功处理: {video['actress_name']} - {video['video_title']} ({subtitle_status})")
                         
-                        # 添加延迟避免过于频繁的请求
-                        time.sleep(2)
-                        
                     except Exception as e:
                         failed_count += 1
                         print(f"✗ 处理失败: {video['video_id']} - {e}")
                         continue
                         
             finally:
-                context.close()
+                close_page(page, context, fleet_lease)
         
         result = {
             'total': len(unscraped_videos),
@@ -907,8 +803,10 @@ def main():
     parser.add_argument("--timeout", type=int, default=30, help="页面加载超时时间（秒）")
     parser.add_argument("--no-save", action="store_true", help="不保存到数据库，仅打印结果")
     parser.add_argument("--update-subtitle-status", action="store_true", help="更新所有视频的字幕存在状态")
+    add_har_arguments(parser)
     
     args = parser.parse_args()
+    configure_from_args(args)
     
     # 验证参数
     if not args.batch and not args.url and not args.update_subtitle_status: